@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import random
+import socket
 import sys
+import time
+import zlib
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -21,11 +25,74 @@ from oslo_service import service
 
 from ovn_bgp_agent import config
 from ovn_bgp_agent.drivers import driver_api
+from ovn_bgp_agent.utils import device_registry
+from ovn_bgp_agent.utils import linux_net
+from ovn_bgp_agent.utils import profiling
 
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+# Maximum factor the jitter is multiplied by when the runs overrun the
+# interval
+MAX_BACKOFF_FACTOR = 8
+
+
+class ReconcileScheduler(object):
+    """Run a reconcile function periodically, spread over time
+
+    The first run is delayed by a per agent (hostname based) phase offset,
+    and the following ones start the interval plus a random jitter after
+    the previous one started, so that the agents do not hit the OVSDB
+    servers and FRR at the same time. When a run takes longer than the
+    interval, the next one is delayed by a backoff, which grows with the
+    consecutive overruns up to the jitter times MAX_BACKOFF_FACTOR (and no
+    more than the interval), instead of running right away. Without jitter
+    the runs are then scheduled as with a FixedIntervalLoopingCall. And
+    when a run reports that it found drift (returning True), the next one
+    starts the drift_interval after it, if shorter than the interval.
+    """
+
+    def __init__(self, func, interval, drift_interval=0):
+        self.func = func
+        self.interval = interval
+        self.drift_interval = drift_interval
+        self.overruns = 0
+
+    def start(self):
+        loop = loopingcall.DynamicLoopingCall(self._run)
+        loop.start(initial_delay=self.get_initial_delay())
+        return loop
+
+    def get_initial_delay(self):
+        max_offset = self.interval * CONF.reconcile_jitter
+        phase = zlib.crc32(socket.gethostname().encode()) / 0xffffffff
+        return max_offset * phase
+
+    def _run(self):
+        start = time.monotonic()
+        drift = self.func()
+        return self.get_next_delay(time.monotonic() - start, drift)
+
+    def get_next_delay(self, elapsed, drift=None):
+        """Get the delay until the next run, from the end of the last one"""
+        if elapsed >= self.interval:
+            self.overruns += 1
+            backoff = min(2 ** (self.overruns - 1), MAX_BACKOFF_FACTOR)
+            delay = min(self.interval * CONF.reconcile_jitter * backoff,
+                        self.interval)
+            LOG.warning("Run of %s took %.2f seconds, more than its interval "
+                        "of %s seconds. Delaying the next one %.2f seconds",
+                        self.func.__name__, elapsed, self.interval, delay)
+            return delay
+        self.overruns = 0
+        if drift and 0 < self.drift_interval < self.interval:
+            interval = self.drift_interval
+        else:
+            interval = self.interval * (
+                1 + random.uniform(0, CONF.reconcile_jitter))
+        return max(interval - elapsed, 0)
+
 
 class BGPAgent(service.Service):
     """BGP OVN Agent."""
@@ -41,16 +108,16 @@ class BGPAgent(service.Service):
         self.agent_driver.start()
 
         LOG.info("Service '%s' started", self.__class__.__name__)
-        sync_routes = loopingcall.FixedIntervalLoopingCall(self.sync)
-        sync_routes.start(interval=CONF.reconcile_interval)
-        sync_frr = loopingcall.FixedIntervalLoopingCall(self.frr_sync)
-        sync_frr.start(interval=CONF.frr_reconcile_interval)
+        ReconcileScheduler(self.sync, CONF.reconcile_interval,
+                           CONF.reconcile_drift_interval).start()
+        ReconcileScheduler(self.frr_sync, CONF.frr_reconcile_interval).start()
 
     def sync(self):
         LOG.info("Running reconciliation loop to ensure routes/rules are "
                  "in place.")
         try:
-            self.agent_driver.sync()
+            with profiling.sync_profile(CONF.driver):
+                return self.agent_driver.sync()
         except Exception as e:
             LOG.exception("Unexpected exception while running the sync: %s", e)
 
@@ -77,6 +144,11 @@ def start():
     config.init(sys.argv[1:])
     config.setup_logging()
     config.setup_privsep()
+    profiling.setup_signal_handler()
+    if CONF.cache_link_indexes:
+        linux_net.start_link_monitor()
+    if CONF.cache_ensured_devices:
+        device_registry.start_monitor()
 
     bgp_agent_launcher = service.launch(config.CONF, BGPAgent())
     bgp_agent_launcher.wait()
@@ -30,6 +30,89 @@ agent_opts = [
                help='Time (seconds) between re-sync actions to ensure frr '
                     'configuration is correct, in case frr is restart.',
                default=15),
+    cfg.FloatOpt('reconcile_jitter',
+                 min=0,
+                 max=1,
+                 default=0.1,
+                 help='Fraction of the reconcile_interval and '
+                      'frr_reconcile_interval used to spread the re-sync '
+                      'actions of the agents over time. The first one is '
+                      'delayed by a per agent (hostname based) offset up to '
+                      'that fraction of the interval, and every following '
+                      'one by a random jitter up to it. The re-sync '
+                      'actions overrunning the interval delay the next one '
+                      'up to 8 times that fraction of the interval. Set it '
+                      'to 0 to run the first re-sync on startup and the '
+                      'rest at fixed intervals.'),
+    cfg.IntOpt('reconcile_drift_interval',
+               min=0,
+               default=30,
+               help='Time (seconds) until the next re-sync action when the '
+                    'previous one found the node state drifted from the '
+                    'expected one, instead of waiting for the whole '
+                    'reconcile_interval. Only used with drivers reporting '
+                    'it, i.e., ovn_bgp_driver with sync_skip_unchanged '
+                    'enabled. Set it to 0 to disable it.'),
+    cfg.StrOpt('trace_file',
+               default=None,
+               help='File where the traces of the OVSDB notifications '
+                    'handling (events matching, lock waits, wiring and '
+                    'privsep calls) are written to, in OpenTelemetry '
+                    '(OTLP/JSON) format, one per line. Tracing is disabled '
+                    'if not set.'),
+    cfg.FloatOpt('trace_sample_rate',
+                 min=0,
+                 max=1,
+                 default=0.1,
+                 help='Fraction of the OVSDB notifications traced when '
+                      'trace_file is set.'),
+    cfg.StrOpt('profiling_dir',
+               default=None,
+               help='Directory where the profiling data requested by sending '
+                    'SIGUSR1 to the agent is written to. Defaults to the '
+                    'system temporary directory. Existing files (or '
+                    'symlinks) are never overwritten.'),
+    cfg.IntOpt('profiling_syncs',
+               min=0,
+               default=1,
+               help='Number of re-sync actions profiled, with the wall-clock '
+                    'time of each of their phases, after receiving SIGUSR1.'),
+    cfg.IntOpt('profiling_duration',
+               min=0,
+               default=60,
+               help='Time (seconds) the OVN events handlers are profiled '
+                    'for after receiving SIGUSR1. Set it to 0 to not profile '
+                    'them.'),
+    cfg.BoolOpt('cache_ensured_devices',
+                default=False,
+                help='If enabled, the devices (VRFs, bridges, vxlan, veth, '
+                     'vlan and dummy devices) already ensured by the agent '
+                     'are not ensured again on every re-sync, saving the '
+                     'privileged calls, unless a link event shows they were '
+                     'deleted, set down or moved to another master.'),
+    cfg.BoolOpt('cache_link_indexes',
+                default=False,
+                help='If enabled, the privileged daemon caches the index of '
+                     'the interfaces, kept up to date with the link events, '
+                     'instead of looking it up on every call made on an '
+                     'interface by its name.'),
+    cfg.IntOpt('sync_workers',
+               min=1,
+               default=1,
+               help='Number of threads used by the re-sync action to process '
+                    'the ports and the routers (cr-lrps with their LRPs and '
+                    'load balancers) in parallel, as well as to set up the '
+                    'EVPN VNIs found on the host after a restart. With 1 '
+                    '(default) they are processed sequentially.'),
+    cfg.BoolOpt('sync_skip_unchanged',
+                default=False,
+                help='If enabled, the re-sync action is skipped when there '
+                     'were no changes on the OVN SB DB since the previous '
+                     'one and a fingerprint of the node state (IPs exposed, '
+                     'ip rules and routes on the OVN routing tables and '
+                     'OVS flows) matches the one taken after it. Only '
+                     'supported by the ovn_bgp_driver (SB DB based) driver, '
+                     'the other drivers always run the re-sync action.'),
     cfg.BoolOpt('expose_tenant_networks',
                 help='Expose VM IPs on tenant networks. '
                      'If this flag is enabled, it takes precedence over '
@@ -102,6 +185,15 @@ agent_opts = [
                 help='If enabled, all routes are removed from the VRF table'
                      '(specified by bgp_vrf_table_id option) at startup.',
                 default=False),
+    cfg.BoolOpt('bgp_graceful_restart',
+                help='If enabled, BGP graceful restart (with preserved '
+                     'forwarding state) is configured on FRR so that peers '
+                     'keep the routes while the agent or FRR restarts. '
+                     'Besides, when clear_vrf_routes_on_startup is enabled, '
+                     'the routes on the VRF table are not removed at '
+                     'startup, but marked as stale and only the ones not '
+                     're-installed by the first sync are removed.',
+                default=False),
     cfg.StrOpt('bgp_nic',
                default='bgp-nic',
                help='The name of the interface used within the VRF '
@@ -280,4 +372,7 @@ def list_opts():
         ("agent", root_helper_opts),
         ("ovn", ovn_opts),
         ("local_ovn_cluster", local_ovn_cluster_opts),
+        # the [privsep] section is listed by the oslo.privsep namespace
+        ("privsep_ovs_vsctl", priv_context.OPTS),
+        ("privsep_vtysh", priv_context.OPTS),
     ]
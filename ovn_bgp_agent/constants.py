@@ -53,6 +53,8 @@ OVN_LB_EXT_ID_ROUTER_KEY = [
 
 OVS_RULE_COOKIE = "999"
 OVS_VRF_RULE_COOKIE = "998"
+# Priority of the flows added with no explicit one (OFP_DEFAULT_PRIORITY)
+OVS_DEFAULT_FLOW_PRIORITY = 32768
 
 FRR_SOCKET_PATH = "/run/frr/"
 
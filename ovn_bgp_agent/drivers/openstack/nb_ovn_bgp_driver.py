@@ -16,7 +16,6 @@ import collections
 import ipaddress
 import threading
 
-from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log as logging
 
@@ -30,13 +29,17 @@ from ovn_bgp_agent.drivers.openstack.utils import ovn
 from ovn_bgp_agent.drivers.openstack.utils import ovs
 from ovn_bgp_agent.drivers.openstack.utils import port as port_utils
 from ovn_bgp_agent.drivers.openstack.utils import wire as wire_utils
+from ovn_bgp_agent.drivers.openstack.watchers import base_watcher
 from ovn_bgp_agent.drivers.openstack.watchers import nb_bgp_watcher as watcher
 from ovn_bgp_agent import exceptions
 from ovn_bgp_agent.utils import linux_net
+from ovn_bgp_agent.utils import profiling
+from ovn_bgp_agent.utils import tracing
 
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
+
 # LOG.setLevel(logging.DEBUG)
 # logging.basicConfig(level=logging.DEBUG)
 
@@ -57,6 +60,16 @@ def _validate_ovn_version(distributed, idl):
             "OVN_Northbound schema. Please update OVN to 23.09.0 or later.")
 
 
+class ExposedIp(collections.namedtuple(
+        'ExposedIp', ['bridge_device', 'bridge_vlan', 'via'])):
+    """Wiring of an IP exposed through a provider network
+
+    Kept for each exposed IP, hence a compact record. Tenant IPs, which are
+    not wired, are kept with None instead.
+    """
+    __slots__ = ()
+
+
 class NATExposer:
     def __init__(self, agent):
         self.agent = agent
@@ -116,6 +129,16 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
     def __init__(self):
         self.allowed_address_scopes = set(CONF.address_scopes or [])
 
+        # Logical switches classification, kept across syncs and
+        # invalidated on localnet, logical switch and bridge mappings
+        # changes
+        # {'ls_name': {'bridge_device': X, 'bridge_vlan': Y, 'localnet': Z}}
+        self.ovn_provider_ls = {}
+        # dict instead of list to speed up look ups
+        self.ovn_tenant_ls = {}  # {'ls_name': True}
+        # OVS topology generation the provider bridges were last wired for
+        self.ovs_topology_generation = None
+
         self._init_vars()
 
         self._nb_idl = None
@@ -190,22 +213,21 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         self.ovs_flows = {}
 
         self.ovn_routing_tables = {}  # {'br-ex': 200}
-        # {'br-ex': [route1, route2]}
-        self.ovn_routing_tables_routes = collections.defaultdict(list)
+        # {'br-ex': {route1, route2}}
+        self.ovn_routing_tables_routes = collections.defaultdict(set)
 
         self.ovn_local_cr_lrps = {}
         self.ovn_local_lrps = {}
 
-        # {'ls_name': ['ip': {'bridge_device': X, 'bridge_vlan': Y}]}
+        # {'ls_name': {'ip': ExposedIp(bridge_device, bridge_vlan, via)}}
         self._exposed_ips = {}
         self._ovs_flows = collections.defaultdict()
-        self.ovn_provider_ls = {}
-        # dict instead of list to speed up look ups
-        self.ovn_tenant_ls = {}  # {'ls_name': True}
 
     def start(self):
         self.ovs_idl = ovs.OvsIdl()
-        self.ovs_idl.start(CONF.ovsdb_connection)
+        self.ovs_idl.start(
+            CONF.ovsdb_connection,
+            events=base_watcher.get_ovs_topology_events(self))
         self.chassis = self.ovs_idl.get_own_chassis_name()
         self.chassis_id = self.ovs_idl.get_own_chassis_id()
 
@@ -220,7 +242,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
 
         # Clear vrf routing table
         if CONF.clear_vrf_routes_on_startup:
-            linux_net.delete_routes_from_table(CONF.bgp_vrf_table_id)
+            bgp_utils.clear_vrf_routes()
 
         LOG.info("VRF configuration for advertising routes completed")
         if self._expose_tenant_networks and self.allowed_address_scopes:
@@ -259,14 +281,16 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
                   watcher.ChassisRedirectCreateEvent(self),
                   watcher.ChassisRedirectDeleteEvent(self),
                   watcher.DistributedFlagChangedEvent(self),
+                  # The cached provider information of the logical switches
+                  # comes from their localnet ports, whatever the mode
+                  watcher.LocalnetCreateDeleteEvent(self),
+                  watcher.LocalnetUpdateEvent(self),
                   }
 
         if CONF.exposing_method == constants.EXPOSE_METHOD_VRF:
             # For vrf we require more information on the logical_switch
             # before performing a sync.
             events.add(watcher.LogicalSwitchUpdateEvent(self))
-        else:
-            events.add(watcher.LocalnetCreateDeleteEvent(self))
 
         if self._expose_tenant_networks:
             events.update({watcher.LogicalSwitchPortSubnetAttachEvent(self),
@@ -281,14 +305,16 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
     def _get_additional_events(self, distributed):
         return self.__d_events[distributed]
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def frr_sync(self):
         LOG.debug("Ensuring VRF configuration for advertising routes")
         # Base BGP configuration
         bgp_utils.ensure_base_bgp_configuration()
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def sync(self):
+        bridge_mappings = self.ovn_bridge_mappings
+        topology_generation = self.ovs_idl.topology_generation
         self._init_vars()
 
         LOG.debug("Configuring default wiring for each provider network")
@@ -297,12 +323,18 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
             wire_utils.ensure_base_wiring_config(
                 self.nb_idl, self.ovs_idl, ovn_idl=self.local_nb_idl,
                 routing_tables=self.ovn_routing_tables))
+        if self.ovn_bridge_mappings != bridge_mappings:
+            # bridge devices of the provider networks may have changed
+            self.invalidate_ls_cache()
+        self.ovs_topology_generation = topology_generation
+        profiling.end_phase('wiring')
 
         LOG.debug("Syncing current routes.")
         # add missing routes/ips for OVN router gateway ports
         ports = self.nb_idl.get_active_cr_lrp_on_chassis(self.chassis_id)
         for port in ports:
             self._ensure_crlrp_exposed(port)
+        profiling.end_phase('cr_lrps')
         # add missing routes/ips for subnets connected to local gateway ports
         ports = self.nb_idl.get_active_local_lrps(
             self.ovn_local_cr_lrps.keys())
@@ -316,6 +348,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
                     constants.OVN_LS_NAME_EXT_ID_KEY),
                 'address_scopes': driver_utils.get_addr_scopes(port)}
             self._expose_subnet(ips, subnet_info)
+        profiling.end_phase('lrps')
 
         # add missing routes/ips for IPs on provider network and FIPs
         ports = self.nb_idl.get_active_lsp_on_chassis(self.chassis)
@@ -330,9 +363,11 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
                                  constants.OVN_VIRTUAL_VIF_PORT_TYPE]:
                 continue
             self._ensure_lsp_exposed(port)
+        profiling.end_phase('lsps')
 
         # add missing routes/ips for OVN loadbalancers
         self._expose_lbs(self.ovn_local_cr_lrps.keys())
+        profiling.end_phase('lbs')
 
         # remove extra wiring leftovers
         wire_utils.cleanup_wiring(self.nb_idl,
@@ -341,6 +376,9 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
                                   self._exposed_ips,
                                   self.ovn_routing_tables,
                                   self.ovn_routing_tables_routes)
+        # remove the routes left from before the restart, if any
+        bgp_utils.sweep_stale_vrf_routes()
+        profiling.end_phase('cleanup')
 
     def _ensure_lsp_exposed(self, port):
         port_fip = port.external_ids.get(constants.OVN_FIP_EXT_ID_KEY)
@@ -403,10 +441,10 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
                     ovn_idl=self.local_nb_idl):
                 # Expose the IP now that it is connected
                 bgp_utils.announce_ips(port_ips)
+                exposed_ip = ExposedIp(bridge_device, bridge_vlan, None)
                 for ip in port_ips:
-                    self._exposed_ips.setdefault(logical_switch, {}).update(
-                        {ip: {'bridge_device': bridge_device,
-                              'bridge_vlan': bridge_vlan}})
+                    self._exposed_ips.setdefault(logical_switch, {})[ip] = (
+                        exposed_ip)
             else:
                 return False
         except Exception as e:
@@ -467,6 +505,21 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
                 if lb.external_ids.get(constants.OVN_LB_VIP_FIP_EXT_ID_KEY):
                     self._withdraw_ovn_lb_fip(lb)
 
+    def invalidate_ls_cache(self, logical_switch=None):
+        '''Forget the cached classification of the logical switches
+
+        If no logical switch is given, the whole cache is cleared.
+        '''
+        if logical_switch is None:
+            LOG.debug("Clearing the cached logical switches information")
+            self.ovn_provider_ls.clear()
+            self.ovn_tenant_ls.clear()
+            return
+        LOG.debug("Clearing the cached information of logical switch %s",
+                  logical_switch)
+        self.ovn_provider_ls.pop(logical_switch, None)
+        self.ovn_tenant_ls.pop(logical_switch, None)
+
     def is_ls_provider(self, logical_switch):
         '''Check if given logical switch is a provider network on this host
 
@@ -509,7 +562,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
 
         return False
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def expose_ip(self, ips, ips_info):
         '''Advertice BGP route by adding IP to device.
 
@@ -573,7 +626,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         LOG.debug("Added BGP route for logical port with ip %s", ips)
         return ips
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def withdraw_ip(self, ips, ips_info):
         '''Withdraw BGP route by removing IP from device.
 
@@ -692,7 +745,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         ls_name = "neutron-{}".format(net_id)
         return nat_entry.external_ip, external_mac, ls_name
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def expose_fip(self, ip, mac, logical_switch, row):
         '''Advertice BGP route by adding IP to device.
 
@@ -727,7 +780,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         LOG.debug("Added BGP route for FIP with ip %s", ip)
         return True
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def withdraw_fip(self, ip, row):
         '''Withdraw BGP route by removing IP from device.
 
@@ -748,19 +801,19 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         if not fip_info:
             # No information to withdraw the FIP
             return
-        bridge_device = fip_info['bridge_device']
-        bridge_vlan = fip_info['bridge_vlan']
+        bridge_device = fip_info.bridge_device
+        bridge_vlan = fip_info.bridge_vlan
 
         LOG.debug("Deleting BGP route for FIP with ip %s", ip)
         self._withdraw_provider_port([ip], tenant_logical_switch,
                                      bridge_device, bridge_vlan)
         LOG.debug("Deleted BGP route for FIP with ip %s", ip)
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def expose_remote_ip(self, ips, ips_info):
         self._expose_remote_ip(ips, ips_info)
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def withdraw_remote_ip(self, ips, ips_info):
         self._withdraw_remote_ip(ips, ips_info)
 
@@ -777,7 +830,8 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
             return
 
         _, cr_lrp_info = self._get_exposed_ip(lrps[0])
-        return cr_lrp_info
+        if cr_lrp_info:
+            return cr_lrp_info._asdict()
 
     def _expose_remote_ip(self, ips, ips_info):
         if (CONF.advertisement_method_tenant_networks ==
@@ -810,7 +864,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         bgp_utils.announce_ips(ips_to_expose, ips_info=ips_info)
         for ip in ips_to_expose:
             self._exposed_ips.setdefault(
-                ips_info['logical_switch'], {}).setdefault(ip, {})
+                ips_info['logical_switch'], {}).setdefault(ip, None)
 
         LOG.debug("Added BGP route for tenant IP(s) %s on chassis %s",
                   ips_to_expose, self.chassis)
@@ -849,11 +903,11 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         LOG.debug("Deleted BGP route for tenant IP(s) %s on chassis %s",
                   ips_to_withdraw, self.chassis)
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def expose_subnet(self, ips, subnet_info):
         return self._expose_subnet(ips, subnet_info)
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def withdraw_subnet(self, ips, subnet_info):
         return self._withdraw_subnet(ips, subnet_info)
 
@@ -1038,11 +1092,10 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
                         self.ovn_routing_tables, cr_lrp_info.get('ips')):
 
                     logical_switch = cr_lrp_info['provider_switch']
-                    self._exposed_ips.setdefault(logical_switch, {}).update(
-                        {ip: {
-                            'bridge_device': cr_lrp_info.get('bridge_device'),
-                            'bridge_vlan': cr_lrp_info.get('bridge_vlan'),
-                            'via': cr_lrp_info.get('ips')}})
+                    self._exposed_ips.setdefault(logical_switch, {})[ip] = (
+                        ExposedIp(cr_lrp_info.get('bridge_device'),
+                                  cr_lrp_info.get('bridge_vlan'),
+                                  cr_lrp_info.get('ips')))
 
                     self.ovn_local_lrps.setdefault(
                         subnet_info['network'], set()).add(ip)
@@ -1130,7 +1183,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
 
         return True
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def expose_ovn_lb_vip(self, lb):
         self._expose_ovn_lb_vip(lb)
 
@@ -1157,7 +1210,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
             self._expose_provider_port([vip_ip], None, vip_net, bridge_device,
                                        bridge_vlan, localnet)
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def withdraw_ovn_lb_vip(self, lb):
         self._withdraw_ovn_lb_vip(lb)
 
@@ -1181,7 +1234,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
             ips_info = {'logical_switch': vip_router}
             self._withdraw_remote_ip([vip_ip], ips_info)
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def expose_ovn_lb_fip(self, lb):
         self._expose_ovn_lb_fip(lb)
 
@@ -1229,11 +1282,11 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
 
         return kwargs
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def expose_ovn_pf_lb_fip(self, lb):
         self._expose_ovn_pf_lb_fip(lb)
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def withdraw_ovn_pf_lb_fip(self, lb):
         self._withdraw_ovn_pf_lb_fip(lb)
 
@@ -1245,7 +1298,7 @@ class NBOVNBGPDriver(driver_api.AgentDriverBase):
         kwargs = self._get_parameters_from_lb(lb, True)
         self._expose_provider_port(**kwargs) if kwargs else None
 
-    @lockutils.synchronized('nbbgp')
+    @tracing.synchronized('nbbgp')
     def withdraw_ovn_lb_fip(self, lb):
         self._withdraw_ovn_lb_fip(lb)
 
@@ -13,10 +13,11 @@
 # limitations under the License.
 
 import collections
+from concurrent import futures
+import functools
 import ipaddress
 import threading
 
-from oslo_concurrency import lockutils
 from oslo_config import cfg
 from oslo_log import log as logging
 
@@ -32,6 +33,8 @@ from ovn_bgp_agent.drivers.openstack.watchers import bgp_watcher as watcher
 from ovn_bgp_agent import exceptions as agent_exc
 from ovn_bgp_agent.utils import helpers
 from ovn_bgp_agent.utils import linux_net
+from ovn_bgp_agent.utils import profiling
+from ovn_bgp_agent.utils import tracing
 
 
 CONF = cfg.CONF
@@ -43,6 +46,28 @@ OVN_TABLES = ["Port_Binding", "Chassis", "Datapath_Binding", "Load_Balancer",
               "Chassis_Private", "Logical_DP_Group"]
 
 
+class _LeftoversPlan(object):
+    """Partition view of the IPs or ip rules found on the node at sync time.
+
+    It only records the IPs the partition keeps, so that partitions can run
+    concurrently and be merged afterwards with apply.
+    """
+
+    def __init__(self, leftovers):
+        self._leftovers = leftovers
+        self._kept = set()
+
+    def __bool__(self):
+        return bool(self._leftovers)
+
+    def discard(self, ip):
+        self._kept.add(ip)
+
+    def apply(self):
+        for ip in self._kept:
+            self._leftovers.discard(ip)
+
+
 class OVNBGPDriver(driver_api.AgentDriverBase):
 
     def __init__(self):
@@ -58,8 +83,15 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
         self.ovn_routing_tables_routes = collections.defaultdict()
         # {ovn_lb: {'ips': [VIP1, VIP2], 'gateway_port': cr-lrpX}
         self.provider_ovn_lbs = collections.defaultdict()
+        # the sync partitions may expose the loadbalancers concurrently
+        self._provider_ovn_lbs_lock = threading.Lock()
         # {datapath: localnet_port_name}
         self.ovn_provider_datapath = {}
+        # (SB changes count, node state fingerprint) after the last sync
+        self._sync_state = None
+        self.skipped_syncs = 0
+        # OVS topology generation the provider bridges were last wired for
+        self.ovs_topology_generation = None
 
         self._sb_idl = None
         self._post_fork_event = threading.Event()
@@ -76,7 +108,9 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
 
     def start(self):
         self.ovs_idl = ovs.OvsIdl()
-        self.ovs_idl.start(CONF.ovsdb_connection)
+        self.ovs_idl.start(
+            CONF.ovsdb_connection,
+            events=base_watcher.get_ovs_topology_events(self))
         self.chassis = self.ovs_idl.get_own_chassis_id()
         self.ovn_remote = self.ovs_idl.get_ovn_remote()
         LOG.info("Loaded chassis %s.", self.chassis)
@@ -87,7 +121,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
 
         # Clear vrf routing table
         if CONF.clear_vrf_routes_on_startup:
-            linux_net.delete_routes_from_table(CONF.bgp_vrf_table_id)
+            bgp_utils.clear_vrf_routes()
 
         LOG.info("VRF configuration for advertising routes completed")
         if self._expose_tenant_networks and self.allowed_address_scopes:
@@ -124,14 +158,51 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
                            watcher.OVNLBVIPPortEvent(self)})
         return events
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def frr_sync(self):
         LOG.debug("Ensuring VRF configuration for advertising routes")
         # Base BGP configuration
         bgp_utils.ensure_base_bgp_configuration()
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def sync(self):
+        """Reconcile the node state with the OVN SB DB
+
+        Returns whether the node state drifted, i.e., it changed with no
+        changes on the OVN SB DB, since the previous sync, or None if that
+        is not known (sync_skip_unchanged disabled or first sync).
+        """
+        drift = None
+        changes_count = self.sb_idl.idl.changes_count
+        if CONF.sync_skip_unchanged and self._sync_state is not None:
+            if self._sync_state == (changes_count,
+                                    self._get_state_fingerprint()):
+                self.skipped_syncs += 1
+                LOG.info("Skipping sync as nothing changed since the "
+                         "previous one (%d syncs skipped so far)",
+                         self.skipped_syncs)
+                return False
+            drift = self._sync_state[0] == changes_count
+            LOG.debug("Changes found since the previous sync (drift: %s), "
+                      "running it", drift)
+        self._sync_state = None
+
+        self._sync()
+
+        if CONF.sync_skip_unchanged:
+            self._sync_state = (changes_count, self._get_state_fingerprint())
+        return drift
+
+    def _get_state_fingerprint(self):
+        bridges = sorted(set(self.ovn_bridge_mappings.values()))
+        return (
+            self.ovs_idl.topology_generation,
+            linux_net.get_state_fingerprint(
+                CONF.bgp_nic, list(self.ovn_routing_tables.values())),
+            tuple((bridge, ovs.get_bridge_flows_fingerprint(
+                bridge, constants.OVS_RULE_COOKIE)) for bridge in bridges))
+
+    def _sync(self):
         self._expose_tenant_networks = (CONF.expose_tenant_networks or
                                         CONF.expose_ipv6_gua_tenant_networks)
         self.ovn_routing_tables = {}
@@ -144,6 +215,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
 
         LOG.debug("Configuring br-ex default rule and routing tables for "
                   "each provider network")
+        topology_generation = self.ovs_idl.topology_generation
         # 1) Get bridge mappings: xxxx:br-ex,yyyy:br-ex2
         bridge_mappings = self.ovs_idl.get_ovn_bridge_mappings()
         # 2) Get macs for bridge mappings
@@ -174,13 +246,8 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             if self.ovs_flows.get(bridge):
                 continue
 
-            mac = linux_net.get_interface_address(bridge)
-            self.ovs_flows[bridge] = {
-                'mac': mac,
-                'in_port': []}
-            # 3) Get in_port for bridge mappings (br-ex, br-ex2)
-            self.ovs_flows[bridge]['in_port'] = (
-                ovs.get_ovs_patch_ports_info(bridge))
+            # 3) Get mac and in_port for bridge mappings (br-ex, br-ex2)
+            self.ovs_flows[bridge] = self.ovs_idl.get_bridge_info(bridge)
 
             # 4) Add/Remove flows for each bridge mappings
             ovs.ensure_mac_tweak_flows(bridge,
@@ -190,43 +257,43 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             ovs.remove_extra_ovs_flows(self.ovs_flows, bridge,
                                        constants.OVS_RULE_COOKIE)
 
+        self.ovs_topology_generation = topology_generation
+        profiling.end_phase('wiring')
+
         LOG.debug("Syncing current routes.")
-        exposed_ips = linux_net.get_exposed_ips(CONF.bgp_nic)
+        exposed_ips = linux_net.IpLeftovers(
+            linux_net.get_exposed_ips(CONF.bgp_nic))
         # get the rules pointing to ovn bridges
-        ovn_ip_rules = linux_net.get_ovn_ip_rules(
-            self.ovn_routing_tables.values())
+        ovn_ip_rules = linux_net.IpLeftovers(linux_net.get_ovn_ip_rules(
+            self.ovn_routing_tables.values()))
+        profiling.end_phase('dump')
 
         # add missing routes/ips for IPs on provider network
         ports = self.sb_idl.get_ports_on_chassis(self.chassis)
-        for port in ports:
-            self._ensure_port_exposed(port, exposed_ips, ovn_ip_rules)
+        self._sync_partitions(
+            [functools.partial(self._ensure_port_exposed, port)
+             for port in ports],
+            exposed_ips, ovn_ip_rules)
+        profiling.end_phase('lsps')
 
         # this information is only available when there are cr-lrps add
         # missing routes/ips for FIPs associated to VMs/LBs on the chassis
         cr_lrp_ports = self.sb_idl.get_cr_lrp_ports_on_chassis(
             self.chassis)
-        for cr_lrp_port in cr_lrp_ports:
-            self._ensure_cr_lrp_associated_ports_exposed(
-                cr_lrp_port, exposed_ips, ovn_ip_rules)
-
-        for cr_lrp_port, cr_lrp_info in self.ovn_local_cr_lrps.items():
-            lrp_ports = self.sb_idl.get_lrp_ports_for_router(
-                cr_lrp_info['router_datapath'])
-            for lrp in lrp_ports:
-                self._process_lrp_port(lrp, cr_lrp_port, exposed_ips,
-                                       ovn_ip_rules)
-
-            # add missing routes/ips related to ovn-octavia loadbalancers
-            # on the provider networks
-            provider_ovn_lbs = self.sb_idl.get_provider_ovn_lbs_on_cr_lrp(
-                cr_lrp_info['provider_datapath'],
-                cr_lrp_info['router_datapath'])
-            for ovn_lb, ovn_lb_ip in provider_ovn_lbs.items():
-                self._expose_ovn_lb_on_provider(ovn_lb_ip,
-                                                ovn_lb,
-                                                cr_lrp_port,
-                                                exposed_ips,
-                                                ovn_ip_rules)
+        self._sync_partitions(
+            [functools.partial(self._ensure_cr_lrp_associated_ports_exposed,
+                               cr_lrp_port)
+             for cr_lrp_port in cr_lrp_ports],
+            exposed_ips, ovn_ip_rules)
+        profiling.end_phase('cr_lrps')
+
+        self._sync_partitions(
+            [functools.partial(self._ensure_router_exposed, cr_lrp_port,
+                               cr_lrp_info)
+             for cr_lrp_port, cr_lrp_info in list(
+                 self.ovn_local_cr_lrps.items())],
+            exposed_ips, ovn_ip_rules)
+        profiling.end_phase('lrps_lbs')
 
         # remove extra routes/ips
         # remove all the leftovers on the list of current ips on dev OVN
@@ -242,6 +309,58 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
 
         wire_utils.delete_vlan_devices_leftovers(self.sb_idl,
                                                  self.ovn_bridge_mappings)
+        wire_utils.delete_ndp_proxies_leftovers(self.ovn_bridge_mappings,
+                                                self.ovs_flows)
+        # remove the routes left from before the restart, if any
+        bgp_utils.sweep_stale_vrf_routes()
+        profiling.end_phase('cleanup')
+
+    def _sync_partitions(self, partitions, exposed_ips, ovn_ip_rules):
+        """Run the sync partitions and merge what they keep exposed.
+
+        Each partition is called with its own view of exposed_ips and
+        ovn_ip_rules. When sync_workers is greater than 1 they are run on a
+        bounded thread pool, so that the per router netlink/privsep calls
+        are not serialized. Once all of them finished, the IPs and rules
+        they keep are discarded from exposed_ips and ovn_ip_rules (both
+        linux_net.IpLeftovers), leaving there only the leftovers to delete.
+        """
+        def _run(partition):
+            ips_plan = _LeftoversPlan(exposed_ips)
+            rules_plan = _LeftoversPlan(ovn_ip_rules)
+            partition(ips_plan, rules_plan)
+            return ips_plan, rules_plan
+
+        if CONF.sync_workers > 1 and len(partitions) > 1:
+            with futures.ThreadPoolExecutor(
+                    max_workers=CONF.sync_workers) as executor:
+                plans = list(executor.map(_run, partitions))
+        else:
+            plans = [_run(partition) for partition in partitions]
+
+        for ips_plan, rules_plan in plans:
+            ips_plan.apply()
+            rules_plan.apply()
+
+    def _ensure_router_exposed(self, cr_lrp_port, cr_lrp_info, exposed_ips,
+                               ovn_ip_rules):
+        lrp_ports = self.sb_idl.get_lrp_ports_for_router(
+            cr_lrp_info['router_datapath'])
+        for lrp in lrp_ports:
+            self._process_lrp_port(lrp, cr_lrp_port, exposed_ips,
+                                   ovn_ip_rules)
+
+        # add missing routes/ips related to ovn-octavia loadbalancers
+        # on the provider networks
+        provider_ovn_lbs = self.sb_idl.get_provider_ovn_lbs_on_cr_lrp(
+            cr_lrp_info['provider_datapath'],
+            cr_lrp_info['router_datapath'])
+        for ovn_lb, ovn_lb_ip in provider_ovn_lbs.items():
+            self._expose_ovn_lb_on_provider(ovn_lb_ip,
+                                            ovn_lb,
+                                            cr_lrp_port,
+                                            exposed_ips,
+                                            ovn_ip_rules)
 
     def _ensure_cr_lrp_associated_ports_exposed(self, cr_lrp_port,
                                                 exposed_ips, ovn_ip_rules):
@@ -252,15 +371,10 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
         ips_adv = self._expose_ip(ips, patch_port_row,
                                   associated_port=cr_lrp_port)
         for ip in ips_adv:
-            if exposed_ips and ip in exposed_ips:
-                exposed_ips.remove(ip)
+            if exposed_ips:
+                exposed_ips.discard(ip)
             if ovn_ip_rules:
-                ip_version = linux_net.get_ip_version(ip)
-                if ip_version == constants.IP_VERSION_6:
-                    ip_dst = "{}/128".format(ip)
-                else:
-                    ip_dst = "{}/32".format(ip)
-                ovn_ip_rules.pop(ip_dst, None)
+                ovn_ip_rules.discard(ip)
 
     def _ensure_port_exposed(self, port, exposed_ips, ovn_ip_rules):
         if port.type not in constants.OVN_VIF_PORT_TYPES or not port.mac:
@@ -291,16 +405,10 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
 
         for port_ip in ips_adv:
             ip_address = port_ip.split("/")[0]
-            if exposed_ips and ip_address in exposed_ips:
-                # remove each ip to add from the list of current ips on dev OVN
-                exposed_ips.remove(ip_address)
+            if exposed_ips:
+                exposed_ips.discard(ip_address)
             if ovn_ip_rules:
-                ip_version = linux_net.get_ip_version(port_ip)
-                if ip_version == constants.IP_VERSION_6:
-                    ip_dst = "{}/128".format(ip_address)
-                else:
-                    ip_dst = "{}/32".format(ip_address)
-                ovn_ip_rules.pop(ip_dst, None)
+                ovn_ip_rules.discard(ip_address)
 
     def _expose_provider_port(self, port_ips, provider_datapath,
                               bridge_device=None, bridge_vlan=None,
@@ -355,10 +463,10 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             if ext_n_cidr:
                 ovn_lb_ip = ext_n_cidr.split(" ")[0].split("/")[0]
                 bgp_utils.announce_ips([ovn_lb_ip])
-                if exposed_ips and ovn_lb_ip in exposed_ips:
-                    exposed_ips.remove(ovn_lb_ip)
+                if exposed_ips:
+                    exposed_ips.discard(ovn_lb_ip)
                 if ovn_ip_rules:
-                    ovn_ip_rules.pop(ext_n_cidr.split(" ")[0], None)
+                    ovn_ip_rules.discard(ext_n_cidr.split(" ")[0])
             return
         elif (not port.mac or
                 port.type not in (
@@ -386,14 +494,10 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             port_ip_version = linux_net.get_ip_version(port_ip)
             if port_ip_version == ip_version:
                 bgp_utils.announce_ips([port_ip])
-                if exposed_ips and port_ip in exposed_ips:
-                    exposed_ips.remove(port_ip)
+                if exposed_ips:
+                    exposed_ips.discard(port_ip)
                 if ovn_ip_rules:
-                    if port_ip_version == constants.IP_VERSION_6:
-                        ip_dst = "{}/128".format(port_ip)
-                    else:
-                        ip_dst = "{}/32".format(port_ip)
-                    ovn_ip_rules.pop(ip_dst, None)
+                    ovn_ip_rules.discard(port_ip)
 
     def _withdraw_provider_port(self, port_ips, provider_datapath,
                                 bridge_device=None, bridge_vlan=None,
@@ -429,11 +533,11 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             return self.ovn_bridge_mappings[network_name], None
         return None, None
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def expose_ovn_lb(self, ip, row):
         self._process_ovn_lb(ip, row, constants.EXPOSE)
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def withdraw_ovn_lb(self, ip, row):
         self._process_ovn_lb(ip, row, constants.WITHDRAW)
 
@@ -456,11 +560,11 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
         # if unknown action return
         return
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def expose_ovn_lb_on_provider(self, ip, lb_name, cr_lrp_port):
         self._expose_ovn_lb_on_provider(ip, lb_name, cr_lrp_port)
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def withdraw_ovn_lb_on_provider(self, lb_name, cr_lrp_port):
         self._withdraw_ovn_lb_on_provider(lb_name, cr_lrp_port)
 
@@ -474,27 +578,24 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             LOG.debug("Failure adding BGP route for loadbalancer VIP %s", ip)
             return False
 
-        self.ovn_local_cr_lrps[cr_lrp]['provider_ovn_lbs'].append(lb_name)
-        if self.provider_ovn_lbs.get(lb_name):
-            self.provider_ovn_lbs[lb_name]['ips'].append(ip)
-        else:
-            self.provider_ovn_lbs[lb_name] = {'ips': [ip],
-                                              'gateway_port': cr_lrp}
+        with self._provider_ovn_lbs_lock:
+            self.ovn_local_cr_lrps[cr_lrp]['provider_ovn_lbs'].append(
+                lb_name)
+            if self.provider_ovn_lbs.get(lb_name):
+                self.provider_ovn_lbs[lb_name]['ips'].append(ip)
+            else:
+                self.provider_ovn_lbs[lb_name] = {'ips': [ip],
+                                                  'gateway_port': cr_lrp}
         if not self._expose_provider_port(
                 [ip], self.ovn_local_cr_lrps[cr_lrp]['provider_datapath'],
                 bridge_device=bridge_device, bridge_vlan=bridge_vlan):
             LOG.debug("Failure adding BGP route for loadbalancer VIP %s", ip)
             return False
         LOG.debug("Added BGP route for loadbalancer VIP %s", ip)
-        if exposed_ips and ip in exposed_ips:
-            exposed_ips.remove(ip)
+        if exposed_ips:
+            exposed_ips.discard(ip)
         if ovn_ip_rules:
-            ip_version = linux_net.get_ip_version(ip)
-            if ip_version == constants.IP_VERSION_6:
-                ip_dst = "{}/128".format(ip)
-            else:
-                ip_dst = "{}/32".format(ip)
-            ovn_ip_rules.pop(ip_dst, None)
+            ovn_ip_rules.discard(ip)
         return True
 
     def _withdraw_ovn_lb_on_provider(self, lb_name, cr_lrp):
@@ -522,7 +623,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
                 lb_name)
         return True
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def expose_ip(self, ips, row, associated_port=None):
         '''Advertice BGP route by adding IP to device.
 
@@ -651,7 +752,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
                 return ips
         return []
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def withdraw_ip(self, ips, row, associated_port=None):
         '''Withdraw BGP route by removing IP from device.
 
@@ -776,7 +877,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
                                        provider_datapath=cr_lrp_datapath,
                                        cr_lrp_port=row.logical_port)
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def expose_remote_ip(self, ips, row):
         self._expose_remote_ip(ips, row)
 
@@ -818,7 +919,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
                           ips_to_expose, self.chassis)
                 break
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def withdraw_remote_ip(self, ips, row, chassis=None):
         self._withdraw_remote_ip(ips, row, chassis)
 
@@ -1011,7 +1112,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             LOG.exception("Unexpected exception while wiring lrp port: %s", e)
             return
         if ovn_ip_rules:
-            ovn_ip_rules.pop(ip, None)
+            ovn_ip_rules.discard(ip)
 
         # Check if there are VMs on the network
         # and if so expose the route
@@ -1078,7 +1179,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
             LOG.exception("Unexpected exception while unwiring lrp port: %s",
                           e)
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def expose_subnet(self, ip, row):
         try:
             cr_lrp = self.sb_idl.is_router_gateway_on_chassis(
@@ -1104,7 +1205,7 @@ class OVNBGPDriver(driver_api.AgentDriverBase):
 
         self._expose_lrp_port(ip, row.logical_port, cr_lrp, subnet_datapath)
 
-    @lockutils.synchronized('bgp')
+    @tracing.synchronized('bgp')
     def withdraw_subnet(self, ip, row):
         try:
             cr_lrp = self.sb_idl.is_router_gateway_on_chassis(
@@ -28,6 +28,7 @@ from ovn_bgp_agent.drivers.openstack.utils import ovs
 from ovn_bgp_agent.drivers.openstack.watchers import base_watcher
 from ovn_bgp_agent.drivers.openstack.watchers import evpn_watcher as \
     watcher
+from ovn_bgp_agent import exceptions as agent_exc
 from ovn_bgp_agent.utils import helpers
 from ovn_bgp_agent.utils import linux_net
 
@@ -52,6 +53,8 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
         # {'br-ex': [route1, route2]}
         self._ovn_routing_tables_routes = collections.defaultdict()
         self._ovn_exposed_evpn_ips = collections.defaultdict()
+        # {'br-ex': {'2001:db8::1/64'}}
+        self._ovn_ndp_proxies = collections.defaultdict(set)
 
         self._sb_idl = None
         self._post_fork_event = threading.Event()
@@ -109,6 +112,7 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
         self.ovn_local_lrps = {}
         self._ovn_routing_tables_routes = collections.defaultdict()
         self._ovn_exposed_evpn_ips = collections.defaultdict()
+        self._ovn_ndp_proxies = collections.defaultdict(set)
 
         # 1) Get bridge mappings: xxxx:br-ex,yyyy:br-ex2
         bridge_mappings = self.ovs_idl.get_ovn_bridge_mappings()
@@ -132,6 +136,7 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
         self._remove_extra_exposed_ips()
         self._remove_extra_routes()
         self._remove_extra_ovs_flows()
+        self._remove_extra_ndp_proxies()
         self._remove_extra_vrfs()
 
     def _ensure_network_exposed(self, router_port, gateway):
@@ -662,6 +667,7 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
             ovs.add_device_to_ovs_bridge(veth_ovs, datapath_bridge)
 
         # add route for ip to ovs provider bridge (at the vrf routing table)
+        ndp_proxy_ips = []
         for ip in ips:
             ip_without_mask = ip.split("/")[0]
             if vlan_tag:
@@ -669,18 +675,19 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
                 linux_net.add_ip_route(
                     self._ovn_routing_tables_routes, ip_without_mask,
                     vni, vlan)
-                # add proxy ndp config for ipv6
-                if (linux_net.get_ip_version(ip_without_mask) ==
-                        constants.IP_VERSION_6):
-                    linux_net.add_ndp_proxy(ip, vlan)
             else:
                 linux_net.add_ip_route(
                     self._ovn_routing_tables_routes, ip_without_mask,
                     vni, veth_vrf)
-                # add proxy ndp config for ipv6
-                if (linux_net.get_ip_version(ip_without_mask) ==
-                        constants.IP_VERSION_6):
-                    linux_net.add_ndp_proxy(ip, datapath_bridge)
+            if (linux_net.get_ip_version(ip_without_mask) ==
+                    constants.IP_VERSION_6):
+                ndp_proxy_ips.append(ip)
+
+        # add proxy ndp config for ipv6
+        ndp_proxy_dev = vlan if vlan_tag else datapath_bridge
+        linux_net.add_ndp_proxies(ndp_proxy_ips, ndp_proxy_dev)
+        if ndp_proxy_ips:
+            self._ovn_ndp_proxies[ndp_proxy_dev].update(ndp_proxy_ips)
 
         # add unreachable route to vrf
         linux_net.add_unreachable_route(vrf)
@@ -698,9 +705,10 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
         linux_net.delete_routes_from_table(vni)
 
         if cleanup_ndp_proxy:
-            for ip in ips:
-                if linux_net.get_ip_version(ip) == constants.IP_VERSION_6:
-                    linux_net.del_ndp_proxy(ip, datapath_bridge)
+            linux_net.del_ndp_proxies(
+                [ip for ip in ips
+                 if linux_net.get_ip_version(ip) == constants.IP_VERSION_6],
+                datapath_bridge)
 
     def _remove_extra_vrfs(self):
         vrfs, los, bridges, vxlans, veths, vlans = ([], [], [], [], [], [])
@@ -712,9 +720,11 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
             veths.append(cr_lrp_info['veth_vrf'])
             vlans.append(cr_lrp_info['vlan'])
 
-        filter_out = ["{}.{}".format(key, value[0]['vlan'])
-                      for key, value in self._ovn_routing_tables_routes.items()
-                      if value[0]['vlan']]
+        filter_out = {"{}.{}".format(device, route_info.vlan)
+                      for device, routes_info in (
+                          self._ovn_routing_tables_routes.items())
+                      for route_info in routes_info
+                      if route_info.vlan}
 
         interfaces = linux_net.get_interfaces(filter_out)
         for interface in interfaces:
@@ -740,6 +750,20 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
                     interface not in vlans):
                 ovs.del_device_from_ovs_bridge(interface)
 
+    def _remove_extra_ndp_proxies(self):
+        devices = set(self.ovn_bridge_mappings.values())
+        devices.update(cr_lrp_info['vlan']
+                       for cr_lrp_info in self.ovn_local_cr_lrps.values()
+                       if cr_lrp_info['vlan'])
+        devices.update(self._ovn_ndp_proxies)
+        for device in devices:
+            try:
+                linux_net.sync_ndp_proxies(
+                    sorted(self._ovn_ndp_proxies.get(device, [])), device)
+            except agent_exc.NetworkInterfaceNotFound:
+                LOG.debug("Device %s not found, no proxy neighbours to "
+                          "remove from it", device)
+
     def _remove_extra_routes(self):
         table_ids = self._get_table_ids()
         vrf_routes = linux_net.get_routes_on_tables(table_ids)
@@ -749,21 +773,20 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
         for device, routes_info in self._ovn_routing_tables_routes.items():
             for route_info in routes_info:
                 oif = linux_net.get_interface_index(device)
-                if 'gateway' in route_info['route'].keys():  # subnet route
+                if route_info.gateway:  # subnet route
                     possible_matchings = [
                         r for r in vrf_routes
-                        if (r.get('dst') == route_info['route']['dst'] and
-                            r['dst_len'] == route_info['route']['dst_len'] and
-                            r.get('gateway') == (
-                                route_info['route']['gateway']) and
-                            r['table'] == route_info['route']['table'])]
+                        if (r.get('dst') == route_info.dst and
+                            r['dst_len'] == route_info.dst_len and
+                            r.get('gateway') == route_info.gateway and
+                            r['table'] == route_info.table)]
                 else:  # cr-lrp
                     possible_matchings = [
                         r for r in vrf_routes
-                        if (r.get('dst') == route_info['route']['dst'] and
-                            r['dst_len'] == route_info['route']['dst_len'] and
+                        if (r.get('dst') == route_info.dst and
+                            r['dst_len'] == route_info.dst_len and
                             r.get('oif') == oif and
-                            r['table'] == route_info['route']['table'])]
+                            r['table'] == route_info.table)]
                 for r in possible_matchings:
                     vrf_routes.remove(r)
 
@@ -771,54 +794,54 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
 
     def _remove_extra_ovs_flows(self):
         cr_lrp_mac_mappings = self._get_cr_lrp_mac_mapping()
-        cookie_id = "cookie={}/-1".format(constants.OVS_VRF_RULE_COOKIE)
+        # computed once per sync instead of once per flow
+        ofports = self._get_devices_ofport(
+            dev_ovs for _, dev_ovs in cr_lrp_mac_mappings.values())
+        routes = {dev: {(route_info.dst, route_info.dst_len)
+                        for route_info in routes_info}
+                  for dev, routes_info in
+                  self._ovn_routing_tables_routes.items()}
         for bridge in set(self.ovn_bridge_mappings.values()):
-            current_flows = ovs.get_bridge_flows(bridge, filter_=cookie_id)
-            for flow in current_flows:
-                flow_info = ovs.get_flow_info(flow)
-                if not flow_info.get('mac'):
-                    ovs.del_flow(flow, bridge, constants.OVS_VRF_RULE_COOKIE)
-                elif flow_info['mac'] not in cr_lrp_mac_mappings.keys():
-                    ovs.del_flow(flow, bridge, constants.OVS_VRF_RULE_COOKIE)
-                elif flow_info['port']:
-                    if (not flow_info.get('nw_src') and not
-                            flow_info.get('ipv6_src')):
-                        ovs.del_flow(flow, bridge,
-                                     constants.OVS_VRF_RULE_COOKIE)
-                    else:
-                        dev_info = cr_lrp_mac_mappings[flow_info['mac']]
-                        if dev_info.get('vlan'):
-                            dev = dev_info['vlan']
-                            dev_ovs = dev
-                        else:
-                            dev = dev_info['veth_vrf']
-                            dev_ovs = dev_info['veth_ovs']
-                        dev_ovs_port = ovs.get_device_port_at_ovs(
-                            dev_ovs)
-
-                        if dev_ovs_port != flow_info['port']:
-                            ovs.del_flow(flow, bridge,
-                                         constants.OVS_VRF_RULE_COOKIE)
-                        nw_src_ip = nw_src_mask = None
-                        matching_dst = False
-                        if flow_info.get('nw_src'):
-                            nw_src_ip = flow_info['nw_src'].split('/')[0]
-                            nw_src_mask = int(
-                                flow_info['nw_src'].split('/')[1])
-                        elif flow_info.get('ipv6_src'):
-                            nw_src_ip = flow_info['ipv6_src'].split('/')[0]
-                            nw_src_mask = int(
-                                flow_info['ipv6_src'].split('/')[1])
-
-                        for route_info in self._ovn_routing_tables_routes[
-                                dev]:
-                            if (route_info['route']['dst'] == nw_src_ip and
-                                    route_info['route'][
-                                        'dst_len'] == nw_src_mask):
-                                matching_dst = True
-                        if not matching_dst:
-                            ovs.del_flow(flow, bridge,
-                                         constants.OVS_VRF_RULE_COOKIE)
+            current_flows = ovs.get_cookie_flows(
+                bridge, constants.OVS_VRF_RULE_COOKIE)
+            ovs.del_flows(bridge, sorted(
+                (flow for flow in current_flows
+                 if self._is_extra_ovs_flow(flow, cr_lrp_mac_mappings,
+                                            ofports, routes)),
+                key=str))
+
+    def _get_devices_ofport(self, devices):
+        ofports = self.ovs_idl.get_ofports()
+        for device in set(devices):
+            if device in ofports:
+                continue
+            # it may have just been added to OVS, and not be on the IDL yet
+            try:
+                ofports[device] = ovs.get_device_port_at_ovs(device)
+            except agent_exc.PortNotFound:
+                LOG.debug("Device %s not found on OVS, removing its flows",
+                          device)
+        return ofports
+
+    @staticmethod
+    def _is_extra_ovs_flow(flow, cr_lrp_mac_mappings, ofports, routes):
+        mac = flow.get('dl_src')
+        if not mac or mac not in cr_lrp_mac_mappings:
+            return True
+        port = flow.output_port
+        if not port:
+            return False
+        nw_src = flow.get('nw_src') or flow.get('ipv6_src')
+        if not nw_src:
+            return True
+
+        dev, dev_ovs = cr_lrp_mac_mappings[mac]
+        if ofports.get(dev_ovs) != port:
+            return True
+        # host ones are dumped with no prefix length
+        nw_src_ip, _, nw_src_mask = nw_src.partition('/')
+        nw_src_mask = int(nw_src_mask or (128 if ':' in nw_src_ip else 32))
+        return (nw_src_ip, nw_src_mask) not in routes.get(dev, ())
 
     def _remove_extra_exposed_ips(self):
         for lo, ips in self._ovn_exposed_evpn_ips.items():
@@ -834,10 +857,12 @@ class OVNEVPNDriver(driver_api.AgentDriverBase):
         return table_ids
 
     def _get_cr_lrp_mac_mapping(self):
+        """Return the (device, OVS device) the traffic of each MAC goes to"""
         mac_mappings = {}
         for cr_lrp_info in self.ovn_local_cr_lrps.values():
-            mac_mappings[cr_lrp_info['mac']] = {
-                'veth_vrf': cr_lrp_info['veth_vrf'],
-                'veth_ovs': cr_lrp_info['veth_ovs'],
-                'vlan': cr_lrp_info['vlan']}
+            if cr_lrp_info.get('vlan'):
+                devices = (cr_lrp_info['vlan'], cr_lrp_info['vlan'])
+            else:
+                devices = (cr_lrp_info['veth_vrf'], cr_lrp_info['veth_ovs'])
+            mac_mappings[cr_lrp_info['mac']] = devices
         return mac_mappings
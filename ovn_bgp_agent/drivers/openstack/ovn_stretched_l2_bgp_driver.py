@@ -50,6 +50,9 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
     def __init__(self):
         self.ovn_local_cr_lrps = {}
         self.vrf_routes = set()
+        # gateway network -> tenant routes via a gateway on it, which need
+        # its link-local route
+        self.gateway_network_routes = collections.defaultdict(set)
         self.ovn_routing_tables_routes = collections.defaultdict()
         self.allowed_address_scopes = set(CONF.address_scopes or [])
         self.propagated_lrp_ports = {}
@@ -78,7 +81,7 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
 
         # Clear vrf routing table
         if CONF.clear_vrf_routes_on_startup:
-            linux_net.delete_routes_from_table(CONF.bgp_vrf_table_id)
+            bgp_utils.clear_vrf_routes()
 
         self.chassis = self.ovs_idl.get_own_chassis_id()
         self.ovn_remote = self.ovs_idl.get_ovn_remote()
@@ -121,6 +124,7 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
         self.ovn_local_cr_lrps = {}
         self.ovn_routing_tables_routes = collections.defaultdict()
         self.vrf_routes = set()
+        self.gateway_network_routes = collections.defaultdict(set)
         self.propagated_lrp_ports = {}
 
         LOG.debug("Syncing current routes.")
@@ -140,15 +144,18 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
         delete_routes = []
         for route in vrf_routes:
             r = HashedRoute(
-                network=route.dst,
-                prefix_len=route.dst_len,
-                dst=route.gateway if route.gateway else None)
+                network=route.get('dst'),
+                prefix_len=route['dst_len'],
+                dst=route.get('gateway') or None)
             if r not in self.vrf_routes:
                 delete_routes.append(route)
 
         linux_net.delete_ip_routes(delete_routes)
+        # remove the routes left from before the restart, if any
+        bgp_utils.sweep_stale_vrf_routes()
 
-    def _add_route(self, network, prefix_len, dst=None):
+    def _add_route(self, network, prefix_len, dst=None,
+                   gateway_network=None):
         LOG.debug("Adding BGP route for Network %s/%d via %s",
                   network, prefix_len, dst)
 
@@ -165,11 +172,14 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
             prefix_len=prefix_len,
             dst=dst)
         self.vrf_routes.add(r)
+        if gateway_network is not None:
+            self.gateway_network_routes[gateway_network].add(r)
 
         LOG.debug("Added BGP route for Network %s/%d via %s",
                   network, prefix_len, dst)
 
-    def _del_route(self, network, prefix_len, dst=None):
+    def _del_route(self, network, prefix_len, dst=None,
+                   gateway_network=None):
         LOG.debug("Deleting BGP route for Network %s/%d via %s",
                   network, prefix_len, dst)
 
@@ -185,12 +195,26 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
             network=network,
             prefix_len=prefix_len,
             dst=dst)
-        if r in self.vrf_routes:
-            self.vrf_routes.remove(r)
+        self.vrf_routes.discard(r)
+        if gateway_network is not None:
+            routes = self.gateway_network_routes.get(gateway_network)
+            if routes is not None:
+                routes.discard(r)
+                if not routes:
+                    del self.gateway_network_routes[gateway_network]
 
         LOG.debug("Deleted BGP route for Network %s/%d via %s",
                   network, prefix_len, dst)
 
+    def _del_unused_gateway_network_route(self, gateway_network):
+        # the link-local route is needed while any tenant route is exposed
+        # via a gateway on it
+        if self.gateway_network_routes.get(gateway_network):
+            return
+        self._del_route(
+            network=str(gateway_network.network_address),
+            prefix_len=gateway_network.prefixlen)
+
     def _address_scope_allowed(self, scope1, scope2, ip_version):
         if not self.allowed_address_scopes:
             # No address scopes to filter on => announce everything
@@ -278,17 +302,10 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
                 self._del_route(
                     network=str(subnet.network_address),
                     prefix_len=subnet.prefixlen,
-                    dst=str(gateway_ip.ip))
+                    dst=str(gateway_ip.ip),
+                    gateway_network=gateway_ip.network)
 
-            # Check if can delete the link-local route
-            exposed_routes = linux_net.get_exposed_routes_on_network(
-                [CONF.bgp_vrf_table_id],
-                gateway_ip.network)
-
-            if not exposed_routes:
-                self._del_route(
-                    network=str(gateway_ip.network.network_address),
-                    prefix_len=gateway_ip.network.prefixlen)
+            self._del_unused_gateway_network_route(gateway_ip.network)
 
     @lockutils.synchronized('bgp')
     def withdraw_ip(self, ips, row, associated_port=None):
@@ -423,7 +440,8 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
                 self._add_route(
                     network=str(router_ip.network.network_address),
                     prefix_len=router_ip.network.prefixlen,
-                    dst=str(gateway_ip.ip))
+                    dst=str(gateway_ip.ip),
+                    gateway_network=gateway_ip.network)
                 subnets.add(str(router_ip.network))
 
             for router_ip in ips_to_delete:
@@ -439,21 +457,13 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
                 self._del_route(
                     network=str(router_ip.network.network_address),
                     prefix_len=router_ip.network.prefixlen,
-                    dst=str(gateway_ip.ip))
+                    dst=str(gateway_ip.ip),
+                    gateway_network=gateway_ip.network)
 
             # We only need to check this if we really deleted a route for
             # a tenant network
             if ips_to_delete:
-                # Check if can delete the link-local route
-                exposed_routes = linux_net.get_exposed_routes_on_network(
-                    [CONF.bgp_vrf_table_id],
-                    gateway_ip.network
-                )
-
-                if not exposed_routes:
-                    self._del_route(
-                        network=str(gateway_ip.network.network_address),
-                        prefix_len=gateway_ip.network.prefixlen)
+                self._del_unused_gateway_network_route(gateway_ip.network)
 
         self.ovn_local_cr_lrps[gateway_port]["lrp_ports"].add(
             router_port.logical_port)
@@ -519,7 +529,8 @@ class OVNBGPStretchedL2Driver(driver_api.AgentDriverBase):
                 self._add_route(
                     network=str(router_ip.network.network_address),
                     prefix_len=router_ip.network.prefixlen,
-                    dst=str(gateway_ip.ip))
+                    dst=str(gateway_ip.ip),
+                    gateway_network=gateway_ip.network)
                 subnets.add(str(router_ip.network))
 
         if subnets:
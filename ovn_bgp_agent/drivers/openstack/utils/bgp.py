@@ -86,3 +86,16 @@ def ensure_base_bgp_configuration(template=frr.LEAK_VRF_TEMPLATE):
 
     # Create OVN dummy device
     linux_net.ensure_ovn_device(CONF.bgp_nic, CONF.bgp_vrf)
+
+
+def clear_vrf_routes():
+    if CONF.bgp_graceful_restart:
+        # Keep the routes in place (and forwarding) while the first sync
+        # re-installs them, only the stale ones are removed afterwards
+        linux_net.mark_stale_routes(CONF.bgp_vrf_table_id)
+        return
+    linux_net.delete_routes_from_table(CONF.bgp_vrf_table_id)
+
+
+def sweep_stale_vrf_routes():
+    linux_net.sweep_stale_routes(CONF.bgp_vrf_table_id)
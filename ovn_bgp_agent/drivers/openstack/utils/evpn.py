@@ -13,6 +13,10 @@
 # limitations under the License.
 
 import collections
+from concurrent import futures
+import sys
+import threading
+
 import netaddr
 
 from oslo_config import cfg
@@ -34,6 +38,18 @@ local_bridges: 'dict[str, EvpnBridge]' = {}
 # dictionary to hold all vlandev mappings, based on port uuid
 local_vlandevs: 'dict[str, VlanDev]' = {}
 
+_ovs_flows_lock = threading.Lock()
+
+
+class VlanDevRoute(collections.namedtuple(
+        'VlanDevRoute', ['ip', 'mask', 'mac', 'via'])):
+    '''Route added by the agent on the routing table of a vlan_dev'''
+    __slots__ = ()
+
+    @classmethod
+    def create(cls, ip, mask=None, mac=None, via=None):
+        return cls(sys.intern(ip), mask, mac, via)
+
 
 class EvpnBridge:
     def __init__(self, ovs_bridge: str, vni: int, evpn_opts: dict,
@@ -64,37 +80,34 @@ class EvpnBridge:
         self.vlans: dict[str, 'VlanDev'] = {}
         self._setup_done = False
 
+    def __repr__(self):
+        return 'EvpnBridge(%s)' % self.vrf_name
+
     def setup(self):
         if self._setup_done:
             return
 
-        LOG.debug('Creating bridge %s', self.bridge_name)
-        linux_net.ensure_bridge(self.bridge_name)
-
-        LOG.debug('Creating vxlan interface %s for vni %s with local ip %s',
-                  self.vxlan_name, self.vni, self.local_ip)
-        linux_net.ensure_vxlan(self.vxlan_name, self.vni, self.local_ip,
-                               CONF.evpn_udp_dstport)
-
-        LOG.debug('Connect vxlan interface %s to bridge %s',
-                  self.vxlan_name, self.bridge_name)
-        linux_net.set_master_for_device(self.vxlan_name, self.bridge_name)
-
-        LOG.debug('Disable learning for vxlan device %s', self.vxlan_name)
-        linux_net.disable_learning_vxlan_intf(self.vxlan_name)
+        self._setup_devices()
 
         LOG.debug('Configure FRR VRF (add)')
         frr.vrf_reconfigure(self.evpn_opts, 'add-vrf')
 
-        if self.mode == constants.OVN_EVPN_TYPE_L3:
-            LOG.debug('Create L3 EVPN devices')
-            linux_net.ensure_vrf(self.vrf_name, self.vni)
+        self._setup_done = True
 
-            LOG.debug('Attach bridge %s to vrf %s',
+    def _setup_devices(self):
+        LOG.debug('Creating bridge %s and vxlan interface %s for vni %s with '
+                  'local ip %s', self.bridge_name, self.vxlan_name, self.vni,
+                  self.local_ip)
+        vrf_name = None
+        if self.mode == constants.OVN_EVPN_TYPE_L3:
+            LOG.debug('Create L3 EVPN devices, attaching bridge %s to vrf %s',
                       self.bridge_name, self.vrf_name)
-            linux_net.set_master_for_device(self.bridge_name, self.vrf_name)
+            vrf_name = self.vrf_name
 
-        self._setup_done = True
+        linux_net.ensure_evpn_devices(self.bridge_name, self.vxlan_name,
+                                      self.vni, self.local_ip,
+                                      CONF.evpn_udp_dstport,
+                                      vrf_name=vrf_name)
 
     def _eval_disconnect(self):
         if not self._setup_done:
@@ -173,13 +186,17 @@ class VlanDev:
         # ipv6 neighbor discovery, or to add ip's to the interface.
         self._post_setup_tasks = []
 
-        self._agent_routing_tables_routes = collections.defaultdict(list)
+        # {ip: VlanDevRoute}
+        self._agent_routing_tables_routes = {}
         self._route_table_routes = {}
 
+    def __repr__(self):
+        return 'VlanDev(%s)' % self.veth_vrf
+
     def _set_agent_cache(self, routing_tables_routes):
         if routing_tables_routes is not None:
             self._agent_routing_tables_routes = (
-                routing_tables_routes[self.veth_vrf])
+                routing_tables_routes.setdefault(self.veth_vrf, {}))
 
     @property
     def lladdr(self):
@@ -198,7 +215,21 @@ class VlanDev:
 
         LOG.debug('Create VLAN veth interface %s <-> %s',
                   self.veth_vrf, self.veth_ovs)
-        linux_net.ensure_veth(self.veth_vrf, self.veth_ovs)
+        if self.bridge.mode == constants.OVN_EVPN_TYPE_L2:
+            # Connect veth to bridge for L2
+            linux_net.ensure_evpn_vlan_device(self.veth_vrf, self.veth_ovs,
+                                              self.bridge.bridge_name)
+        else:
+            # Connect veth to vrf for L3, with the custom ips added before
+            # the 169.254.x.x ones (for ipv4 and ipv6), and ipv4 and ipv6
+            # forwarding enabled. The proxy arp/ndp required for the initial
+            # router discovery (as long as we use 169.254.x.x addresses) is
+            # enabled too
+            LOG.debug('Configure L3 for EVPN devices')
+            linux_net.ensure_evpn_vlan_device(
+                self.veth_vrf, self.veth_ovs, self.bridge.vrf_name,
+                ips=list(self._custom_ips), arp_ndp_offset=int(self.vlan_tag),
+                routing_devices=(self.bridge.bridge_name,))
         self._veth_created = True
 
         # Connect the veth_ovs to ovs
@@ -210,41 +241,16 @@ class VlanDev:
                                      self.bridge.ovs_bridge,
                                      vlan_tag=ovs_vlan_tag)
 
-        # Connect veth to bridge for L2
         if self.bridge.mode == constants.OVN_EVPN_TYPE_L2:
-            linux_net.set_master_for_device(self.veth_vrf,
-                                            self.bridge.bridge_name)
             self._setup_done = True
             return
 
-        # Connect veth to vrf for L3
-        # Create vrf interface, connect bridge and veth_vrf to it.
-        LOG.debug('Configure L3 for EVPN devices')
-        linux_net.set_master_for_device(self.veth_vrf, self.bridge.vrf_name)
-
-        if self._custom_ips:
-            linux_net.add_ips_to_dev(self.veth_vrf, ips=list(self._custom_ips))
-
-        # Add 169.254.x.x address to veth_vrf for ipv4 and ipv6
-        linux_net.ensure_arp_ndp_enabled_for_bridge(
-            self.veth_vrf, offset=int(self.vlan_tag), vlan_tag=self.vlan_tag
-        )
-
         # Configure mac on the veth interface to be the same on all hosts
         offset = _offset_for_vni_and_vlan(self.bridge.vni, self.vlan_tag)
         linux_net.ensure_anycast_mac_for_interface(
             self.veth_vrf, offset=offset
         )
 
-        # Make sure ipv4 and ipv6 forwarding is enabled
-        linux_net.enable_routing_for_interfaces(self.veth_vrf,
-                                                self.bridge.bridge_name)
-
-        # As long as we use 169.254.x.x addresses, we require proxy arp to be
-        # there for initial router discovery
-        linux_net.enable_proxy_arp(self.veth_vrf)
-        linux_net.enable_proxy_ndp(self.veth_vrf)
-
         ovs_ok = self._setup_ovs()
         if ovs_ok is False:
             LOG.error('Unable to setup ovs, a retry will pick it up.')
@@ -265,17 +271,21 @@ class VlanDev:
 
         ovs_flows = self.bridge.ovs_flows
         ovs_bridge = self.bridge.ovs_bridge
+        lladdr = self.lladdr
 
-        pmm = ovs_flows[ovs_bridge].setdefault('port-mac-mapping', {})
-        pmm[in_port] = self.lladdr
+        # The vlan devices of a bridge share its flows, which are removed
+        # based on the port-mac-mapping of all of them
+        with _ovs_flows_lock:
+            pmm = ovs_flows[ovs_bridge].setdefault('port-mac-mapping', {})
+            pmm[in_port] = lladdr
 
-        ovs.ensure_mac_tweak_flows(ovs_bridge,
-                                   self.lladdr,
-                                   [in_port],
-                                   constants.OVS_RULE_COOKIE)
+            ovs.ensure_mac_tweak_flows(ovs_bridge,
+                                       lladdr,
+                                       [in_port],
+                                       constants.OVS_RULE_COOKIE)
 
-        ovs.remove_extra_ovs_flows(ovs_flows, ovs_bridge,
-                                   constants.OVS_RULE_COOKIE)
+            ovs.remove_extra_ovs_flows(ovs_flows, ovs_bridge,
+                                       constants.OVS_RULE_COOKIE)
 
     def _eval_disconnect(self):
         if not self._setup_done:
@@ -367,9 +377,8 @@ class VlanDev:
         if '/' in ip:
             ip, mask = ip.split('/')
 
-        self._agent_routing_tables_routes.append({
-            'ip': ip, 'mask': mask, 'mac': mac, 'via': via,
-        })
+        self._agent_routing_tables_routes[ip] = VlanDevRoute.create(
+            ip, mask=mask, mac=mac, via=via)
         LOG.debug('Add route %s/%s via %s dev %s table %s',
                   ip, mask, via, self.veth_vrf, self.bridge.vni)
         linux_net.add_ip_route(self._route_table_routes, ip, self.bridge.vni,
@@ -409,57 +418,59 @@ class VlanDev:
 
         # Remove route from vrf
         linux_net.del_ip_route(self._route_table_routes, ip, self.bridge.vni,
-                               self.veth_vrf, mask=mask or route['mask'],
-                               via=route['via'])
+                               self.veth_vrf, mask=mask or route.mask,
+                               via=route.via)
 
         # Remove any neighbor information for route.
-        for mac in _ensure_list(lladdr or route['mac']):
+        for mac in _ensure_list(lladdr or route.mac):
             linux_net.del_ip_nei(ip, mac, self.veth_vrf)
 
-        if route in self._agent_routing_tables_routes:
-            self._agent_routing_tables_routes.remove(route)
+        self._agent_routing_tables_routes.pop(ip, None)
 
         self._eval_disconnect()
 
-    def cleanup_excessive_routes(self, routing_tables_routes: dict):
+    def cleanup_excessive_routes(self, routing_tables_routes: dict,
+                                 tables_routes: 'dict | None' = None):
+        '''Remove the routes of this vlan_dev not exposed by the agent
+
+        tables_routes is a cache of the routes of each vrf table, by output
+        device index (as returned by linux_net.get_table_routes_by_oif),
+        that should be shared across the vlan_devs cleaned up in a sync, so
+        that each table is only dumped once.
+        '''
         if not self._setup_done:
             return
 
         self._set_agent_cache(routing_tables_routes)
 
+        if tables_routes is None:
+            tables_routes = {}
+        if self.bridge.vni not in tables_routes:
+            tables_routes[self.bridge.vni] = (
+                linux_net.get_table_routes_by_oif(self.bridge.vni))
+
         # Get all routes on host for our vrf and our veth_vrf
         intf_idx = linux_net.get_interface_index(self.veth_vrf)
-        current_routes = dict([
-            (r.get_attr('RTA_DST'), r)
-            for r in linux_net._get_table_routes(self.bridge.vni)
-            if r.get_attr('RTA_OIF') == intf_idx and
-            r['type'] == constants.ROUTE_TYPE_UNICAST and
-            r.get_attr('RTA_DST') not in ('fe80::') and
-            not r.get_attr('RTA_DST').startswith(
-                constants.NDP_IPV6_PREFIX)
-        ])
-
-        # Create set with prefixes currently on host
-        prefixes = {r.get_attr('RTA_DST') for r in current_routes.values()}
-
-        # Create set with prefixes we maintain
-        exposed_prefixes = {r['ip']
-                            for r in self._agent_routing_tables_routes}
-
-        if len(prefixes - exposed_prefixes) == 0:
+        current_routes = {}
+        for r in tables_routes[self.bridge.vni].get(intf_idx, ()):
+            dst = r.get_attr('RTA_DST')
+            if (dst and r['type'] == constants.ROUTE_TYPE_UNICAST and
+                    dst != 'fe80::' and
+                    not dst.startswith(constants.NDP_IPV6_PREFIX)):
+                current_routes[dst] = r
+
+        # Prefixes on host we do not maintain
+        excessive_prefixes = (current_routes.keys() -
+                              self._agent_routing_tables_routes.keys())
+        if not excessive_prefixes:
             LOG.debug('No excessive routes to remove.')
 
-        for ip in prefixes - exposed_prefixes:
+        for ip in excessive_prefixes:
             LOG.info('Remove excessive route %s', ip)
             kernel_route = current_routes[ip]
-            route = _find_route_info(self._agent_routing_tables_routes, ip)
-            if ((route['mask'] and
-                    int(route['mask']) != kernel_route['dst_len']) or
-                    route['via'] != kernel_route.get_attr('RTA_GATEWAY')):
-                self._agent_routing_tables_routes.append({
-                    'ip': ip, 'mask': kernel_route['dst_len'], 'mac': None,
-                    'via': kernel_route.get_attr('RTA_GATEWAY'),
-                })
+            self._agent_routing_tables_routes[ip] = VlanDevRoute.create(
+                ip, mask=kernel_route['dst_len'],
+                via=kernel_route.get_attr('RTA_GATEWAY'))
 
             self.del_route(routing_tables_routes, ip)
 
@@ -474,12 +485,8 @@ def _ensure_list(var):
     return var
 
 
-def _find_route_info(routes: 'list[dict]', ip: str):
-    for r in routes:
-        if r['ip'] == ip:
-            return r
-
-    return {'ip': ip, 'mask': None, 'mac': None, 'via': None}
+def _find_route_info(routes: 'dict[str, VlanDevRoute]', ip: str):
+    return routes.get(ip) or VlanDevRoute(ip, None, None, None)
 
 
 def _offset_for_vni_and_vlan(vni: int, vlan: str):
@@ -523,6 +530,66 @@ def setup(ovs_bridge, vni, evpn_opts, mode=constants.OVN_EVPN_TYPE_L3,
     return local_bridges[vni]
 
 
+def provision(vlan_devs: 'list[VlanDev]'):
+    '''Set up at once the vlan devices (and bridges) needed on the host
+
+    The vlan devices are set up on demand, when the first route is added
+    through them. However, the base wiring already knows the ones needed by
+    the provider networks of the chassis (e.g. every VNI in use after an
+    agent restart), so the ones not set up yet are set up here instead of
+    one by one while syncing: the devices of the VNIs are created
+    concurrently (up to CONF.sync_workers at a time) and FRR is reconfigured
+    once for all of them.
+
+    Failures are logged and left for the on demand setup to retry.
+    '''
+    vlan_devs = [vlan_dev for vlan_dev in vlan_devs
+                 if not vlan_dev._setup_done]
+    if not vlan_devs:
+        return
+
+    pending_bridges = list({vlan_dev.bridge.vni: vlan_dev.bridge
+                            for vlan_dev in vlan_devs
+                            if not vlan_dev.bridge._setup_done}.values())
+    LOG.info('Provisioning %d EVPN vlan devices on %d new VNIs',
+             len(vlan_devs), len(pending_bridges))
+
+    ready = _run_concurrently(EvpnBridge._setup_devices, pending_bridges)
+    if ready:
+        LOG.debug('Configure FRR VRFs (add)')
+        try:
+            frr.vrfs_reconfigure([bridge.evpn_opts for bridge in ready],
+                                 'add-vrf')
+        except Exception:
+            LOG.exception('Unable to configure the FRR VRFs for VNIs %s',
+                          [bridge.vni for bridge in ready])
+        else:
+            for bridge in ready:
+                bridge._setup_done = True
+
+    _run_concurrently(VlanDev.setup, [vlan_dev for vlan_dev in vlan_devs
+                                      if vlan_dev.bridge._setup_done])
+
+
+def _run_concurrently(method, items):
+    # Returns the items the method succeeded for
+    def _run(item):
+        try:
+            method(item)
+        except Exception:
+            LOG.exception('Unable to set up %s', item)
+            return False
+        return True
+
+    if CONF.sync_workers > 1 and len(items) > 1:
+        with futures.ThreadPoolExecutor(
+                max_workers=CONF.sync_workers) as executor:
+            results = list(executor.map(_run, items))
+    else:
+        results = [_run(item) for item in items]
+    return [item for item, ok in zip(items, results) if ok]
+
+
 def lookup(ovs_bridge: str, vlan: str) -> EvpnBridge:
     if vlan is None:
         vlan = constants.VLAN_ID_UNTAGGED
@@ -14,6 +14,7 @@
 
 import json
 import tempfile
+import threading
 
 from jinja2 import Template
 from oslo_config import cfg
@@ -28,6 +29,10 @@ LOG = logging.getLogger(__name__)
 
 DEFAULT_REDISTRIBUTE = {'connected'}
 
+# the VNIs can be set up concurrently, but the configuration is applied to
+# FRR one file at a time
+_vtysh_config_lock = threading.Lock()
+
 CONFIGURE_ND_TEMPLATE = '''
 interface {{ intf }}
 {% if is_dhcpv6 %}
@@ -47,6 +52,10 @@ vrf {{ vrf_name }}
 exit-vrf
 
 router bgp {{ bgp_as }} vrf {{ vrf_name }}
+{% if graceful_restart %}
+  bgp graceful-restart
+  bgp graceful-restart preserve-fw-state
+{% endif %}
   address-family ipv4 unicast
 {% for redist in redistribute %}
     redistribute {{ redist }}
@@ -88,6 +97,10 @@ no router bgp {{ bgp_as }} vrf {{ vrf_name }}
 
 LEAK_VRF_TEMPLATE = '''
 router bgp {{ bgp_as }}
+{% if graceful_restart %}
+  bgp graceful-restart
+  bgp graceful-restart preserve-fw-state
+{% endif %}
   address-family ipv4 unicast
     import vrf {{ vrf_name }}
   exit-address-family
@@ -132,7 +145,8 @@ def _run_vtysh_config_with_tempfile(vrf_config):
         raise
 
     try:
-        ovn_bgp_agent.privileged.vtysh.run_vtysh_config(f.name)
+        with _vtysh_config_lock:
+            ovn_bgp_agent.privileged.vtysh.run_vtysh_config(f.name)
     finally:
         if f is not None:
             f.close()
@@ -186,15 +200,21 @@ def vrf_leak(vrf, bgp_as, bgp_router_id=None, template=LEAK_VRF_TEMPLATE):
             return
 
     vrf_template = Template(template)
-    vrf_config = vrf_template.render(vrf_name=vrf, bgp_as=bgp_as,
-                                     redistribute=DEFAULT_REDISTRIBUTE,
-                                     bgp_router_id=bgp_router_id)
+    vrf_config = vrf_template.render(
+        vrf_name=vrf, bgp_as=bgp_as, redistribute=DEFAULT_REDISTRIBUTE,
+        bgp_router_id=bgp_router_id,
+        graceful_restart=CONF.bgp_graceful_restart)
     _run_vtysh_config_with_tempfile(vrf_config)
 
 
 def vrf_reconfigure(evpn_info, action):
+    vrfs_reconfigure([evpn_info], action)
+
+
+def vrfs_reconfigure(evpn_infos, action):
+    """Reconfigure the VRFs of all the given evpn infos with one vtysh run"""
     LOG.info("FRR reconfiguration (action = %s) for evpn: %s",
-             action, evpn_info)
+             action, ', '.join(str(evpn_info) for evpn_info in evpn_infos))
 
     # If we have more actions, we can define them in this list.
     vrf_templates = {
@@ -204,20 +224,26 @@ def vrf_reconfigure(evpn_info, action):
     if action not in vrf_templates:
         LOG.error("Unknown FRR reconfiguration action: %s", action)
         return
-
-    # Set default opts, so all params are available for the templates
-    # Then update them with evpn_info
-    opts = dict(route_targets=[], route_distinguishers=[], export_targets=[],
-                import_targets=[], local_ip=CONF.evpn_local_ip,
-                redistribute=DEFAULT_REDISTRIBUTE,
-                bgp_as=CONF.bgp_AS, vrf_name='', vni=0)
-    opts.update(evpn_info)
-
-    if not opts['vrf_name']:
-        opts['vrf_name'] = "{}{}".format(constants.OVN_EVPN_VRF_PREFIX,
-                                         evpn_info['vni'])
+    if not evpn_infos:
+        return
 
     vrf_template = Template(vrf_templates.get(action))
-    vrf_config = vrf_template.render(**opts)
-
-    _run_vtysh_config_with_tempfile(vrf_config)
+    vrf_configs = []
+    for evpn_info in evpn_infos:
+        # Set default opts, so all params are available for the templates
+        # Then update them with evpn_info
+        opts = dict(route_targets=[], route_distinguishers=[],
+                    export_targets=[], import_targets=[],
+                    local_ip=CONF.evpn_local_ip,
+                    redistribute=DEFAULT_REDISTRIBUTE,
+                    bgp_as=CONF.bgp_AS, vrf_name='', vni=0,
+                    graceful_restart=CONF.bgp_graceful_restart)
+        opts.update(evpn_info)
+
+        if not opts['vrf_name']:
+            opts['vrf_name'] = "{}{}".format(constants.OVN_EVPN_VRF_PREFIX,
+                                             evpn_info['vni'])
+
+        vrf_configs.append(vrf_template.render(**opts))
+
+    _run_vtysh_config_with_tempfile(''.join(vrf_configs))
@@ -12,6 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import threading
+
 from oslo_config import cfg
 from oslo_log import log as logging
 from ovs.stream import Stream
@@ -28,6 +31,7 @@ from ovn_bgp_agent import constants
 from ovn_bgp_agent.drivers.openstack.utils import driver_utils
 from ovn_bgp_agent import exceptions
 from ovn_bgp_agent.utils import helpers
+from ovn_bgp_agent.utils import tracing
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -37,16 +41,88 @@ class OvnIdl(connection.OvsdbIdl):
     def __init__(self, driver, remote, schema, **kwargs):
         super(OvnIdl, self).__init__(remote, schema, **kwargs)
         self.driver = driver
-        self.notify_handler = OvnDbNotifyHandler(driver)
+        self.notify_handler = OvnDbNotifyHandler(driver, idl=self)
 
     def notify(self, event, row, updates=None):
         self.notify_handler.notify(event, row, updates)
 
 
+class _TracedEvent(object):
+    """Matched event running within the trace of the notification"""
+    ONETIME = False
+
+    def __init__(self, event, trace):
+        self.event = event
+        self.trace = trace
+
+    def run(self, event, row, old):
+        try:
+            with self.trace.activate('event.run',
+                                     {'event': self.event.event_name}):
+                self.event.run(event, row, old)
+        finally:
+            self.trace.release()
+
+
 class OvnDbNotifyHandler(event.RowEventHandler):
-    def __init__(self, driver):
+    def __init__(self, driver, idl=None):
         super(OvnDbNotifyHandler, self).__init__()
         self.driver = driver
+        self.idl = idl
+        # (table, event type) -> watched events, in priority order, that
+        # could match it. Lazily filled and reset when the watched events
+        # change
+        self._dispatch_table = {}
+
+    def _add(self, event):
+        super(OvnDbNotifyHandler, self)._add(event)
+        self._dispatch_table.clear()
+
+    def _discard(self, event):
+        super(OvnDbNotifyHandler, self)._discard(event)
+        self._dispatch_table.clear()
+
+    def _get_candidate_events(self, event_type, table):
+        key = (table, event_type)
+        try:
+            return self._dispatch_table[key]
+        except KeyError:
+            candidates = tuple(
+                t for t in self._watched_events
+                if t.table == table and event_type in t.events)
+            self._dispatch_table[key] = candidates
+            return candidates
+
+    def matching_events(self, event, row, updates):
+        with self._lock:
+            candidates = self._get_candidate_events(event, row._table.name)
+            return tuple(t for t in candidates
+                         if self.match(t, event, row, updates))
+
+    def notify(self, event, row, updates=None):
+        trace = tracing.start_trace(
+            'ovsdb.notify',
+            {'ovsdb.table': row._table.name, 'ovsdb.event': event,
+             'ovsdb.row': row.uuid},
+            idl=self.idl)
+        if trace is None:
+            return super(OvnDbNotifyHandler, self).notify(event, row, updates)
+
+        with trace.activate('ovsdb.match_events') as span:
+            matching = self.matching_events(event, row, updates)
+            span.attributes['events'] = ','.join(
+                m.event_name for m in matching)
+        if not matching:
+            # Nothing to trace as no action is taken
+            return
+        row = self._on_matching(event, row, updates)
+        for match in matching:
+            if match.ONETIME:
+                self.notifications.put((match, event, row, updates))
+                continue
+            trace.hold()
+            self.notifications.put(
+                (_TracedEvent(match, trace), event, row, updates))
 
 
 class OvnNbIdl(OvnIdl):
@@ -93,6 +169,9 @@ class OvnNbIdl(OvnIdl):
 
 class OvnSbIdl(OvnIdl):
     SCHEMA = 'OVN_Southbound'
+    # Tables whose row updates are not counted as changes, as they are
+    # bumped periodically (e.g., nb_cfg) without affecting what is exposed
+    UNCOUNTED_UPDATE_TABLES = ('Chassis', 'Chassis_Private', 'SB_Global')
 
     def __init__(self, connection_string, chassis=None, events=None,
                  tables=None):
@@ -105,6 +184,15 @@ class OvnSbIdl(OvnIdl):
                       'SB_Global')
         for table in tables:
             helper.register_table(table)
+        self.lb_index = (LoadBalancerIndex() if 'Load_Balancer' in tables
+                         else None)
+        self.nat_index = (NatAddressesIndex() if 'Port_Binding' in tables
+                          else None)
+        self.localnet_index = (LocalnetIndex() if 'Port_Binding' in tables
+                               else None)
+        # Number of row changes notified, to tell if anything changed
+        # between two points in time
+        self.changes_count = 0
         super(OvnSbIdl, self).__init__(
             None, connection_string, helper, leader_only=False)
         if chassis:
@@ -112,6 +200,26 @@ class OvnSbIdl(OvnIdl):
                      else 'Chassis')
             self.tables[table].condition = [['name', '==', chassis]]
 
+    def run(self):
+        monitoring = self.state == self.IDL_S_MONITORING
+        changed = super(OvnSbIdl, self).run()
+        if not monitoring and self.state == self.IDL_S_MONITORING:
+            # (Re)connected, the rows deleted while disconnected are not
+            # notified when the tables are cleared for the new full dump
+            for index in (self.lb_index, self.nat_index, self.localnet_index):
+                if index is not None:
+                    index.prune(self.tables)
+        return changed
+
+    def notify(self, event_type, row, updates=None):
+        if not (event_type == event.RowEvent.ROW_UPDATE and
+                row._table.name in self.UNCOUNTED_UPDATE_TABLES):
+            self.changes_count += 1
+        for index in (self.lb_index, self.nat_index, self.localnet_index):
+            if index is not None:
+                index.update(event_type, row)
+        super(OvnSbIdl, self).notify(event_type, row, updates)
+
     def _get_ovsdb_helper(self, connection_string):
         return idlutils.get_schema_helper(connection_string, self.SCHEMA)
 
@@ -138,6 +246,280 @@ class OvnSbIdl(OvnIdl):
         return ovsdbSbConn
 
 
+def _get_current_row(row):
+    # NOTE: rows deleted while the IDL was disconnected are dropped without
+    # any notification when the tables are cleared for a new full dump, and
+    # the ones still there are replaced by new Row objects with the same uuid
+    return row._table.rows.get(row.uuid)
+
+
+class _RowIndex(object):
+    """Base class of the maps of rows kept up to date from IDL updates
+
+    Subclasses keep in _indexed the uuids of the rows indexed, and remove
+    them from the maps with _forget, both while holding _lock.
+    """
+
+    def _get_table_name(self, uuid):
+        return 'Port_Binding'
+
+    def prune(self, tables):
+        """Forget the indexed rows that are no longer on their tables"""
+        with self._lock:
+            for uuid in list(self._indexed):
+                table = tables.get(self._get_table_name(uuid))
+                if table is None or uuid not in table.rows:
+                    self._forget(uuid)
+
+
+class LoadBalancerIndex(_RowIndex):
+    """SB Load_Balancer and VIP port maps kept up to date from IDL updates
+
+    Finding the OVN load balancers to expose through a router otherwise
+    requires scanning the Port_Binding and Load_Balancer tables for every
+    load balancer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # lb name -> {lb uuid: Load_Balancer row}
+        self._lbs = collections.defaultdict(dict)
+        # lb name -> VIP Port_Binding row
+        self._vip_ports = {}
+        # datapath -> names of the lbs with a VIP port on it
+        self._vip_ports_by_dp = collections.defaultdict(set)
+        # patch port name -> Port_Binding row
+        self._patch_ports = {}
+        # datapath -> peer names of its patch ports
+        self._patch_peers = collections.defaultdict(set)
+        # row uuid -> (kind, name, datapath, peer) it was indexed with
+        self._indexed = {}
+
+    def _get_table_name(self, uuid):
+        if self._indexed[uuid][0] == 'lb':
+            return 'Load_Balancer'
+        return 'Port_Binding'
+
+    def update(self, event_type, row):
+        table = row._table.name
+        if table not in ('Load_Balancer', 'Port_Binding'):
+            return
+        with self._lock:
+            self._forget(row.uuid)
+            if event_type == event.RowEvent.ROW_DELETE:
+                return
+            if table == 'Load_Balancer':
+                self._lbs[row.name][row.uuid] = row
+                self._indexed[row.uuid] = ('lb', row.name, None, None)
+            else:
+                self._index_port(row)
+
+    def _index_port(self, row):
+        if row.type == constants.OVN_PATCH_VIF_PORT_TYPE:
+            peer = row.options.get('peer')
+            self._patch_ports[row.logical_port] = row
+            if peer:
+                self._patch_peers[row.datapath].add(peer)
+            self._indexed[row.uuid] = ('patch', row.logical_port,
+                                       row.datapath, peer)
+            return
+
+        # ovn-sbctl find port_binding type=\"\" chassis=[] mac=[] up=false
+        if (row.type != constants.OVN_VM_VIF_PORT_TYPE or row.chassis or
+                row.mac or row.up != [False]):
+            return
+        port_name = row.external_ids.get(constants.OVN_PORT_NAME_EXT_ID_KEY)
+        if (not port_name or
+                len(port_name) <= len(constants.LB_VIP_PORT_PREFIX)):
+            return
+        lb_name = port_name[len(constants.LB_VIP_PORT_PREFIX):]
+        self._vip_ports[lb_name] = row
+        self._vip_ports_by_dp[row.datapath].add(lb_name)
+        self._indexed[row.uuid] = ('vip', lb_name, row.datapath, None)
+
+    def _forget(self, uuid):
+        try:
+            kind, name, datapath, peer = self._indexed.pop(uuid)
+        except KeyError:
+            return
+        if kind == 'lb':
+            self._lbs[name].pop(uuid, None)
+            if not self._lbs[name]:
+                del self._lbs[name]
+        elif kind == 'patch':
+            patch_port = self._patch_ports.get(name)
+            if patch_port is not None and patch_port.uuid == uuid:
+                del self._patch_ports[name]
+            if peer:
+                self._discard(self._patch_peers, datapath, peer)
+        else:
+            vip_port = self._vip_ports.get(name)
+            if vip_port is not None and vip_port.uuid == uuid:
+                del self._vip_ports[name]
+                self._discard(self._vip_ports_by_dp, datapath, name)
+
+    @staticmethod
+    def _discard(mapping, key, value):
+        values = mapping.get(key)
+        if values is None:
+            return
+        values.discard(value)
+        if not values:
+            del mapping[key]
+
+    def get_lb(self, name):
+        with self._lock:
+            lbs = list(self._lbs.get(name, {}).values())
+        for lb in lbs:
+            lb = _get_current_row(lb)
+            if lb is not None:
+                return lb
+
+    def get_vip_port(self, lb_name):
+        vip_port = self._vip_ports.get(lb_name)
+        if vip_port is not None:
+            return _get_current_row(vip_port)
+
+    def get_vip_ports_on_datapath(self, datapath):
+        """Return a {lb name: VIP Port_Binding row} dict for a datapath"""
+        with self._lock:
+            vip_ports = [(lb_name, self._vip_ports[lb_name])
+                         for lb_name in self._vip_ports_by_dp.get(datapath,
+                                                                  ())]
+        vip_ports = [(lb_name, _get_current_row(vip_port))
+                     for lb_name, vip_port in vip_ports]
+        return {lb_name: vip_port for lb_name, vip_port in vip_ports
+                if vip_port is not None}
+
+    def get_router_datapaths(self, datapath):
+        """Return the datapaths connected to a datapath through patch ports"""
+        with self._lock:
+            peers = [self._patch_ports[peer]
+                     for peer in self._patch_peers.get(datapath, ())
+                     if peer in self._patch_ports]
+        peers = [_get_current_row(peer) for peer in peers]
+        return [peer.datapath for peer in peers if peer is not None]
+
+
+def _parse_nat_address(nat_address):
+    # Format: "MAC IP1 [IP2 ...] [is_chassis_resident(\"PORT\")]"
+    fields = nat_address.strip().split(" ")
+    if '"' not in fields[-1]:
+        return fields[1:], None
+    return fields[1:-1], fields[-1].split('"')[1]
+
+
+class NatAddressesIndex(_RowIndex):
+    """Parsed SB Port_Binding nat_addresses kept up to date from IDL updates
+
+    It allows to resolve the FIP of a logical port and the NAT addresses
+    behind a router gateway port without parsing nat_addresses of every
+    patch port.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # patch port name -> (Port_Binding row, [(ips, resident port)])
+        self._nat_addresses = {}
+        # resident port name -> (first ip, patch Port_Binding row)
+        self._fips = {}
+        # row uuid -> (patch port name, resident port names)
+        self._indexed = {}
+
+    def update(self, event_type, row):
+        if row._table.name != 'Port_Binding':
+            return
+        with self._lock:
+            self._forget(row.uuid)
+            if (event_type == event.RowEvent.ROW_DELETE or
+                    row.type != constants.OVN_PATCH_VIF_PORT_TYPE or
+                    not row.nat_addresses):
+                return
+            nat_addresses = [_parse_nat_address(nat_address)
+                             for nat_address in row.nat_addresses]
+            ports = []
+            for ips, port in nat_addresses:
+                if port and ips:
+                    self._fips.setdefault(port, (ips[0], row))
+                    ports.append(port)
+            self._nat_addresses[row.logical_port] = (row, nat_addresses)
+            self._indexed[row.uuid] = (row.logical_port, ports)
+
+    def _forget(self, uuid):
+        try:
+            name, ports = self._indexed.pop(uuid)
+        except KeyError:
+            return
+        self._nat_addresses.pop(name, None)
+        for port in ports:
+            fip = self._fips.get(port)
+            if fip is not None and fip[1].uuid == uuid:
+                del self._fips[port]
+
+    def get_fip(self, port):
+        """Return the (fip, patch port row) associated to a logical port"""
+        fip = self._fips.get(port)
+        if fip is not None:
+            patch_port = _get_current_row(fip[1])
+            if patch_port is not None:
+                return fip[0], patch_port
+        return None, None
+
+    def get_nat_addresses(self, patch_port):
+        """Return the (patch port row, [(ips, port)]) for a patch port"""
+        nat_addresses = self._nat_addresses.get(patch_port)
+        if nat_addresses is not None:
+            row = _get_current_row(nat_addresses[0])
+            if row is not None:
+                return row, nat_addresses[1]
+        return None, []
+
+
+class LocalnetIndex(_RowIndex):
+    """SB localnet Port_Bindings per datapath kept up to date from IDL updates
+
+    It tells provider from tenant datapaths, and their network name and
+    VLAN tag, without scanning the Port_Binding table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # datapath -> {port uuid: localnet Port_Binding row}
+        self._localnets = collections.defaultdict(dict)
+        # port uuid -> datapath it was indexed with
+        self._indexed = {}
+
+    def update(self, event_type, row):
+        if row._table.name != 'Port_Binding':
+            return
+        with self._lock:
+            self._forget(row.uuid)
+            if (event_type == event.RowEvent.ROW_DELETE or
+                    row.type != constants.OVN_LOCALNET_VIF_PORT_TYPE):
+                return
+            self._localnets[row.datapath][row.uuid] = row
+            self._indexed[row.uuid] = row.datapath
+
+    def _forget(self, uuid):
+        datapath = self._indexed.pop(uuid, None)
+        if datapath is not None:
+            self._localnets[datapath].pop(uuid, None)
+            if not self._localnets[datapath]:
+                del self._localnets[datapath]
+
+    def get_localnets(self, datapath=None):
+        """Return the localnet ports of a datapath, or all of them"""
+        with self._lock:
+            if datapath is None:
+                localnets = [localnet
+                             for dp_localnets in self._localnets.values()
+                             for localnet in dp_localnets.values()]
+            else:
+                localnets = list(self._localnets.get(datapath, {}).values())
+        localnets = [_get_current_row(localnet) for localnet in localnets]
+        return [localnet for localnet in localnets if localnet is not None]
+
+
 class Backend(ovs_idl.Backend):
     lookup_table = {}
     ovsdb_connection = None
@@ -490,37 +872,24 @@ class OvsdbSbOvnIdl(sb_impl_idl.OvnSbApiIdlImpl, Backend):
                                 ('type', '=', port_type))
         return cmd.execute(check_error=True)
 
-    def is_provider_network(self, datapath):
-        try:
-            cmd = self.db_find_rows('Port_Binding',
-                                    ('datapath', '=', datapath),
-                                    ('type', '=',
-                                     constants.OVN_LOCALNET_VIF_PORT_TYPE))
-            return bool(cmd.execute(check_error=True))
-        except ValueError:
+    def _get_localnets_on_datapath(self, datapath):
+        if datapath.uuid not in datapath._table.rows:
             # Datapath has been removed.
             raise exceptions.DatapathNotFound(datapath=datapath)
+        return self.idl.localnet_index.get_localnets(datapath)
+
+    def is_provider_network(self, datapath):
+        return bool(self._get_localnets_on_datapath(datapath))
 
     def get_localnet_for_datapath(self, datapath):
-        try:
-            cmd = self.db_find_rows('Port_Binding',
-                                    ('datapath', '=', datapath),
-                                    ('type', '=',
-                                     constants.OVN_LOCALNET_VIF_PORT_TYPE))
-            localnet_info = cmd.execute(check_error=True)
-            return localnet_info[0].logical_port if localnet_info else []
-        except ValueError:
-            # Datapath has been removed.
-            raise exceptions.DatapathNotFound(datapath=datapath)
+        localnet_info = self._get_localnets_on_datapath(datapath)
+        return localnet_info[0].logical_port if localnet_info else []
 
     def get_fip_associated(self, port):
-        cmd = self.db_find_rows(
-            'Port_Binding', ('type', '=', constants.OVN_PATCH_VIF_PORT_TYPE))
-        for row in cmd.execute(check_error=True):
-            for fip in row.nat_addresses:
-                if port in fip:
-                    return fip.split(" ")[1], row.datapath
-        return None, None
+        fip, patch_port_row = self.idl.nat_index.get_fip(port)
+        if not fip:
+            return None, None
+        return fip, patch_port_row.datapath
 
     def is_port_on_chassis(self, port_name, chassis):
         port_info = self.get_port_by_name(port_name)
@@ -558,13 +927,12 @@ class OvsdbSbOvnIdl(sb_impl_idl.OvnSbApiIdlImpl, Backend):
     def get_cr_lrp_nat_addresses_info(self, cr_lrp_port_name, chassis, sb_idl):
         # NOTE: Assuming logical_port format is "cr-lrp-XXXX"
         patch_port_name = cr_lrp_port_name.split("cr-lrp-")[1]
-        patch_port_row = self.get_port_by_name(patch_port_name)
+        patch_port_row, nat_addresses = self.idl.nat_index.get_nat_addresses(
+            patch_port_name)
         if not patch_port_row:
             return [], None
         ips = []
-        for row in patch_port_row.nat_addresses:
-            nat_ips = row.split(" ")[1:-1]
-            port = row.split(" ")[-1].split("\"")[1]
+        for nat_ips, port in nat_addresses:
             if port and sb_idl and sb_idl.is_port_on_chassis(port, chassis):
                 ips.extend(nat_ips)
         return ips, patch_port_row
@@ -580,8 +948,7 @@ class OvsdbSbOvnIdl(sb_impl_idl.OvnSbApiIdlImpl, Backend):
         return self.get_port_datapath(peer_name)
 
     def get_network_name_and_tag(self, datapath, bridge_mappings):
-        for row in self.get_ports_on_datapath(
-                datapath, constants.OVN_LOCALNET_VIF_PORT_TYPE):
+        for row in self._get_localnets_on_datapath(datapath):
             if (row.options and
                     row.options.get('network_name') in bridge_mappings):
                 return row.options.get('network_name'), row.tag
@@ -589,18 +956,14 @@ class OvsdbSbOvnIdl(sb_impl_idl.OvnSbApiIdlImpl, Backend):
 
     def get_network_vlan_tags(self):
         tags = []
-        cmd = self.db_find_rows('Port_Binding', ('type', '=',
-                                constants.OVN_LOCALNET_VIF_PORT_TYPE))
-        for row in cmd.execute(check_error=True):
+        for row in self.idl.localnet_index.get_localnets():
             if row.tag:
                 tags.append(row.tag[0])
         return tags
 
     def get_network_vlan_tag_by_network_name(self, network_name):
         tags = []
-        cmd = self.db_find_rows('Port_Binding', ('type', '=',
-                                constants.OVN_LOCALNET_VIF_PORT_TYPE))
-        for row in cmd.execute(check_error=True):
+        for row in self.idl.localnet_index.get_localnets():
             if (row.tag and row.options and
                     row.options.get('network_name') == network_name):
                 tags.append(row.tag[0])
@@ -697,66 +1060,36 @@ class OvsdbSbOvnIdl(sb_impl_idl.OvnSbApiIdlImpl, Backend):
         return [r for r in rows if r.chassis and r.chassis[0].name == chassis]
 
     def get_ovn_lb(self, name):
-        cmd = self.db_find_rows('Load_Balancer', ('name', '=', name))
-        lb_info = cmd.execute(check_error=True)
-        return lb_info[0] if lb_info else []
+        return self.idl.lb_index.get_lb(name) or []
 
     def get_provider_ovn_lbs_on_cr_lrp(self, provider_dp, router_dp):
         # return {vip_port: vip_ip, vip_port2: vip_ip2, ...}
-        # ovn-sbctl find port_binding type=\"\" chassis=[] mac=[] up=false
-        cmd = self.db_find_rows('Port_Binding',
-                                ('datapath', '=', provider_dp),
-                                ('type', '=', constants.OVN_VM_VIF_PORT_TYPE),
-                                ('chassis', '=', []),
-                                ('mac', '=', []),
-                                ('up', '=', False))
+        lb_index = self.idl.lb_index
         lbs = {}
-        for row in cmd.execute(check_error=True):
+        vip_ports = lb_index.get_vip_ports_on_datapath(provider_dp)
+        for lb_name, row in vip_ports.items():
             # This is depending on the external-id information added by
             # neutron, regarding the neutron:cidrs
             ip_info = row.external_ids.get(
                 constants.OVN_CIDRS_EXT_ID_KEY, "")
             if not ip_info:
                 continue
-            port_name = row.external_ids.get(
-                constants.OVN_PORT_NAME_EXT_ID_KEY)
-            if (not port_name or
-                    len(port_name) <= len(constants.LB_VIP_PORT_PREFIX)):
-                continue
-            lb_name = port_name[len(constants.LB_VIP_PORT_PREFIX):]
-            lb = self.get_ovn_lb(lb_name)
+            lb = lb_index.get_lb(lb_name)
             if not lb:
                 continue
             lb_dps, lr_dps = helpers.get_lb_datapaths(lb)
             if not lb_dps:
                 lb_dps = lb.datapaths
 
-            if not lr_dps:
+            if not lr_dps and lb_dps:
                 # assume all the members are connected through the same router
                 # so only one datapath needs to be checked
-                router_lrps = self.get_lrps_for_datapath(lb_dps[0])
-                for lrp in router_lrps:
-                    router_lrp_dp = self.get_port_datapath(lrp)
-                    if router_lrp_dp == router_dp:
-                        lb_ip = ip_info.split(" ")[0].split("/")[0]
-                        lbs[lb.name] = lb_ip
-                        break
-            elif router_dp in lr_dps:
+                lr_dps = lb_index.get_router_datapaths(lb_dps[0])
+            if router_dp in lr_dps:
                 lb_ip = ip_info.split(" ")[0].split("/")[0]
                 lbs[lb.name] = lb_ip
 
         return lbs
 
     def get_ovn_vip_port(self, name):
-        # ovn-sbctl find port_binding type=\"\" chassis=[] mac=[] up=false
-        cmd = self.db_find_rows('Port_Binding',
-                                ('type', '=', constants.OVN_VM_VIF_PORT_TYPE),
-                                ('chassis', '=', []),
-                                ('mac', '=', []),
-                                ('up', '=', False))
-
-        for row in cmd.execute(check_error=True):
-            port_name = row.external_ids.get(
-                constants.OVN_PORT_NAME_EXT_ID_KEY)
-            if port_name[len(constants.LB_VIP_PORT_PREFIX):] == name:
-                return row
+        return self.idl.lb_index.get_vip_port(name)
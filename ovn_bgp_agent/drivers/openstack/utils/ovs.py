@@ -12,23 +12,45 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+
 from oslo_config import cfg
 from oslo_log import log as logging
 from ovs.db import idl
 from ovsdbapp.backend.ovs_idl import connection
 from ovsdbapp.backend.ovs_idl import idlutils
+from ovsdbapp import event as ovsdb_event
 from ovsdbapp.schema.open_vswitch import impl_idl as idl_ovs
+import re
 import socket
 import tenacity
 
 from ovn_bgp_agent import constants
 from ovn_bgp_agent import exceptions as agent_exc
 import ovn_bgp_agent.privileged.ovs_vsctl
+from ovn_bgp_agent.utils import helpers
 from ovn_bgp_agent.utils import linux_net
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+# Flow statistics changing on every dump-flows
+FLOW_STATS_FIELDS = frozenset(
+    ('duration', 'n_packets', 'n_bytes', 'idle_age', 'hard_age'))
+# Match fields and actions as dumped with OpenFlow13 -> as with OpenFlow10
+FLOW_FIELD_ALIASES = {'eth_src': 'dl_src', 'eth_dst': 'dl_dst',
+                      'eth_type': 'dl_type'}
+FLOW_ACTION_ALIASES = {'normal': 'NORMAL', 'pop_vlan': 'strip_vlan'}
+FLOW_MAC_FIELDS = ('dl_src', 'dl_dst')
+RE_FLOW_ACTIONS = re.compile(r'(?:^|[\s,])actions=')
+RE_FLOW_SET_FIELD = re.compile(r'^set_field:(.+)->eth_(src|dst)$')
+
+TOPOLOGY_TABLES = ('Open_vSwitch', 'Bridge', 'Port', 'Interface')
+# Interfaces the bridges wiring depends on: the patch ports and the
+# bridges' own ones (internal)
+TOPOLOGY_INTERFACE_TYPES = ('patch', 'internal')
+BRIDGE_MAPPINGS_KEY = 'ovn-bridge-mappings'
+
 
 def _find_ovs_port(bridge):
     # TODO(ltomasbo): What happens if there are several patch ports on the
@@ -50,6 +72,158 @@ def get_bridge_flows(bridge, filter_=None):
         args)[0].split('\n')[1:-1]
 
 
+def _parse_number(value):
+    try:
+        return int(value, 0)
+    except ValueError:
+        return value
+
+
+def _split_flow_actions(actions):
+    # commas within parentheses (e.g., ct(...) or learn(...)) do not
+    # separate actions
+    result = []
+    depth = start = 0
+    for i, char in enumerate(actions):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and not depth:
+            result.append(actions[start:i])
+            start = i + 1
+    result.append(actions[start:])
+    return [action.strip() for action in result if action.strip()]
+
+
+def _normalize_flow_action(action):
+    set_field = RE_FLOW_SET_FIELD.match(action)
+    if set_field:
+        return 'mod_dl_{}:{}'.format(set_field.group(2),
+                                     set_field.group(1).lower())
+    if action.startswith(('mod_dl_src:', 'mod_dl_dst:')):
+        return action.lower()
+    if action.startswith('output='):
+        return 'output:' + action[len('output='):]
+    return FLOW_ACTION_ALIASES.get(action, action)
+
+
+class Flow(collections.namedtuple(
+        'Flow', ['cookie', 'table', 'priority', 'match', 'actions'])):
+    """OpenFlow flow, as dumped by ovs-ofctl dump-flows or added by the agent
+
+    The match is a frozenset of (field, value) pairs (with None as value
+    for the protocol shorthands, such as ip or ipv6) and the actions a
+    tuple, both normalized, so that the same flow compares and hashes equal
+    regardless of its fields order, its statistics, or whether it was
+    dumped with OpenFlow10 or OpenFlow13.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, flow):
+        """Parse a flow, as dumped by ovs-ofctl or given to add-flow
+
+        :raises ValueError: if the table or the priority are not numbers.
+        """
+        head, *actions = RE_FLOW_ACTIONS.split(flow.strip(), 1)
+        cookie = 0
+        table = 0
+        priority = constants.OVS_DEFAULT_FLOW_PRIORITY
+        match = []
+        for token in re.split(r'[\s,]+', head):
+            if not token:
+                continue
+            separator = '=' if '=' in token else ':'
+            field, _, value = token.partition(separator)
+            field = FLOW_FIELD_ALIASES.get(field, field)
+            if field in FLOW_STATS_FIELDS:
+                continue
+            if field == 'cookie':
+                cookie = _parse_number(value.split('/')[0])
+            elif field == 'table':
+                table = int(value)
+            elif field == 'priority':
+                priority = int(value)
+            elif field in FLOW_MAC_FIELDS:
+                match.append((field, value.lower()))
+            else:
+                match.append((field, value or None))
+        return cls(cookie, table, priority, frozenset(match),
+                   tuple(_normalize_flow_action(action) for action in
+                         _split_flow_actions(actions[0] if actions else '')))
+
+    def get(self, field, default=None):
+        for match_field, value in self.match:
+            if match_field == field:
+                return value
+        return default
+
+    @property
+    def output_port(self):
+        """The port of the last output action, if any"""
+        for action in reversed(self.actions):
+            if action.startswith('output:'):
+                return action[len('output:'):]
+
+    def _get_match_string(self):
+        # protocol shorthands first, as ovs-ofctl dumps them
+        return ','.join(
+            field if value is None else '{}={}'.format(field, value)
+            for field, value in sorted(
+                self.match, key=lambda item: (item[1] is not None, item[0])))
+
+    def to_match_string(self):
+        """Return the flow as a strict match, to delete it with del-flows"""
+        return 'cookie={}/-1,table={},priority={},{}'.format(
+            self.cookie, self.table, self.priority, self._get_match_string())
+
+    def __str__(self):
+        table = 'table={},'.format(self.table) if self.table else ''
+        return 'cookie={},{}priority={},{},actions={}'.format(
+            self.cookie, table, self.priority, self._get_match_string(),
+            ','.join(self.actions))
+
+
+def get_cookie_flows(bridge, cookie):
+    """Return the set of flows with the cookie on the bridge, parsed"""
+    flows = set()
+    for flow in get_bridge_flows(bridge, "cookie={}/-1".format(cookie)):
+        try:
+            flows.add(Flow.parse(flow))
+        except ValueError:
+            LOG.warning("Unable to parse the flow %s of bridge %s", flow,
+                        bridge)
+    return flows
+
+
+def diff_flows(current_flows, expected_flows):
+    """Return the (missing, extra) flows, sorted
+
+    :param current_flows: set of Flow on the bridge.
+    :param expected_flows: set of Flow that should be on the bridge.
+    """
+    return (sorted(expected_flows - current_flows, key=str),
+            sorted(current_flows - expected_flows, key=str))
+
+
+def add_flows(bridge, flows):
+    for flow in flows:
+        ovn_bgp_agent.privileged.ovs_vsctl.ovs_ofctl(
+            ['add-flow', bridge, str(flow)])
+
+
+def del_flows(bridge, flows):
+    for flow in flows:
+        ovn_bgp_agent.privileged.ovs_vsctl.ovs_ofctl(
+            ['--strict', 'del-flows', bridge, flow.to_match_string()])
+
+
+def get_bridge_flows_fingerprint(bridge, cookie):
+    """Return a fingerprint of the flows on the bridge with the cookie"""
+    return helpers.fingerprint(get_cookie_flows(bridge, cookie))
+
+
 @tenacity.retry(
     retry=tenacity.retry_if_exception_type(agent_exc.PortNotFound),
     wait=tenacity.wait_fixed(1),
@@ -91,60 +265,29 @@ def get_ovs_patch_port_ofport(patch):
     return get_device_port_at_ovs(patch_name)
 
 
+def _get_mac_tweak_flows(mac, ports, cookie):
+    return {Flow.parse("cookie={},priority=900,{},in_port={},"
+                       "actions=mod_dl_dst:{},NORMAL".format(
+                           cookie, protocol, in_port, mac))
+            for in_port in ports for protocol in ('ip', 'ipv6')}
+
+
 def ensure_mac_tweak_flows(bridge, mac, ports, cookie):
-    cookie_id = "cookie={}/-1".format(cookie)
-    current_flows = get_bridge_flows(bridge, cookie_id)
-    flows_info = [flow.split("priority")[1].replace(" ", ",")
-                  for flow in current_flows]
-
-    for in_port in ports:
-        exist_flow = False
-        exist_flow_v6 = False
-        flow = ("cookie={},priority=900,ip,in_port={},"
-                "actions=mod_dl_dst:{},NORMAL".format(
-                    cookie, in_port, mac))
-        flow_v6 = ("cookie={},priority=900,ipv6,in_port={},"
-                   "actions=mod_dl_dst:{},NORMAL".format(
-                       cookie, in_port, mac))
-
-        if flow.split("priority")[1] in flows_info:
-            exist_flow = True
-        if flow_v6.split("priority")[1] in flows_info:
-            exist_flow_v6 = True
-
-        if not exist_flow:
-            ovn_bgp_agent.privileged.ovs_vsctl.ovs_ofctl(
-                ['add-flow', bridge, flow])
-        if not exist_flow_v6:
-            ovn_bgp_agent.privileged.ovs_vsctl.ovs_ofctl(
-                ['add-flow', bridge, flow_v6])
+    missing_flows, _ = diff_flows(get_cookie_flows(bridge, cookie),
+                                  _get_mac_tweak_flows(mac, ports, cookie))
+    add_flows(bridge, missing_flows)
 
 
 def remove_extra_ovs_flows(ovs_flows, bridge, cookie):
-    expected_flows = []
+    expected_flows = set()
+    pmm = ovs_flows[bridge].get('port-mac-mapping', {})
     for port in ovs_flows[bridge].get('in_port'):
-        pmm = ovs_flows[bridge].get('port-mac-mapping', {})
         lladdr = pmm.get(port, ovs_flows[bridge]['mac'])
+        expected_flows.update(_get_mac_tweak_flows(lladdr, [port], cookie))
 
-        for flow in [
-            # Add ipv4 flow in 'normal' and OpenFlow13 format
-            "=900,ip,in_port={} actions=mod_dl_dst:{},NORMAL",
-            "=900,ip,in_port={} actions=set_field:{}->eth_dst,NORMAL",
-
-            # Add ipv6 flow in 'normal' and OpenFlow13 format
-            "=900,ipv6,in_port={} actions=mod_dl_dst:{},NORMAL",
-            "=900,ipv6,in_port={} actions=set_field:{}->eth_dst,NORMAL",
-        ]:
-            expected_flows.append(flow.format(port, lladdr))
-
-    cookie_id = "cookie={}/-1".format(cookie)
-    current_flows = get_bridge_flows(bridge, cookie_id)
-    for flow in current_flows:
-        if flow.split("priority")[1] not in expected_flows:
-            del_flow = ('{},{}').format(
-                cookie_id, flow.split("priority=900,")[1].split(" actions")[0])
-            ovn_bgp_agent.privileged.ovs_vsctl.ovs_ofctl(
-                ['del-flows', bridge, del_flow])
+    _, extra_flows = diff_flows(get_cookie_flows(bridge, cookie),
+                                expected_flows)
+    del_flows(bridge, extra_flows)
 
 
 def ensure_flow(bridge, flow):
@@ -233,50 +376,124 @@ def add_vlan_port_to_ovs_bridge(bridge, vlan, vlan_tag):
     ovn_bgp_agent.privileged.ovs_vsctl.ovs_vsctl(args)
 
 
-def del_flow(flow, bridge, cookie):
-    cookie_id = "cookie={}/-1".format(cookie)
-    f = '{},priority{}'.format(
-        cookie_id, flow.split(' actions')[0].split(' priority')[1])
-    ovn_bgp_agent.privileged.ovs_vsctl.ovs_ofctl(
-        ['--strict', 'del-flows', bridge, f])
-
-
-def get_flow_info(flow):
-    # example:
-    # cookie=0x3e7, duration=85.005s, table=0, n_packets=0,
-    #  n_bytes=0, idle_age=65534, priority=1000,ip,in_port=1
-    #  nw_src=20.0.0.0/24 actions=mod_dl_dst:1a:bd:c3:dc:6a:4c,
-    # output:5
-    flow_mac = flow_port = flow_nw_src = flow_ipv6_src = None
-    try:
-        flow_mac = flow.split('dl_src=')[1].split(',')[0]
-        flow_port = flow.split('output:')[1].split(',')[0]
-    except (IndexError, TypeError):
-        pass
-    flow_nw = flow.split('nw_src=')
-    if len(flow_nw) == 2:
-        flow_nw_src = flow_nw[1].split(' ')[0]
-    flow_ipv6 = flow.split('ipv6_src=')
-    if len(flow_ipv6) == 2:
-        flow_ipv6_src = flow_ipv6[1].split(' ')[0]
-
-    return {'mac': flow_mac, 'port': flow_port, 'nw_src': flow_nw_src,
-            'ipv6_src': flow_ipv6_src}
+def _get_bridge_mappings(external_ids):
+    return {key: value for key, value in external_ids.items()
+            if key.startswith(BRIDGE_MAPPINGS_KEY)}
+
+
+def is_topology_change(event, row, updates=None):
+    """Whether the row change affects the wiring of the provider bridges
+
+    That is, a change on the bridge mappings, a bridge being created or
+    deleted, or a patch or internal (e.g., the bridge's own) interface being
+    created, deleted or changing its ofport or MAC. The Port rows changes
+    are not relevant, as they come along with the ones of their interfaces.
+    """
+    table = row._table.name
+    if table == 'Open_vSwitch':
+        if event != idl.ROW_UPDATE:
+            return True
+        old_external_ids = getattr(updates, 'external_ids', None)
+        return (old_external_ids is not None and
+                _get_bridge_mappings(old_external_ids) !=
+                _get_bridge_mappings(row.external_ids))
+    if table == 'Bridge':
+        return event != idl.ROW_UPDATE
+    if table == 'Interface':
+        if row.type not in TOPOLOGY_INTERFACE_TYPES:
+            return False
+        return (event != idl.ROW_UPDATE or hasattr(updates, 'ofport') or
+                hasattr(updates, 'mac_in_use'))
+    return False
+
+
+class OvsTopologyIdl(idl.Idl):
+    """Open_vSwitch IDL keeping track of the changes on the OVS topology
+
+    topology_generation is bumped on every change the provider bridges
+    wiring depends on (see is_topology_change), so that it is only derived
+    again when it changes. The row changes are also notified to the
+    watched events.
+    """
+
+    def __init__(self, remote, schema_helper, events=None):
+        super(OvsTopologyIdl, self).__init__(remote, schema_helper)
+        self.topology_generation = 0
+        self.notify_handler = ovsdb_event.RowEventHandler()
+        if events:
+            self.notify_handler.watch_events(events)
+
+    def notify(self, event, row, updates=None):
+        if is_topology_change(event, row, updates):
+            self.topology_generation += 1
+        self.notify_handler.notify(event, row, updates)
 
 
 class OvsIdl(object):
-    def start(self, connection_string):
+    def __init__(self):
+        # (bridge, prefix) -> (topology generation, (mac, patch ofports))
+        self._bridges_info = {}
+
+    def start(self, connection_string, events=None):
         helper = idlutils.get_schema_helper(connection_string,
                                             'Open_vSwitch')
-        tables = ('Open_vSwitch', 'Bridge', 'Port', 'Interface')
-        for table in tables:
+        for table in TOPOLOGY_TABLES:
             helper.register_table(table)
-        ovs_idl = idl.Idl(connection_string, helper)
+        ovs_idl = OvsTopologyIdl(connection_string, helper, events=events)
         ovs_idl._session.reconnect.set_probe_interval(60000)
         conn = connection.Connection(
             ovs_idl, timeout=180)
         self.idl_ovs = idl_ovs.OvsdbIdl(conn)
 
+    @property
+    def topology_generation(self):
+        return self.idl_ovs.idl.topology_generation
+
+    def get_bridge_info(self, bridge,
+                        prefix=constants.OVS_PATCH_PROVNET_PORT_PREFIX):
+        """Return the MAC of the bridge and the ofports of its patch ports
+
+        It returns them as the flows info, i.e., {'mac': mac, 'in_port':
+        [ofport1, ofport2]}, reading them from the IDL instead of running
+        ovs-vsctl for each port. They are only read again when the OVS
+        topology changes. Patch ports with no ofport assigned yet are
+        skipped, as assigning it changes the topology.
+        """
+        generation = self.topology_generation
+        cached = self._bridges_info.get((bridge, prefix))
+        if cached is None or cached[0] != generation:
+            cached = (generation, self._read_bridge_info(bridge, prefix))
+            self._bridges_info[(bridge, prefix)] = cached
+        mac, ofports = cached[1]
+        return {'mac': mac, 'in_port': list(ofports)}
+
+    def _read_bridge_info(self, bridge, prefix):
+        mac = None
+        ofports = []
+        bridge_row = idlutils.row_by_value(self.idl_ovs.idl, 'Bridge', 'name',
+                                           bridge, None)
+        interfaces = sorted(
+            (iface for port in getattr(bridge_row, 'ports', [])
+             for iface in port.interfaces), key=lambda iface: iface.name)
+        for iface in interfaces:
+            if iface.name == bridge:
+                mac = iface.mac_in_use[0] if iface.mac_in_use else None
+            elif (iface.name.startswith(prefix) and iface.ofport and
+                    iface.ofport[0] > 0):
+                ofports.append(str(iface.ofport[0]))
+        if not mac:
+            mac = linux_net.get_interface_address(bridge)
+        return mac, tuple(ofports)
+
+    def get_ofports(self):
+        """Return the ofport of each interface, by name, from the IDL
+
+        Interfaces with no ofport assigned yet are not included.
+        """
+        return {iface.name: str(iface.ofport[0])
+                for iface in self.idl_ovs.tables['Interface'].rows.values()
+                if iface.ofport and iface.ofport[0] > 0}
+
     def _get_from_ext_ids(self, key):
         return self.idl_ovs.db_get(
             'Open_vSwitch', '.', 'external_ids').execute()[key]
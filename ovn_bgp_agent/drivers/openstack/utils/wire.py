@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import ast
+import threading
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -25,11 +26,15 @@ from ovn_bgp_agent.drivers.openstack.utils import ovs
 from ovn_bgp_agent import exceptions as agent_exc
 from ovn_bgp_agent.utils import helpers
 from ovn_bgp_agent.utils import linux_net
+from ovn_bgp_agent.utils import tracing
 
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+# The sync partitions may wire ports on the same bridge concurrently
+_ovs_flows_lock = threading.Lock()
+
 
 def ensure_base_wiring_config(idl, ovs_idl, ovn_idl=None, routing_tables={}):
     if CONF.exposing_method == constants.EXPOSE_METHOD_UNDERLAY:
@@ -67,10 +72,8 @@ def _ensure_base_wiring_config_underlay(idl, ovs_idl, routing_tables):
                                                     bridge_index,
                                                     vlan_tags)
         if not flows_info.get(bridge):
-            mac = linux_net.get_interface_address(bridge)
-            flows_info[bridge] = {'mac': mac, 'in_port': set()}
-            flows_info[bridge]['in_port'] = ovs.get_ovs_patch_ports_info(
-                bridge)
+            flows_info[bridge] = ovs_idl.get_bridge_info(bridge)
+            mac = flows_info[bridge]['mac']
             ovs.ensure_mac_tweak_flows(bridge, mac,
                                        flows_info[bridge]['in_port'],
                                        constants.OVS_RULE_COOKIE)
@@ -104,11 +107,8 @@ def _ensure_base_wiring_config_evpn(idl: 'ovn.OvsdbNbOvnIdl|ovn.OvsdbSbOvnIdl',
         ovs_idl.idl_ovs.add_br(bridge).execute(check_error=True)
 
         if bridge not in flows_info:
-            flows_info[bridge] = {
-                'mac': linux_net.get_interface_address(bridge),
-                'in_port': ovs.get_ovs_patch_ports_info(bridge),
-                'evpn': {}
-            }
+            flows_info[bridge] = dict(ovs_idl.get_bridge_info(bridge),
+                                      evpn={})
 
         # Find all provider networks, and create the vrf's
         localnet_ports = list(idl.get_localnet_ports_by_network_name(network))
@@ -154,6 +154,11 @@ def _ensure_base_wiring_config_evpn(idl: 'ovn.OvsdbNbOvnIdl|ovn.OvsdbSbOvnIdl',
             if dhcp_opts and evpn_dev:
                 evpn_dev.process_dhcp_opts(dhcp_opts)
 
+    # Set up at once the vlan devices (and VNIs) of the provider networks
+    evpn.provision([evpn_bridge.get_vlan(vlan_tag)
+                    for flow_info in flows_info.values()
+                    for vlan_tag, evpn_bridge in flow_info['evpn'].items()])
+
     return ovn_bridge_mappings, flows_info
 
 
@@ -214,10 +219,7 @@ def _ensure_base_wiring_config_ovn(ovs_idl, ovn_idl):
         ovn_bridge_mappings[network] = bridge
 
         if not flows_info.get(bridge):
-            mac = linux_net.get_interface_address(bridge)
-            flows_info[bridge] = {'mac': mac, 'in_port': set()}
-            flows_info[bridge]['in_port'] = ovs.get_ovs_patch_ports_info(
-                bridge)
+            flows_info[bridge] = ovs_idl.get_bridge_info(bridge)
         _ensure_egress_flows(bridge, flows_info[bridge]['in_port'])
 
     # Extra OVN cluster configuration
@@ -493,11 +495,12 @@ def cleanup_wiring(idl, bridge_mappings, ovs_flows, exposed_ips,
 
 def _cleanup_wiring_underlay(idl, bridge_mappings, ovs_flows, exposed_ips,
                              routing_tables, routing_tables_routes):
-    current_ips = linux_net.get_exposed_ips(CONF.bgp_nic)
-    expected_ips = [ip for ip_dict in exposed_ips.values()
-                    for ip in ip_dict.keys()]
-
-    ips_to_delete = [ip for ip in current_ips if ip not in expected_ips]
+    ips_to_delete = linux_net.IpLeftovers(
+        linux_net.get_exposed_ips(CONF.bgp_nic))
+    expected_ips = {ip for ip_dict in exposed_ips.values()
+                    for ip in ip_dict.keys()}
+    for ip in expected_ips:
+        ips_to_delete.discard(ip)
     linux_net.delete_exposed_ips(ips_to_delete, CONF.bgp_nic)
 
     extra_routes = {}
@@ -510,18 +513,11 @@ def _cleanup_wiring_underlay(idl, bridge_mappings, ovs_flows, exposed_ips,
                                    constants.OVS_RULE_COOKIE)
 
     # get rules and delete the old ones
-    ovn_ip_rules = linux_net.get_ovn_ip_rules(routing_tables.values())
+    ovn_ip_rules = linux_net.IpLeftovers(
+        linux_net.get_ovn_ip_rules(routing_tables.values()))
     if ovn_ip_rules:
         for ip in expected_ips:
-            if len(ip.split("/")) == 1:
-                ip_version = linux_net.get_ip_version(ip)
-                if ip_version == constants.IP_VERSION_6:
-                    ip_dst = "{}/128".format(ip)
-                else:
-                    ip_dst = "{}/32".format(ip)
-            else:
-                ip_dst = ip
-            ovn_ip_rules.pop(ip_dst, None)
+            ovn_ip_rules.discard(ip)
     linux_net.delete_ip_rules(ovn_ip_rules)
 
     # remove all the extra routes not needed
@@ -531,6 +527,9 @@ def _cleanup_wiring_underlay(idl, bridge_mappings, ovs_flows, exposed_ips,
     # delete leaked vlan devices from previous vlan provider networks
     delete_vlan_devices_leftovers(idl, bridge_mappings)
 
+    # delete the proxy neighbours no longer needed by the exposed ports
+    delete_ndp_proxies_leftovers(bridge_mappings, ovs_flows)
+
 
 def delete_vlan_devices_leftovers(idl, bridge_mappings):
     vlan_tags = idl.get_network_vlan_tags()
@@ -542,17 +541,43 @@ def delete_vlan_devices_leftovers(idl, bridge_mappings):
                 linux_net.delete_vlan_device_for_network(ovs_device, vlan)
 
 
+def delete_ndp_proxies_leftovers(bridge_mappings, ovs_flows):
+    """Remove the proxy neighbours not recorded while wiring the ports
+
+    The ones needed are recorded on the ovs_flows of the bridges, which are
+    built again on every sync, so the proxies left behind by the ports that
+    went away in the meantime (or missed their unwiring) are dropped here.
+    """
+    for ovs_device in set(bridge_mappings.values()):
+        ndp_proxies = ovs_flows.get(ovs_device, {}).get('ndp_proxies', {})
+        vlans = {None}
+        vlans.update(vlan for vlan in linux_net.get_bridge_vlans(ovs_device)
+                     if vlan)
+        vlans.update(ndp_proxies)
+        for vlan in vlans:
+            try:
+                linux_net.sync_ndp_proxies(ndp_proxies.get(vlan, []),
+                                           ovs_device, vlan)
+            except agent_exc.NetworkInterfaceNotFound:
+                LOG.debug("Device %s (vlan %s) not found, no proxy neighbours "
+                          "to remove from it", ovs_device, vlan)
+
+
 def _cleanup_wiring_evpn(ovs_flows, routing_tables_routes):
+    # The vlan devices of a vrf share its routing table, so it is dumped
+    # once and shared across them
+    tables_routes = {}
     for flow_conf in ovs_flows.values():
         for vlan, evpn_bridge in flow_conf.get('evpn', {}).items():
             LOG.debug('Running cleanup for vrf %s vlan %s',
                       evpn_bridge.vrf_name, vlan)
             evpn_bridge.get_vlan(vlan).cleanup_excessive_routes(
-                routing_tables_routes
+                routing_tables_routes, tables_routes=tables_routes
             )
     return True
 
 
+@tracing.traced()
 def wire_provider_port(routing_tables_routes, ovs_flows, port_ips,
                        bridge_device, bridge_vlan, localnet, routing_table,
                        proxy_cidrs, mac=None, ovn_idl=None):
@@ -575,6 +600,7 @@ def wire_provider_port(routing_tables_routes, ovs_flows, port_ips,
         return _wire_provider_port_ovn(ovn_idl, port_ips, mac)
 
 
+@tracing.traced()
 def unwire_provider_port(routing_tables_routes, port_ips, bridge_device,
                          bridge_vlan, routing_table, proxy_cidrs, mac=None,
                          ovn_idl=None):
@@ -596,12 +622,25 @@ def unwire_provider_port(routing_tables_routes, port_ips, bridge_device,
 
 def _ensure_updated_mac_tweak_flows(localnet, bridge_device, ovs_flows):
     ofport = ovs.get_ovs_patch_port_ofport(localnet)
-    if ofport not in ovs_flows[bridge_device]['in_port']:
-        ovs_flows[bridge_device]['in_port'].append(ofport)
+    with _ovs_flows_lock:
+        if ofport in ovs_flows[bridge_device]['in_port']:
+            return
         ovs.ensure_mac_tweak_flows(bridge_device,
                                    ovs_flows[bridge_device]['mac'],
                                    [ofport],
                                    constants.OVS_RULE_COOKIE)
+        # only once the flows are there, so that a failure is retried
+        ovs_flows[bridge_device]['in_port'].append(ofport)
+
+
+def _record_ndp_proxies(cidrs, bridge_device, bridge_vlan, ovs_flows):
+    # NOTE: they are not removed on the unwiring, as other ports may share
+    # the cidrs, but recorded again after the next sync rebuilt ovs_flows
+    if not cidrs or bridge_device not in ovs_flows:
+        return
+    with _ovs_flows_lock:
+        ndp_proxies = ovs_flows[bridge_device].setdefault('ndp_proxies', {})
+        ndp_proxies.setdefault(bridge_vlan, set()).update(cidrs)
 
 
 def _wire_provider_port_underlay(routing_tables_routes, ovs_flows, port_ips,
@@ -628,9 +667,10 @@ def _wire_provider_port_underlay(routing_tables_routes, ovs_flows, port_ips,
                                routing_table[bridge_device], bridge_device,
                                vlan=bridge_vlan)
     # add proxy ndp config for ipv6
-    for n_cidr in proxy_cidrs:
-        if linux_net.get_ip_version(n_cidr) == constants.IP_VERSION_6:
-            linux_net.add_ndp_proxy(n_cidr, bridge_device, bridge_vlan)
+    ndp_cidrs = [n_cidr for n_cidr in proxy_cidrs
+                 if linux_net.get_ip_version(n_cidr) == constants.IP_VERSION_6]
+    linux_net.add_ndp_proxies(ndp_cidrs, bridge_device, bridge_vlan)
+    _record_ndp_proxies(ndp_cidrs, bridge_device, bridge_vlan, ovs_flows)
     # NOTE(ltomasbo): This is needed as the patch ports are not created
     # until the first VM/FIP in that provider network is created in a node
     try:
@@ -709,9 +749,10 @@ def _unwire_provider_port_underlay(routing_tables_routes, port_ips,
         linux_net.del_ip_route(routing_tables_routes, ip,
                                routing_table[bridge_device], bridge_device,
                                vlan=bridge_vlan)
-    for n_cidr in proxy_cidrs:
-        if linux_net.get_ip_version(n_cidr) == constants.IP_VERSION_6:
-            linux_net.del_ndp_proxy(n_cidr, bridge_device, bridge_vlan)
+    linux_net.del_ndp_proxies(
+        [n_cidr for n_cidr in proxy_cidrs
+         if linux_net.get_ip_version(n_cidr) == constants.IP_VERSION_6],
+        bridge_device, bridge_vlan)
     return True
 
 
@@ -745,6 +786,7 @@ def _unwire_provider_port_ovn(ovn_idl, port_ips):
     return True
 
 
+@tracing.traced()
 def wire_lrp_port(routing_tables_routes, ip, bridge_device, bridge_vlan,
                   routing_tables, cr_lrp_ips):
     if CONF.exposing_method == constants.EXPOSE_METHOD_UNDERLAY:
@@ -829,6 +871,7 @@ def _wire_lrp_port_evpn(routing_tables_routes, ip, bridge_device,
     return True
 
 
+@tracing.traced()
 def unwire_lrp_port(routing_tables_routes, ip, bridge_device, bridge_vlan,
                     routing_tables, cr_lrp_ips):
     if CONF.exposing_method == constants.EXPOSE_METHOD_UNDERLAY:
@@ -18,19 +18,32 @@ from ovsdbapp.backend.ovs_idl import event as row_event
 from ovn_bgp_agent import constants
 from ovn_bgp_agent.drivers.openstack.utils import driver_utils
 from ovn_bgp_agent.drivers.openstack.utils import nat as nat_utils
+from ovn_bgp_agent.drivers.openstack.utils import ovs
+from ovn_bgp_agent.utils import profiling
 
 
 LOG = logging.getLogger(__name__)
 
 
 class Event(row_event.RowEvent):
+    # Columns whose update can make the event match. If set, updates not
+    # changing any of them are discarded before calling match_fn
+    columns = ()
+
     def __init__(self, agent, events, table, condition=None):
         self.agent = agent
         super().__init__(events, table, condition)
 
+    def matches(self, event, row, old=None):
+        if (self.columns and event == self.ROW_UPDATE and
+                not any(hasattr(old, column) for column in self.columns)):
+            return False
+        return super().matches(event, row, old)
+
     def run(self, *args, **kwargs):
         try:
-            self._run(*args, **kwargs)
+            with profiling.handler_profile(self.__class__.__name__):
+                self._run(*args, **kwargs)
         except Exception:
             LOG.exception("Unexpected exception while running the event "
                           "action")
@@ -102,6 +115,38 @@ class ChassisPrivateCreateEvent(ChassisCreateEventBase):
     table = 'Chassis_Private'
 
 
+class OvsTopologyEvent(Event):
+    """Sync when the OVS topology the bridges wiring depends on changes
+
+    That is, the bridge mappings, the bridges, the patch ports and their
+    ofports or the bridges MACs, instead of waiting for the next periodic
+    sync. Only once the agent wired the bridges for the first time, and if they
+    were not wired again since the change.
+    """
+
+    def __init__(self, bgp_agent, table):
+        events = (self.ROW_CREATE, self.ROW_UPDATE, self.ROW_DELETE)
+        super().__init__(bgp_agent, events, table)
+        self.event_name = self.__class__.__name__
+
+    def match_fn(self, event, row, old):
+        return (self.agent.ovs_topology_generation is not None and
+                ovs.is_topology_change(event, row, old))
+
+    def _run(self, event, row, old):
+        if (self.agent.ovs_topology_generation ==
+                self.agent.ovs_idl.topology_generation):
+            return
+        LOG.info("OVS topology changed (%s %s), doing a full sync",
+                 row._table.name, event)
+        self.agent.sync()
+
+
+def get_ovs_topology_events(bgp_agent):
+    return [OvsTopologyEvent(bgp_agent, table)
+            for table in ('Open_vSwitch', 'Bridge', 'Interface')]
+
+
 class DnatSnatBaseEvent(Event):
     events = None
 
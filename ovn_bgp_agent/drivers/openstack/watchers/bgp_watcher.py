@@ -27,6 +27,8 @@ _SYNC_STATE_LOCK = lockutils.ReaderWriterLock()
 
 
 class PortBindingChassisCreatedEvent(base_watcher.PortBindingChassisEvent):
+    columns = ('chassis', 'up')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(PortBindingChassisCreatedEvent, self).__init__(
@@ -60,6 +62,8 @@ class PortBindingChassisCreatedEvent(base_watcher.PortBindingChassisEvent):
 
 
 class PortBindingChassisDeletedEvent(base_watcher.PortBindingChassisEvent):
+    columns = ('chassis', 'up')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE,)
         super(PortBindingChassisDeletedEvent, self).__init__(
@@ -97,6 +101,8 @@ class PortBindingChassisDeletedEvent(base_watcher.PortBindingChassisEvent):
 
 
 class FIPSetEvent(base_watcher.PortBindingChassisEvent):
+    columns = ('nat_addresses',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(FIPSetEvent, self).__init__(
@@ -135,6 +141,8 @@ class FIPSetEvent(base_watcher.PortBindingChassisEvent):
 
 
 class FIPUnsetEvent(base_watcher.PortBindingChassisEvent):
+    columns = ('nat_addresses',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(FIPUnsetEvent, self).__init__(
@@ -199,6 +207,8 @@ class SubnetRouterAttachedEvent(base_watcher.PortBindingChassisEvent):
 
 
 class SubnetRouterUpdateEvent(base_watcher.PortBindingChassisEvent):
+    columns = ('mac',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(SubnetRouterUpdateEvent, self).__init__(
@@ -258,6 +268,8 @@ class SubnetRouterDetachedEvent(base_watcher.PortBindingChassisEvent):
 
 
 class TenantPortCreatedEvent(base_watcher.PortBindingChassisEvent):
+    columns = ('chassis',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(TenantPortCreatedEvent, self).__init__(
@@ -297,6 +309,8 @@ class TenantPortCreatedEvent(base_watcher.PortBindingChassisEvent):
 
 
 class TenantPortDeletedEvent(base_watcher.PortBindingChassisEvent):
+    columns = ('chassis',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE,)
         super(TenantPortDeletedEvent, self).__init__(
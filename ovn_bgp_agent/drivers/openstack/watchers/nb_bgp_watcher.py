@@ -31,6 +31,8 @@ _SYNC_STATE_LOCK = lockutils.ReaderWriterLock()
 
 
 class LogicalSwitchPortProviderCreateEvent(base_watcher.LSPChassisEvent):
+    columns = ('up', 'options', 'external_ids', 'addresses', 'type')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(LogicalSwitchPortProviderCreateEvent, self).__init__(
@@ -94,6 +96,8 @@ class LogicalSwitchPortProviderCreateEvent(base_watcher.LSPChassisEvent):
 
 
 class LogicalSwitchPortProviderDeleteEvent(base_watcher.LSPChassisEvent):
+    columns = ('up', 'options', 'external_ids', 'addresses', 'type')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE,)
         super(LogicalSwitchPortProviderDeleteEvent, self).__init__(
@@ -194,6 +198,8 @@ class LogicalSwitchPortFIPCreateEvent(base_watcher.LSPChassisEvent):
 
     In this case we only need to catch event 4.
     '''
+    columns = ('up', 'options', 'external_ids', 'addresses', 'type')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(LogicalSwitchPortFIPCreateEvent, self).__init__(
@@ -272,6 +278,8 @@ class LogicalSwitchPortFIPDeleteEvent(base_watcher.LSPChassisEvent):
                                                       row.up = false)
     - current floating ip is not the same as old floating ip
     '''
+    columns = ('up', 'options', 'external_ids', 'addresses', 'type')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE,)
         super(LogicalSwitchPortFIPDeleteEvent, self).__init__(
@@ -347,6 +355,8 @@ class LogicalSwitchPortFIPDeleteEvent(base_watcher.LSPChassisEvent):
 
 class LogicalSwitchUpdateEvent(base_watcher.LogicalSwitchChassisEvent):
     '''Event to trigger on logical switch vrf config updates'''
+    columns = ('external_ids',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE)
         super(LogicalSwitchUpdateEvent, self).__init__(
@@ -374,6 +384,7 @@ class LogicalSwitchUpdateEvent(base_watcher.LogicalSwitchChassisEvent):
         return settings != old_settings
 
     def _run(self, event, row, old):
+        self.agent.invalidate_ls_cache(row.name)
         with _SYNC_STATE_LOCK.read_lock():
             # NOTE(mnederlof): For now it makes sense to run the sync method
             # as this is triggered with a configured interval anyway and it
@@ -394,11 +405,35 @@ class LocalnetCreateDeleteEvent(base_watcher.LSPChassisEvent):
         return False
 
     def _run(self, event, row, old):
+        # NOTE: if the localnet port does not reference its logical switch,
+        # the whole cache is invalidated
+        self.agent.invalidate_ls_cache(common_utils.get_from_external_ids(
+            row, constants.OVN_LS_NAME_EXT_ID_KEY))
         with _SYNC_STATE_LOCK.read_lock():
             self.agent.sync()
 
 
+class LocalnetUpdateEvent(LocalnetCreateDeleteEvent):
+    '''Event to trigger on localnet port bridge/vlan config updates
+
+    The provider information of a logical switch is cached from its localnet
+    port, so it must be refreshed whenever the network name or tag changes.
+    '''
+    columns = ('options', 'tag', 'type')
+
+    def __init__(self, bgp_agent):
+        events = (self.ROW_UPDATE,)
+        super(LocalnetCreateDeleteEvent, self).__init__(
+            bgp_agent, events)
+
+    def match_fn(self, event, row, old):
+        return constants.OVN_LOCALNET_VIF_PORT_TYPE in (
+            row.type, getattr(old, 'type', None))
+
+
 class ChassisRedirectCreateEvent(base_watcher.LRPChassisEvent):
+    columns = ('status',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(ChassisRedirectCreateEvent, self).__init__(
@@ -433,6 +468,8 @@ class ChassisRedirectCreateEvent(base_watcher.LRPChassisEvent):
 
 
 class ChassisRedirectDeleteEvent(base_watcher.LRPChassisEvent):
+    columns = ('status',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE,)
         super(ChassisRedirectDeleteEvent, self).__init__(
@@ -467,6 +504,8 @@ class ChassisRedirectDeleteEvent(base_watcher.LRPChassisEvent):
 
 
 class LogicalSwitchPortSubnetAttachEvent(base_watcher.LSPChassisEvent):
+    columns = ('up', 'external_ids')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(LogicalSwitchPortSubnetAttachEvent, self).__init__(
@@ -519,6 +558,8 @@ class LogicalSwitchPortSubnetAttachEvent(base_watcher.LSPChassisEvent):
 
 
 class LogicalSwitchPortSubnetDetachEvent(base_watcher.LSPChassisEvent):
+    columns = ('up', 'external_ids')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE,)
         super(LogicalSwitchPortSubnetDetachEvent, self).__init__(
@@ -608,6 +649,8 @@ class LogicalSwitchPortSubnetDetachEvent(base_watcher.LSPChassisEvent):
 
 
 class LogicalSwitchPortTenantCreateEvent(base_watcher.LSPChassisEvent):
+    columns = ('up', 'external_ids')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(LogicalSwitchPortTenantCreateEvent, self).__init__(
@@ -661,6 +704,8 @@ class LogicalSwitchPortTenantCreateEvent(base_watcher.LSPChassisEvent):
 
 
 class LogicalSwitchPortTenantDeleteEvent(base_watcher.LSPChassisEvent):
+    columns = ('up',)
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE, self.ROW_DELETE,)
         super(LogicalSwitchPortTenantDeleteEvent, self).__init__(
@@ -710,6 +755,8 @@ class LogicalSwitchPortTenantDeleteEvent(base_watcher.LSPChassisEvent):
 
 
 class OVNLBCreateEvent(base_watcher.OVNLBEvent):
+    columns = ('vips', 'external_ids')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_UPDATE,)
         super(OVNLBCreateEvent, self).__init__(
@@ -767,6 +814,8 @@ class OVNLBCreateEvent(base_watcher.OVNLBEvent):
 
 
 class OVNLBDeleteEvent(base_watcher.OVNLBEvent):
+    columns = ('vips', 'external_ids')
+
     def __init__(self, bgp_agent):
         events = (self.ROW_DELETE, self.ROW_UPDATE)
         super(OVNLBDeleteEvent, self).__init__(
@@ -882,6 +931,8 @@ class OVNPFDeleteEvent(OVNPFBaseEvent):
 class NATMACAddedEvent(base_watcher.DnatSnatBaseEvent):
     events = (base_watcher.DnatSnatBaseEvent.ROW_UPDATE,)
 
+    columns = ('external_mac',)
+
     def match_fn(self, event, row, old):
         try:
             lsp_id = row.logical_port[0]
@@ -969,6 +1020,8 @@ class CrLrpChassisChangeBaseEvent(base_watcher.LRPChassisEvent):
     It matches if the hosting-chassis in status column of the gateway port has
     changed.
     """
+    columns = ('status',)
+
     def __init__(self, bgp_agent):
         super().__init__(bgp_agent, (self.ROW_UPDATE,))
 
@@ -1044,6 +1097,8 @@ class DistributedFlagChangedEvent(base_watcher.Event):
     re-registers the events to react on the right events and does a full
     re-sync to withdraw or expose IPs.
     """
+    columns = ('external_ids',)
+
     def __init__(self, bgp_agent):
         table = 'NB_Global'
         events = (self.ROW_UPDATE,)
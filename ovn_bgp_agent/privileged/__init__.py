@@ -12,10 +12,70 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import threading
+import time
+
 from oslo_privsep import capabilities
 from oslo_privsep import priv_context
 
-default = priv_context.PrivContext(
+from ovn_bgp_agent.utils import tracing
+
+
+class ContextStats(collections.namedtuple(
+        'ContextStats', ['calls', 'in_flight', 'max_in_flight', 'queued',
+                         'busy_time', 'max_time'])):
+    """Calls made to the entrypoints of a privsep context
+
+    queued is the number of calls made while all the threads of the daemon
+    (thread_pool_size) were already busy, so they had to wait for one.
+    busy_time and max_time are the total and longest time (in seconds) the
+    calls took, including that wait.
+    """
+
+    __slots__ = ()
+
+
+class PrivContext(priv_context.PrivContext):
+    """PrivContext tracing the calls to its entrypoints
+
+    It also keeps the statistics of the calls, to tell whether its daemon
+    has enough threads (the thread_pool_size option of its cfg_section) to
+    run them concurrently.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(PrivContext, self).__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._stats = ContextStats(0, 0, 0, 0, 0.0, 0.0)
+
+    def get_stats(self):
+        with self._stats_lock:
+            return self._stats
+
+    def _wrap(self, func, *args, **kwargs):
+        thread_pool_size = self.conf.thread_pool_size
+        with self._stats_lock:
+            in_flight = self._stats.in_flight + 1
+            self._stats = self._stats._replace(
+                in_flight=in_flight,
+                max_in_flight=max(self._stats.max_in_flight, in_flight),
+                queued=self._stats.queued + (in_flight > thread_pool_size))
+        start = time.monotonic()
+        try:
+            with tracing.span('privsep.{}'.format(func.__name__)):
+                return super(PrivContext, self)._wrap(func, *args, **kwargs)
+        finally:
+            elapsed = time.monotonic() - start
+            with self._stats_lock:
+                self._stats = self._stats._replace(
+                    calls=self._stats.calls + 1,
+                    in_flight=self._stats.in_flight - 1,
+                    busy_time=self._stats.busy_time + elapsed,
+                    max_time=max(self._stats.max_time, elapsed))
+
+
+default = PrivContext(
     __name__,
     cfg_section='privsep',
     pypath=__name__ + '.default',
@@ -25,7 +85,7 @@ default = priv_context.PrivContext(
                   capabilities.CAP_SYS_ADMIN],
 )
 
-ovs_vsctl_cmd = priv_context.PrivContext(
+ovs_vsctl_cmd = PrivContext(
     __name__,
     cfg_section='privsep_ovs_vsctl',
     pypath=__name__ + '.ovs_vsctl_cmd',
@@ -33,10 +93,22 @@ ovs_vsctl_cmd = priv_context.PrivContext(
                   capabilities.CAP_NET_ADMIN]
 )
 
-vtysh_cmd = priv_context.PrivContext(
+vtysh_cmd = PrivContext(
     __name__,
     cfg_section='privsep_vtysh',
     pypath=__name__ + '.vtysh_cmd',
     capabilities=[capabilities.CAP_SYS_ADMIN,
                   capabilities.CAP_NET_ADMIN]
 )
+
+
+# Each context has its own daemon, so the ovs-ofctl/ovs-vsctl and vtysh
+# commands (forking a process per call) do not take the threads of the
+# default one, running the netlink operations
+CONTEXTS = (default, ovs_vsctl_cmd, vtysh_cmd)
+
+
+def get_stats():
+    """Get the statistics of the calls to each context, by cfg_section"""
+    return {context.cfg_section: context.get_stats()._asdict()
+            for context in CONTEXTS}
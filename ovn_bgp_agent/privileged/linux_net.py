@@ -12,16 +12,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
 import errno
 import ipaddress
 import os
+import threading
 
 import netaddr
 
 from neutron_lib import constants as n_const
-from oslo_concurrency import processutils
 from oslo_log import log as logging
-import pyroute2
 from pyroute2 import iproute
 from pyroute2 import netlink as pyroute_netlink
 from pyroute2.netlink import exceptions as netlink_exceptions
@@ -33,11 +33,30 @@ import ovn_bgp_agent
 from ovn_bgp_agent import constants
 from ovn_bgp_agent import exceptions as agent_exc
 from ovn_bgp_agent.utils import common as common_utils
+from ovn_bgp_agent.utils import link_events
 from ovn_bgp_agent.utils import linux_net as l_net
 
 LOG = logging.getLogger(__name__)
 
 NUD_STATES = {state[1]: state[0] for state in ndmsg.states.items()}
+NTF_PROXY = ndmsg.flags['proxy']
+
+# IPRoute socket of each thread
+_local = threading.local()
+
+_link_ids_lock = threading.Lock()
+_link_monitor_started = False
+# {ifname: ifindex} and {ifindex: ifname}, while the links are monitored
+_link_ids = None
+_link_names = {}
+# number of link events received, to not cache the indexes looked up while
+# the link changed
+_link_events = 0
+
+SYSCTL_PROC_PATH = '/proc/sys'
+# sysctl keys use '.' as separator and '/' for dots within a component (e.g.
+# vlan devices), which is the other way around on the /proc/sys paths
+SYSCTL_KEY_TO_PATH = str.maketrans('./', '/.')
 
 
 def get_scope_name(scope):
@@ -126,20 +145,59 @@ def ensure_vlan_device_for_network(bridge, vlan_tag):
     reraise=True)
 @ovn_bgp_agent.privileged.default.entrypoint
 def set_master_for_device(device, master):
-    try:
-        dev_index = _get_link_id(ifname=device)
-        master_index = _get_link_id(ifname=master)
-        with pyroute2.IPRoute() as ipr:
+    def _set_master(dev_index, master_index):
+        with _iproute() as ipr:
             # Check if already associated to the master,
             # and associate it if not
             iface = ipr.link('get', index=dev_index)[0]
             if iface.get_attr('IFLA_MASTER') != master_index:
                 ipr.link('set', index=dev_index, master=master_index)
+
+    try:
+        _call_with_link_ids(_set_master, device, master)
     except IndexError:
         LOG.debug("No need to set %s on VRF %s, as one of them is deleted",
                   device, master)
 
 
+@ovn_bgp_agent.privileged.default.entrypoint
+def ensure_evpn_devices(bridge_name, vxlan_name, vni, local_ip, dstport,
+                        vrf_name=None):
+    """Ensure the devices of an EVPN VNI in a single privsep call
+
+    The bridge and the vxlan interface connected to it (with learning
+    disabled) are created if needed and, if vrf_name is given (L3 mode),
+    the VRF with the bridge attached to it.
+    """
+    ensure_bridge(bridge_name)
+    ensure_vxlan(vxlan_name, vni, local_ip, dstport)
+    set_master_for_device(vxlan_name, bridge_name)
+    set_brport_attribute(vxlan_name, neigh_suppress=True, learning=False)
+    if vrf_name:
+        ensure_vrf(vrf_name, vni)
+        set_master_for_device(bridge_name, vrf_name)
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def ensure_evpn_vlan_device(veth_vrf, veth_ovs, master, ips=(), flags=()):
+    """Ensure the veth pair of an EVPN vlan device in a single privsep call
+
+    The veth pair is created if needed, with veth_vrf attached to master
+    (the VRF in L3 mode, the bridge in L2 mode) and the given IPs (in order,
+    the ones already there are skipped) and sysctl flags set on it.
+
+    :return: list of the flags that were modified
+    """
+    ensure_veth(veth_vrf, veth_ovs)
+    set_master_for_device(veth_vrf, master)
+    for ip in ips:
+        try:
+            add_ip_address(ip, veth_vrf)
+        except agent_exc.IpAddressAlreadyExists:
+            LOG.debug("IP %s already added on device %s", ip, veth_vrf)
+    return set_kernel_flags(flags)
+
+
 @ovn_bgp_agent.privileged.default.entrypoint
 def delete_device(device):
     try:
@@ -166,14 +224,46 @@ def route_delete(route):
     _run_iproute_route('del', **route)
 
 
-@ovn_bgp_agent.privileged.default.entrypoint
-def set_kernel_flag(flag, value):
-    command = ["sysctl", "-w", "{}={}".format(flag, value)]
+def _get_sysctl_path(flag):
+    return os.path.join(SYSCTL_PROC_PATH, flag.translate(SYSCTL_KEY_TO_PATH))
+
+
+def _set_kernel_flag(flag, value):
+    value = str(value)
+    path = _get_sysctl_path(flag)
     try:
-        return processutils.execute(*command)
-    except Exception as e:
-        LOG.error("Unable to execute %s. Exception: %s", command, e)
+        with open(path) as f:
+            if f.read().strip() == value:
+                return False
+        with open(path, 'w') as f:
+            f.write(value)
+    except OSError as e:
+        LOG.error("Unable to set kernel flag %s=%s. Exception: %s",
+                  flag, value, e)
         raise
+    return True
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def set_kernel_flag(flag, value):
+    """Set a sysctl flag, writing directly into /proc/sys
+
+    :return: whether the flag was modified
+    """
+    return _set_kernel_flag(flag, value)
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def set_kernel_flags(flags):
+    """Set several sysctl flags at once, writing directly into /proc/sys
+
+    Flags that already have the requested value are not written again.
+
+    :param flags: list of (flag, value) tuples, with the flag in sysctl
+                  notation, e.g. ('net.ipv4.conf.br-ex/100.proxy_arp', 1)
+    :return: list of the flags that were modified
+    """
+    return [flag for flag, value in flags if _set_kernel_flag(flag, value)]
 
 
 @ovn_bgp_agent.privileged.default.entrypoint
@@ -199,41 +289,99 @@ def delete_ip_rules(ip_rules):
         _run_iproute_rule('del', **rule)
 
 
-@ovn_bgp_agent.privileged.default.entrypoint
-def add_ndp_proxy(ip, dev, vlan=None):
-    # FIXME(ltomasbo): This should use pyroute instead but I didn't find
-    # out how
-    net_ip = str(ipaddress.IPv6Network(ip, strict=False).network_address)
-    dev_name = dev
+def _get_ndp_proxy_device(dev, vlan=None):
     if vlan:
-        dev_name = f"{dev[:constants.OVN_VLAN_DEVICE_MAX_LENGTH]}.{vlan}"
-    command = ["ip", "-6", "nei", "add", "proxy", net_ip, "dev", dev_name]
+        return f"{dev[:constants.OVN_VLAN_DEVICE_MAX_LENGTH]}.{vlan}"
+    return dev
+
+
+def _get_ndp_proxy_ips(ips):
+    return {str(ipaddress.IPv6Network(ip, strict=False).network_address)
+            for ip in ips}
+
+
+def _run_ndp_proxies(ipr, command, ips, ifindex, dev_name):
+    for ip in ips:
+        try:
+            ipr.neigh(command, dst=ip, ifindex=ifindex,
+                      family=constants.AF_INET6, flags=NTF_PROXY)
+        except netlink_exceptions.NetlinkError as e:
+            if command == 'add' and e.code == errno.EEXIST:
+                continue
+            if command == 'del' and e.code == errno.ENOENT:
+                # Already deleted
+                continue
+            LOG.error("Unable to %s proxy neighbour %s on dev %s. "
+                      "Exception: %s", command, ip, dev_name, e)
+            raise
+
+
+def _dump_ndp_proxies(ipr, ifindex):
+    # NOTE: the kernel only dumps the proxy entries if NTF_PROXY is set on
+    # the request itself, hence the explicit dump_filter so that the flags
+    # are not just used to filter the (regular) neighbours on the reply
+    return {entry.get_attr('NDA_DST')
+            for entry in ipr.neigh('dump', family=constants.AF_INET6,
+                                   flags=NTF_PROXY,
+                                   dump_filter=lambda msg: True)
+            if entry['ifindex'] == ifindex and entry['flags'] & NTF_PROXY}
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def add_ndp_proxies(ips, dev, vlan=None):
+    dev_name = _get_ndp_proxy_device(dev, vlan)
+    with _iproute() as ipr:
+        ifindex = _get_link_id(dev_name)
+        _run_ndp_proxies(ipr, 'add', _get_ndp_proxy_ips(ips), ifindex,
+                         dev_name)
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def del_ndp_proxies(ips, dev, vlan=None):
+    dev_name = _get_ndp_proxy_device(dev, vlan)
     try:
-        return processutils.execute(*command)
-    except Exception as e:
-        LOG.error("Unable to execute %s. Exception: %s", command, e)
-        raise
+        ifindex = _get_link_id(dev_name)
+    except agent_exc.NetworkInterfaceNotFound:
+        LOG.debug("No need to delete proxy neighbours for dev %s as it does "
+                  "not exists", dev_name)
+        return
+    with _iproute() as ipr:
+        _run_ndp_proxies(ipr, 'del', _get_ndp_proxy_ips(ips), ifindex,
+                         dev_name)
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def add_ndp_proxy(ip, dev, vlan=None):
+    add_ndp_proxies([ip], dev, vlan)
 
 
 @ovn_bgp_agent.privileged.default.entrypoint
 def del_ndp_proxy(ip, dev, vlan=None):
-    # FIXME(ltomasbo): This should use pyroute instead but I didn't find
-    # out how
-    net_ip = str(ipaddress.IPv6Network(ip, strict=False).network_address)
-    dev_name = dev
-    if vlan:
-        dev_name = f"{dev[:constants.OVN_VLAN_DEVICE_MAX_LENGTH]}.{vlan}"
-    command = ["ip", "-6", "nei", "del", "proxy", net_ip, "dev", dev_name]
-    env = dict(os.environ)
-    env['LC_ALL'] = 'C'
-    try:
-        return processutils.execute(*command, env_variables=env)
-    except Exception as e:
-        if "No such file or directory" in e.stderr:
-            # Already deleted
-            return
-        LOG.error("Unable to execute %s. Exception: %s", command, e)
-        raise
+    del_ndp_proxies([ip], dev, vlan)
+
+
+@tenacity.retry(
+    retry=tenacity.retry_if_exception_type(
+        netlink_exceptions.NetlinkDumpInterrupted),
+    wait=tenacity.wait_exponential(multiplier=0.02, max=1),
+    stop=tenacity.stop_after_delay(8),
+    reraise=True)
+@ovn_bgp_agent.privileged.default.entrypoint
+def sync_ndp_proxies(ips, dev, vlan=None):
+    """Ensure the proxy neighbours of the device are exactly the given ones
+
+    :return: tuple with the list of added and the list of deleted entries
+    """
+    dev_name = _get_ndp_proxy_device(dev, vlan)
+    expected = _get_ndp_proxy_ips(ips)
+    with _iproute() as ipr:
+        ifindex = _get_link_id(dev_name)
+        current = _dump_ndp_proxies(ipr, ifindex)
+        to_add = sorted(expected - current)
+        to_del = sorted(current - expected)
+        _run_ndp_proxies(ipr, 'add', to_add, ifindex, dev_name)
+        _run_ndp_proxies(ipr, 'del', to_del, ifindex, dev_name)
+    return to_add, to_del
 
 
 @ovn_bgp_agent.privileged.default.entrypoint
@@ -412,33 +560,189 @@ def make_serializable(value):
     return _ensure_string(value)
 
 
+@contextlib.contextmanager
+def _iproute():
+    """Get the IPRoute socket of the current thread
+
+    Each thread of the privsep daemon keeps its socket open across the calls
+    it runs, instead of opening one per call. It is closed (and opened again
+    on the next call) if it failed.
+    """
+    ip = getattr(_local, 'iproute', None)
+    if ip is None:
+        ip = _local.iproute = iproute.IPRoute()
+    try:
+        yield ip
+    except (netlink_exceptions.NetlinkDumpInterrupted, OSError):
+        close_iproute()
+        raise
+
+
+def close_iproute():
+    """Close the IPRoute socket of the current thread, if any"""
+    ip = getattr(_local, 'iproute', None)
+    _local.iproute = None
+    if ip is not None:
+        ip.close()
+
+
 def _get_link_id(ifname, raise_exception=True):
     ifname = ifname[:n_const.DEVICE_NAME_MAX_LEN]
-    with iproute.IPRoute() as ip:
+    with _link_ids_lock:
+        if _link_ids is not None and ifname in _link_ids:
+            return _link_ids[ifname]
+        link_events = _link_events
+
+    with _iproute() as ip:
         link_id = ip.link_lookup(ifname=ifname)
     if not link_id or len(link_id) < 1:
         if raise_exception:
             raise agent_exc.NetworkInterfaceNotFound(device=ifname)
         LOG.debug('Interface %(dev)s not found', {'dev': ifname})
         return
+
+    with _link_ids_lock:
+        # unless the link changed meanwhile
+        if _link_ids is not None and link_events == _link_events:
+            _cache_link_id(ifname, link_id[0])
     return link_id[0]
 
 
+def _forget_link_ids(ifnames):
+    """Drop the cached indexes of the links, if any"""
+    global _link_events
+    with _link_ids_lock:
+        # the indexes being looked up meanwhile may be the old ones too
+        _link_events += 1
+        if _link_ids is None:
+            return
+        for ifname in ifnames:
+            index = _link_ids.pop(ifname[:n_const.DEVICE_NAME_MAX_LEN], None)
+            if index is not None:
+                _link_names.pop(index, None)
+
+
+def _call_with_link_ids(func, *ifnames):
+    """Call func with the indexes of the links
+
+    If it fails with ENODEV, any cached index (which may belong to a link
+    deleted before the monitor got its event) is dropped and func is called
+    again with the indexes looked up.
+    """
+    with _link_ids_lock:
+        cached = _link_ids is not None and any(
+            ifname[:n_const.DEVICE_NAME_MAX_LEN] in _link_ids
+            for ifname in ifnames)
+    try:
+        return func(*[_get_link_id(ifname) for ifname in ifnames])
+    except netlink_exceptions.NetlinkError as e:
+        if e.code != errno.ENODEV or not cached:
+            raise
+    _forget_link_ids(ifnames)
+    return func(*[_get_link_id(ifname) for ifname in ifnames])
+
+
+def _cache_link_id(ifname, index):
+    old_ifname = _link_names.pop(index, None)
+    if old_ifname is not None:
+        _link_ids.pop(old_ifname, None)
+    _link_ids[ifname] = index
+    _link_names[index] = ifname
+
+
+def _process_link_event(msg):
+    global _link_events
+    ifname = msg.get_attr('IFLA_IFNAME')
+    index = msg['index']
+    with _link_ids_lock:
+        _link_events += 1
+        if _link_ids is None:
+            return
+        if msg['event'] == 'RTM_DELLINK':
+            if _link_names.get(index) == ifname:
+                del _link_names[index]
+            if _link_ids.get(ifname) == index:
+                del _link_ids[ifname]
+        elif ifname:
+            _cache_link_id(ifname, index)
+
+
+def _monitor_links_started():
+    global _link_ids, _link_names
+    with _link_ids_lock:
+        _link_ids = {}
+        _link_names = {}
+
+
+def _monitor_links_stopped():
+    global _link_ids, _link_names
+    with _link_ids_lock:
+        _link_ids = None
+        _link_names = {}
+
+
+def _monitor_links():
+    link_events.monitor('interface indexes', _process_link_event,
+                        _monitor_links_started, _monitor_links_stopped)
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def start_link_monitor():
+    """Cache the interface indexes, kept fresh by the link events
+
+    It runs on the privsep daemon, saving the link lookups done to get the
+    index of the interfaces given by name.
+    """
+    global _link_monitor_started
+    with _link_ids_lock:
+        if _link_monitor_started:
+            return
+        _link_monitor_started = True
+    link_events.start_thread('link-monitor', _monitor_links)
+
+
 @ovn_bgp_agent.privileged.default.entrypoint
 def get_link_id(device):
     return _get_link_id(device, raise_exception=False)
 
 
 def get_link_state(device_name):
-    device = get_link_device(device_name)
-    return device['state'] if device else None
+    attrs = get_link_attributes(device_name)
+    return attrs['state'] if attrs else None
+
+
+@ovn_bgp_agent.privileged.default.entrypoint
+def get_link_attributes(device_name, attributes=()):
+    """Get only the given attributes of a single link
+
+    :return: (dict) the 'index' and 'state' of the link, plus the given
+             (IFLA_*) attributes, or None if the link does not exist
+    """
+    link = _get_link(device_name)
+    if link is None:
+        return
+    attrs = {attr: make_serializable(link.get_attr(attr))
+             for attr in attributes}
+    attrs.update(index=link['index'], state=link['state'])
+    return attrs
 
 
+@ovn_bgp_agent.privileged.default.entrypoint
 def get_link_device(device_name):
+    """Get a single link, without dumping all of them"""
+    link = _get_link(device_name)
+    return make_serializable(link) if link is not None else None
+
+
+def _get_link(device_name):
     device_name = device_name[:n_const.DEVICE_NAME_MAX_LEN]
-    for device in get_link_devices():
-        if get_attr(device, 'IFLA_IFNAME') == device_name:
-            return device
+    try:
+        with _iproute() as ip:
+            return ip.link('get', ifname=device_name)[0]
+    except netlink_exceptions.NetlinkError as e:
+        if e.code == errno.ENODEV:
+            return
+        raise
 
 
 @ovn_bgp_agent.privileged.default.entrypoint
@@ -447,15 +751,16 @@ def get_bridge_vlans(device_name):
     if not index:
         LOG.debug("OVS Bridge %s deleted, no need to get information about "
                   "associated vlan devices", device_name)
+        return []
 
-    vlan_devices = get_link_devices(link=index)
+    # only the VLAN IDs are returned, not the (serialized) devices
+    with _iproute() as ip:
+        vlan_devices = ip.get_links(link=index)
     vlans = []
     for vlan_device in vlan_devices:
-        ifla_linkinfo = get_attr(vlan_device, 'IFLA_LINKINFO')
-        if ifla_linkinfo:
-            ifla_data = get_attr(ifla_linkinfo, 'IFLA_INFO_DATA')
-            if ifla_data:
-                vlans.append(get_attr(ifla_data, 'IFLA_VLAN_ID'))
+        ifla_data = vlan_device.get_nested('IFLA_LINKINFO', 'IFLA_INFO_DATA')
+        if ifla_data:
+            vlans.append(ifla_data.get_attr('IFLA_VLAN_ID'))
     return vlans
 
 
@@ -473,7 +778,7 @@ def get_link_devices(**kwargs):
     """
     index = kwargs.pop('index') if 'index' in kwargs else 'all'
     try:
-        with iproute.IPRoute() as ip:
+        with _iproute() as ip:
             return make_serializable(ip.get_links(index, **kwargs))
     except OSError:
         raise
@@ -481,25 +786,25 @@ def get_link_devices(**kwargs):
 
 def _run_iproute_link(command, ifname, **kwargs):
     try:
-        with iproute.IPRoute() as ip:
-            idx = _get_link_id(ifname)
-            return ip.link(command, index=idx, **kwargs)
+        with _iproute() as ip:
+            return _call_with_link_ids(
+                lambda idx: ip.link(command, index=idx, **kwargs), ifname)
     except netlink_exceptions.NetlinkError as e:
         _translate_ip_device_exception(e, ifname)
 
 
 def _run_iproute_addr(command, device, **kwargs):
     try:
-        with iproute.IPRoute() as ip:
-            idx = _get_link_id(device)
-            return ip.addr(command, index=idx, **kwargs)
+        with _iproute() as ip:
+            return _call_with_link_ids(
+                lambda idx: ip.addr(command, index=idx, **kwargs), device)
     except netlink_exceptions.NetlinkError as e:
         _translate_ip_addr_exception(e, ip=kwargs['address'], device=device)
 
 
 def _run_iproute_route(command, **kwargs):
     try:
-        with iproute.IPRoute() as ip:
+        with _iproute() as ip:
             ip.route(command, **kwargs)
     except netlink_exceptions.NetlinkError as e:
         _translate_ip_route_exception(e, kwargs)
@@ -507,7 +812,7 @@ def _run_iproute_route(command, **kwargs):
 
 def _run_iproute_rule(command, **kwargs):
     try:
-        with iproute.IPRoute() as ip:
+        with _iproute() as ip:
             ip.rule(command, **kwargs)
     except netlink_exceptions.NetlinkError as e:
         _translate_ip_rule_exception(e, kwargs)
@@ -515,9 +820,9 @@ def _run_iproute_rule(command, **kwargs):
 
 def _run_iproute_neigh(command, device, **kwargs):
     try:
-        with iproute.IPRoute() as ip:
-            idx = _get_link_id(device)
-            return ip.neigh(command, ifindex=idx, **kwargs)
+        with _iproute() as ip:
+            return _call_with_link_ids(
+                lambda idx: ip.neigh(command, ifindex=idx, **kwargs), device)
     except agent_exc.NetworkInterfaceNotFound:
         LOG.debug("No need to %s nei for dev %s as it does not exists",
                   command, device)
@@ -525,9 +830,9 @@ def _run_iproute_neigh(command, device, **kwargs):
 
 def _run_iproute_brport(command, ifname, **kwargs):
     try:
-        with iproute.IPRoute() as ip:
-            idx = _get_link_id(ifname)
-            return ip.brport(command, index=idx, **kwargs)
+        with _iproute() as ip:
+            return _call_with_link_ids(
+                lambda idx: ip.brport(command, index=idx, **kwargs), ifname)
     except netlink_exceptions.NetlinkError as e:
         _translate_ip_device_exception(e, ifname)
 
@@ -536,12 +841,16 @@ def _run_iproute_brport(command, ifname, **kwargs):
 def create_interface(ifname, kind, **kwargs):
     ifname = ifname[:n_const.DEVICE_NAME_MAX_LEN]
     try:
-        with iproute.IPRoute() as ip:
+        with _iproute() as ip:
             physical_interface = kwargs.pop('physical_interface', None)
-            if physical_interface:
-                link_key = 'vxlan_link' if kind == 'vxlan' else 'link'
-                kwargs[link_key] = _get_link_id(physical_interface)
-            ip.link("add", ifname=ifname, kind=kind, **kwargs)
+            if not physical_interface:
+                ip.link("add", ifname=ifname, kind=kind, **kwargs)
+                return
+            link_key = 'vxlan_link' if kind == 'vxlan' else 'link'
+            _call_with_link_ids(
+                lambda idx: ip.link("add", ifname=ifname, kind=kind,
+                                    **dict(kwargs, **{link_key: idx})),
+                physical_interface)
     except netlink_exceptions.NetlinkError as e:
         _translate_ip_device_exception(e, ifname)
 
@@ -550,6 +859,9 @@ def create_interface(ifname, kind, **kwargs):
 def delete_interface(ifname, **kwargs):
     ifname = ifname[:n_const.DEVICE_NAME_MAX_LEN]
     _run_iproute_link('del', ifname, **kwargs)
+    # the monitor may not have processed the deletion by the time the name
+    # is used again (e.g. to create it again right after)
+    _forget_link_ids([ifname])
 
 
 @ovn_bgp_agent.privileged.default.entrypoint
@@ -602,7 +914,7 @@ def get_ip_addresses(**kwargs):
 
     :return: (tuple) IP addresses in a namespace
     """
-    with iproute.IPRoute() as ip:
+    with _iproute() as ip:
         return make_serializable(ip.get_addr(**kwargs))
 
 
@@ -620,13 +932,13 @@ def list_ip_routes(ip_version, device=None, table=None, **kwargs):
         kwargs['oif'] = _get_link_id(device)
     if table:
         kwargs['table'] = int(table)
-    with iproute.IPRoute() as ip:
+    with _iproute() as ip:
         return make_serializable(ip.route('show', **kwargs))
 
 
 @ovn_bgp_agent.privileged.default.entrypoint
 def list_ip_rules(ip_version, **kwargs):
     """List all IP rules"""
-    with iproute.IPRoute() as ip:
+    with _iproute() as ip:
         return make_serializable(ip.get_rules(
             family=common_utils.IP_VERSION_FAMILY_MAP[ip_version], **kwargs))
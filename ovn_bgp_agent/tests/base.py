@@ -21,6 +21,7 @@ from oslotest import base
 
 from ovn_bgp_agent import config
 from ovn_bgp_agent import privileged
+from ovn_bgp_agent.privileged import linux_net as priv_linux_net
 
 
 class TestCase(base.BaseTestCase):
@@ -33,6 +34,9 @@ class TestCase(base.BaseTestCase):
         privileged.ovs_vsctl_cmd.client_mode = False
         privileged.vtysh_cmd.client_mode = False
         config.register_opts()
+        # do not reuse the IPRoute (maybe a mock) of previous tests
+        priv_linux_net.close_iproute()
+        self.addCleanup(priv_linux_net.close_iproute)
         self.addCleanup(self._clean_up)
         self.addCleanup(mock.patch.stopall)
 
@@ -621,3 +621,29 @@ class IpNeighTestCase(_LinuxNetTestCase):
                                              constants.IP_VERSION_6)
         self.assertEqual(0, len(neigh4))
         self.assertEqual(0, len(neigh6))
+
+    def _get_ndp_proxies(self):
+        with linux_net._iproute() as ipr:
+            return sorted(linux_net._dump_ndp_proxies(
+                ipr, linux_net._get_link_id(self.dev_name)))
+
+    def test_add_sync_and_delete_ndp_proxies(self):
+        self.assertEqual([], self._get_ndp_proxies())
+
+        linux_net.add_ndp_proxies(['2001:db8::1/64', '2001:db8:1::/64'],
+                                  self.dev_name)
+        self.assertEqual(['2001:db8:1::', '2001:db8::'],
+                         self._get_ndp_proxies())
+
+        added, deleted = linux_net.sync_ndp_proxies(
+            ['2001:db8::/64', '2001:db8:2::5/64'], self.dev_name)
+        self.assertEqual(['2001:db8:2::'], added)
+        self.assertEqual(['2001:db8:1::'], deleted)
+        self.assertEqual(['2001:db8:2::', '2001:db8::'],
+                         self._get_ndp_proxies())
+
+        # Deleting non existing entries is not an error
+        linux_net.del_ndp_proxies(
+            ['2001:db8::/64', '2001:db8:2::/64', '2001:db8:3::/64'],
+            self.dev_name)
+        self.assertEqual([], self._get_ndp_proxies())
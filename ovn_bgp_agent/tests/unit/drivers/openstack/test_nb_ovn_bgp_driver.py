@@ -27,6 +27,7 @@ from ovn_bgp_agent.drivers.openstack.utils import frr
 from ovn_bgp_agent.drivers.openstack.utils import ovn
 from ovn_bgp_agent.drivers.openstack.utils import ovs
 from ovn_bgp_agent.drivers.openstack.utils import wire as wire_utils
+from ovn_bgp_agent.drivers.openstack.watchers import nb_bgp_watcher
 from ovn_bgp_agent import exceptions
 from ovn_bgp_agent.tests import base as test_base
 from ovn_bgp_agent.tests.unit import fakes
@@ -96,7 +97,11 @@ class TestNBOVNBGPDriver(test_base.TestCase):
 
         # Verify mock object method calls and arguments
         self.mock_ovs_idl().start.assert_called_once_with(
-            CONF.ovsdb_connection)
+            CONF.ovsdb_connection, events=mock.ANY)
+        events = self.mock_ovs_idl().start.call_args[1]['events']
+        self.assertEqual(['Open_vSwitch', 'Bridge', 'Interface'],
+                         [e.table for e in events])
+        self.assertTrue(all(e.agent is self.nb_bgp_driver for e in events))
         self.mock_ovs_idl().get_own_chassis_name.assert_called_once()
         self.mock_ovs_idl().get_own_chassis_id.assert_called_once()
 
@@ -113,6 +118,29 @@ class TestNBOVNBGPDriver(test_base.TestCase):
             CONF.bgp_vrf_table_id)
         self.mock_nbdb().start.assert_called_once_with()
 
+    def _test_get_base_events(self, exposing_method):
+        CONF.set_override('exposing_method', exposing_method)
+        self.addCleanup(CONF.clear_override, 'exposing_method')
+
+        events = {type(e) for e in self.nb_bgp_driver._get_base_events()}
+
+        # the cached provider logical switches info must be refreshed
+        self.assertIn(nb_bgp_watcher.LocalnetCreateDeleteEvent, events)
+        self.assertIn(nb_bgp_watcher.LocalnetUpdateEvent, events)
+        return events
+
+    def test_get_base_events_underlay(self):
+        events = self._test_get_base_events(constants.EXPOSE_METHOD_UNDERLAY)
+        self.assertNotIn(nb_bgp_watcher.LogicalSwitchUpdateEvent, events)
+
+    def test_get_base_events_ovn(self):
+        events = self._test_get_base_events(constants.EXPOSE_METHOD_OVN)
+        self.assertNotIn(nb_bgp_watcher.LogicalSwitchUpdateEvent, events)
+
+    def test_get_base_events_vrf(self):
+        events = self._test_get_base_events(constants.EXPOSE_METHOD_VRF)
+        self.assertIn(nb_bgp_watcher.LogicalSwitchUpdateEvent, events)
+
     @mock.patch.object(linux_net, 'ensure_ovn_device')
     @mock.patch.object(frr, 'vrf_leak')
     @mock.patch.object(linux_net, 'ensure_vrf')
@@ -128,6 +156,7 @@ class TestNBOVNBGPDriver(test_base.TestCase):
         mock_ensure_ovn_dev.assert_called_once_with(
             CONF.bgp_nic, CONF.bgp_vrf)
 
+    @mock.patch.object(linux_net, 'sync_ndp_proxies')
     @mock.patch.object(linux_net, 'delete_vlan_device_for_network')
     @mock.patch.object(linux_net, 'get_bridge_vlans')
     @mock.patch.object(linux_net, 'get_extra_routing_table_for_bridge')
@@ -138,22 +167,21 @@ class TestNBOVNBGPDriver(test_base.TestCase):
     @mock.patch.object(linux_net, 'get_exposed_ips')
     @mock.patch.object(ovs, 'remove_extra_ovs_flows')
     @mock.patch.object(ovs, 'ensure_mac_tweak_flows')
-    @mock.patch.object(ovs, 'get_ovs_patch_ports_info')
-    @mock.patch.object(linux_net, 'get_interface_address')
     @mock.patch.object(linux_net, 'ensure_arp_ndp_enabled_for_bridge')
     @mock.patch.object(linux_net, 'ensure_vlan_device_for_network')
     @mock.patch.object(linux_net, 'ensure_routing_table_for_bridge')
     def test_sync(self, mock_routing_bridge, mock_ensure_vlan_network,
-                  mock_ensure_arp, mock_nic_address, mock_get_patch_ports,
-                  mock_ensure_mac, mock_remove_flows, mock_exposed_ips,
-                  mock_get_ip_rules, mock_del_exposed_ips, mock_del_ip_rules,
-                  mock_del_ip_routes, mock_get_extra_route,
-                  mock_get_bridge_vlans, mock_delete_vlan_dev):
+                  mock_ensure_arp, mock_ensure_mac, mock_remove_flows,
+                  mock_exposed_ips, mock_get_ip_rules, mock_del_exposed_ips,
+                  mock_del_ip_rules, mock_del_ip_routes, mock_get_extra_route,
+                  mock_get_bridge_vlans, mock_delete_vlan_dev,
+                  mock_sync_ndp_proxies):
         self.mock_ovs_idl.get_ovn_bridge_mappings.return_value = [
             'net0:bridge0', 'net1:bridge1']
         self.nb_idl.get_network_vlan_tag_by_network_name.side_effect = (
             [10], [11])
-        fake_ip_rules = 'fake-ip-rules'
+        fake_ip_rules = {'{}/32'.format(self.ipv4): {'table': 200,
+                                                     'family': 2}}
         mock_get_ip_rules.return_value = fake_ip_rules
         ips = [self.ipv4, self.ipv6]
         mock_exposed_ips.return_value = ips
@@ -192,11 +220,13 @@ class TestNBOVNBGPDriver(test_base.TestCase):
         mock_expose_ovn_lb_fip = mock.patch.object(
             self.nb_bgp_driver, '_expose_ovn_lb_fip').start()
         mock_routing_bridge.return_value = ['fake-route']
-        mock_nic_address.return_value = self.mac
-        mock_get_patch_ports.return_value = [1, 2]
+        self.mock_ovs_idl.topology_generation = 3
+        self.mock_ovs_idl.get_bridge_info.side_effect = (
+            lambda bridge: {'mac': self.mac, 'in_port': [1, 2]})
 
         self.nb_idl.get_network_vlan_tags.return_value = [10, 11]
-        mock_get_bridge_vlans.side_effect = [[10, 12], [11]]
+        mock_get_bridge_vlans.side_effect = lambda bridge: {
+            'bridge0': [10, 12], 'bridge1': [11]}[bridge]
 
         self.nb_bgp_driver.sync()
 
@@ -210,10 +240,10 @@ class TestNBOVNBGPDriver(test_base.TestCase):
         mock_ensure_arp.assert_has_calls(expected_calls)
         expected_calls = [
             mock.call('bridge0'), mock.call('bridge1')]
-        mock_get_patch_ports.assert_has_calls(expected_calls)
+        self.mock_ovs_idl.get_bridge_info.assert_has_calls(expected_calls)
         expected_calls = [
-            mock.call('bridge0', mock.ANY, [1, 2], constants.OVS_RULE_COOKIE),
-            mock.call('bridge1', mock.ANY, [1, 2], constants.OVS_RULE_COOKIE)]
+            mock.call('bridge0', self.mac, [1, 2], constants.OVS_RULE_COOKIE),
+            mock.call('bridge1', self.mac, [1, 2], constants.OVS_RULE_COOKIE)]
         mock_ensure_mac.assert_has_calls(expected_calls)
         expected_calls = [
             mock.call(mock.ANY, 'bridge0', constants.OVS_RULE_COOKIE),
@@ -230,11 +260,20 @@ class TestNBOVNBGPDriver(test_base.TestCase):
         mock_expose_ovn_lb_vip.assert_called_once_with(lb1)
         mock_expose_ovn_lb_fip.assert_called_once_with(lb1)
         mock_del_exposed_ips.assert_called_once_with(
-            ips, CONF.bgp_nic)
-        mock_del_ip_rules.assert_called_once_with(fake_ip_rules)
+            mock.ANY, CONF.bgp_nic)
+        self.assertEqual(ips, list(mock_del_exposed_ips.call_args[0][0]))
+        mock_del_ip_rules.assert_called_once_with(mock.ANY)
+        self.assertEqual(fake_ip_rules,
+                         dict(mock_del_ip_rules.call_args[0][0].items()))
         mock_del_ip_routes.assert_called_once()
-        bridge = set(self.nb_bgp_driver.ovn_bridge_mappings.values()).pop()
-        mock_delete_vlan_dev.assert_called_once_with(bridge, 12)
+        mock_delete_vlan_dev.assert_called_once_with('bridge0', 12)
+        # no proxy neighbours were recorded by the (mocked) exposing
+        self.assertCountEqual([
+            mock.call([], 'bridge0', None), mock.call([], 'bridge0', 10),
+            mock.call([], 'bridge0', 12), mock.call([], 'bridge1', None),
+            mock.call([], 'bridge1', 11)],
+            mock_sync_ndp_proxies.call_args_list)
+        self.assertEqual(3, self.nb_bgp_driver.ovs_topology_generation)
 
     def test__ensure_lsp_exposed_fip(self):
         port0 = fakes.create_object({
@@ -258,6 +297,52 @@ class TestNBOVNBGPDriver(test_base.TestCase):
                                                 "test-ls", port0)
         mock_expose_ip.assert_not_called()
 
+    def _test_sync_bridge_mappings(self, bridge_mappings):
+        self.nb_bgp_driver._distributed = True
+        self.nb_bgp_driver.ovn_provider_ls = {'provider-ls': {
+            'bridge_device': self.bridge, 'bridge_vlan': None,
+            'localnet': 'provnet'}}
+        self.nb_bgp_driver.ovn_tenant_ls = {'tenant-ls': True}
+        mock.patch.object(wire_utils, 'ensure_base_wiring_config',
+                          return_value=(bridge_mappings, {})).start()
+        mock.patch.object(wire_utils, 'cleanup_wiring').start()
+        mock.patch.object(bgp_utils, 'sweep_stale_vrf_routes').start()
+        for method in ('get_active_cr_lrp_on_chassis', 'get_active_local_lrps',
+                       'get_active_lsp_on_chassis', 'get_active_local_lbs'):
+            getattr(self.nb_idl, method).return_value = []
+
+        self.nb_bgp_driver.sync()
+
+    def test_sync_keeps_ls_cache(self):
+        self._test_sync_bridge_mappings({'fake-network': self.bridge})
+
+        self.assertIn('provider-ls', self.nb_bgp_driver.ovn_provider_ls)
+        self.assertIn('tenant-ls', self.nb_bgp_driver.ovn_tenant_ls)
+
+    def test_sync_bridge_mappings_changed(self):
+        self._test_sync_bridge_mappings({'fake-network': 'br-other'})
+
+        self.assertEqual({}, self.nb_bgp_driver.ovn_provider_ls)
+        self.assertEqual({}, self.nb_bgp_driver.ovn_tenant_ls)
+
+    def test_invalidate_ls_cache(self):
+        self.nb_bgp_driver.ovn_provider_ls = {'ls1': {}, 'ls2': {}}
+        self.nb_bgp_driver.ovn_tenant_ls = {'ls1': True, 'ls3': True}
+
+        self.nb_bgp_driver.invalidate_ls_cache('ls1')
+
+        self.assertEqual({'ls2': {}}, self.nb_bgp_driver.ovn_provider_ls)
+        self.assertEqual({'ls3': True}, self.nb_bgp_driver.ovn_tenant_ls)
+
+    def test_invalidate_ls_cache_all(self):
+        self.nb_bgp_driver.ovn_provider_ls = {'ls1': {}, 'ls2': {}}
+        self.nb_bgp_driver.ovn_tenant_ls = {'ls3': True}
+
+        self.nb_bgp_driver.invalidate_ls_cache()
+
+        self.assertEqual({}, self.nb_bgp_driver.ovn_provider_ls)
+        self.assertEqual({}, self.nb_bgp_driver.ovn_tenant_ls)
+
     def test__ensure_lsp_exposed_tenant_ls(self):
         port0 = fakes.create_object({
             'name': 'port-0',
@@ -805,7 +890,7 @@ class TestNBOVNBGPDriver(test_base.TestCase):
     def test_withdraw_fip(self):
         ip = '10.0.0.1'
         self.nb_bgp_driver._exposed_ips['test-ls'] = {
-            ip: {'bridge_device': 'br-ex', 'bridge_vlan': 100}}
+            ip: nb_ovn_bgp_driver.ExposedIp('br-ex', 100, None)}
         mock_withdraw_provider_port = mock.patch.object(
             self.nb_bgp_driver, '_withdraw_provider_port').start()
         row = fakes.create_object({
@@ -884,19 +969,19 @@ class TestNBOVNBGPDriver(test_base.TestCase):
         m_announce_ips.assert_called_once_with([self.ipv6], ips_info=ips_info)
 
     def test__get_exposed_ip(self):
+        exposed_ip = nb_ovn_bgp_driver.ExposedIp(self.bridge, None, None)
         self.nb_bgp_driver._exposed_ips = {
-            'provider-ls': {'vip': {'bridge_device': self.bridge,
-                                    'bridge_vlan': None}}}
+            'provider-ls': {'vip': exposed_ip}}
 
         ls, info = self.nb_bgp_driver._get_exposed_ip('vip')
         self.assertEqual('provider-ls', ls)
-        self.assertDictEqual({'bridge_device': self.bridge,
-                              'bridge_vlan': None}, info)
+        self.assertEqual(exposed_ip, info)
 
     def test__get_router_port_info_for_ls(self):
         ls = 'provider-ls'
         self.nb_bgp_driver._exposed_ips = {
-            ls: {'vip': {'bridge_device': self.bridge, 'bridge_vlan': None}}
+            ls: {'vip': nb_ovn_bgp_driver.ExposedIp(
+                self.bridge, None, ['fake-via'])}
         }
 
         tenant_ls = 'tenant_ls'
@@ -904,7 +989,7 @@ class TestNBOVNBGPDriver(test_base.TestCase):
 
         info = self.nb_bgp_driver._get_router_port_info_for_ls(tenant_ls)
         self.assertDictEqual({'bridge_device': self.bridge,
-                              'bridge_vlan': None}, info)
+                              'bridge_vlan': None, 'via': ['fake-via']}, info)
         self.assertIsNone(self.nb_bgp_driver._get_router_port_info_for_ls(
             'other_ls'))
 
@@ -1569,8 +1654,8 @@ class TestNBOVNBGPDriver(test_base.TestCase):
 
     def test_withdraw_ovn_lb_vip_provider(self):
         self.nb_bgp_driver._exposed_ips = {
-            'provider-ls': {'vip': {'bridge_device': self.bridge,
-                                    'bridge_vlan': None}}}
+            'provider-ls': {'vip': nb_ovn_bgp_driver.ExposedIp(
+                self.bridge, None, None)}}
         lb = utils.create_row(
             external_ids={
                 constants.OVN_LB_LR_REF_EXT_ID_KEY: 'neutron-router1',
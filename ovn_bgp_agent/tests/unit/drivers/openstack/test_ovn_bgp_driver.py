@@ -13,6 +13,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+import threading
+import time
 from unittest import mock
 
 from oslo_config import cfg
@@ -84,7 +87,11 @@ class TestOVNBGPDriver(test_base.TestCase):
             template=frr.LEAK_VRF_TEMPLATE)
         # Assert connections were started
         self.mock_ovs_idl().start.assert_called_once_with(
-            CONF.ovsdb_connection)
+            CONF.ovsdb_connection, events=mock.ANY)
+        events = self.mock_ovs_idl().start.call_args[1]['events']
+        self.assertEqual(['Open_vSwitch', 'Bridge', 'Interface'],
+                         [e.table for e in events])
+        self.assertTrue(all(e.agent is self.bgp_driver for e in events))
         self.mock_sbdb().start.assert_called_once_with()
 
     @mock.patch.object(linux_net, 'ensure_ovn_device')
@@ -102,30 +109,30 @@ class TestOVNBGPDriver(test_base.TestCase):
         mock_ensure_ovn_dev.assert_called_once_with(
             CONF.bgp_nic, CONF.bgp_vrf)
 
+    @mock.patch.object(wire_utils, 'delete_ndp_proxies_leftovers')
     @mock.patch.object(wire_utils, 'delete_vlan_devices_leftovers')
     @mock.patch.object(linux_net, 'delete_bridge_ip_routes')
     @mock.patch.object(linux_net, 'delete_ip_rules')
     @mock.patch.object(linux_net, 'delete_exposed_ips')
     @mock.patch.object(ovs, 'remove_extra_ovs_flows')
     @mock.patch.object(ovs, 'ensure_mac_tweak_flows')
-    @mock.patch.object(ovs, 'get_ovs_patch_ports_info')
     @mock.patch.object(linux_net, 'get_ovn_ip_rules')
     @mock.patch.object(linux_net, 'get_exposed_ips')
-    @mock.patch.object(linux_net, 'get_interface_address')
     @mock.patch.object(linux_net, 'ensure_vlan_device_for_network')
     @mock.patch.object(linux_net, 'ensure_routing_table_for_bridge')
     @mock.patch.object(linux_net, 'ensure_arp_ndp_enabled_for_bridge')
     def test_sync(
             self, mock_ensure_arp, mock_routing_bridge,
-            mock_ensure_vlan_network, mock_nic_address, mock_exposed_ips,
-            mock_get_ip_rules, mock_get_patch_ports, mock_ensure_mac,
-            mock_remove_flows, mock_del_exposed_ips, mock_del_ip_rules,
-            mock_del_ip_routes, mock_vlan_leftovers):
+            mock_ensure_vlan_network, mock_exposed_ips, mock_get_ip_rules,
+            mock_ensure_mac, mock_remove_flows, mock_del_exposed_ips,
+            mock_del_ip_rules, mock_del_ip_routes, mock_vlan_leftovers,
+            mock_ndp_leftovers):
         self.mock_ovs_idl.get_ovn_bridge_mappings.return_value = [
             'net0:bridge0', 'net1:bridge1']
         self.sb_idl.get_network_vlan_tag_by_network_name.side_effect = (
             [10], [11])
-        fake_ip_rules = 'fake-ip-rules'
+        fake_ip_rules = {'{}/32'.format(self.ipv4): {'table': 200,
+                                                     'family': 2}}
         mock_get_ip_rules.return_value = fake_ip_rules
         ips = [self.ipv4, self.ipv6]
         mock_exposed_ips.return_value = ips
@@ -139,8 +146,9 @@ class TestOVNBGPDriver(test_base.TestCase):
         mock_ensure_cr_port_exposed = mock.patch.object(
             self.bgp_driver, '_ensure_cr_lrp_associated_ports_exposed').start()
         mock_routing_bridge.return_value = ['fake-route']
-        mock_nic_address.return_value = self.mac
-        mock_get_patch_ports.return_value = [1, 2]
+        self.mock_ovs_idl.topology_generation = 3
+        self.mock_ovs_idl.get_bridge_info.side_effect = (
+            lambda bridge: {'mac': self.mac, 'in_port': [1, 2]})
 
         self.bgp_driver.sync()
 
@@ -157,10 +165,10 @@ class TestOVNBGPDriver(test_base.TestCase):
 
         expected_calls = [
             mock.call('bridge0'), mock.call('bridge1')]
-        mock_get_patch_ports.assert_has_calls(expected_calls)
+        self.mock_ovs_idl.get_bridge_info.assert_has_calls(expected_calls)
         expected_calls = [
-            mock.call('bridge0', mock.ANY, [1, 2], constants.OVS_RULE_COOKIE),
-            mock.call('bridge1', mock.ANY, [1, 2], constants.OVS_RULE_COOKIE)]
+            mock.call('bridge0', self.mac, [1, 2], constants.OVS_RULE_COOKIE),
+            mock.call('bridge1', self.mac, [1, 2], constants.OVS_RULE_COOKIE)]
         mock_ensure_mac.assert_has_calls(expected_calls)
 
         expected_calls = [
@@ -168,17 +176,20 @@ class TestOVNBGPDriver(test_base.TestCase):
             mock.call(mock.ANY, 'bridge1', constants.OVS_RULE_COOKIE)]
         mock_remove_flows.assert_has_calls(expected_calls)
 
-        expected_calls = [mock.call('fake-port0', ips, fake_ip_rules),
-                          mock.call('fake-port1', ips, fake_ip_rules)]
+        expected_calls = [mock.call('fake-port0', mock.ANY, mock.ANY),
+                          mock.call('fake-port1', mock.ANY, mock.ANY)]
         mock_ensure_port_exposed.assert_has_calls(expected_calls)
 
-        expected_calls = [mock.call('fake-cr-port0', ips, fake_ip_rules),
-                          mock.call('fake-cr-port1', ips, fake_ip_rules)]
+        expected_calls = [mock.call('fake-cr-port0', mock.ANY, mock.ANY),
+                          mock.call('fake-cr-port1', mock.ANY, mock.ANY)]
         mock_ensure_cr_port_exposed.assert_has_calls(expected_calls)
 
         mock_del_exposed_ips.assert_called_once_with(
-            ips, CONF.bgp_nic)
-        mock_del_ip_rules.assert_called_once_with(fake_ip_rules)
+            mock.ANY, CONF.bgp_nic)
+        self.assertEqual(ips, list(mock_del_exposed_ips.call_args[0][0]))
+        mock_del_ip_rules.assert_called_once_with(mock.ANY)
+        self.assertEqual(fake_ip_rules,
+                         dict(mock_del_ip_rules.call_args[0][0].items()))
         mock_del_ip_routes.assert_called_once_with(
             {}, mock.ANY,
             {'bridge0': ['fake-route'], 'bridge1': ['fake-route']})
@@ -186,6 +197,201 @@ class TestOVNBGPDriver(test_base.TestCase):
         mock_get_ip_rules.assert_called_once_with(mock.ANY)
         mock_vlan_leftovers.assert_called_once_with(
             self.sb_idl, self.bgp_driver.ovn_bridge_mappings)
+        mock_ndp_leftovers.assert_called_once_with(
+            self.bgp_driver.ovn_bridge_mappings, self.bgp_driver.ovs_flows)
+        self.assertEqual(3, self.bgp_driver.ovs_topology_generation)
+
+    def _test_sync_skip_unchanged(self, skip_unchanged=True,
+                                  changes_count=5, fingerprint='fp0'):
+        CONF.set_override('sync_skip_unchanged', skip_unchanged)
+        self.addCleanup(CONF.clear_override, 'sync_skip_unchanged')
+        mock_sync = mock.patch.object(self.bgp_driver, '_sync').start()
+        mock_fingerprint = mock.patch.object(
+            self.bgp_driver, '_get_state_fingerprint').start()
+        mock_fingerprint.return_value = 'fp0'
+        self.sb_idl.idl.changes_count = 5
+
+        self.assertIsNone(self.bgp_driver.sync())
+        mock_sync.assert_called_once_with()
+
+        mock_fingerprint.return_value = fingerprint
+        self.sb_idl.idl.changes_count = changes_count
+        self.drift = self.bgp_driver.sync()
+        return mock_sync, mock_fingerprint
+
+    def test_sync_skip_unchanged(self):
+        mock_sync, mock_fingerprint = self._test_sync_skip_unchanged()
+
+        self.assertFalse(self.drift)
+        mock_sync.assert_called_once_with()
+        self.assertEqual(2, mock_fingerprint.call_count)
+        self.assertEqual(1, self.bgp_driver.skipped_syncs)
+
+    def test_sync_skip_unchanged_sb_changes(self):
+        mock_sync, _ = self._test_sync_skip_unchanged(changes_count=6)
+
+        self.assertFalse(self.drift)
+        self.assertEqual(2, mock_sync.call_count)
+        self.assertEqual(0, self.bgp_driver.skipped_syncs)
+        self.assertEqual((6, 'fp0'), self.bgp_driver._sync_state)
+
+    def test_sync_skip_unchanged_state_drift(self):
+        mock_sync, _ = self._test_sync_skip_unchanged(fingerprint='fp1')
+
+        self.assertTrue(self.drift)
+        self.assertEqual(2, mock_sync.call_count)
+        self.assertEqual(0, self.bgp_driver.skipped_syncs)
+        self.assertEqual((5, 'fp1'), self.bgp_driver._sync_state)
+
+    def test_sync_skip_unchanged_disabled(self):
+        mock_sync, mock_fingerprint = self._test_sync_skip_unchanged(
+            skip_unchanged=False)
+
+        self.assertIsNone(self.drift)
+        self.assertEqual(2, mock_sync.call_count)
+        mock_fingerprint.assert_not_called()
+        self.assertIsNone(self.bgp_driver._sync_state)
+
+    def test_sync_skip_unchanged_failed_sync(self):
+        CONF.set_override('sync_skip_unchanged', True)
+        self.addCleanup(CONF.clear_override, 'sync_skip_unchanged')
+        mock.patch.object(self.bgp_driver, '_sync',
+                          side_effect=ValueError).start()
+        mock.patch.object(self.bgp_driver, '_get_state_fingerprint',
+                          return_value='fp0').start()
+        self.bgp_driver._sync_state = (5, 'fp0')
+        self.sb_idl.idl.changes_count = 6
+
+        self.assertRaises(ValueError, self.bgp_driver.sync)
+        self.assertIsNone(self.bgp_driver._sync_state)
+
+    @mock.patch.object(ovs, 'get_bridge_flows_fingerprint')
+    @mock.patch.object(linux_net, 'get_state_fingerprint')
+    def test__get_state_fingerprint(self, mock_state_fp, mock_flows_fp):
+        self.mock_ovs_idl.topology_generation = 3
+        mock_state_fp.return_value = 'fake-state-fp'
+        mock_flows_fp.return_value = 'fake-flows-fp'
+
+        ret = self.bgp_driver._get_state_fingerprint()
+
+        self.assertEqual(
+            (3, 'fake-state-fp',
+             ((self.bridge, 'fake-flows-fp'),)),
+            ret)
+        mock_state_fp.assert_called_once_with(CONF.bgp_nic, ['fake-table'])
+        mock_flows_fp.assert_called_once_with(self.bridge,
+                                              constants.OVS_RULE_COOKIE)
+
+    def _test_sync_partitions(self, sync_workers):
+        CONF.set_override('sync_workers', sync_workers)
+        self.addCleanup(CONF.clear_override, 'sync_workers')
+        exposed_ips = linux_net.IpLeftovers(
+            ['10.0.0.1', '10.0.0.2', '10.0.0.3'])
+        ip_rules = linux_net.IpLeftovers(
+            {'10.0.0.1/32': 'rule1', '10.0.0.2/32': 'rule2',
+             '10.0.0.3/32': 'rule3'})
+
+        def _partition(ip, partition_ips, partition_rules):
+            # every partition sees the original state, not the one left by
+            # the rest of partitions
+            self.assertTrue(partition_ips)
+            partition_ips.discard(ip)
+            partition_rules.discard('10.0.0.1')
+            partition_rules.discard(ip)
+            self.assertEqual(3, len(exposed_ips))
+
+        self.bgp_driver._sync_partitions(
+            [functools.partial(_partition, '10.0.0.1'),
+             functools.partial(_partition, '10.0.0.2')],
+            exposed_ips, ip_rules)
+
+        self.assertEqual(['10.0.0.3'], list(exposed_ips))
+        self.assertEqual([('10.0.0.3/32', 'rule3')], ip_rules.items())
+
+    def test__sync_partitions(self):
+        self._test_sync_partitions(1)
+
+    def test__sync_partitions_parallel(self):
+        self._test_sync_partitions(4)
+
+    def test__sync_partitions_parallel_exception(self):
+        CONF.set_override('sync_workers', 4)
+        self.addCleanup(CONF.clear_override, 'sync_workers')
+        exposed_ips = linux_net.IpLeftovers(['10.0.0.1'])
+        partition = mock.Mock(side_effect=[None, ValueError])
+
+        self.assertRaises(ValueError, self.bgp_driver._sync_partitions,
+                          [partition, partition], exposed_ips,
+                          linux_net.IpLeftovers())
+        self.assertEqual(['10.0.0.1'], list(exposed_ips))
+
+    @mock.patch.object(bgp_utils, 'announce_ips')
+    @mock.patch.object(ovs, 'ensure_mac_tweak_flows')
+    @mock.patch.object(ovs, 'get_ovs_patch_port_ofport')
+    @mock.patch.object(linux_net, 'add_ip_route')
+    @mock.patch.object(linux_net, 'add_ip_rule')
+    def test__sync_partitions_parallel_same_bridge(
+            self, mock_ip_rule, mock_ip_route, mock_ofport, mock_ensure_mac,
+            mock_announce):
+        CONF.set_override('sync_workers', 2)
+        self.addCleanup(CONF.clear_override, 'sync_workers')
+        self.bgp_driver.ovn_provider_datapath = {
+            'fake-provider-dp': 'fake-localnet'}
+        self.bgp_driver.ovs_flows = {
+            self.bridge: {'mac': self.mac, 'in_port': []}}
+        # both partitions reach the bridge flows at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def _get_ofport(localnet):
+            barrier.wait()
+            return 5
+
+        mock_ofport.side_effect = _get_ofport
+        mock_ensure_mac.side_effect = lambda *args: time.sleep(0.05)
+        exposed_ips = linux_net.IpLeftovers([self.ipv4, self.ipv6, self.fip])
+
+        self.bgp_driver._sync_partitions(
+            [functools.partial(self.bgp_driver._expose_ovn_lb_on_provider,
+                               ip, 'ovn-lb-2', self.cr_lrp0)
+             for ip in (self.ipv4, self.ipv6)],
+            exposed_ips, linux_net.IpLeftovers())
+
+        self.assertEqual([5],
+                         self.bgp_driver.ovs_flows[self.bridge]['in_port'])
+        mock_ensure_mac.assert_called_once_with(
+            self.bridge, self.mac, [5], constants.OVS_RULE_COOKIE)
+        self.assertCountEqual(
+            [self.ipv4, self.ipv6],
+            self.bgp_driver.provider_ovn_lbs['ovn-lb-2']['ips'])
+        self.assertEqual(
+            ['ovn-lb-2', 'ovn-lb-2'],
+            self.bgp_driver.ovn_local_cr_lrps[self.cr_lrp0][
+                'provider_ovn_lbs'])
+        self.assertEqual([self.fip], list(exposed_ips))
+
+    def test__ensure_router_exposed(self):
+        mock_process_lrp = mock.patch.object(
+            self.bgp_driver, '_process_lrp_port').start()
+        mock_expose_lb = mock.patch.object(
+            self.bgp_driver, '_expose_ovn_lb_on_provider').start()
+        self.sb_idl.get_lrp_ports_for_router.return_value = ['lrp0', 'lrp1']
+        self.sb_idl.get_provider_ovn_lbs_on_cr_lrp.return_value = {
+            'fake-lb': self.fip}
+        cr_lrp_info = {'router_datapath': 'fake-router-dp',
+                       'provider_datapath': 'fake-provider-dp'}
+
+        self.bgp_driver._ensure_router_exposed(
+            'fake-cr-lrp', cr_lrp_info, 'fake-ips', 'fake-rules')
+
+        self.sb_idl.get_lrp_ports_for_router.assert_called_once_with(
+            'fake-router-dp')
+        mock_process_lrp.assert_has_calls([
+            mock.call('lrp0', 'fake-cr-lrp', 'fake-ips', 'fake-rules'),
+            mock.call('lrp1', 'fake-cr-lrp', 'fake-ips', 'fake-rules')])
+        self.sb_idl.get_provider_ovn_lbs_on_cr_lrp.assert_called_once_with(
+            'fake-provider-dp', 'fake-router-dp')
+        mock_expose_lb.assert_called_once_with(
+            self.fip, 'fake-lb', 'fake-cr-lrp', 'fake-ips', 'fake-rules')
 
     @mock.patch.object(linux_net, 'get_ip_version')
     def test__ensure_cr_lrp_associated_ports_exposed(self, mock_ip_version):
@@ -197,16 +403,18 @@ class TestOVNBGPDriver(test_base.TestCase):
         self.sb_idl.get_cr_lrp_nat_addresses_info.return_value = (
             [self.ipv4, self.ipv6], patch_port_row)
 
-        exposed_ips = [self.ipv4, '192.168.1.20']
-        mock_expose_ip.return_value = exposed_ips
-        ip_rules = {"{}/128".format(self.ipv6): 'fake-rules'}
+        mock_expose_ip.return_value = [self.ipv4, self.ipv6]
+        exposed_ips = linux_net.IpLeftovers([self.ipv4, '192.168.1.20'])
+        ip_rules = linux_net.IpLeftovers(
+            {"{}/128".format(self.ipv6): 'fake-rules'})
         self.bgp_driver._ensure_cr_lrp_associated_ports_exposed(
             'fake-cr-lrp', exposed_ips, ip_rules)
 
         mock_expose_ip.assert_called_once_with(
             [self.ipv4, self.ipv6], patch_port_row,
             associated_port='fake-cr-lrp')
-        self.assertEqual(['192.168.1.20'], exposed_ips)
+        self.assertEqual(['192.168.1.20'], list(exposed_ips))
+        self.assertFalse(ip_rules)
 
     def test__ensure_port_exposed(self):
         mock_expose_ip = mock.patch.object(
@@ -217,14 +425,15 @@ class TestOVNBGPDriver(test_base.TestCase):
             'type': '',
             'mac': ['{} {} {}'.format(self.mac, self.ipv4, self.ipv6)]})
 
-        exposed_ips = [self.ipv4, self.ipv6]
-        ip_rules = {"{}/128".format(self.ipv6): 'fake-rules'}
+        exposed_ips = linux_net.IpLeftovers([self.ipv4, self.ipv6])
+        ip_rules = linux_net.IpLeftovers(
+            {"{}/128".format(self.ipv6): 'fake-rules'})
         self.bgp_driver._ensure_port_exposed(port, exposed_ips, ip_rules)
 
         mock_expose_ip.assert_called_once_with(
             [self.ipv4, self.ipv6], port)
-        self.assertEqual([], exposed_ips)
-        self.assertEqual({}, ip_rules)
+        self.assertEqual([], list(exposed_ips))
+        self.assertEqual([], ip_rules.items())
 
     def test__ensure_port_exposed_fip(self):
         fip = '172.24.4.225'
@@ -236,14 +445,16 @@ class TestOVNBGPDriver(test_base.TestCase):
             'type': '',
             'mac': ['{} {} {}'.format(self.mac, self.ipv4, self.ipv6)]})
 
-        exposed_ips = [self.ipv4, fip]
-        ip_rules = {"{}/128".format(self.ipv6): 'fake-rules'}
+        exposed_ips = linux_net.IpLeftovers([self.ipv4, fip])
+        ip_rules = linux_net.IpLeftovers(
+            {"{}/128".format(self.ipv6): 'fake-rules'})
         self.bgp_driver._ensure_port_exposed(port, exposed_ips, ip_rules)
 
         mock_expose_ip.assert_called_once_with(
             [self.ipv4, self.ipv6], port)
-        self.assertEqual([self.ipv4], exposed_ips)
-        self.assertEqual({"{}/128".format(self.ipv6): 'fake-rules'}, ip_rules)
+        self.assertEqual([self.ipv4], list(exposed_ips))
+        self.assertEqual([("{}/128".format(self.ipv6), 'fake-rules')],
+                         ip_rules.items())
 
     def test__ensure_port_exposed_fip_unknown_mac(self):
         fip = '172.24.4.225'
@@ -256,15 +467,17 @@ class TestOVNBGPDriver(test_base.TestCase):
             'mac': ['unknown'],
             'datapath': 'fake-dp'})
 
-        exposed_ips = [self.ipv4, fip]
-        ip_rules = {"{}/128".format(self.ipv6): 'fake-rules'}
+        exposed_ips = linux_net.IpLeftovers([self.ipv4, fip])
+        ip_rules = linux_net.IpLeftovers(
+            {"{}/128".format(self.ipv6): 'fake-rules'})
         self.sb_idl.is_provider_network.return_value = False
 
         self.bgp_driver._ensure_port_exposed(port, exposed_ips, ip_rules)
 
         mock_expose_ip.assert_called_once_with([], port)
-        self.assertEqual([self.ipv4], exposed_ips)
-        self.assertEqual({"{}/128".format(self.ipv6): 'fake-rules'}, ip_rules)
+        self.assertEqual([self.ipv4], list(exposed_ips))
+        self.assertEqual([("{}/128".format(self.ipv6), 'fake-rules')],
+                         ip_rules.items())
 
     def test__ensure_port_exposed_wrong_port_type(self):
         mock_expose_ip = mock.patch.object(
@@ -1124,7 +1337,7 @@ class TestOVNBGPDriver(test_base.TestCase):
         mock_bgp_announce.assert_not_called()
 
     @mock.patch.object(wire_utils, '_ensure_updated_mac_tweak_flows')
-    @mock.patch.object(linux_net, 'add_ndp_proxy')
+    @mock.patch.object(linux_net, 'add_ndp_proxies')
     @mock.patch.object(linux_net, 'get_ip_version')
     @mock.patch.object(linux_net, 'add_ip_route')
     @mock.patch.object(linux_net, 'add_ip_rule')
@@ -1165,9 +1378,9 @@ class TestOVNBGPDriver(test_base.TestCase):
                                     self.bridge, vlan=10)]
         mock_add_route.assert_has_calls(expected_calls)
         mock_add_ndp_proxy.assert_called_once_with(
-            '{}/128'.format(self.ipv6), self.bridge, 10)
+            ['{}/128'.format(self.ipv6)], self.bridge, 10)
 
-    @mock.patch.object(linux_net, 'add_ndp_proxy')
+    @mock.patch.object(linux_net, 'add_ndp_proxies')
     @mock.patch.object(linux_net, 'get_ip_version')
     @mock.patch.object(linux_net, 'add_ip_route')
     @mock.patch.object(linux_net, 'add_ip_rule')
@@ -1315,7 +1528,7 @@ class TestOVNBGPDriver(test_base.TestCase):
         mock_add_route.assert_has_calls(expected_calls)
 
     @mock.patch.object(wire_utils, '_ensure_updated_mac_tweak_flows')
-    @mock.patch.object(linux_net, 'add_ndp_proxy')
+    @mock.patch.object(linux_net, 'add_ndp_proxies')
     @mock.patch.object(linux_net, 'get_ip_version')
     @mock.patch.object(linux_net, 'add_ip_route')
     @mock.patch.object(linux_net, 'add_ip_rule')
@@ -1389,7 +1602,7 @@ class TestOVNBGPDriver(test_base.TestCase):
                                     self.bridge, vlan=10)]
         mock_add_route.assert_has_calls(expected_calls)
 
-        mock_ndp_proxy.assert_called_once_with(self.ipv6, self.bridge, 10)
+        mock_ndp_proxy.assert_called_once_with([self.ipv6], self.bridge, 10)
 
         expected_calls = [mock.call(lrp0, self.cr_lrp0),
                           mock.call(lrp1, self.cr_lrp0),
@@ -1398,7 +1611,7 @@ class TestOVNBGPDriver(test_base.TestCase):
         mock_expose_ovn_lb.assert_called_once_with(
             ovn_lb_vip, 'fake-vip-port', self.cr_lrp0)
 
-    @mock.patch.object(linux_net, 'add_ndp_proxy')
+    @mock.patch.object(linux_net, 'add_ndp_proxies')
     @mock.patch.object(linux_net, 'add_ip_route')
     @mock.patch.object(linux_net, 'add_ip_rule')
     @mock.patch.object(linux_net, 'add_ips_to_dev')
@@ -1456,7 +1669,7 @@ class TestOVNBGPDriver(test_base.TestCase):
                                     self.bridge, vlan=10)]
         mock_del_route.assert_has_calls(expected_calls)
 
-    @mock.patch.object(linux_net, 'del_ndp_proxy')
+    @mock.patch.object(linux_net, 'del_ndp_proxies')
     @mock.patch.object(linux_net, 'get_ip_version')
     @mock.patch.object(linux_net, 'del_ip_route')
     @mock.patch.object(linux_net, 'del_ip_rule')
@@ -1496,7 +1709,7 @@ class TestOVNBGPDriver(test_base.TestCase):
                                     self.bridge, vlan=10)]
         mock_del_route.assert_has_calls(expected_calls)
         mock_del_ndp_proxy.assert_called_once_with(
-            '{}/128'.format(self.ipv6), self.bridge, 10)
+            ['{}/128'.format(self.ipv6)], self.bridge, 10)
 
     @mock.patch.object(linux_net, 'del_ip_route')
     @mock.patch.object(linux_net, 'del_ip_rule')
@@ -1579,7 +1792,7 @@ class TestOVNBGPDriver(test_base.TestCase):
                                     self.bridge, vlan=10)]
         mock_del_route.assert_has_calls(expected_calls)
 
-    @mock.patch.object(linux_net, 'del_ndp_proxy')
+    @mock.patch.object(linux_net, 'del_ndp_proxies')
     @mock.patch.object(linux_net, 'get_ip_version')
     @mock.patch.object(linux_net, 'del_ip_route')
     @mock.patch.object(linux_net, 'del_ip_rule')
@@ -1620,7 +1833,8 @@ class TestOVNBGPDriver(test_base.TestCase):
                                     self.bridge, vlan=None)]
         mock_del_route.assert_has_calls(expected_calls)
 
-        mock_ndp_proxy.assert_called_once_with(self.ipv6, self.bridge, None)
+        mock_ndp_proxy.assert_called_once_with([self.ipv6], self.bridge,
+                                               None)
 
         mock_withdraw_lrp_port.assert_called_once_with(
             '192.168.1.1/24', None, self.cr_lrp0)
@@ -22,6 +22,7 @@ from ovn_bgp_agent.drivers.openstack import ovn_evpn_driver
 from ovn_bgp_agent.drivers.openstack.utils import frr
 from ovn_bgp_agent.drivers.openstack.utils import ovn
 from ovn_bgp_agent.drivers.openstack.utils import ovs
+from ovn_bgp_agent import exceptions
 from ovn_bgp_agent.tests import base as test_base
 from ovn_bgp_agent.tests.unit import fakes
 from ovn_bgp_agent.utils import linux_net
@@ -90,15 +91,9 @@ class TestOVNEVPNDriver(test_base.TestCase):
                 'mac': self.mac1},
         }
         self.evpn_driver._ovn_routing_tables_routes = {
-            'fake-vlan': [{
-                'route': {
-                    'oif': 'fake-oif',
-                    'gateway': 'fake-gateway',
-                    'dst': '{}/32'.format(self.ipv4),
-                    'dst_len': 32,
-                    'table': 'fake-table'},
-                'vlan': 88,
-                }]
+            'fake-vlan': {linux_net.RouteInfo(
+                dst='{}/32'.format(self.ipv4), dst_len=32, oif='fake-oif',
+                table='fake-table', gateway='fake-gateway', vlan=88)}
             }
 
     def test_start(self):
@@ -129,17 +124,24 @@ class TestOVNEVPNDriver(test_base.TestCase):
             self.evpn_driver, '_remove_extra_routes').start()
         mock_remove_extra_ovs_flows = mock.patch.object(
             self.evpn_driver, '_remove_extra_ovs_flows').start()
+        mock_remove_extra_ndp_proxies = mock.patch.object(
+            self.evpn_driver, '_remove_extra_ndp_proxies').start()
         mock_remove_extra_vrfs = mock.patch.object(
             self.evpn_driver, '_remove_extra_vrfs').start()
 
+        self.evpn_driver._ovn_ndp_proxies['fake-vlan'].add(self.ipv6)
+
         self.evpn_driver.sync()
 
+        # recorded again while exposing the ports
+        self.assertEqual({}, self.evpn_driver._ovn_ndp_proxies)
         expected_calls = [mock.call('bridge0', 1), mock.call('bridge1', 2)]
         mock_ensure_ndp.assert_has_calls(expected_calls)
         mock_expose_ip.assert_called_once_with(port0, cr_lrp=True)
         mock_remove_extra_exposed_ips.assert_called_once_with()
         mock_remove_extra_routes.assert_called_once_with()
         mock_remove_extra_ovs_flows.assert_called_once_with()
+        mock_remove_extra_ndp_proxies.assert_called_once_with()
         mock_remove_extra_vrfs.assert_called_once_with()
 
     def test__ensure_network_exposed(self):
@@ -562,7 +564,7 @@ class TestOVNEVPNDriver(test_base.TestCase):
         mock_del_device.assert_has_calls(expected_calls)
 
     @mock.patch.object(linux_net, 'add_unreachable_route')
-    @mock.patch.object(linux_net, 'add_ndp_proxy')
+    @mock.patch.object(linux_net, 'add_ndp_proxies')
     @mock.patch.object(linux_net, 'get_ip_version')
     @mock.patch.object(linux_net, 'add_ip_route')
     @mock.patch.object(ovs, 'add_device_to_ovs_bridge')
@@ -586,13 +588,17 @@ class TestOVNEVPNDriver(test_base.TestCase):
         mock_add_unreachable_route.assert_called_once_with(vrf)
 
         if not use_vlan:
-            mock_add_ndp_proxy.assert_called_once_with(self.ipv6, dp_bridge)
+            mock_add_ndp_proxy.assert_called_once_with([self.ipv6], dp_bridge)
+            self.assertEqual({dp_bridge: {self.ipv6}},
+                             self.evpn_driver._ovn_ndp_proxies)
             mock_add_ovs_bridge.assert_called_once_with(veth_ovs, dp_bridge)
             add_route_expected_calls = [
                 mock.call(mock.ANY, self.ipv4, self.vni, veth_vrf),
                 mock.call(mock.ANY, self.ipv6, self.vni, veth_vrf)]
         else:
-            mock_add_ndp_proxy.assert_called_once_with(self.ipv6, vlan)
+            mock_add_ndp_proxy.assert_called_once_with([self.ipv6], vlan)
+            self.assertEqual({vlan: {self.ipv6}},
+                             self.evpn_driver._ovn_ndp_proxies)
             add_route_expected_calls = [
                 mock.call(mock.ANY, self.ipv4, self.vni, vlan),
                 mock.call(mock.ANY, self.ipv6, self.vni, vlan)]
@@ -605,7 +611,7 @@ class TestOVNEVPNDriver(test_base.TestCase):
     def test__connect_evpn_to_ovn_not_vlan(self):
         self._test__connect_evpn_to_ovn(use_vlan=False)
 
-    @mock.patch.object(linux_net, 'del_ndp_proxy')
+    @mock.patch.object(linux_net, 'del_ndp_proxies')
     @mock.patch.object(linux_net, 'delete_routes_from_table')
     @mock.patch.object(ovs, 'del_device_from_ovs_bridge')
     @mock.patch.object(linux_net, 'get_ip_version')
@@ -631,7 +637,7 @@ class TestOVNEVPNDriver(test_base.TestCase):
 
         mock_del_device.assert_called_once_with(device, dp_bridge)
         if clean_ndp:
-            mock_del_ndp.assert_called_once_with(self.ipv6, dp_bridge)
+            mock_del_ndp.assert_called_once_with([self.ipv6], dp_bridge)
         else:
             mock_del_ndp.assert_not_called()
 
@@ -674,6 +680,27 @@ class TestOVNEVPNDriver(test_base.TestCase):
                           mock.call('vlan-iface')]
         mock_del_device_bridge.assert_has_calls(expected_calls)
 
+    @mock.patch.object(linux_net, 'sync_ndp_proxies')
+    def test__remove_extra_ndp_proxies(self, mock_sync_ndp):
+        self.evpn_driver.ovn_local_cr_lrps[self.cr_lrp1]['vlan'] = None
+        self.evpn_driver._ovn_ndp_proxies['fake-vlan'].add(self.ipv6)
+        self.evpn_driver._ovn_ndp_proxies['other-bridge'].add('fd00::1/64')
+
+        def _sync_ndp_proxies(ips, dev):
+            if dev == 'other-bridge':
+                raise exceptions.NetworkInterfaceNotFound(device=dev)
+
+        mock_sync_ndp.side_effect = _sync_ndp_proxies
+
+        self.evpn_driver._remove_extra_ndp_proxies()
+
+        # the bridges and vlan devices with no proxy needed are cleaned up
+        self.assertCountEqual([
+            mock.call([], self.bridge),
+            mock.call([self.ipv6], 'fake-vlan'),
+            mock.call(['fd00::1/64'], 'other-bridge')],
+            mock_sync_ndp.call_args_list)
+
     @mock.patch.object(linux_net, 'get_interface_index')
     @mock.patch.object(linux_net, 'delete_ip_routes')
     @mock.patch.object(linux_net, 'get_routes_on_tables')
@@ -689,89 +716,95 @@ class TestOVNEVPNDriver(test_base.TestCase):
             'dst': 'fake-dst0',
             'dst_len': 'fake-dst-len0',
             'table': 'fake-table0'}
-        mock_get_routes.return_value = [
-            self.evpn_driver._ovn_routing_tables_routes[
-                'fake-vlan'][0]['route'],
-            route_to_del]
+        route_to_keep = {
+            'oif': 'fake-oif',
+            'gateway': 'fake-gateway',
+            'dst': '{}/32'.format(self.ipv4),
+            'dst_len': 32,
+            'table': 'fake-table'}
+        mock_get_routes.return_value = [route_to_keep, route_to_del]
 
         self.evpn_driver._remove_extra_routes()
 
         # Assert the route meant to be deleted was deleted
         mock_del_ip_routes.assert_called_once_with([route_to_del])
 
-    @mock.patch.object(ovs, 'get_flow_info')
-    @mock.patch.object(ovs, 'get_bridge_flows')
-    @mock.patch.object(ovs, 'del_flow')
-    def test_remove_extra_ovs_flows_mac(
-            self, mock_del_flow, mock_get_flows, mock_flow_info):
-        mock_flow_info.return_value = {'mac': 'aa:aa:aa:aa:aa:aa'}
-        mock_get_flows.return_value = ['fake-flow0', 'fake-flow1']
-
-        self.evpn_driver._remove_extra_ovs_flows()
-
-        expected_calls = [mock.call('fake-flow0', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE),
-                          mock.call('fake-flow1', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE)]
-        mock_del_flow.assert_has_calls(expected_calls)
-
-    @mock.patch.object(ovs, 'get_flow_info')
-    @mock.patch.object(ovs, 'get_bridge_flows')
-    @mock.patch.object(ovs, 'del_flow')
-    def test_remove_extra_ovs_flows_port(
-            self, mock_del_flow, mock_get_flows, mock_flow_info):
-        mock_flow_info.return_value = {
-            'mac': self.mac,
-            'port': 'fake-port',
-        }
-        mock_get_flows.return_value = ['fake-flow0', 'fake-flow1']
-
-        self.evpn_driver._remove_extra_ovs_flows()
-
-        expected_calls = [mock.call('fake-flow0', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE),
-                          mock.call('fake-flow1', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE)]
-        mock_del_flow.assert_has_calls(expected_calls)
+    def _get_vrf_flow(self, mac=None, output_port=None, nw_src=None):
+        flow = 'cookie=0x3e6, duration=11.647s, table=0, priority=1000,ip'
+        if mac:
+            flow += ',dl_src={}'.format(mac)
+        if nw_src:
+            flow += ',{}={}'.format(
+                'ipv6_src' if ':' in nw_src else 'nw_src', nw_src)
+        flow += ' actions=mod_dl_dst:d2:33:c5:fd:7c:42'
+        if output_port:
+            flow += ',output:{}'.format(output_port)
+        return ovs.Flow.parse(flow)
 
     @mock.patch.object(ovs, 'get_device_port_at_ovs')
-    @mock.patch.object(ovs, 'get_flow_info')
-    @mock.patch.object(ovs, 'get_bridge_flows')
-    @mock.patch.object(ovs, 'del_flow')
-    def test_remove_extra_ovs_flows_port_nw_src(
-            self, mock_del_flow, mock_get_flows, mock_flow_info,
-            mock_get_port_ovs):
-        mock_get_port_ovs.return_value = 'fake-ovs-port'
-        mock_flow_info.return_value = {
-            'mac': self.mac,
-            'port': 'fake-port',
-            'nw_src': '10.10.1.88/32',
-        }
-        mock_get_flows.return_value = ['fake-flow0', 'fake-flow1']
+    @mock.patch.object(ovs, 'get_cookie_flows')
+    @mock.patch.object(ovs, 'del_flows')
+    def test__remove_extra_ovs_flows(self, mock_del_flows, mock_get_flows,
+                                     mock_get_port_ovs):
+        # not on the IDL yet
+        self.mock_ovs_idl.get_ofports.return_value = {'fake-vlan': '3'}
+        mock_get_port_ovs.return_value = '4'
+        self.evpn_driver._ovn_routing_tables_routes = {
+            'fake-vlan': {linux_net.RouteInfo(
+                dst=self.ipv4, dst_len=32, oif='fake-oif', table='fake-table',
+                gateway=None, vlan=None)},
+            'fake-vlan1': {linux_net.RouteInfo(
+                dst='2002::', dst_len=64, oif='fake-oif', table='fake-table',
+                gateway=None, vlan=None)}}
+        keep_flows = [
+            self._get_vrf_flow(mac=self.mac),
+            self._get_vrf_flow(mac=self.mac, output_port='3',
+                               nw_src=self.ipv4),
+            self._get_vrf_flow(mac=self.mac1, output_port='4',
+                               nw_src='2002::/64')]
+        extra_flows = [
+            # no mac or an unknown one
+            self._get_vrf_flow(),
+            self._get_vrf_flow(mac='ff:ff:ff:ff:ff:ff', output_port='3',
+                               nw_src=self.ipv4),
+            # no source network
+            self._get_vrf_flow(mac=self.mac, output_port='3'),
+            # output to another port than the device one
+            self._get_vrf_flow(mac=self.mac, output_port='4',
+                               nw_src=self.ipv4),
+            # no route to the source network
+            self._get_vrf_flow(mac=self.mac, output_port='3',
+                               nw_src='10.0.0.0/24')]
+        mock_get_flows.return_value = set(keep_flows + extra_flows)
 
         self.evpn_driver._remove_extra_ovs_flows()
 
-        expected_calls = [mock.call('fake-flow0', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE),
-                          mock.call('fake-flow1', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE)]
-        mock_del_flow.assert_has_calls(expected_calls)
+        mock_get_flows.assert_called_once_with(
+            self.bridge, constants.OVS_VRF_RULE_COOKIE)
+        mock_del_flows.assert_called_once_with(
+            self.bridge, sorted(extra_flows, key=str))
+        # looked up once, instead of once per flow
+        mock_get_port_ovs.assert_called_once_with('fake-vlan1')
 
-    @mock.patch.object(ovs, 'get_flow_info')
-    @mock.patch.object(ovs, 'get_bridge_flows')
-    @mock.patch.object(ovs, 'del_flow')
-    def test_remove_extra_ovs_flows(
-            self, mock_del_flow, mock_get_flows, mock_flow_info):
-        mock_flow_info.return_value = {}
-        mock_get_flows.return_value = ['fake-flow0', 'fake-flow1']
+    @mock.patch.object(ovs, 'get_device_port_at_ovs')
+    @mock.patch.object(ovs, 'get_cookie_flows')
+    @mock.patch.object(ovs, 'del_flows')
+    def test__remove_extra_ovs_flows_device_not_found(
+            self, mock_del_flows, mock_get_flows, mock_get_port_ovs):
+        self.mock_ovs_idl.get_ofports.return_value = {}
+        mock_get_port_ovs.side_effect = exceptions.PortNotFound(
+            port='fake-vlan')
+        self.evpn_driver._ovn_routing_tables_routes = {
+            'fake-vlan': {linux_net.RouteInfo(
+                dst=self.ipv4, dst_len=32, oif='fake-oif', table='fake-table',
+                gateway=None, vlan=None)}}
+        flow = self._get_vrf_flow(mac=self.mac, output_port='3',
+                                  nw_src=self.ipv4)
+        mock_get_flows.return_value = {flow}
 
         self.evpn_driver._remove_extra_ovs_flows()
 
-        expected_calls = [mock.call('fake-flow0', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE),
-                          mock.call('fake-flow1', self.bridge,
-                                    constants.OVS_VRF_RULE_COOKIE)]
-        mock_del_flow.assert_has_calls(expected_calls)
+        mock_del_flows.assert_called_once_with(self.bridge, [flow])
 
     @mock.patch.object(linux_net, 'del_ips_from_dev')
     @mock.patch.object(linux_net, 'get_exposed_ips')
@@ -790,15 +823,9 @@ class TestOVNEVPNDriver(test_base.TestCase):
         self.assertEqual([self.vni, self.vni1], ret)
 
     def test_get_cr_lrp_mac_mapping(self):
+        self.evpn_driver.ovn_local_cr_lrps[self.cr_lrp1]['vlan'] = None
         ret = self.evpn_driver._get_cr_lrp_mac_mapping()
         expected_ret = {
-            self.mac: {
-                'veth_ovs': 'fake-veth-ovs',
-                'veth_vrf': 'fake-veth-vrf',
-                'vlan': 'fake-vlan'},
-            self.mac1: {
-                'veth_ovs': 'fake-veth-ovs1',
-                'veth_vrf': 'fake-veth-vrf1',
-                'vlan': 'fake-vlan1'}
-        }
+            self.mac: ('fake-vlan', 'fake-vlan'),
+            self.mac1: ('fake-veth-vrf1', 'fake-veth-ovs1')}
         self.assertEqual(expected_ret, ret)
@@ -215,6 +215,41 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
             )
 
             self.assertIn(test_route, self.bgp_driver.vrf_routes)
+        self.assertEqual({}, self.bgp_driver.gateway_network_routes)
+
+    @mock.patch.object(linux_net, "add_ip_route")
+    def test__add_route_gateway_network(self, mock_add_route):
+        gateway_network = ipaddress.ip_network("10.0.0.0/24")
+        self.bgp_driver._add_route(
+            self.test_route_ipv4.network,
+            self.test_route_ipv4.prefix_len,
+            self.test_route_ipv4.dst,
+            gateway_network=gateway_network)
+
+        self.assertEqual({gateway_network: {self.test_route_ipv4}},
+                         self.bgp_driver.gateway_network_routes)
+
+    @mock.patch.object(linux_net, "del_ip_route")
+    def test__del_route_gateway_network(self, mock_del_route):
+        gateway_network = ipaddress.ip_network("10.0.0.0/24")
+        other_route = ovn_stretched_l2_bgp_driver.HashedRoute(
+            network="192.168.2.0", prefix_len=24, dst="10.0.0.2")
+        self.bgp_driver.gateway_network_routes[gateway_network].update(
+            {self.test_route_ipv4, other_route})
+
+        for route in (self.test_route_ipv4, other_route):
+            self.bgp_driver._del_route(
+                route.network, route.prefix_len, route.dst,
+                gateway_network=gateway_network)
+            # deleting it twice does not break the index
+            self.bgp_driver._del_route(
+                route.network, route.prefix_len, route.dst,
+                gateway_network=gateway_network)
+            if route == self.test_route_ipv4:
+                self.assertEqual({gateway_network: {other_route}},
+                                 self.bgp_driver.gateway_network_routes)
+
+        self.assertEqual({}, self.bgp_driver.gateway_network_routes)
 
     @mock.patch.object(linux_net, "del_ip_route")
     def test__del_route(self, mock_del_route):
@@ -435,14 +470,12 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
 
         mock__update_network.assert_not_called()
 
-    @mock.patch.object(linux_net, "get_exposed_routes_on_network")
     @mock.patch.object(linux_net, "del_ip_route")
     @mock.patch.object(linux_net, "add_ip_route")
     def test__update_network(
         self,
         mock_add_ip_route,
         mock_del_ip_route,
-        mock_get_exposed_routes_on_network,
     ):
         gateway = {}
         gateway["ips"] = [
@@ -461,11 +494,6 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
         add_ips = ["192.168.1.1/24", "fdcc:8cf2:d40c:2::1/64"]
         delete_ips = ["192.168.0.1/24"]
 
-        mock_get_exposed_routes_on_network.side_effect = (
-            ["route-v4"],
-            ["route-v6"],
-        )
-
         self.sb_idl.get_port_by_name.return_value = self.fake_patch_port
 
         self.bgp_driver._update_network(
@@ -526,6 +554,16 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
             via="10.0.0.10",
         )
 
+        self.assertEqual(
+            {gateway["ips"][0].network: {
+                ovn_stretched_l2_bgp_driver.HashedRoute(
+                    network="192.168.1.0", prefix_len=24,
+                    dst="10.0.0.10")},
+             gateway["ips"][1].network: {
+                ovn_stretched_l2_bgp_driver.HashedRoute(
+                    network="fdcc:8cf2:d40c:2::", prefix_len=64,
+                    dst="fd51:f4b3:872:eda::10")}},
+            self.bgp_driver.gateway_network_routes)
         self.assertDictEqual(
             self.bgp_driver.propagated_lrp_ports,
             {
@@ -539,14 +577,12 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
             }
         )
 
-    @mock.patch.object(linux_net, "get_exposed_routes_on_network")
     @mock.patch.object(linux_net, "del_ip_route")
     @mock.patch.object(linux_net, "add_ip_route")
     def test__update_network_no_gateway(
         self,
         mock_add_ip_route,
         mock_del_ip_route,
-        mock_get_exposed_routes_on_network,
     ):
         self.bgp_driver.ovn_local_cr_lrps = {}
 
@@ -562,19 +598,16 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
             self.router_port, "gateway_port", add_ips, delete_ips
         )
 
-        mock_get_exposed_routes_on_network.assert_not_called()
         mock_del_ip_route.assert_not_called()
         mock_add_ip_route.assert_not_called()
         self.sb_idl.get_port_by_name.assert_not_called()
 
-    @mock.patch.object(linux_net, "get_exposed_routes_on_network")
     @mock.patch.object(linux_net, "del_ip_route")
     @mock.patch.object(linux_net, "add_ip_route")
     def test__update_network_no_mac(
         self,
         mock_add_ip_route,
         mock_del_ip_route,
-        mock_get_exposed_routes_on_network,
     ):
         gateway = {}
         gateway["ips"] = [
@@ -593,7 +626,6 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
             self.router_port, "gateway_port", add_ips, delete_ips
         )
 
-        mock_get_exposed_routes_on_network.assert_not_called()
         mock_del_ip_route.assert_not_called()
         mock_add_ip_route.assert_not_called()
         self.sb_idl.get_port_by_name.assert_not_called()
@@ -878,11 +910,8 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
             {}
         )
 
-    @mock.patch.object(linux_net, "get_exposed_routes_on_network")
     @mock.patch.object(linux_net, "del_ip_route")
-    def test__withdraw_subnet(
-        self, mock_del_ip_route, mock_get_exposed_routes_on_network
-    ):
+    def test__withdraw_subnet(self, mock_del_ip_route):
         gateway = {}
         gateway["ips"] = [
             ipaddress.ip_interface(ip)
@@ -899,7 +928,20 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
             }
         }
 
-        mock_get_exposed_routes_on_network.side_effect = (["route-v4"], [])
+        # another router still exposes a tenant network via the IPv4
+        # gateway network, but the IPv6 one has no tenant networks left
+        v4_network = gateway["ips"][0].network
+        v6_network = gateway["ips"][1].network
+        other_route = ovn_stretched_l2_bgp_driver.HashedRoute(
+            network="192.168.2.0", prefix_len=24, dst="10.0.0.11")
+        self.bgp_driver.gateway_network_routes[v4_network].update(
+            {other_route,
+             ovn_stretched_l2_bgp_driver.HashedRoute(
+                 network="192.168.1.0", prefix_len=24, dst="10.0.0.10")})
+        self.bgp_driver.gateway_network_routes[v6_network].add(
+            ovn_stretched_l2_bgp_driver.HashedRoute(
+                network="fdcc:8cf2:d40c:2::", prefix_len=64,
+                dst="fd51:f4b3:872:eda::10"))
 
         self.bgp_driver._withdraw_subnet(port_info, "gateway_port")
 
@@ -934,26 +976,24 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
         ]
 
         mock_del_ip_route.assert_has_calls(expected_calls)
+        self.assertEqual(3, mock_del_ip_route.call_count)
+        self.assertEqual({v4_network: {other_route}},
+                         self.bgp_driver.gateway_network_routes)
 
-    @mock.patch.object(linux_net, "get_exposed_routes_on_network")
     @mock.patch.object(linux_net, "del_ip_route")
-    def test__withdraw_subnet_no_gateway(
-        self, mock_del_ip_route, mock_get_exposed_routes_on_network
-    ):
+    def test__withdraw_subnet_no_gateway(self, mock_del_ip_route):
         self.bgp_driver.ovn_local_cr_lrps = {}
         self.bgp_driver._withdraw_subnet(self.router_port, "gateway_port")
         mock_del_ip_route.assert_not_called()
-        mock_get_exposed_routes_on_network.assert_not_called()
 
     @mock.patch.object(linux_net, "delete_ip_routes")
     @mock.patch.object(linux_net, "get_routes_on_tables")
     def test_sync(self, mock_get_routes_on_tables, mock_delete_ip_routes):
         def create_route(dst, dst_len, gateway):
-            m = mock.Mock([])
-            m.dst = dst
-            m.dst_len = dst_len
-            m.gateway = gateway
-            return m
+            route = {"dst": dst, "dst_len": dst_len}
+            if gateway:
+                route["gateway"] = gateway
+            return route
 
         def create_hashed_route(dst, dst_len, gateway):
             return ovn_stretched_l2_bgp_driver.HashedRoute(
@@ -996,9 +1036,13 @@ class TestOVNBGPStretchedL2Driver(test_base.TestCase):
         routes.append(delete_route)
 
         mock_get_routes_on_tables.return_value = routes
+        self.bgp_driver.gateway_network_routes[
+            ipaddress.ip_network("10.0.0.0/24")].add(vrf_routes[0])
 
         self.bgp_driver.sync()
 
+        self.assertEqual({}, self.bgp_driver.gateway_network_routes)
+
         mock_get_routes_on_tables.assert_called_once_with(
             [CONF.bgp_vrf_table_id]
         )
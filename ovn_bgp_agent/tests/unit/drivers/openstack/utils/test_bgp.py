@@ -120,3 +120,20 @@ class TestEVPN(test_base.TestCase):
 
     def test_ensure_base_bgp_configuration_l2vni(self):
         self._test_ensure_base_bgp_configuration('l2vni')
+
+    def test_clear_vrf_routes(self):
+        bgp_utils.clear_vrf_routes()
+
+        self.mock_linux_net.delete_routes_from_table.assert_called_once_with(
+            CONF.bgp_vrf_table_id)
+        self.mock_linux_net.mark_stale_routes.assert_not_called()
+
+    def test_clear_vrf_routes_graceful_restart(self):
+        CONF.set_override('bgp_graceful_restart', True)
+        self.addCleanup(CONF.clear_override, 'bgp_graceful_restart')
+
+        bgp_utils.clear_vrf_routes()
+
+        self.mock_linux_net.mark_stale_routes.assert_called_once_with(
+            CONF.bgp_vrf_table_id)
+        self.mock_linux_net.delete_routes_from_table.assert_not_called()
@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import threading
+
 from oslo_config import cfg
 from unittest import mock
 
@@ -21,6 +23,7 @@ from ovn_bgp_agent.drivers.openstack.utils import evpn
 from ovn_bgp_agent import exceptions
 from ovn_bgp_agent.tests import base as test_base
 from ovn_bgp_agent.tests import utils
+from ovn_bgp_agent.utils import linux_net as linux_net_utils
 
 
 CONF = cfg.CONF
@@ -143,16 +146,9 @@ class TestEVPN(test_base.TestCase):
         # Create pointer for shorter lines.
         linux_net = self.mock_linux_net
 
-        linux_net.ensure_bridge.assert_called_once_with(self.bridge_name)
-        linux_net.ensure_vxlan.assert_called_once_with(self.vxlan_name, 100,
-                                                       '127.0.0.1', 4789)
-        linux_net.set_master_for_device.assert_has_calls([
-            mock.call(self.vxlan_name, self.bridge_name),
-            mock.call(self.bridge_name, self.vrf_name),
-        ])
-        linux_net.disable_learning_vxlan_intf.assert_called_once_with(
-            self.vxlan_name)
-        linux_net.ensure_vrf.assert_called_once_with(self.vrf_name, 100)
+        linux_net.ensure_evpn_devices.assert_called_once_with(
+            self.bridge_name, self.vxlan_name, 100, '127.0.0.1', 4789,
+            vrf_name=self.vrf_name)
 
         frr = self.mock_frr
         frr.vrf_reconfigure.assert_called_once_with(mock.ANY, 'add-vrf')
@@ -166,15 +162,9 @@ class TestEVPN(test_base.TestCase):
         # Create pointer for shorter lines.
         linux_net = self.mock_linux_net
 
-        linux_net.ensure_bridge.assert_called_once_with(self.bridge_name)
-        linux_net.ensure_vxlan.assert_called_once_with(self.vxlan_name, 100,
-                                                       '127.0.0.1', 4789)
-        linux_net.set_master_for_device.assert_has_calls([
-            mock.call(self.vxlan_name, self.bridge_name),
-        ])
-        linux_net.disable_learning_vxlan_intf.assert_called_once_with(
-            self.vxlan_name)
-        linux_net.ensure_vrf.assert_not_called()
+        linux_net.ensure_evpn_devices.assert_called_once_with(
+            self.bridge_name, self.vxlan_name, 100, '127.0.0.1', 4789,
+            vrf_name=None)
 
         frr = self.mock_frr
         frr.vrf_reconfigure.assert_called_once_with(mock.ANY, 'add-vrf')
@@ -184,7 +174,7 @@ class TestEVPN(test_base.TestCase):
         bridge._setup_done = True
         bridge.setup()
 
-        self.mock_linux_net.ensure_bridge.assert_not_called()
+        self.mock_linux_net.ensure_evpn_devices.assert_not_called()
 
     def test_evpnbridge_eval_disconnect(self):
         _, bridge, evpn_vlan = self._create_bridge_and_vlan()
@@ -249,12 +239,10 @@ class TestEVPN(test_base.TestCase):
         evpn_setup.assert_called_once()
 
         linux_net = self.mock_linux_net
-        linux_net.ensure_veth.assert_called_once_with(self.veth_vrf,
-                                                      self.veth_ovs)
+        linux_net.ensure_evpn_vlan_device.assert_called_once_with(
+            self.veth_vrf, self.veth_ovs, 'br-100')
         self.mock_ovs.add_device_to_ovs_bridge(self.veth_ovs, 'br-ex',
                                                vlan_tag=vlan_tag_str)
-        linux_net.set_master_for_device.assert_called_once_with(self.veth_vrf,
-                                                                'br-100')
 
         linux_net.ensure_arp_ndp_enabled_for_bridge.assert_not_called()
         linux_net.enable_routing_for_interfaces.assert_not_called()
@@ -282,20 +270,16 @@ class TestEVPN(test_base.TestCase):
         evpn_setup.assert_called_once()
 
         linux_net = self.mock_linux_net
-        linux_net.ensure_veth.assert_called_once_with(self.veth_vrf,
-                                                      self.veth_ovs)
+        # a single privsep call for the veth pair and its configuration
+        linux_net.ensure_evpn_vlan_device.assert_called_once_with(
+            self.veth_vrf, self.veth_ovs, self.vrf_name, ips=custom_ips,
+            arp_ndp_offset=vlan_tag, routing_devices=('br-100',))
         self.mock_ovs.add_device_to_ovs_bridge(self.veth_ovs, 'br-ex',
                                                vlan_tag=vlan_tag_str)
-        linux_net.set_master_for_device.assert_called_once_with(self.veth_vrf,
-                                                                self.vrf_name)
-        linux_net.ensure_arp_ndp_enabled_for_bridge.assert_called_once_with(
-            self.veth_vrf, offset=vlan_tag, vlan_tag=vlan_tag_str)
-
-        linux_net.enable_routing_for_interfaces.assert_called_once_with(
-            self.veth_vrf, 'br-100')
-
-        linux_net.enable_proxy_arp.assert_called_once_with(self.veth_vrf)
-        linux_net.enable_proxy_ndp.assert_called_once_with(self.veth_vrf)
+        linux_net.ensure_veth.assert_not_called()
+        linux_net.set_master_for_device.assert_not_called()
+        linux_net.ensure_arp_ndp_enabled_for_bridge.assert_not_called()
+        linux_net.enable_routing_for_interfaces.assert_not_called()
 
         self.mock_ovs.ensure_mac_tweak_flows.assert_called_once_with(
             'br-ex', self.fake_mac, [12], constants.OVS_RULE_COOKIE)
@@ -328,6 +312,104 @@ class TestEVPN(test_base.TestCase):
         self.assertTrue(vlan_dev._veth_created)
         self.assertFalse(vlan_dev._setup_done)
 
+    def _create_bridges_and_vlans(self, count):
+        self.addCleanup(CONF.clear_override, 'sync_workers')
+        CONF.set_override('sync_workers', 2)
+        return [self._create_bridge_and_vlan(vni=vni)[2]
+                for vni in range(100, 100 + count)]
+
+    def test_provision(self):
+        vlan_devs = self._create_bridges_and_vlans(3)
+        # the last one is already set up
+        vlan_devs[-1].bridge._setup_done = True
+        vlan_devs[-1]._setup_done = True
+        bridges = [vlan_dev.bridge for vlan_dev in vlan_devs]
+
+        evpn.provision(vlan_devs)
+
+        # the devices missing on the host are created too
+        self.mock_linux_net.ensure_evpn_devices.assert_has_calls([
+            mock.call('br-100', 'vxlan-100', 100, '127.0.0.1', 4789,
+                      vrf_name='vrf-100'),
+            mock.call('br-101', 'vxlan-101', 101, '127.0.0.1', 4789,
+                      vrf_name='vrf-101')], any_order=True)
+        self.assertEqual(
+            2, self.mock_linux_net.ensure_evpn_devices.call_count)
+        self.assertEqual(
+            2, self.mock_linux_net.ensure_evpn_vlan_device.call_count)
+        self.mock_frr.vrfs_reconfigure.assert_called_once_with(
+            [bridges[0].evpn_opts, bridges[1].evpn_opts], 'add-vrf')
+        self.mock_frr.vrf_reconfigure.assert_not_called()
+        self.assertTrue(all(bridge._setup_done for bridge in bridges))
+        self.assertTrue(all(vlan_dev._setup_done for vlan_dev in vlan_devs))
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.ensure_evpn_devices')
+    def test_provision_concurrently(self, mock_ensure_evpn_devices):
+        vlan_devs = self._create_bridges_and_vlans(2)
+        # through the actual ensure, each VNI devices creation only completes
+        # once the other one is in progress, which would time out if they
+        # were serialized
+        self.mock_linux_net.ensure_evpn_devices.side_effect = (
+            linux_net_utils.ensure_evpn_devices)
+        barrier = threading.Barrier(2, timeout=5)
+        mock_ensure_evpn_devices.side_effect = (
+            lambda *args, **kwargs: barrier.wait())
+
+        evpn.provision(vlan_devs)
+
+        self.assertEqual(2, mock_ensure_evpn_devices.call_count)
+        self.assertFalse(barrier.broken)
+        self.assertTrue(all(vlan_dev._setup_done for vlan_dev in vlan_devs))
+
+    def test_provision_nothing_pending(self):
+        vlan_devs = self._create_bridges_and_vlans(2)
+        for vlan_dev in vlan_devs:
+            vlan_dev._setup_done = True
+
+        evpn.provision(vlan_devs)
+
+        self.mock_linux_net.ensure_evpn_devices.assert_not_called()
+        self.mock_linux_net.ensure_evpn_vlan_device.assert_not_called()
+        self.mock_frr.vrfs_reconfigure.assert_not_called()
+
+    def test_provision_bridge_setup_done(self):
+        vlan_dev = self._create_bridges_and_vlans(1)[0]
+        vlan_dev.bridge._setup_done = True
+
+        evpn.provision([vlan_dev])
+
+        self.mock_linux_net.ensure_evpn_devices.assert_not_called()
+        self.mock_frr.vrfs_reconfigure.assert_not_called()
+        self.assertTrue(vlan_dev._setup_done)
+
+    def test_provision_failed_bridge(self):
+        vlan_devs = self._create_bridges_and_vlans(2)
+        bridges = [vlan_dev.bridge for vlan_dev in vlan_devs]
+        # sequentially, for the errors to match the bridges
+        CONF.set_override('sync_workers', 1)
+        self.mock_linux_net.ensure_evpn_devices.side_effect = [
+            None, RuntimeError('fake-error')]
+
+        evpn.provision(vlan_devs)
+
+        self.mock_frr.vrfs_reconfigure.assert_called_once_with(
+            [bridges[0].evpn_opts], 'add-vrf')
+        self.assertEqual([True, False],
+                         [vlan_dev._setup_done for vlan_dev in vlan_devs])
+
+    def test_provision_failed_frr(self):
+        vlan_devs = self._create_bridges_and_vlans(2)
+        self.mock_frr.vrfs_reconfigure.side_effect = RuntimeError(
+            'fake-error')
+
+        evpn.provision(vlan_devs)
+
+        self.assertEqual([False, False],
+                         [vlan_dev._setup_done for vlan_dev in vlan_devs])
+        self.assertEqual([False, False],
+                         [vlan_dev.bridge._setup_done
+                          for vlan_dev in vlan_devs])
+
     def test_evpnbridge_vlan__eval_disconnect(self):
         _, _, vlan_dev = self._create_bridge_and_vlan()
 
@@ -335,11 +417,11 @@ class TestEVPN(test_base.TestCase):
 
         vlan_dev._setup_done = True
 
-        vlan_dev._agent_routing_tables_routes = ['entry']
+        vlan_dev._agent_routing_tables_routes = {'fake-ip': 'fake-route'}
         vlan_dev._eval_disconnect()
         vlan_dev_disconnect.assert_not_called()
 
-        vlan_dev._agent_routing_tables_routes = []
+        vlan_dev._agent_routing_tables_routes = {}
         vlan_dev._eval_disconnect()
         vlan_dev_disconnect.assert_called_once()
 
@@ -348,7 +430,7 @@ class TestEVPN(test_base.TestCase):
 
         vlan_dev_disconnect = mock.patch.object(vlan_dev, 'disconnect').start()
 
-        vlan_dev._agent_routing_tables_routes = []
+        vlan_dev._agent_routing_tables_routes = {}
         vlan_dev._eval_disconnect()
 
         vlan_dev_disconnect.assert_not_called()
@@ -423,7 +505,7 @@ class TestEVPN(test_base.TestCase):
         _, _, vlan_dev = self._create_bridge_and_vlan()
         vlan_dev._setup_done = True
 
-        routing_tables_routes = {self.veth_vrf: []}
+        routing_tables_routes = {self.veth_vrf: {}}
         addr = ip.split('/')[0]
         mask = None if '/' not in ip else ip.split('/')[1]
         mac = 'fe:12:34:56:89:12'
@@ -431,12 +513,9 @@ class TestEVPN(test_base.TestCase):
 
         vlan_dev.add_route(routing_tables_routes, ip, mac, via)
 
-        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: [{
-            'ip': '10.10.10.10',
-            'mask': mask,
-            'mac': 'fe:12:34:56:89:12',
-            'via': None,
-        }]})
+        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: {
+            '10.10.10.10': evpn.VlanDevRoute(
+                '10.10.10.10', mask, 'fe:12:34:56:89:12', None)}})
 
         self.mock_linux_net.add_ip_route.assert_called_once_with(
             mock.ANY, addr, 100, self.veth_vrf, mask=mask, via=None)
@@ -451,7 +530,7 @@ class TestEVPN(test_base.TestCase):
         _, _, vlan_dev = self._create_bridge_and_vlan(mode='l2')
         vlan_dev._setup_done = True
 
-        routing_tables_routes = {self.veth_vrf: []}
+        routing_tables_routes = {self.veth_vrf: {}}
         ip = '10.10.10.10/32'
         mac = 'fe:12:34:56:89:12'
         via = None
@@ -465,29 +544,20 @@ class TestEVPN(test_base.TestCase):
         vlan_dev._setup_done = True
 
         addr = ip.split('/')[0]
-        routing_tables_routes = {self.veth_vrf: [{
-            'ip': addr,
-            'mask': '32',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '10.10.20.10',
-        }, {
-            'ip': '10.10.10.11',
-            'mask': '32',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '10.10.20.10',
-        }]}
+        routing_tables_routes = {self.veth_vrf: {
+            addr: evpn.VlanDevRoute(
+                addr, '32', 'fe:12:34:56:89:12', '10.10.20.10'),
+            '10.10.10.11': evpn.VlanDevRoute(
+                '10.10.10.11', '32', 'fe:12:34:56:89:12', '10.10.20.10')}}
         mac = 'fe:12:34:56:89:12'
         vlan_dev__eval_disconnect = mock.patch.object(
             vlan_dev, '_eval_disconnect').start()
 
         vlan_dev.del_route(routing_tables_routes, ip, mac)
 
-        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: [{
-            'ip': '10.10.10.11',
-            'mask': '32',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '10.10.20.10',
-        }]})
+        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: {
+            '10.10.10.11': evpn.VlanDevRoute(
+                '10.10.10.11', '32', 'fe:12:34:56:89:12', '10.10.20.10')}})
 
         self.mock_linux_net.del_ip_route.assert_called_once_with(
             mock.ANY, addr, 100, self.veth_vrf, mask='32', via='10.10.20.10')
@@ -506,12 +576,8 @@ class TestEVPN(test_base.TestCase):
 
         addr = '10.10.10.10'
         routing_tables_routes = {
-            self.veth_vrf: [{
-                'ip': '10.10.10.11',
-                'mask': '32',
-                'mac': 'fe:12:34:56:89:12',
-                'via': '10.10.20.10',
-            }]
+            self.veth_vrf: {'10.10.10.11': evpn.VlanDevRoute(
+                '10.10.10.11', '32', 'fe:12:34:56:89:12', '10.10.20.10')}
         }
         mac = 'fe:12:34:56:89:12'
         vlan_dev__eval_disconnect = mock.patch.object(
@@ -519,12 +585,9 @@ class TestEVPN(test_base.TestCase):
 
         vlan_dev.del_route(routing_tables_routes, addr, mac)
 
-        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: [{
-            'ip': '10.10.10.11',
-            'mask': '32',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '10.10.20.10',
-        }]})
+        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: {
+            '10.10.10.11': evpn.VlanDevRoute(
+                '10.10.10.11', '32', 'fe:12:34:56:89:12', '10.10.20.10')}})
 
         self.mock_linux_net.del_ip_route.assert_called_once_with(
             mock.ANY, addr, 100, self.veth_vrf, mask=None, via=None)
@@ -538,28 +601,22 @@ class TestEVPN(test_base.TestCase):
         _, _, vlan_dev = self._create_bridge_and_vlan(mode='l2')
         vlan_dev._setup_done = True
 
-        routing_tables_routes = {self.veth_vrf: [{
-            'ip': '10.10.10.10',
-            'mask': '32',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '10.10.20.10',
-        }]}
+        routing_tables_routes = {self.veth_vrf: {
+            '10.10.10.10': evpn.VlanDevRoute(
+                '10.10.10.10', '32', 'fe:12:34:56:89:12', '10.10.20.10')}}
         ip = '10.10.10.10'
         mac = 'fe:12:34:56:89:12'
 
         vlan_dev.del_route(routing_tables_routes, ip, mac)
 
-        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: [{
-            'ip': '10.10.10.10',
-            'mask': '32',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '10.10.20.10',
-        }]})
+        self.assertDictEqual(routing_tables_routes, {self.veth_vrf: {
+            '10.10.10.10': evpn.VlanDevRoute(
+                '10.10.10.10', '32', 'fe:12:34:56:89:12', '10.10.20.10')}})
 
         self.mock_linux_net.del_ip_route.assert_not_called()
 
     def test_evpnbridge_vlan_cleanup_excessive_routes(self):
-        _, _, vlan_dev = self._create_bridge_and_vlan()
+        _, evpn_bridge, vlan_dev = self._create_bridge_and_vlan()
         vlan_dev._setup_done = True
 
         intf_idx = 1337
@@ -577,24 +634,45 @@ class TestEVPN(test_base.TestCase):
         }, {
             'attrs': [('RTA_DST', '198.51.100.158'), ('RTA_OIF', intf_idx)],
             'dst_len': 32, 'type': 1,
+        }, {
+            'attrs': [('RTA_DST', '198.51.100.0'), ('RTA_OIF', intf_idx)],
+            'dst_len': 28, 'type': 1,
         }])
-        self.mock_linux_net._get_table_routes.return_value = routes
-
-        routing_tables_routes = {self.veth_vrf: [{
-            'ip': '198.51.100.0',
-            'mask': '28',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '100.64.0.102',
-        }]}
+        # the routes of other devices on the table are not looked at
+        tables_routes = {evpn_bridge.vni: {intf_idx: routes,
+                                           intf_idx + 1: mock.Mock()}}
+
+        routing_tables_routes = {self.veth_vrf: {
+            '198.51.100.0': evpn.VlanDevRoute(
+                '198.51.100.0', '28', 'fe:12:34:56:89:12', '100.64.0.102')}}
         del_route = mock.patch.object(vlan_dev, 'del_route').start()
 
-        vlan_dev.cleanup_excessive_routes(routing_tables_routes)
+        vlan_dev.cleanup_excessive_routes(routing_tables_routes,
+                                          tables_routes=tables_routes)
 
         calls = [
             mock.call(mock.ANY, '198.51.100.136'),
             mock.call(mock.ANY, '198.51.100.158'),
         ]
         del_route.assert_has_calls(calls, any_order=True)
+        self.assertEqual(2, del_route.call_count)
+        self.assertEqual(
+            evpn.VlanDevRoute('198.51.100.136', 32, None, None),
+            routing_tables_routes[self.veth_vrf]['198.51.100.136'])
+        self.mock_linux_net.get_table_routes_by_oif.assert_not_called()
+
+    def test_evpnbridge_vlan_cleanup_excessive_routes_dump_once(self):
+        _, evpn_bridge, vlan_dev = self._create_bridge_and_vlan()
+        vlan_dev._setup_done = True
+        self.mock_linux_net.get_table_routes_by_oif.return_value = {}
+
+        tables_routes = {}
+        vlan_dev.cleanup_excessive_routes({}, tables_routes=tables_routes)
+        vlan_dev.cleanup_excessive_routes({}, tables_routes=tables_routes)
+
+        self.mock_linux_net.get_table_routes_by_oif.assert_called_once_with(
+            evpn_bridge.vni)
+        self.assertEqual({evpn_bridge.vni: {}}, tables_routes)
 
     def test_evpnbridge_vlan_cleanup_excessive_routes_in_sync(self):
         _, _, vlan_dev = self._create_bridge_and_vlan()
@@ -610,14 +688,12 @@ class TestEVPN(test_base.TestCase):
             ],
             'dst_len': 28, 'type': 1,
         }])
-        self.mock_linux_net._get_table_routes.return_value = routes
-
-        routing_tables_routes = {self.veth_vrf: [{
-            'ip': '198.51.100.0',
-            'mask': '28',
-            'mac': 'fe:12:34:56:89:12',
-            'via': '100.64.0.102',
-        }]}
+        self.mock_linux_net.get_table_routes_by_oif.return_value = {
+            intf_idx: routes}
+
+        routing_tables_routes = {self.veth_vrf: {
+            '198.51.100.0': evpn.VlanDevRoute(
+                '198.51.100.0', '28', 'fe:12:34:56:89:12', '100.64.0.102')}}
         del_route = mock.patch.object(vlan_dev, 'del_route').start()
 
         vlan_dev.cleanup_excessive_routes(routing_tables_routes)
@@ -626,22 +702,22 @@ class TestEVPN(test_base.TestCase):
     def test_evpnbridge_vlan_cleanup_excessive_routes_not_setup_yet(self):
         _, _, vlan_dev = self._create_bridge_and_vlan()
         vlan_dev.cleanup_excessive_routes({})
-        self.mock_linux_net._get_table_routes.assert_not_called()
+        self.mock_linux_net.get_table_routes_by_oif.assert_not_called()
 
     def test_evpn__find_route_info(self):
-        result = evpn._find_route_info([
-            {'ip': '198.51.100.136', 'mask': '32', 'mac': None, 'via': None},
-            {'ip': '198.51.100.158', 'mask': '24', 'mac': None, 'via': None},
-            {'ip': '127.0.0.1', 'mask': '8', 'mac': None, 'via': None},
-            {'ip': '198.51.100.0', 'mask': '28', 'mac': None, 'via': None},
-        ], '127.0.0.1')
-        self.assertDictEqual(result, {'ip': '127.0.0.1', 'mask': '8',
-                                      'mac': None, 'via': None})
+        routes = {ip: evpn.VlanDevRoute.create(ip, mask=mask)
+                  for ip, mask in [('198.51.100.136', '32'),
+                                   ('198.51.100.158', '24'),
+                                   ('127.0.0.1', '8'),
+                                   ('198.51.100.0', '28')]}
+        result = evpn._find_route_info(routes, '127.0.0.1')
+        self.assertEqual(evpn.VlanDevRoute('127.0.0.1', '8', None, None),
+                         result)
 
     def test_evpn__find_route_info_not_found(self):
-        result = evpn._find_route_info([], '127.0.0.1')
-        self.assertDictEqual(result, {'ip': '127.0.0.1', 'mask': None,
-                                      'mac': None, 'via': None})
+        result = evpn._find_route_info({}, '127.0.0.1')
+        self.assertEqual(evpn.VlanDevRoute('127.0.0.1', None, None, None),
+                         result)
 
     def test_evpn__ensure_list(self):
         self.assertListEqual(evpn._ensure_list(None), [])
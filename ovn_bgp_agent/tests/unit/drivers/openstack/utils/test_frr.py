@@ -16,10 +16,14 @@
 import tempfile
 from unittest import mock
 
+from oslo_config import cfg
+
 from ovn_bgp_agent import constants
 from ovn_bgp_agent.drivers.openstack.utils import frr as frr_utils
 from ovn_bgp_agent.tests import base as test_base
 
+CONF = cfg.CONF
+
 
 class TestFrr(test_base.TestCase):
 
@@ -55,6 +59,24 @@ class TestFrr(test_base.TestCase):
         # Assert the file was closed
         mock_tf.return_value.close.assert_called_once_with()
 
+    @mock.patch.object(tempfile, 'NamedTemporaryFile')
+    def test_vrf_leak_graceful_restart(self, mock_tf):
+        CONF.set_override('bgp_graceful_restart', True)
+        self.addCleanup(CONF.clear_override, 'bgp_graceful_restart')
+
+        frr_utils.vrf_leak('fake-vrf', 'fake-bgp-as', 'fake-router-id')
+
+        write_arg = mock_tf.return_value.write.call_args_list[0][0][0]
+        self.assertIn('bgp graceful-restart\n', write_arg)
+        self.assertIn('bgp graceful-restart preserve-fw-state', write_arg)
+
+    @mock.patch.object(tempfile, 'NamedTemporaryFile')
+    def test_vrf_leak_no_graceful_restart(self, mock_tf):
+        frr_utils.vrf_leak('fake-vrf', 'fake-bgp-as', 'fake-router-id')
+
+        write_arg = mock_tf.return_value.write.call_args_list[0][0][0]
+        self.assertNotIn('graceful-restart', write_arg)
+
     @mock.patch.object(frr_utils, '_get_router_id')
     @mock.patch.object(tempfile, 'NamedTemporaryFile')
     def test_vrf_leak_no_router_id(self, mock_tf, mock_gri):
@@ -92,6 +114,38 @@ class TestFrr(test_base.TestCase):
     def test_vrf_reconfigure_del_vrf(self):
         self._test_vrf_reconfigure(add_vrf=False)
 
+    @mock.patch.object(tempfile, 'NamedTemporaryFile')
+    def test_vrf_reconfigure_add_vrf_graceful_restart(self, mock_tf):
+        CONF.set_override('bgp_graceful_restart', True)
+        self.addCleanup(CONF.clear_override, 'bgp_graceful_restart')
+
+        frr_utils.vrf_reconfigure({'vni': '1001', 'bgp_as': 'fake-bgp-as'},
+                                  'add-vrf')
+
+        write_arg = mock_tf.return_value.write.call_args_list[0][0][0]
+        self.assertIn('bgp graceful-restart preserve-fw-state', write_arg)
+
+    @mock.patch.object(tempfile, 'NamedTemporaryFile')
+    def test_vrfs_reconfigure(self, mock_tf):
+        frr_utils.vrfs_reconfigure([{'vni': '1001', 'bgp_as': 'fake-bgp-as'},
+                                    {'vni': '1002', 'bgp_as': 'fake-bgp-as'}],
+                                   'add-vrf')
+
+        mock_tf.return_value.write.assert_called_once()
+        write_arg = mock_tf.return_value.write.call_args_list[0][0][0]
+        self.assertIn('\nvrf %s1001' % constants.OVN_EVPN_VRF_PREFIX,
+                      write_arg)
+        self.assertIn('\nvrf %s1002' % constants.OVN_EVPN_VRF_PREFIX,
+                      write_arg)
+        self.mock_vtysh.run_vtysh_config.assert_called_once_with(
+            mock_tf.return_value.name)
+
+    @mock.patch.object(tempfile, 'NamedTemporaryFile')
+    def test_vrfs_reconfigure_empty(self, mock_tf):
+        frr_utils.vrfs_reconfigure([], 'add-vrf')
+        mock_tf.assert_not_called()
+        self.mock_vtysh.run_vtysh_config.assert_not_called()
+
     def test_vrf_reconfigure_unknown_action(self):
         frr_utils.vrf_reconfigure({'fake': 'evpn-info'}, 'non-existing-action')
         # Assert run_vtysh_command() wasn't called
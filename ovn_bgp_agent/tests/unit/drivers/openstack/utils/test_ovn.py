@@ -25,10 +25,314 @@ from ovn_bgp_agent.drivers.openstack.utils import ovn as ovn_utils
 from ovn_bgp_agent import exceptions
 from ovn_bgp_agent.tests import base as test_base
 from ovn_bgp_agent.tests.unit import fakes
+from ovn_bgp_agent.utils import tracing
 
 CONF = cfg.CONF
 
 
+class TestNatAddressesIndex(test_base.TestCase):
+
+    def setUp(self):
+        super(TestNatAddressesIndex, self).setUp()
+        self.nat_index = ovn_utils.NatAddressesIndex()
+        self.pb_table = fakes.create_idl_table('Port_Binding')
+
+    def _create_patch_port(self, nat_addresses, **columns):
+        port = dict(logical_port='fake-patch-port', datapath='fake-dp',
+                    type=constants.OVN_PATCH_VIF_PORT_TYPE,
+                    nat_addresses=nat_addresses)
+        port.update(columns)
+        return fakes.create_idl_row(self.pb_table, **port)
+
+    def test_update(self):
+        row = self._create_patch_port([
+            'aa:bb:cc:dd:ee:ff 172.24.200.7 172.24.200.8 '
+            'is_chassis_resident("cr-lrp-fake-patch-port")',
+            'aa:bb:cc:dd:ee:fe 172.24.200.9 '
+            'is_chassis_resident("fake-port")'])
+        self.nat_index.update('create', row)
+
+        self.assertEqual(('172.24.200.9', row),
+                         self.nat_index.get_fip('fake-port'))
+        self.assertEqual(('172.24.200.7', row),
+                         self.nat_index.get_fip('cr-lrp-fake-patch-port'))
+        self.assertEqual(
+            (row, [(['172.24.200.7', '172.24.200.8'],
+                    'cr-lrp-fake-patch-port'),
+                   (['172.24.200.9'], 'fake-port')]),
+            self.nat_index.get_nat_addresses('fake-patch-port'))
+
+    def test_update_nat_address_removed(self):
+        row = self._create_patch_port([
+            'aa:bb:cc:dd:ee:fe 172.24.200.9 '
+            'is_chassis_resident("fake-port")'])
+        self.nat_index.update('create', row)
+        row.nat_addresses = []
+        self.nat_index.update('update', row)
+
+        self.assertEqual((None, None), self.nat_index.get_fip('fake-port'))
+        self.assertEqual((None, []),
+                         self.nat_index.get_nat_addresses('fake-patch-port'))
+
+    def test_update_delete(self):
+        row = self._create_patch_port([
+            'aa:bb:cc:dd:ee:fe 172.24.200.9 '
+            'is_chassis_resident("fake-port")'])
+        self.nat_index.update('create', row)
+        self.nat_index.update('delete', row)
+
+        self.assertEqual((None, None), self.nat_index.get_fip('fake-port'))
+        self.assertEqual((None, []),
+                         self.nat_index.get_nat_addresses('fake-patch-port'))
+
+    def test_update_not_patch_port(self):
+        row = self._create_patch_port(
+            ['aa:bb:cc:dd:ee:fe 172.24.200.9 '
+             'is_chassis_resident("fake-port")'],
+            type=constants.OVN_VM_VIF_PORT_TYPE)
+        self.nat_index.update('create', row)
+
+        self.assertEqual((None, None), self.nat_index.get_fip('fake-port'))
+
+    def test_update_without_resident_port(self):
+        row = self._create_patch_port(['aa:bb:cc:dd:ee:fe 172.24.200.9'])
+        self.nat_index.update('create', row)
+
+        self.assertEqual(
+            (row, [(['172.24.200.9'], None)]),
+            self.nat_index.get_nat_addresses('fake-patch-port'))
+
+    def test_get_fip_removed_while_disconnected(self):
+        row = self._create_patch_port([
+            'aa:bb:cc:dd:ee:fe 172.24.200.9 '
+            'is_chassis_resident("fake-port")'])
+        self.nat_index.update('create', row)
+        self.pb_table.rows.clear()
+
+        self.assertEqual((None, None), self.nat_index.get_fip('fake-port'))
+
+    def test_prune(self):
+        row = self._create_patch_port([
+            'aa:bb:cc:dd:ee:fe 172.24.200.9 '
+            'is_chassis_resident("fake-port")'])
+        other_row = self._create_patch_port([], logical_port='other-port')
+        for port in (row, other_row):
+            self.nat_index.update('create', port)
+        del self.pb_table.rows[row.uuid]
+
+        self.nat_index.prune({'Port_Binding': self.pb_table})
+
+        self.assertEqual({}, self.nat_index._nat_addresses)
+        self.assertEqual({}, self.nat_index._fips)
+        self.assertEqual({}, self.nat_index._indexed)
+
+    def test_get_fip_row_replaced_on_reconnect(self):
+        nat_addresses = ['aa:bb:cc:dd:ee:fe 172.24.200.9 '
+                         'is_chassis_resident("fake-port")']
+        row = self._create_patch_port(nat_addresses)
+        self.nat_index.update('create', row)
+        # the full dump after a reconnect brings a new row with the same uuid
+        new_row = self._create_patch_port(nat_addresses, uuid=row.uuid,
+                                          datapath='new-dp')
+
+        fip, patch_port = self.nat_index.get_fip('fake-port')
+        self.assertEqual('172.24.200.9', fip)
+        self.assertIs(new_row, patch_port)
+        self.assertIs(
+            new_row,
+            self.nat_index.get_nat_addresses('fake-patch-port')[0])
+
+
+class TestLocalnetIndex(test_base.TestCase):
+
+    def setUp(self):
+        super(TestLocalnetIndex, self).setUp()
+        self.localnet_index = ovn_utils.LocalnetIndex()
+        self.pb_table = fakes.create_idl_table('Port_Binding')
+
+    def _create_port(self, port_type=constants.OVN_LOCALNET_VIF_PORT_TYPE,
+                     datapath='fake-dp'):
+        return fakes.create_idl_row(self.pb_table, type=port_type,
+                                    datapath=datapath)
+
+    def test_update(self):
+        localnet = self._create_port()
+        other_localnet = self._create_port(datapath='other-dp')
+        for row in (localnet, other_localnet,
+                    self._create_port(constants.OVN_VM_VIF_PORT_TYPE)):
+            self.localnet_index.update('create', row)
+
+        self.assertEqual([localnet],
+                         self.localnet_index.get_localnets('fake-dp'))
+        self.assertCountEqual([localnet, other_localnet],
+                              self.localnet_index.get_localnets())
+
+    def test_update_delete(self):
+        localnet = self._create_port()
+        self.localnet_index.update('create', localnet)
+        self.localnet_index.update('delete', localnet)
+
+        self.assertEqual([], self.localnet_index.get_localnets('fake-dp'))
+        self.assertEqual([], self.localnet_index.get_localnets())
+
+    def test_update_type_changed(self):
+        port = self._create_port()
+        self.localnet_index.update('create', port)
+        port.type = constants.OVN_VM_VIF_PORT_TYPE
+        self.localnet_index.update('update', port)
+
+        self.assertEqual([], self.localnet_index.get_localnets('fake-dp'))
+
+    def test_get_localnets_removed_while_disconnected(self):
+        self.localnet_index.update('create', self._create_port())
+        self.pb_table.rows.clear()
+
+        self.assertEqual([], self.localnet_index.get_localnets('fake-dp'))
+
+    def test_prune(self):
+        localnet = self._create_port()
+        other_localnet = self._create_port(datapath='other-dp')
+        for row in (localnet, other_localnet):
+            self.localnet_index.update('create', row)
+        del self.pb_table.rows[localnet.uuid]
+
+        self.localnet_index.prune({'Port_Binding': self.pb_table})
+
+        self.assertEqual({'other-dp': {other_localnet.uuid: other_localnet}},
+                         self.localnet_index._localnets)
+        self.assertEqual({other_localnet.uuid: 'other-dp'},
+                         self.localnet_index._indexed)
+
+    def test_get_localnets_row_replaced_on_reconnect(self):
+        localnet = self._create_port()
+        self.localnet_index.update('create', localnet)
+        new_localnet = fakes.create_idl_row(
+            self.pb_table, uuid=localnet.uuid, type=localnet.type,
+            datapath='fake-dp')
+
+        localnets = self.localnet_index.get_localnets('fake-dp')
+        self.assertEqual(1, len(localnets))
+        self.assertIs(new_localnet, localnets[0])
+
+
+class TestOvnDbNotifyHandler(test_base.TestCase):
+
+    def setUp(self):
+        super(TestOvnDbNotifyHandler, self).setUp()
+        mock.patch.object(ovn_utils.OvnDbNotifyHandler, 'start').start()
+        self.handler = ovn_utils.OvnDbNotifyHandler(mock.Mock())
+
+    def _create_event(self, table, events, priority=20):
+        event = mock.Mock(table=table, events=events, priority=priority)
+        event.matches.return_value = True
+        return event
+
+    def _create_row(self, table):
+        return mock.Mock(_table=fakes.create_object({'name': table}))
+
+    def test_matching_events(self):
+        pb_update = self._create_event('Port_Binding', ('update',))
+        pb_update_delete = self._create_event('Port_Binding',
+                                              ('update', 'delete'), 10)
+        lb_update = self._create_event('Load_Balancer', ('update',))
+        pb_create = self._create_event('Port_Binding', ('create',))
+        self.handler.watch_events(
+            [pb_update, pb_update_delete, lb_update, pb_create])
+        row = self._create_row('Port_Binding')
+
+        ret = self.handler.matching_events('update', row, 'fake-old')
+
+        self.assertEqual((pb_update, pb_update_delete), ret)
+        pb_update.matches.assert_called_once_with('update', row, 'fake-old')
+        lb_update.matches.assert_not_called()
+        pb_create.matches.assert_not_called()
+
+    def test_matching_events_not_matched(self):
+        pb_update = self._create_event('Port_Binding', ('update',))
+        pb_update.matches.return_value = False
+        self.handler.watch_event(pb_update)
+
+        self.assertEqual((), self.handler.matching_events(
+            'update', self._create_row('Port_Binding'), None))
+
+    def test_matching_events_watched_events_changed(self):
+        pb_update = self._create_event('Port_Binding', ('update',))
+        self.handler.watch_event(pb_update)
+        row = self._create_row('Port_Binding')
+        self.assertEqual((pb_update,),
+                         self.handler.matching_events('update', row, None))
+
+        pb_update2 = self._create_event('Port_Binding', ('update',), 10)
+        self.handler.watch_event(pb_update2)
+        self.assertEqual((pb_update, pb_update2),
+                         self.handler.matching_events('update', row, None))
+
+        self.handler.unwatch_event(pb_update)
+        self.assertEqual((pb_update2,),
+                         self.handler.matching_events('update', row, None))
+
+    @mock.patch.object(tracing, 'start_trace', return_value=None)
+    def test_notify(self, mock_start_trace):
+        pb_update = self._create_event('Port_Binding', ('update',))
+        self.handler.watch_event(pb_update)
+        row = self._create_row('Port_Binding')
+
+        self.handler.notify('update', row, 'fake-old')
+
+        self.assertEqual((pb_update, 'update', row, 'fake-old'),
+                         self.handler.notifications.get_nowait())
+        mock_start_trace.assert_called_once_with(
+            'ovsdb.notify',
+            {'ovsdb.table': 'Port_Binding', 'ovsdb.event': 'update',
+             'ovsdb.row': row.uuid},
+            idl=None)
+
+    @mock.patch.object(tracing, 'start_trace')
+    def test_notify_traced(self, mock_start_trace):
+        trace = mock_start_trace.return_value
+        pb_update = self._create_event('Port_Binding', ('update',))
+        pb_update.ONETIME = False
+        pb_update.event_name = 'FakeEvent'
+        pb_wait = self._create_event('Port_Binding', ('update',), 10)
+        pb_wait.ONETIME = True
+        pb_wait.event_name = 'FakeWaitEvent'
+        self.handler.watch_events([pb_update, pb_wait])
+        row = self._create_row('Port_Binding')
+
+        self.handler.notify('update', row, 'fake-old')
+
+        trace.activate.assert_called_once_with('ovsdb.match_events')
+        trace.hold.assert_called_once_with()
+        traced_event, event, notified_row, old = (
+            self.handler.notifications.get_nowait())
+        self.assertEqual(('update', row, 'fake-old'),
+                         (event, notified_row, old))
+        self.assertEqual(
+            (pb_wait, 'update', row, 'fake-old'),
+            self.handler.notifications.get_nowait())
+        self.assertFalse(traced_event.ONETIME)
+
+        trace.activate.reset_mock()
+        traced_event.run('update', row, 'fake-old')
+
+        trace.activate.assert_called_once_with('event.run',
+                                               {'event': 'FakeEvent'})
+        pb_update.run.assert_called_once_with('update', row, 'fake-old')
+        trace.release.assert_called_once_with()
+
+    @mock.patch.object(tracing, 'start_trace')
+    def test_notify_traced_not_matched(self, mock_start_trace):
+        trace = mock_start_trace.return_value
+        pb_update = self._create_event('Port_Binding', ('update',))
+        pb_update.matches.return_value = False
+        self.handler.watch_event(pb_update)
+
+        self.handler.notify('update', self._create_row('Port_Binding'))
+
+        self.assertTrue(self.handler.notifications.empty())
+        trace.hold.assert_not_called()
+
+
 class TestOvsdbNbOvnIdl(test_base.TestCase):
 
     def setUp(self):
@@ -237,6 +541,9 @@ class TestOvsdbNbOvnIdl(test_base.TestCase):
 
 
 class TestOvsdbSbOvnIdl(test_base.TestCase):
+    INDEXES = {'lb_index': ovn_utils.LoadBalancerIndex,
+               'nat_index': ovn_utils.NatAddressesIndex,
+               'localnet_index': ovn_utils.LocalnetIndex}
 
     def setUp(self):
         super(TestOvsdbSbOvnIdl, self).setUp()
@@ -246,6 +553,15 @@ class TestOvsdbSbOvnIdl(test_base.TestCase):
         self.sb_idl.db_find_rows = mock.Mock()
         self.sb_idl.db_list_rows = mock.Mock()
 
+        self.lb_table = fakes.create_idl_table('Load_Balancer')
+        self.pb_table = fakes.create_idl_table('Port_Binding')
+        self.datapath = fakes.create_idl_row('Datapath_Binding')
+
+    def _create_index(self, name):
+        index = self.INDEXES[name]()
+        setattr(self.sb_idl.ovsdb_connection.idl, name, index)
+        return index
+
     def test_get_port_by_name(self):
         fake_p_info = 'fake-port-info'
         port = 'fake-port'
@@ -298,46 +614,105 @@ class TestOvsdbSbOvnIdl(test_base.TestCase):
         self.sb_idl.db_find_rows.assert_called_once_with(
             'Port_Binding', ('type', '=', port_type))
 
+    def _create_localnet(self, localnet_index, datapath, network='public',
+                         tag=None):
+        row = fakes.create_idl_row(
+            self.pb_table, logical_port='provnet-%s' % network,
+            type=constants.OVN_LOCALNET_VIF_PORT_TYPE, datapath=datapath,
+            options={'network_name': network}, tag=tag or [])
+        localnet_index.update('create', row)
+        return row
+
     def test_is_provider_network(self):
-        dp = 'fake-datapath'
-        self.sb_idl.db_find_rows.return_value.execute.return_value = ['fake']
-        self.assertTrue(self.sb_idl.is_provider_network(dp))
-        self.sb_idl.db_find_rows.assert_called_once_with(
-            'Port_Binding', ('datapath', '=', dp),
-            ('type', '=', constants.OVN_LOCALNET_VIF_PORT_TYPE))
+        localnet_index = self._create_index('localnet_index')
+        self._create_localnet(localnet_index, self.datapath)
+        self.assertTrue(self.sb_idl.is_provider_network(self.datapath))
+        self.sb_idl.db_find_rows.assert_not_called()
 
     def test_is_provider_network_false(self):
-        dp = 'fake-datapath'
-        self.sb_idl.db_find_rows.return_value.execute.return_value = []
-        self.assertFalse(self.sb_idl.is_provider_network(dp))
-        self.sb_idl.db_find_rows.assert_called_once_with(
-            'Port_Binding', ('datapath', '=', dp),
-            ('type', '=', constants.OVN_LOCALNET_VIF_PORT_TYPE))
+        self._create_index('localnet_index')
+        self.assertFalse(self.sb_idl.is_provider_network(self.datapath))
+
+    def test_is_provider_network_datapath_removed(self):
+        self._create_index('localnet_index')
+        self.datapath._table.rows.clear()
+        self.assertRaises(exceptions.DatapathNotFound,
+                          self.sb_idl.is_provider_network, self.datapath)
+
+    def test_is_provider_network_datapath_replaced_on_reconnect(self):
+        localnet_index = self._create_index('localnet_index')
+        self._create_localnet(localnet_index, self.datapath)
+        # the datapath row held by the driver is not the IDL one anymore
+        fakes.create_idl_row(self.datapath._table, uuid=self.datapath.uuid)
+        self.assertTrue(self.sb_idl.is_provider_network(self.datapath))
+
+    def test_get_localnet_for_datapath(self):
+        localnet_index = self._create_index('localnet_index')
+        self._create_localnet(localnet_index, self.datapath)
+        self.assertEqual(
+            'provnet-public',
+            self.sb_idl.get_localnet_for_datapath(self.datapath))
+
+    def test_get_localnet_for_datapath_not_found(self):
+        self._create_index('localnet_index')
+        self.assertEqual(
+            [], self.sb_idl.get_localnet_for_datapath(self.datapath))
 
     def test_get_fip_associated(self):
+        nat_index = self._create_index('nat_index')
         port = '1ad5f7e1-fcca-4791-bf50-120c4c73e602'
         datapath = '3e2dc454-6970-4419-9132-b3593d19cdfa'
         fip = '172.24.200.7'
-        row = fakes.create_object({
-            'datapath': datapath,
-            'nat_addresses': ['aa:bb:cc:dd:ee:ff {} is_chassis_resident('
-                              '"cr-lrp-{}")'.format(fip, port)]})
-        self.sb_idl.db_find_rows.return_value.execute.return_value = [row]
+        row = fakes.create_idl_row(
+            self.pb_table, logical_port='fake-patch-port',
+            type=constants.OVN_PATCH_VIF_PORT_TYPE, datapath=datapath,
+            nat_addresses=['aa:bb:cc:dd:ee:ff {} is_chassis_resident('
+                           '"{}")'.format(fip, port)])
+        nat_index.update('create', row)
         fip_addr, fip_dp = self.sb_idl.get_fip_associated(port)
 
         self.assertEqual(fip, fip_addr)
         self.assertEqual(datapath, fip_dp)
-        self.sb_idl.db_find_rows.assert_called_once_with(
-            'Port_Binding', ('type', '=', constants.OVN_PATCH_VIF_PORT_TYPE))
+        self.sb_idl.db_find_rows.assert_not_called()
 
     def test_get_fip_associated_not_found(self):
-        self.sb_idl.db_find_rows.return_value.execute.return_value = []
+        self._create_index('nat_index')
         fip_addr, fip_dp = self.sb_idl.get_fip_associated('fake-port')
 
         self.assertIsNone(fip_addr)
         self.assertIsNone(fip_dp)
-        self.sb_idl.db_find_rows.assert_called_once_with(
-            'Port_Binding', ('type', '=', constants.OVN_PATCH_VIF_PORT_TYPE))
+
+    def test_get_cr_lrp_nat_addresses_info(self):
+        nat_index = self._create_index('nat_index')
+        row = fakes.create_idl_row(
+            self.pb_table, logical_port='fake-patch-port',
+            type=constants.OVN_PATCH_VIF_PORT_TYPE, datapath='fake-dp',
+            nat_addresses=[
+                'aa:bb:cc:dd:ee:ff 172.24.200.7 172.24.200.8 '
+                'is_chassis_resident("cr-lrp-fake-patch-port")',
+                'aa:bb:cc:dd:ee:fe 172.24.200.9 '
+                'is_chassis_resident("fake-port")'])
+        nat_index.update('create', row)
+        sb_idl = mock.Mock()
+        sb_idl.is_port_on_chassis.side_effect = (True, False)
+
+        ret = self.sb_idl.get_cr_lrp_nat_addresses_info(
+            'cr-lrp-fake-patch-port', 'fake-chassis', sb_idl)
+
+        self.assertEqual((['172.24.200.7', '172.24.200.8'], row), ret)
+        sb_idl.is_port_on_chassis.assert_has_calls([
+            mock.call('cr-lrp-fake-patch-port', 'fake-chassis'),
+            mock.call('fake-port', 'fake-chassis')])
+
+    def test_get_cr_lrp_nat_addresses_info_not_found(self):
+        self._create_index('nat_index')
+        sb_idl = mock.Mock()
+
+        ret = self.sb_idl.get_cr_lrp_nat_addresses_info(
+            'cr-lrp-fake-patch-port', 'fake-chassis', sb_idl)
+
+        self.assertEqual(([], None), ret)
+        sb_idl.is_port_on_chassis.assert_not_called()
 
     def _test_is_port_on_chassis(self, should_match=True):
         chassis_name = 'fake-chassis'
@@ -449,22 +824,19 @@ class TestOvsdbSbOvnIdl(test_base.TestCase):
             m_dp.assert_called_once_with('port-peer')
 
     def _test_get_network_name_and_tag(self, network_in_bridge_map=True):
-        tag = 1001
+        localnet_index = self._create_index('localnet_index')
+        tag = [1001]
         network = 'public' if network_in_bridge_map else 'spongebob'
-        with mock.patch.object(self.sb_idl, 'get_ports_on_datapath') as m_dp:
-            row = fakes.create_object({
-                'options': {'network_name': network},
-                'tag': tag})
-            m_dp.return_value = [row, ]
-            net_name, net_tag = self.sb_idl.get_network_name_and_tag(
-                'fake-dp', 'br-ex:public')
+        self._create_localnet(localnet_index, self.datapath, network, tag)
+        net_name, net_tag = self.sb_idl.get_network_name_and_tag(
+            self.datapath, 'br-ex:public')
 
-            if network_in_bridge_map:
-                self.assertEqual(network, net_name)
-                self.assertEqual(tag, net_tag)
-            else:
-                self.assertIsNone(net_name)
-                self.assertIsNone(net_tag)
+        if network_in_bridge_map:
+            self.assertEqual(network, net_name)
+            self.assertEqual(tag, net_tag)
+        else:
+            self.assertIsNone(net_name)
+            self.assertIsNone(net_tag)
 
     def test_get_network_name_and_tag(self):
         self._test_get_network_name_and_tag()
@@ -473,20 +845,18 @@ class TestOvsdbSbOvnIdl(test_base.TestCase):
         self._test_get_network_name_and_tag(network_in_bridge_map=False)
 
     def test_get_netweork_vlan_tags(self):
-        tag = [1001]
-        row = fakes.create_object({'tag': tag})
-        self.sb_idl.db_find_rows.return_value.execute.return_value = [row, ]
+        localnet_index = self._create_index('localnet_index')
+        self._create_localnet(localnet_index, self.datapath, tag=[1001])
+        self._create_localnet(localnet_index, 'other-dp', 'flat')
 
         ret = self.sb_idl.get_network_vlan_tags()
-        self.assertEqual(tag, ret)
+        self.assertEqual([1001], ret)
 
     def _test_get_network_vlan_tag_by_network_name(self, match=True):
+        localnet_index = self._create_index('localnet_index')
         network = 'public' if match else 'spongebob'
         tag = [1001]
-        row = fakes.create_object({
-            'options': {'network_name': 'public'},
-            'tag': tag})
-        self.sb_idl.db_find_rows.return_value.execute.return_value = [row, ]
+        self._create_localnet(localnet_index, self.datapath, tag=tag)
 
         ret = self.sb_idl.get_network_vlan_tag_by_network_name(network)
         if match:
@@ -718,79 +1088,240 @@ class TestOvsdbSbOvnIdl(test_base.TestCase):
 
             self.assertEqual([port1], ret)
 
+    def _create_vip_port(self, lb_index, lb_name, datapath, cidrs):
+        row = fakes.create_idl_row(
+            self.pb_table, logical_port='fake-port-%s' % lb_name,
+            type=constants.OVN_VM_VIF_PORT_TYPE, chassis=[], mac=[],
+            up=[False], datapath=datapath,
+            external_ids={constants.OVN_CIDRS_EXT_ID_KEY: cidrs,
+                          constants.OVN_PORT_NAME_EXT_ID_KEY:
+                          constants.LB_VIP_PORT_PREFIX + lb_name})
+        lb_index.update('create', row)
+        return row
+
     def test_get_ovn_lb(self):
-        fake_lb_info = 'fake-lbinfo'
-        lb = 'fake-lb'
-        self.sb_idl.db_find_rows.return_value.execute.return_value = [
-            fake_lb_info]
-        ret = self.sb_idl.get_ovn_lb(lb)
+        lb_index = self._create_index('lb_index')
+        lb = fakes.create_idl_row(self.lb_table, name='fake-lb')
+        lb_index.update('create', lb)
 
-        self.assertEqual(fake_lb_info, ret)
-        self.sb_idl.db_find_rows.assert_called_once_with(
-            'Load_Balancer', ('name', '=', lb))
+        self.assertEqual(lb, self.sb_idl.get_ovn_lb('fake-lb'))
+        self.sb_idl.db_find_rows.assert_not_called()
 
     def test_get_ovn_lb_empty(self):
-        lb = 'fake-port'
-        self.sb_idl.db_find_rows.return_value.execute.return_value = []
-        ret = self.sb_idl.get_ovn_lb(lb)
-
-        self.assertEqual([], ret)
-        self.sb_idl.db_find_rows.assert_called_once_with(
-            'Load_Balancer', ('name', '=', lb))
+        self._create_index('lb_index')
+        self.assertEqual([], self.sb_idl.get_ovn_lb('fake-lb'))
 
     def test_get_provider_ovn_lbs_on_cr_lrp(self):
-        lb1_name = 'ovn-lb-vip-fake-lb1'
-        lb2_name = 'ovn-lb-vip-fake-lb2'
+        lb_index = self._create_index('lb_index')
         provider_dp = 'fake-provider-dp'
-        router_dp = ['fake-router-dp']
-        router_lrp = 'fake-router-lrp'
+        router_dp = 'fake-router-dp'
         dp1 = fakes.create_object({'datapaths': ['fake-subnet-dp']})
-        lb1 = fakes.create_object({'datapath_group': [dp1],
-                                   'name': 'fake-lb1'})
-        port0 = fakes.create_object({
-            'logical_port': 'fake-port-0',
-            'external_ids': {constants.OVN_CIDRS_EXT_ID_KEY: '10.0.0.15/24',
-                             constants.OVN_PORT_NAME_EXT_ID_KEY: lb1_name}})
-        port1 = fakes.create_object({
-            'logical_port': 'fake-port-1',
-            'external_ids': {constants.OVN_CIDRS_EXT_ID_KEY: '10.0.0.16/24'}})
-        port2 = fakes.create_object({
-            'logical_port': 'fake-port-0',
-            'external_ids': {constants.OVN_CIDRS_EXT_ID_KEY: '10.0.0.17/24',
-                             constants.OVN_PORT_NAME_EXT_ID_KEY: lb2_name}})
-
-        self.sb_idl.db_find_rows.return_value.execute.return_value = [
-            port0, port1, port2]
-
-        mock_lb = mock.patch.object(self.sb_idl, 'get_ovn_lb').start()
-        mock_lb.side_effect = (lb1, [])
-
-        mock_lrp = mock.patch.object(self.sb_idl,
-                                     'get_lrps_for_datapath').start()
-        mock_lrp.return_value = [router_lrp]
-
-        mock_get_port_dp = mock.patch.object(self.sb_idl,
-                                             'get_port_datapath').start()
-        mock_get_port_dp.return_value = router_dp
+        lb1 = fakes.create_idl_row(self.lb_table, datapath_group=[dp1],
+                                   name='fake-lb1')
+        lb3 = fakes.create_idl_row(
+            self.lb_table, datapath_group=[],
+            lr_datapath_group=[fakes.create_object(
+                {'datapaths': ['other-router-dp']})],
+            ls_datapath_group=[dp1], name='fake-lb3')
+        for lb in (lb1, lb3):
+            lb_index.update('create', lb)
+        # lb2 has no Load_Balancer row and lb4 VIP is on another datapath
+        self._create_vip_port(lb_index, 'fake-lb1', provider_dp,
+                              '10.0.0.15/24')
+        self._create_vip_port(lb_index, 'fake-lb2', provider_dp,
+                              '10.0.0.17/24')
+        self._create_vip_port(lb_index, 'fake-lb3', provider_dp,
+                              '10.0.0.18/24')
+        self._create_vip_port(lb_index, 'fake-lb4', 'other-provider-dp',
+                              '10.0.0.19/24')
+        lrp = fakes.create_idl_row(
+            self.pb_table, logical_port='fake-router-lrp',
+            type=constants.OVN_PATCH_VIF_PORT_TYPE, datapath=router_dp,
+            options={'peer': 'fake-lsp'})
+        lsp = fakes.create_idl_row(
+            self.pb_table, logical_port='fake-lsp',
+            type=constants.OVN_PATCH_VIF_PORT_TYPE, datapath='fake-subnet-dp',
+            options={'peer': 'fake-router-lrp'})
+        for port in (lrp, lsp):
+            lb_index.update('create', port)
 
         ret = self.sb_idl.get_provider_ovn_lbs_on_cr_lrp(provider_dp,
                                                          router_dp)
         expected_return = {'fake-lb1': '10.0.0.15'}
         self.assertEqual(expected_return, ret)
+        self.sb_idl.db_find_rows.assert_not_called()
 
     def test_get_ovn_vip_port(self):
-        lb_name = 'ovn-lb-vip-fake-lb'
-        lb1 = fakes.create_object(
-            {'external_ids': {
-                constants.OVN_PORT_NAME_EXT_ID_KEY: 'different-name'}})
-        lb2 = fakes.create_object(
-            {'external_ids': {constants.OVN_PORT_NAME_EXT_ID_KEY: lb_name}})
+        lb_index = self._create_index('lb_index')
+        self._create_vip_port(lb_index, 'different-name', 'fake-dp',
+                              '10.0.0.15/24')
+        vip_port = self._create_vip_port(lb_index, 'fake-lb', 'fake-dp',
+                                         '10.0.0.16/24')
+
+        self.assertEqual(vip_port, self.sb_idl.get_ovn_vip_port('fake-lb'))
+        self.assertIsNone(self.sb_idl.get_ovn_vip_port('fake-lb2'))
 
-        self.sb_idl.db_find_rows.return_value.execute.return_value = [
-            lb1, lb2]
-        ret = self.sb_idl.get_ovn_vip_port('fake-lb')
 
-        self.assertEqual(lb2, ret)
+class TestLoadBalancerIndex(test_base.TestCase):
+
+    def setUp(self):
+        super(TestLoadBalancerIndex, self).setUp()
+        self.lb_index = ovn_utils.LoadBalancerIndex()
+        self.lb_table = fakes.create_idl_table('Load_Balancer')
+        self.pb_table = fakes.create_idl_table('Port_Binding')
+
+    def _create_vip_port(self, lb_name='fake-lb', datapath='fake-dp',
+                         **columns):
+        port = dict(logical_port='fake-port', datapath=datapath,
+                    type=constants.OVN_VM_VIF_PORT_TYPE, chassis=[], mac=[],
+                    up=[False],
+                    external_ids={constants.OVN_PORT_NAME_EXT_ID_KEY:
+                                  constants.LB_VIP_PORT_PREFIX + lb_name})
+        port.update(columns)
+        return fakes.create_idl_row(self.pb_table, **port)
+
+    def _create_patch_port(self, logical_port, datapath, peer, **columns):
+        return fakes.create_idl_row(
+            self.pb_table, logical_port=logical_port,
+            type=constants.OVN_PATCH_VIF_PORT_TYPE, datapath=datapath,
+            options={'peer': peer}, **columns)
+
+    def test_update_lb(self):
+        lb = fakes.create_idl_row(self.lb_table, name='fake-lb')
+        self.lb_index.update('create', lb)
+        self.assertEqual(lb, self.lb_index.get_lb('fake-lb'))
+
+        self.lb_index.update('delete', lb)
+        self.assertIsNone(self.lb_index.get_lb('fake-lb'))
+
+    def test_update_lb_renamed(self):
+        lb = fakes.create_idl_row(self.lb_table, name='fake-lb')
+        self.lb_index.update('create', lb)
+        lb.name = 'fake-lb2'
+        self.lb_index.update('update', lb)
+
+        self.assertIsNone(self.lb_index.get_lb('fake-lb'))
+        self.assertEqual(lb, self.lb_index.get_lb('fake-lb2'))
+
+    def test_update_vip_port(self):
+        port = self._create_vip_port()
+        self.lb_index.update('create', port)
+        self.assertEqual(port, self.lb_index.get_vip_port('fake-lb'))
+        self.assertEqual({'fake-lb': port},
+                         self.lb_index.get_vip_ports_on_datapath('fake-dp'))
+
+        self.lb_index.update('delete', port)
+        self.assertIsNone(self.lb_index.get_vip_port('fake-lb'))
+        self.assertEqual({},
+                         self.lb_index.get_vip_ports_on_datapath('fake-dp'))
+
+    def test_update_vip_port_bound(self):
+        port = self._create_vip_port()
+        self.lb_index.update('create', port)
+        port.chassis = ['fake-chassis']
+        port.up = [True]
+        self.lb_index.update('update', port)
+
+        self.assertIsNone(self.lb_index.get_vip_port('fake-lb'))
+        self.assertEqual({},
+                         self.lb_index.get_vip_ports_on_datapath('fake-dp'))
+
+    def test_update_not_vip_port(self):
+        for port in (self._create_vip_port(mac=['fake-mac']),
+                     self._create_vip_port(up=[]),
+                     self._create_vip_port(external_ids={})):
+            self.lb_index.update('create', port)
+
+        self.assertIsNone(self.lb_index.get_vip_port('fake-lb'))
+
+    def test_update_other_table(self):
+        row = fakes.create_idl_row('Datapath_Binding', name='fake-lb')
+        self.lb_index.update('create', row)
+        self.assertIsNone(self.lb_index.get_lb('fake-lb'))
+
+    def test_get_vip_port_removed_while_disconnected(self):
+        port = self._create_vip_port()
+        self.lb_index.update('create', port)
+        self.pb_table.rows.clear()
+
+        self.assertIsNone(self.lb_index.get_vip_port('fake-lb'))
+        self.assertEqual({},
+                         self.lb_index.get_vip_ports_on_datapath('fake-dp'))
+
+    def test_prune(self):
+        lb = fakes.create_idl_row(self.lb_table, name='fake-lb')
+        port = self._create_vip_port()
+        peers = [self._create_patch_port('lrp-1', 'router-dp', 'lsp-1'),
+                 self._create_patch_port('lsp-1', 'ls-dp', 'lrp-1')]
+        for row in [lb, port] + peers:
+            self.lb_index.update('create', row)
+        # deleted while the IDL was disconnected
+        self.lb_table.rows.clear()
+        self.pb_table.rows.clear()
+
+        self.lb_index.prune({'Load_Balancer': self.lb_table,
+                             'Port_Binding': self.pb_table})
+
+        self.assertEqual({}, self.lb_index._lbs)
+        self.assertEqual({}, self.lb_index._vip_ports)
+        self.assertEqual({}, self.lb_index._vip_ports_by_dp)
+        self.assertEqual({}, self.lb_index._patch_ports)
+        self.assertEqual({}, self.lb_index._patch_peers)
+        self.assertEqual({}, self.lb_index._indexed)
+
+    def test_prune_rows_still_there(self):
+        lb = fakes.create_idl_row(self.lb_table, name='fake-lb')
+        port = self._create_vip_port()
+        for row in (lb, port):
+            self.lb_index.update('create', row)
+
+        self.lb_index.prune({'Load_Balancer': self.lb_table,
+                             'Port_Binding': self.pb_table})
+
+        self.assertEqual(lb, self.lb_index.get_lb('fake-lb'))
+        self.assertEqual(port, self.lb_index.get_vip_port('fake-lb'))
+
+    def test_get_rows_replaced_on_reconnect(self):
+        lb = fakes.create_idl_row(self.lb_table, name='fake-lb')
+        port = self._create_vip_port()
+        peer = self._create_patch_port('lrp-1', 'router-dp', 'lsp-1')
+        for row in (lb, port, peer,
+                    self._create_patch_port('lsp-1', 'ls-dp', 'lrp-1')):
+            self.lb_index.update('create', row)
+        # the full dump after a reconnect brings new rows with the same uuid
+        new_lb = fakes.create_idl_row(self.lb_table, uuid=lb.uuid,
+                                      name='fake-lb')
+        new_port = self._create_vip_port(uuid=port.uuid)
+        self._create_patch_port('lrp-1', 'new-router-dp', 'lsp-1',
+                                uuid=peer.uuid)
+
+        self.assertIs(new_lb, self.lb_index.get_lb('fake-lb'))
+        self.assertIs(new_port, self.lb_index.get_vip_port('fake-lb'))
+        self.assertEqual({'fake-lb': new_port},
+                         self.lb_index.get_vip_ports_on_datapath('fake-dp'))
+        self.assertEqual(['new-router-dp'],
+                         self.lb_index.get_router_datapaths('ls-dp'))
+
+    def test_get_router_datapaths(self):
+        ports = [self._create_patch_port('lrp-1', 'router-dp', 'lsp-1'),
+                 self._create_patch_port('lsp-1', 'ls-dp', 'lrp-1'),
+                 self._create_patch_port('lsp-2', 'ls-dp', 'lrp-2')]
+        for port in ports:
+            self.lb_index.update('create', port)
+
+        self.assertEqual(['router-dp'],
+                         self.lb_index.get_router_datapaths('ls-dp'))
+
+        self.lb_index.update('delete', ports[0])
+        self.assertEqual([], self.lb_index.get_router_datapaths('ls-dp'))
+
+    def test_get_router_datapaths_removed_while_disconnected(self):
+        for port in (self._create_patch_port('lrp-1', 'router-dp', 'lsp-1'),
+                     self._create_patch_port('lsp-1', 'ls-dp', 'lrp-1')):
+            self.lb_index.update('create', port)
+        self.pb_table.rows.clear()
+
+        self.assertEqual([], self.lb_index.get_router_datapaths('ls-dp'))
 
 
 class TestOvnNbIdl(test_base.TestCase):
@@ -863,3 +1394,75 @@ class TestOvnSbIdl(test_base.TestCase):
         mock_conn.assert_called_once_with(self.sb_idl, timeout=180)
         notify_handler.watch_events.assert_called_once_with(
             ['fake-event0', 'fake-event1'])
+
+    def test_notify(self):
+        self.sb_idl.notify_handler = mock.Mock()
+        self.sb_idl.lb_index = mock.Mock()
+        self.sb_idl.nat_index = mock.Mock()
+        self.sb_idl.localnet_index = mock.Mock()
+        row = mock.Mock()
+
+        self.sb_idl.notify('update', row, 'fake-updates')
+
+        self.sb_idl.lb_index.update.assert_called_once_with('update', row)
+        self.sb_idl.nat_index.update.assert_called_once_with('update', row)
+        self.sb_idl.localnet_index.update.assert_called_once_with(
+            'update', row)
+        self.sb_idl.notify_handler.notify.assert_called_once_with(
+            'update', row, 'fake-updates')
+
+    def _test_run(self, state, pruned):
+        self.sb_idl.state = state
+        self.sb_idl.tables = {
+            'Port_Binding': fakes.create_idl_table('Port_Binding')}
+        indexes = [mock.Mock(), mock.Mock(), mock.Mock()]
+        (self.sb_idl.lb_index, self.sb_idl.nat_index,
+         self.sb_idl.localnet_index) = indexes
+
+        def _run():
+            self.sb_idl.state = self.sb_idl.IDL_S_MONITORING
+            return True
+
+        with mock.patch.object(connection.OvsdbIdl, 'run', side_effect=_run):
+            self.assertTrue(self.sb_idl.run())
+
+        for index in indexes:
+            if pruned:
+                index.prune.assert_called_once_with(self.sb_idl.tables)
+            else:
+                index.prune.assert_not_called()
+
+    def test_run_reconnected(self):
+        self._test_run(self.sb_idl.IDL_S_DATA_MONITOR_COND_REQUESTED, True)
+
+    def test_run_monitoring(self):
+        self._test_run(self.sb_idl.IDL_S_MONITORING, False)
+
+    def test_notify_changes_count(self):
+        self.sb_idl.notify_handler = mock.Mock()
+        self.sb_idl.nat_index = mock.Mock()
+        self.sb_idl.localnet_index = mock.Mock()
+        port = fakes.create_idl_row('Port_Binding')
+        chassis_private = fakes.create_idl_row('Chassis_Private')
+        self.assertEqual(0, self.sb_idl.changes_count)
+
+        self.sb_idl.notify('create', port)
+        self.sb_idl.notify('update', port)
+        self.sb_idl.notify('delete', port)
+        self.assertEqual(3, self.sb_idl.changes_count)
+
+        # periodic updates are not counted, but creations are
+        self.sb_idl.notify('update', chassis_private)
+        self.assertEqual(3, self.sb_idl.changes_count)
+        self.sb_idl.notify('create', chassis_private)
+        self.assertEqual(4, self.sb_idl.changes_count)
+
+    def test_notify_without_lb_index(self):
+        self.sb_idl.notify_handler = mock.Mock()
+        self.sb_idl.nat_index = mock.Mock()
+        self.sb_idl.localnet_index = mock.Mock()
+        self.assertIsNone(self.sb_idl.lb_index)
+
+        self.sb_idl.notify('update', mock.Mock(), None)
+
+        self.sb_idl.notify_handler.notify.assert_called_once()
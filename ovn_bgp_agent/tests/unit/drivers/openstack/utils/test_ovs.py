@@ -22,6 +22,7 @@ from ovn_bgp_agent import constants
 from ovn_bgp_agent.drivers.openstack.utils import ovs as ovs_utils
 from ovn_bgp_agent import exceptions as agent_exc
 from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.tests.unit import fakes
 from ovn_bgp_agent.utils import linux_net
 
 
@@ -65,6 +66,30 @@ class TestOVS(test_base.TestCase):
     def test_get_bridge_flows_with_filters(self):
         self._test_get_bridge_flows(has_filter=True)
 
+    def test_get_bridge_flows_fingerprint(self):
+        flow = (' {}, duration={}s, table=0, n_packets={}, n_bytes={}, '
+                'idle_age={}, priority=900,ip,in_port=1 '
+                'actions=mod_dl_dst:{},NORMAL')
+        self.mock_ovs_vsctl.ovs_ofctl.side_effect = [
+            ['HEADER\n%s\n' % flow.format(
+                self.cookie, 1.2, 1, 10, 3, self.mac)],
+            ['HEADER\n%s\n' % flow.format(
+                self.cookie, 5.3, 7, 70, 0, self.mac)],
+            ['HEADER\n%s\n' % flow.format(
+                self.cookie, 5.3, 7, 70, 0, 'aa:aa:aa:aa:aa:aa')]]
+
+        ret = ovs_utils.get_bridge_flows_fingerprint(self.bridge, self.cookie)
+
+        self.mock_ovs_vsctl.ovs_ofctl.assert_called_once_with(
+            ['dump-flows', self.bridge, self.cookie_id])
+        # only the flow statistics changed
+        self.assertEqual(
+            ret, ovs_utils.get_bridge_flows_fingerprint(self.bridge,
+                                                        self.cookie))
+        self.assertNotEqual(
+            ret, ovs_utils.get_bridge_flows_fingerprint(self.bridge,
+                                                        self.cookie))
+
     def test_get_device_port_at_ovs(self):
         port = 'fake-port'
         port_iface = '1'
@@ -161,12 +186,48 @@ class TestOVS(test_base.TestCase):
         ovs_utils.remove_extra_ovs_flows(self.flows_info, self.bridge,
                                          self.cookie)
 
-        expected_del_flow = ('%s,ip,in_port=%s' % (self.cookie_id,
-                                                   extra_port_iface))
+        expected_del_flow = ('%s,table=0,priority=900,ip,in_port=%s' % (
+            self.cookie_id, extra_port_iface))
         self.mock_ovs_vsctl.ovs_ofctl.assert_called_once_with(
-            ['del-flows', self.bridge, expected_del_flow])
+            ['--strict', 'del-flows', self.bridge, expected_del_flow])
         mock_flows.assert_called_once_with(self.bridge, self.cookie_id)
 
+    @mock.patch.object(ovs_utils, 'get_bridge_flows')
+    def test_remove_extra_ovs_flows_openflow13(self, mock_flows):
+        self.flows_info[self.bridge]['in_port'] = ['1']
+        self.flows_info[self.bridge]['mac'] = self.mac
+        mock_flows.return_value = [
+            ' cookie={}, duration=1.1s, table=0, n_packets=0, n_bytes=0, '
+            'priority=900,{},in_port=1 actions=set_field:{}->eth_dst,'
+            'NORMAL'.format(self.cookie, protocol, self.mac.upper())
+            for protocol in ('ip', 'ipv6')]
+
+        ovs_utils.remove_extra_ovs_flows(self.flows_info, self.bridge,
+                                         self.cookie)
+
+        self.mock_ovs_vsctl.ovs_ofctl.assert_not_called()
+
+    @mock.patch.object(ovs_utils, 'get_bridge_flows')
+    def test_ensure_mac_tweak_flows(self, mock_flows):
+        mock_flows.return_value = [
+            ' cookie={}, duration=1.1s, table=0, n_packets=0, n_bytes=0, '
+            'idle_age=5, priority=900,ip,in_port=1 '
+            'actions=mod_dl_dst:{},NORMAL'.format(self.cookie, self.mac)]
+
+        ovs_utils.ensure_mac_tweak_flows(self.bridge, self.mac, ['1', '2'],
+                                         self.cookie)
+
+        flow = ('cookie={},priority=900,{},in_port={},'
+                'actions=mod_dl_dst:{},NORMAL')
+        self.mock_ovs_vsctl.ovs_ofctl.assert_has_calls([
+            mock.call(['add-flow', self.bridge,
+                       flow.format(self.cookie, 'ip', '2', self.mac)]),
+            mock.call(['add-flow', self.bridge,
+                       flow.format(self.cookie, 'ipv6', '1', self.mac)]),
+            mock.call(['add-flow', self.bridge,
+                       flow.format(self.cookie, 'ipv6', '2', self.mac)])])
+        self.assertEqual(3, self.mock_ovs_vsctl.ovs_ofctl.call_count)
+
     def test_ensure_flow(self):
         bridge = 'fake-bridge'
         flow = 'fake-flow'
@@ -373,42 +434,173 @@ class TestOVS(test_base.TestCase):
     def test_del_device_from_ovs_bridge_specifying_bridge(self):
         self._test_del_device_from_ovs_bridge(bridge=True)
 
-    def test_del_flow(self):
-        flow = ('cookie=0x3e6, duration=11.647s, table=0, n_packets=0, '
-                'n_bytes=0, idle_age=3378, priority=1000,ip,dl_src=fa:16:3e'
-                ':15:9e:f0,nw_src=20.0.0.0/24 actions=mod_dl_dst:d2:33:c5:'
-                'fd:7c:42,output:3,in_port=1')
-        ovs_utils.del_flow(flow, self.bridge, self.cookie)
+    def test_del_flows(self):
+        flow = ovs_utils.Flow.parse(
+            'cookie=0x3e6, duration=11.647s, table=0, n_packets=0, '
+            'n_bytes=0, idle_age=3378, priority=1000,ip,in_port=1,'
+            'dl_src=fa:16:3e:15:9e:f0,nw_src=20.0.0.0/24 '
+            'actions=mod_dl_dst:d2:33:c5:fd:7c:42,output:3')
+
+        ovs_utils.del_flows(self.bridge, [flow])
 
-        expected_flow = ('{},priority=1000,ip,dl_src=fa:16:3e:15:9e:f0,'
-                         'nw_src=20.0.0.0/24'.format(self.cookie_id))
+        expected_flow = ('cookie=998/-1,table=0,priority=1000,ip,'
+                         'dl_src=fa:16:3e:15:9e:f0,in_port=1,'
+                         'nw_src=20.0.0.0/24')
         self.mock_ovs_vsctl.ovs_ofctl.assert_called_once_with(
             ['--strict', 'del-flows', self.bridge, expected_flow])
 
-    def test_get_flow_info(self):
-        flow = ('cookie=0x3e6, duration=11.647s, table=0, n_packets=0, '
-                'n_bytes=0, idle_age=3378, priority=1000,ip,dl_src=fa:16:3e'
-                ':15:9e:f0,nw_src=20.0.0.0/24 actions=mod_dl_dst:d2:33:c5:'
-                'fd:7c:42,output:3,in_port=1')
-
-        ret = ovs_utils.get_flow_info(flow)
-
-        expected_ret = {'ipv6_src': None, 'mac': 'fa:16:3e:15:9e:f0',
-                        'nw_src': '20.0.0.0/24', 'port': '3'}
-        self.assertEqual(expected_ret, ret)
-
-    def test_get_flow_info_ipv6(self):
-        flow = ('cookie=0x3e6, duration=9.275s, table=0, n_packets=0, '
-                'n_bytes=0, idle_age=14326, priority=1000,ipv6,in_port=1,'
-                'dl_src=fa:16:3e:15:9e:f0,ipv6_src=fdaa:4ad8:e8fb::/64 '
-                'actions=mod_dl_dst:d2:33:c5:fd:7c:42,output:3')
 
-        ret = ovs_utils.get_flow_info(flow)
+class TestFlow(test_base.TestCase):
+
+    def test_parse(self):
+        flow = ovs_utils.Flow.parse(
+            'cookie=0x3e6, duration=9.275s, table=0, n_packets=0, '
+            'n_bytes=0, idle_age=14326, priority=1000,ipv6,in_port=1,'
+            'dl_src=fa:16:3e:15:9e:f0,ipv6_src=fdaa:4ad8:e8fb::/64 '
+            'actions=mod_dl_dst:d2:33:c5:fd:7c:42,strip_vlan,output:3')
+
+        self.assertEqual(998, flow.cookie)
+        self.assertEqual(0, flow.table)
+        self.assertEqual(1000, flow.priority)
+        self.assertEqual(frozenset([('ipv6', None), ('in_port', '1'),
+                                    ('dl_src', 'fa:16:3e:15:9e:f0'),
+                                    ('ipv6_src', 'fdaa:4ad8:e8fb::/64')]),
+                         flow.match)
+        self.assertEqual(('mod_dl_dst:d2:33:c5:fd:7c:42', 'strip_vlan',
+                          'output:3'), flow.actions)
+        self.assertEqual('fa:16:3e:15:9e:f0', flow.get('dl_src'))
+        self.assertIsNone(flow.get('nw_src'))
+        self.assertEqual('3', flow.output_port)
+
+    def test_parse_equivalent(self):
+        flow = ovs_utils.Flow.parse(
+            'cookie=998,priority=1000,ip,in_port=1,dl_src:FA:16:3E:15:9E:F0,'
+            'actions=mod_dl_dst:d2:33:c5:fd:7c:42,strip_vlan,output=3')
+        # dumped with OpenFlow13, with statistics and other fields order
+        dumped_flow = ovs_utils.Flow.parse(
+            ' cookie=0x3e6, duration=1.5s, table=0, n_packets=10, '
+            'n_bytes=1000, hard_age=5, priority=1000,ip,'
+            'dl_src=fa:16:3e:15:9e:f0,in_port=1 '
+            'actions=set_field:d2:33:c5:fd:7c:42->eth_dst,pop_vlan,output:3')
+
+        self.assertEqual(flow, dumped_flow)
+        self.assertEqual(hash(flow), hash(dumped_flow))
+
+    def test_parse_defaults(self):
+        flow = ovs_utils.Flow.parse('ip,nw_dst=10.0.0.0/24 actions=drop')
+
+        self.assertEqual((0, 0, constants.OVS_DEFAULT_FLOW_PRIORITY),
+                         (flow.cookie, flow.table, flow.priority))
+        self.assertIsNone(flow.output_port)
+
+    def test_parse_nested_actions(self):
+        flow = ovs_utils.Flow.parse(
+            'priority=10,ip actions=ct(commit,zone=1),NORMAL')
+
+        self.assertEqual(('ct(commit,zone=1)', 'NORMAL'), flow.actions)
+
+    def test_parse_invalid(self):
+        self.assertRaises(ValueError, ovs_utils.Flow.parse,
+                          'priority=high,ip actions=NORMAL')
+
+    def test_str(self):
+        flow_str = ('cookie=999,table=10,priority=900,ip,in_port=1,'
+                    'actions=mod_dl_dst:aa:bb:cc:dd:ee:ff,NORMAL')
+        flow = ovs_utils.Flow.parse(flow_str)
+
+        self.assertEqual(flow_str, str(flow))
+        self.assertEqual(flow, ovs_utils.Flow.parse(str(flow)))
+        self.assertEqual('cookie=999/-1,table=10,priority=900,ip,in_port=1',
+                         flow.to_match_string())
+
+    def test_diff_flows(self):
+        flows = [ovs_utils.Flow.parse(
+            'priority=900,ip,in_port={} actions=NORMAL'.format(port))
+            for port in range(4)]
+
+        self.assertEqual(
+            ([flows[3]], [flows[0], flows[1]]),
+            ovs_utils.diff_flows(set(flows[:3]), set(flows[2:])))
 
-        expected_ret = {'ipv6_src': 'fdaa:4ad8:e8fb::/64',
-                        'mac': 'fa:16:3e:15:9e:f0', 'nw_src': None,
-                        'port': '3'}
-        self.assertEqual(expected_ret, ret)
+    @mock.patch.object(ovs_utils, 'get_bridge_flows')
+    def test_get_cookie_flows(self, mock_flows):
+        mock_flows.return_value = [
+            'cookie=0x3e7, priority=900,ip,in_port=1 actions=NORMAL',
+            'cookie=0x3e7, priority=invalid,ip actions=NORMAL']
+
+        ret = ovs_utils.get_cookie_flows('br-ex', constants.OVS_RULE_COOKIE)
+
+        self.assertEqual({ovs_utils.Flow.parse(
+            'cookie=999,priority=900,ip,in_port=1,actions=NORMAL')}, ret)
+        mock_flows.assert_called_once_with('br-ex', 'cookie=999/-1')
+
+
+class TestOvsTopology(test_base.TestCase):
+
+    def test_is_topology_change_open_vswitch(self):
+        row = fakes.create_idl_row('Open_vSwitch', external_ids={
+            'ovn-bridge-mappings': 'physnet1:br-ex', 'other': 'new'})
+        self.assertTrue(ovs_utils.is_topology_change('create', row))
+        self.assertTrue(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'external_ids': {
+                'ovn-bridge-mappings': 'physnet1:br-ex2', 'other': 'new'}})))
+        self.assertTrue(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'external_ids': {
+                'ovn-bridge-mappings': 'physnet1:br-ex',
+                'ovn-bridge-mappings-bgp': 'bgp:br-bgp', 'other': 'new'}})))
+        self.assertFalse(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'external_ids': {
+                'ovn-bridge-mappings': 'physnet1:br-ex', 'other': 'old'}})))
+        self.assertFalse(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'next_cfg': 1})))
+
+    def test_is_topology_change_bridge(self):
+        row = fakes.create_idl_row('Bridge', name='br-ex')
+        self.assertTrue(ovs_utils.is_topology_change('create', row))
+        self.assertTrue(ovs_utils.is_topology_change('delete', row))
+        self.assertFalse(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'ports': []})))
+
+    def test_is_topology_change_interface(self):
+        row = fakes.create_idl_row('Interface', name='patch-provnet-1',
+                                   type='patch')
+        self.assertTrue(ovs_utils.is_topology_change('create', row))
+        self.assertTrue(ovs_utils.is_topology_change('delete', row))
+        self.assertTrue(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'ofport': []})))
+        self.assertTrue(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'mac_in_use': []})))
+        self.assertFalse(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'statistics': {}})))
+
+    def test_is_topology_change_interface_other_type(self):
+        row = fakes.create_idl_row('Interface', name='tap0', type='')
+        self.assertFalse(ovs_utils.is_topology_change('create', row))
+        self.assertFalse(ovs_utils.is_topology_change(
+            'update', row, fakes.create_object({'ofport': []})))
+
+    def test_is_topology_change_port(self):
+        self.assertFalse(ovs_utils.is_topology_change(
+            'create', fakes.create_idl_row('Port', name='patch-provnet-1')))
+
+    @mock.patch('ovs.db.idl.Idl.__init__', return_value=None)
+    @mock.patch('ovsdbapp.event.RowEventHandler')
+    def test_topology_idl_notify(self, mock_handler, mock_idl_init):
+        events = [mock.Mock()]
+        topology_idl = ovs_utils.OvsTopologyIdl('fake-remote', 'fake-helper',
+                                                events=events)
+        mock_handler.return_value.watch_events.assert_called_once_with(events)
+
+        bridge = fakes.create_idl_row('Bridge', name='br-ex')
+        topology_idl.notify('create', bridge)
+        self.assertEqual(1, topology_idl.topology_generation)
+        iface = fakes.create_idl_row('Interface', name='tap0', type='')
+        topology_idl.notify('create', iface)
+        self.assertEqual(1, topology_idl.topology_generation)
+
+        mock_handler.return_value.notify.assert_has_calls([
+            mock.call('create', bridge, None),
+            mock.call('create', iface, None)])
 
 
 class TestOvsIdl(test_base.TestCase):
@@ -420,11 +612,11 @@ class TestOvsIdl(test_base.TestCase):
         self.execute_ref = self.ovs_idl.idl_ovs.db_get.return_value.execute
 
     @mock.patch('ovsdbapp.backend.ovs_idl.connection.Connection')
-    @mock.patch('ovs.db.idl.Idl')
+    @mock.patch.object(ovs_utils, 'OvsTopologyIdl')
     @mock.patch('ovsdbapp.backend.ovs_idl.idlutils.get_schema_helper')
     def test_start(self, mock_schema_helper, mock_idl, mock_conn):
         conn_str = 'fake-connection'
-        self.ovs_idl.start(conn_str)
+        self.ovs_idl.start(conn_str, events=['fake-event'])
 
         mock_schema_helper.assert_called_once_with(conn_str, 'Open_vSwitch')
         helper = mock_schema_helper.return_value
@@ -432,7 +624,8 @@ class TestOvsIdl(test_base.TestCase):
             mock.call('Open_vSwitch'), mock.call('Bridge'),
             mock.call('Port'), mock.call('Interface')]
         helper.register_table.assert_has_calls(expected_calls)
-        mock_idl.assert_called_once_with(conn_str, helper)
+        mock_idl.assert_called_once_with(conn_str, helper,
+                                         events=['fake-event'])
         mock_conn.assert_called_once_with(
             mock_idl.return_value, timeout=mock.ANY)
         # Assert the OvsdbIdl instance was created
@@ -507,3 +700,69 @@ class TestOvsIdl(test_base.TestCase):
         self.assertEqual(['net0:bridge0', 'net1:bridge1', 'net2:bridge2'], ret)
         self.ovs_idl.idl_ovs.db_get.assert_called_once_with(
             'Open_vSwitch', '.', 'external_ids')
+
+    def _set_bridge(self, mac_in_use=('aa:bb:cc:dd:ee:ff',)):
+        def _iface(name, ofport=(), mac_in_use=()):
+            return fakes.create_object({'name': name, 'ofport': list(ofport),
+                                        'mac_in_use': list(mac_in_use)})
+
+        ports = [
+            fakes.create_object({'interfaces': [iface]})
+            for iface in (_iface('patch-provnet-2', ofport=(5,)),
+                          _iface('br-ex', ofport=(65534,),
+                                 mac_in_use=mac_in_use),
+                          _iface('patch-provnet-1', ofport=(4,)),
+                          _iface('patch-provnet-3', ofport=(-1,)),
+                          _iface('patch-other', ofport=(6,)),
+                          _iface('eth1', ofport=(1,)))]
+        self.ovs_idl.idl_ovs.idl.topology_generation = 1
+        row_by_value = mock.patch.object(
+            ovs_utils.idlutils, 'row_by_value').start()
+        row_by_value.return_value = fakes.create_object({'ports': ports})
+        return row_by_value
+
+    def test_get_bridge_info(self):
+        self._set_bridge()
+        self.assertEqual({'mac': 'aa:bb:cc:dd:ee:ff', 'in_port': ['4', '5']},
+                         self.ovs_idl.get_bridge_info('br-ex'))
+        self.assertEqual({'mac': 'aa:bb:cc:dd:ee:ff', 'in_port': ['6']},
+                         self.ovs_idl.get_bridge_info('br-ex',
+                                                      prefix='patch-other'))
+
+    @mock.patch.object(linux_net, 'get_interface_address')
+    def test_get_bridge_info_no_mac(self, mock_get_address):
+        self._set_bridge(mac_in_use=())
+        self.assertEqual(mock_get_address.return_value,
+                         self.ovs_idl.get_bridge_info('br-ex')['mac'])
+        mock_get_address.assert_called_once_with('br-ex')
+
+    @mock.patch.object(linux_net, 'get_interface_address')
+    def test_get_bridge_info_no_bridge(self, mock_get_address):
+        self._set_bridge().return_value = None
+        self.assertEqual({'mac': mock_get_address.return_value,
+                          'in_port': []},
+                         self.ovs_idl.get_bridge_info('br-ex'))
+
+    def test_get_ofports(self):
+        interfaces = [
+            fakes.create_object({'name': name, 'ofport': ofport})
+            for name, ofport in (('br-ex', [65534]), ('veth-ovs', [3]),
+                                 ('pending', []), ('failed', [-1]))]
+        self.ovs_idl.idl_ovs.tables = {'Interface': mock.Mock(rows={
+            i: iface for i, iface in enumerate(interfaces)})}
+
+        self.assertEqual({'br-ex': '65534', 'veth-ovs': '3'},
+                         self.ovs_idl.get_ofports())
+
+    def test_get_bridge_info_cached(self):
+        row_by_value = self._set_bridge()
+        bridge_info = self.ovs_idl.get_bridge_info('br-ex')
+        bridge_info['in_port'].append('7')
+        self.assertEqual(['4', '5'],
+                         self.ovs_idl.get_bridge_info('br-ex')['in_port'])
+        row_by_value.assert_called_once()
+
+        # read again once the topology changes
+        self.ovs_idl.idl_ovs.idl.topology_generation = 2
+        self.ovs_idl.get_bridge_info('br-ex')
+        self.assertEqual(2, row_by_value.call_count)
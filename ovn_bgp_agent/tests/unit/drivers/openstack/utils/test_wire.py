@@ -93,10 +93,9 @@ class TestWire(test_base.TestCase):
     def test__ensure_base_wiring_config_ovn(self):
         pass
 
-    @mock.patch.object(linux_net, 'get_interface_address')
-    @mock.patch.object(ovs_utils, 'get_ovs_patch_ports_info')
-    def test__ensure_base_wiring_config_evpn(self, m_get_ovs_patch_ports_info,
-                                             m_get_interface_address):
+    def test__ensure_base_wiring_config_evpn(self):
+        self.ovs_idl.get_bridge_info.return_value = {
+            'mac': 'fake-mac', 'in_port': ['1']}
         localnet_ports = [test_utils.create_row(
             tag=[4096],
         )]
@@ -126,9 +125,11 @@ class TestWire(test_base.TestCase):
 
         evpn_bridge = mock.MagicMock()
         evpn_bridge.connect_vlan.return_value = vlan_dev
+        evpn_bridge.get_vlan.return_value = vlan_dev
 
         evpn_setup = mock.patch.object(evpn_utils, 'setup').start()
         evpn_setup.return_value = evpn_bridge
+        evpn_provision = mock.patch.object(evpn_utils, 'provision').start()
 
         wire._ensure_base_wiring_config_evpn(self.nb_idl, self.ovs_idl)
 
@@ -141,8 +142,14 @@ class TestWire(test_base.TestCase):
                                       mode=constants.OVN_EVPN_TYPE_L3,
                                       ovs_flows=mock.ANY)
 
+        ovs_flows = evpn_setup.call_args[1]['ovs_flows']['br-ex']
+        self.assertEqual(('fake-mac', ['1']),
+                         (ovs_flows['mac'], ovs_flows['in_port']))
         evpn_bridge.connect_vlan.assert_called_with(ports[0])
         vlan_dev.process_dhcp_opts.assert_called()
+        # the vlan devices needed by the localnet ports are provisioned
+        evpn_bridge.get_vlan.assert_called_once_with(str(vlan_dev.vlan_tag))
+        evpn_provision.assert_called_once_with([vlan_dev])
 
     def test__ensure_ovn_router(self):
         wire._ensure_ovn_router(self.nb_idl)
@@ -325,6 +332,112 @@ class TestWire(test_base.TestCase):
             self.sb_idl, self.bridge_mappings, ovs_flows, exposed_ips,
             routing_tables, routing_tables_routes)
 
+    @mock.patch.object(wire, 'delete_ndp_proxies_leftovers')
+    @mock.patch.object(wire, 'delete_vlan_devices_leftovers')
+    @mock.patch.object(linux_net, 'delete_bridge_ip_routes')
+    @mock.patch.object(linux_net, 'delete_ip_rules')
+    @mock.patch.object(linux_net, 'get_ovn_ip_rules')
+    @mock.patch.object(linux_net, 'delete_exposed_ips')
+    @mock.patch.object(linux_net, 'get_exposed_ips')
+    def test__cleanup_wiring_underlay(self, m_get_ips, m_del_ips,
+                                      m_get_rules, m_del_rules,
+                                      m_del_routes, m_vlan_leftovers,
+                                      m_ndp_leftovers):
+        m_get_ips.return_value = ['10.0.0.1', '10.0.0.2', 'fd00::a']
+        m_get_rules.return_value = {
+            '10.0.0.1/32': {'table': 200, 'family': 2},
+            '10.0.1.0/24': {'table': 200, 'family': 2},
+            '10.0.2.0/24': {'table': 200, 'family': 2},
+            'fd00::a/128': {'table': 200, 'family': 10},
+            'fd00::b/128': {'table': 200, 'family': 10}}
+        # the IPs are matched whatever their notation
+        exposed_ips = {'provider': {'10.0.0.1': {}, 'fd00:0::a': {}},
+                       'tenant': {'10.0.1.0/24': {}}}
+
+        wire._cleanup_wiring_underlay(self.sb_idl, {}, {}, exposed_ips,
+                                      {'br-ex': 200}, {})
+
+        m_del_ips.assert_called_once_with(mock.ANY, CONF.bgp_nic)
+        self.assertEqual(['10.0.0.2'], list(m_del_ips.call_args[0][0]))
+        m_get_rules.assert_called_once_with(mock.ANY)
+        m_del_rules.assert_called_once_with(mock.ANY)
+        self.assertEqual(
+            {'10.0.2.0/24': {'table': 200, 'family': 2},
+             'fd00::b/128': {'table': 200, 'family': 10}},
+            dict(m_del_rules.call_args[0][0].items()))
+        m_del_routes.assert_called_once_with({'br-ex': 200}, {}, {})
+        m_vlan_leftovers.assert_called_once_with(self.sb_idl, {})
+        m_ndp_leftovers.assert_called_once_with({}, {})
+
+    @mock.patch.object(linux_net, 'sync_ndp_proxies')
+    @mock.patch.object(linux_net, 'get_bridge_vlans')
+    def test_delete_ndp_proxies_leftovers(self, m_get_vlans, m_sync):
+        m_get_vlans.side_effect = lambda bridge: {
+            'br-ex': [None, 0, 10, 20], 'br-vlan': []}[bridge]
+        m_sync.side_effect = [
+            None, None,
+            agent_exc.NetworkInterfaceNotFound(device='br-ex.30'),
+            None, None]
+        ovs_flows = {
+            'br-ex': {'mac': 'fake-mac', 'in_port': [],
+                      'ndp_proxies': {10: {'fd00::/64'},
+                                      30: {'fd00:1::/64'}}},
+            'br-vlan': {'mac': 'fake-mac', 'in_port': []}}
+
+        wire.delete_ndp_proxies_leftovers(
+            {'datacentre': 'br-ex', 'other': 'br-ex', 'vlan': 'br-vlan'},
+            ovs_flows)
+
+        # the bridges, their vlan devices and the ones the proxies were
+        # recorded for, even if they were not found
+        self.assertCountEqual([
+            mock.call([], 'br-ex', None),
+            mock.call({'fd00::/64'}, 'br-ex', 10),
+            mock.call([], 'br-ex', 20),
+            mock.call({'fd00:1::/64'}, 'br-ex', 30),
+            mock.call([], 'br-vlan', None)], m_sync.call_args_list)
+
+    @mock.patch.object(wire, '_ensure_updated_mac_tweak_flows')
+    @mock.patch.object(linux_net, 'add_ndp_proxies')
+    @mock.patch.object(linux_net, 'add_ip_route')
+    @mock.patch.object(linux_net, 'add_ip_rule')
+    def test__wire_provider_port_underlay_ndp_proxies(
+            self, m_ip_rule, m_ip_route, m_ndp_proxies, m_mac_tweak):
+        ovs_flows = {'br-ex': {'mac': 'fake-mac', 'in_port': []}}
+        wirings = [(10, ['10.0.0.0/24', 'fd00::/64']),
+                   (10, ['fd00:1::/64']),
+                   (None, ['fd00:2::/64'])]
+
+        for vlan, proxy_cidrs in wirings:
+            ret = wire._wire_provider_port_underlay(
+                {}, ovs_flows, ['fd00::5'], 'br-ex', vlan, 'fake-localnet',
+                {'br-ex': 200}, proxy_cidrs)
+            self.assertTrue(ret)
+
+        m_ndp_proxies.assert_has_calls([
+            mock.call(['fd00::/64'], 'br-ex', 10),
+            mock.call(['fd00:1::/64'], 'br-ex', 10),
+            mock.call(['fd00:2::/64'], 'br-ex', None)])
+        # recorded for the cleanup to keep them
+        self.assertEqual(
+            {10: {'fd00::/64', 'fd00:1::/64'}, None: {'fd00:2::/64'}},
+            ovs_flows['br-ex']['ndp_proxies'])
+
+    @mock.patch.object(wire, '_ensure_updated_mac_tweak_flows')
+    @mock.patch.object(linux_net, 'add_ndp_proxies')
+    @mock.patch.object(linux_net, 'add_ip_route')
+    @mock.patch.object(linux_net, 'add_ip_rule')
+    def test__wire_provider_port_underlay_ndp_proxies_no_flows(
+            self, m_ip_rule, m_ip_route, m_ndp_proxies, m_mac_tweak):
+        ovs_flows = {}
+
+        wire._wire_provider_port_underlay(
+            {}, ovs_flows, ['fd00::5'], 'br-ex', None, 'fake-localnet',
+            {'br-ex': 200}, ['fd00::/64'])
+
+        m_ndp_proxies.assert_called_once_with(['fd00::/64'], 'br-ex', None)
+        self.assertEqual({}, ovs_flows)
+
     def test_cleanup_wiring_ovn(self):
         CONF.set_override('exposing_method', 'ovn')
         self.addCleanup(CONF.clear_override, 'exposing_method')
@@ -360,7 +473,8 @@ class TestWire(test_base.TestCase):
                                   routing_tables_routes)
 
         evpn_bridge.get_vlan.assert_called_with('4096')
-        vlan_dev.cleanup_excessive_routes.assert_called()
+        vlan_dev.cleanup_excessive_routes.assert_called_once_with(
+            routing_tables_routes, tables_routes={})
         self.assertTrue(ret)
 
     @mock.patch.object(wire, '_cleanup_wiring_underlay')
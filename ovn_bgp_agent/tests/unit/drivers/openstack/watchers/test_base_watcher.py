@@ -17,6 +17,7 @@ from unittest import mock
 
 from ovn_bgp_agent.drivers.openstack.watchers import base_watcher
 from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.tests.unit import fakes
 
 
 class TestChassisCreateEvent(test_base.TestCase):
@@ -43,3 +44,87 @@ class TestChassisCreateEvent(test_base.TestCase):
 
 class TestChassisPrivateCreateEvent(TestChassisCreateEvent):
     _event = base_watcher.ChassisPrivateCreateEvent
+
+
+class TestOvsTopologyEvent(test_base.TestCase):
+
+    def setUp(self):
+        super(TestOvsTopologyEvent, self).setUp()
+        self.agent = mock.Mock(ovs_topology_generation=1)
+        self.agent.ovs_idl.topology_generation = 2
+        self.event = base_watcher.OvsTopologyEvent(self.agent, 'Bridge')
+        self.row = fakes.create_object({
+            '_table': fakes.create_object({'name': 'Bridge'}),
+            'name': 'br-ex'})
+
+    def test_match_fn(self):
+        self.assertTrue(self.event.match_fn(self.event.ROW_CREATE, self.row,
+                                            None))
+
+    def test_match_fn_not_topology_change(self):
+        self.assertFalse(self.event.match_fn(
+            self.event.ROW_UPDATE, self.row,
+            fakes.create_object({'ports': []})))
+
+    def test_match_fn_not_wired_yet(self):
+        self.agent.ovs_topology_generation = None
+        self.assertFalse(self.event.match_fn(self.event.ROW_CREATE, self.row,
+                                             None))
+
+    def test_run(self):
+        self.event.run(self.event.ROW_CREATE, self.row, None)
+        self.agent.sync.assert_called_once_with()
+
+    def test_run_already_wired(self):
+        self.agent.ovs_topology_generation = 2
+        self.event.run(self.event.ROW_CREATE, self.row, None)
+        self.agent.sync.assert_not_called()
+
+    def test_get_ovs_topology_events(self):
+        events = base_watcher.get_ovs_topology_events(self.agent)
+        self.assertEqual(['Open_vSwitch', 'Bridge', 'Interface'],
+                         [e.table for e in events])
+
+
+class TestEvent(test_base.TestCase):
+
+    def setUp(self):
+        super(TestEvent, self).setUp()
+        self.event = base_watcher.PortBindingChassisEvent(
+            mock.Mock(), (base_watcher.Event.ROW_UPDATE,
+                          base_watcher.Event.ROW_DELETE))
+        self.event.columns = ('chassis', 'up')
+        self.event.match_fn = mock.Mock(return_value=True)
+        self.table = fakes.create_object({'name': 'Port_Binding',
+                                          'columns': {}})
+        self.row = fakes.create_object({'_table': self.table})
+
+    def _create_old(self, column):
+        return fakes.create_object({'_table': self.table, column: []})
+
+    def test_matches(self):
+        old = self._create_old('up')
+        self.assertTrue(self.event.matches(self.event.ROW_UPDATE, self.row,
+                                           old))
+        self.event.match_fn.assert_called_once_with(
+            self.event.ROW_UPDATE, self.row, old)
+
+    def test_matches_no_interesting_column_changed(self):
+        old = self._create_old('external_ids')
+        self.assertFalse(self.event.matches(self.event.ROW_UPDATE, self.row,
+                                            old))
+        self.event.match_fn.assert_not_called()
+
+    def test_matches_delete(self):
+        self.assertTrue(self.event.matches(self.event.ROW_DELETE, self.row,
+                                           None))
+        self.event.match_fn.assert_called_once_with(
+            self.event.ROW_DELETE, self.row, None)
+
+    def test_matches_no_columns(self):
+        self.event.columns = ()
+        old = self._create_old('external_ids')
+        self.assertTrue(self.event.matches(self.event.ROW_UPDATE, self.row,
+                                           old))
+        self.event.match_fn.assert_called_once_with(
+            self.event.ROW_UPDATE, self.row, old)
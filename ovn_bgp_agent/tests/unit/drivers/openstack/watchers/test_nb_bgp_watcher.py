@@ -649,7 +649,9 @@ class TestLogicalSwitchUpdateEvent(test_base.TestCase):
         self.assertFalse(self.event.match_fn(None, row, None))
 
     def test_run(self):
-        self.event.run(None, None, None)
+        row = utils.create_row(name='fake-ls')
+        self.event.run(None, row, None)
+        self.agent.invalidate_ls_cache.assert_called_once_with('fake-ls')
         self.agent.sync.assert_called_once()
 
 
@@ -669,8 +671,68 @@ class TestLocalnetCreateDeleteEvent(test_base.TestCase):
         self.assertFalse(self.event.match_fn(None, row, None))
 
     def test_run(self):
+        row = utils.create_row(
+            type=constants.OVN_LOCALNET_VIF_PORT_TYPE,
+            external_ids={constants.OVN_LS_NAME_EXT_ID_KEY: 'fake-ls'})
+        self.event.run(None, row, None)
+        self.agent.invalidate_ls_cache.assert_called_once_with('fake-ls')
+        self.agent.sync.assert_called_once()
+
+    def test_run_no_logical_switch(self):
+        row = utils.create_row(type=constants.OVN_LOCALNET_VIF_PORT_TYPE,
+                               external_ids={})
+        self.event.run(None, row, None)
+        self.agent.invalidate_ls_cache.assert_called_once_with(None)
+        self.agent.sync.assert_called_once()
+
+
+class TestLocalnetUpdateEvent(test_base.TestCase):
+
+    def setUp(self):
+        super(TestLocalnetUpdateEvent, self).setUp()
+        self.agent = mock.Mock()
+        self.event = nb_bgp_watcher.LocalnetUpdateEvent(self.agent)
+        self.table = utils.create_row(name='Logical_Switch_Port',
+                                      columns={})
+
+    def _create_row(self, **columns):
+        return utils.create_row(_table=self.table, **columns)
+
+    def test_matches_tag_updated(self):
+        row = self._create_row(type=constants.OVN_LOCALNET_VIF_PORT_TYPE,
+                               tag=[20])
+        old = self._create_row(tag=[10])
+        self.assertTrue(self.event.matches(self.event.ROW_UPDATE, row, old))
+
+    def test_matches_network_name_updated(self):
+        row = self._create_row(type=constants.OVN_LOCALNET_VIF_PORT_TYPE,
+                               options={'network_name': 'physnet2'})
+        old = self._create_row(options={'network_name': 'physnet1'})
+        self.assertTrue(self.event.matches(self.event.ROW_UPDATE, row, old))
+
+    def test_matches_other_column_updated(self):
+        row = self._create_row(type=constants.OVN_LOCALNET_VIF_PORT_TYPE,
+                               up=[True])
+        old = self._create_row(up=[False])
+        self.assertFalse(self.event.matches(self.event.ROW_UPDATE, row, old))
+
+    def test_match_fn(self):
         row = utils.create_row(type=constants.OVN_LOCALNET_VIF_PORT_TYPE)
+        self.assertTrue(self.event.match_fn(None, row, utils.create_row()))
+
+        # no longer a localnet port
+        row = utils.create_row(type=constants.OVN_VM_VIF_PORT_TYPE)
+        old = utils.create_row(type=constants.OVN_LOCALNET_VIF_PORT_TYPE)
+        self.assertTrue(self.event.match_fn(None, row, old))
+
+        self.assertFalse(self.event.match_fn(None, row, utils.create_row()))
+
+    def test_run(self):
+        row = utils.create_row(
+            type=constants.OVN_LOCALNET_VIF_PORT_TYPE,
+            external_ids={constants.OVN_LS_NAME_EXT_ID_KEY: 'fake-ls'})
         self.event.run(None, row, None)
+        self.agent.invalidate_ls_cache.assert_called_once_with('fake-ls')
         self.agent.sync.assert_called_once()
 
 
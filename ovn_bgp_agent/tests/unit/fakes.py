@@ -13,6 +13,26 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import uuid
+
 
 def create_object(attr_dict):
     return type('FakeObject', (object,), attr_dict)
+
+
+def create_idl_table(name):
+    return create_object({'name': name, 'rows': {}})
+
+
+def create_idl_row(table, **columns):
+    """Create a fake IDL row, added to the rows of its table
+
+    The table can be given by name, or as created by create_idl_table.
+    """
+    if isinstance(table, str):
+        table = create_idl_table(table)
+    columns.setdefault('uuid', uuid.uuid4())
+    columns['_table'] = table
+    row = create_object(columns)
+    table.rows[row.uuid] = row
+    return row
@@ -13,13 +13,18 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import errno
+import threading
 from unittest import mock
 
 from oslo_concurrency import processutils
+from pyroute2.netlink import exceptions as netlink_exceptions
 
 from ovn_bgp_agent import constants
+from ovn_bgp_agent import exceptions as agent_exc
 from ovn_bgp_agent.privileged import linux_net as priv_linux_net
 from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.tests import utils as test_utils
 from ovn_bgp_agent.utils import linux_net
 
 
@@ -49,73 +54,506 @@ class TestPrivilegedLinuxNet(test_base.TestCase):
         self.mac = 'aa:bb:cc:dd:ee:ff'
 
     def test_set_kernel_flag(self):
-        priv_linux_net.set_kernel_flag('net.ipv6.conf.fake', 1)
-        self.mock_exc.assert_called_once_with(
-            'sysctl', '-w', 'net.ipv6.conf.fake=1')
+        m_open = mock.mock_open(read_data='0\n')
+        with mock.patch('builtins.open', m_open):
+            self.assertTrue(
+                priv_linux_net.set_kernel_flag('net.ipv6.conf.fake', 1))
+
+        m_open.assert_has_calls([
+            mock.call('/proc/sys/net/ipv6/conf/fake'),
+            mock.call('/proc/sys/net/ipv6/conf/fake', 'w')], any_order=True)
+        m_open().write.assert_called_once_with('1')
+        self.mock_exc.assert_not_called()
 
     def test_set_kernel_flag_exception(self):
-        self.mock_exc.side_effect = FakeException()
-        self.assertRaises(
-            FakeException,
-            priv_linux_net.set_kernel_flag, 'net.ipv6.conf.fake', 1)
+        with mock.patch('builtins.open', side_effect=PermissionError):
+            self.assertRaises(
+                PermissionError,
+                priv_linux_net.set_kernel_flag, 'net.ipv6.conf.fake', 1)
+
+    def test_set_kernel_flags(self):
+        flags = [('net.ipv4.conf.br-ex/10.proxy_arp', 1),
+                 ('net.ipv6.conf.br-ex/10.proxy_ndp', 1)]
+        m_open = mock.mock_open(read_data='0\n')
+        with mock.patch('builtins.open', m_open):
+            ret = priv_linux_net.set_kernel_flags(flags)
+
+        self.assertEqual([flag for flag, _ in flags], ret)
+        m_open.assert_has_calls([
+            mock.call('/proc/sys/net/ipv4/conf/br-ex.10/proxy_arp'),
+            mock.call('/proc/sys/net/ipv4/conf/br-ex.10/proxy_arp', 'w'),
+            mock.call('/proc/sys/net/ipv6/conf/br-ex.10/proxy_ndp'),
+            mock.call('/proc/sys/net/ipv6/conf/br-ex.10/proxy_ndp', 'w'),
+        ], any_order=True)
+        m_open().write.assert_has_calls([mock.call('1'), mock.call('1')])
+        self.mock_exc.assert_not_called()
+
+    def test_set_kernel_flags_already_set(self):
+        m_open = mock.mock_open(read_data='1\n')
+        with mock.patch('builtins.open', m_open):
+            ret = priv_linux_net.set_kernel_flags(
+                [('net.ipv4.ip_forward', 1)])
+
+        self.assertEqual([], ret)
+        m_open.assert_called_once_with('/proc/sys/net/ipv4/ip_forward')
+        m_open().write.assert_not_called()
+
+    def test_set_kernel_flags_exception(self):
+        with mock.patch('builtins.open', side_effect=FileNotFoundError):
+            self.assertRaises(
+                FileNotFoundError, priv_linux_net.set_kernel_flags,
+                [('net.ipv6.conf.fake.proxy_ndp', 1)])
+
+    def _test_ensure_evpn_devices(self, vrf_name=None):
+        mocks = {name: mock.patch.object(priv_linux_net, name).start()
+                 for name in ('ensure_bridge', 'ensure_vxlan', 'ensure_vrf',
+                              'set_master_for_device',
+                              'set_brport_attribute')}
+
+        priv_linux_net.ensure_evpn_devices('br-100', 'vxlan-100', 100,
+                                           self.ip, 4789, vrf_name=vrf_name)
+
+        mocks['ensure_bridge'].assert_called_once_with('br-100')
+        mocks['ensure_vxlan'].assert_called_once_with(
+            'vxlan-100', 100, self.ip, 4789)
+        mocks['set_brport_attribute'].assert_called_once_with(
+            'vxlan-100', neigh_suppress=True, learning=False)
+        master_calls = [mock.call('vxlan-100', 'br-100')]
+        if vrf_name:
+            mocks['ensure_vrf'].assert_called_once_with(vrf_name, 100)
+            master_calls.append(mock.call('br-100', vrf_name))
+        else:
+            mocks['ensure_vrf'].assert_not_called()
+        self.assertEqual(master_calls,
+                         mocks['set_master_for_device'].call_args_list)
+
+    def test_ensure_evpn_devices(self):
+        self._test_ensure_evpn_devices()
+
+    def test_ensure_evpn_devices_vrf(self):
+        self._test_ensure_evpn_devices(vrf_name='vrf-100')
+
+    def test_ensure_evpn_vlan_device(self):
+        mocks = {name: mock.patch.object(priv_linux_net, name).start()
+                 for name in ('ensure_veth', 'set_master_for_device',
+                              'add_ip_address', 'set_kernel_flags')}
+        mocks['add_ip_address'].side_effect = [
+            None, agent_exc.IpAddressAlreadyExists(ip=self.ip,
+                                                   device='veth-vrf')]
+        flags = [('net.ipv4.conf.veth-vrf.proxy_arp', 1)]
+
+        ret = priv_linux_net.ensure_evpn_vlan_device(
+            'veth-vrf', 'veth-ovs', 'vrf-100', ips=[self.ipv6, self.ip],
+            flags=flags)
+
+        self.assertEqual(mocks['set_kernel_flags'].return_value, ret)
+        mocks['ensure_veth'].assert_called_once_with('veth-vrf', 'veth-ovs')
+        mocks['set_master_for_device'].assert_called_once_with('veth-vrf',
+                                                               'vrf-100')
+        self.assertEqual([mock.call(self.ipv6, 'veth-vrf'),
+                          mock.call(self.ip, 'veth-vrf')],
+                         mocks['add_ip_address'].call_args_list)
+        mocks['set_kernel_flags'].assert_called_once_with(flags)
+
+    def _mock_ndp_proxy_iproute(self, ifindex=7):
+        mock_link_id = mock.patch.object(priv_linux_net,
+                                         '_get_link_id').start()
+        mock_link_id.return_value = ifindex
+        mock_ipr = mock.patch.object(priv_linux_net.iproute,
+                                     'IPRoute').start()
+        return mock_link_id, mock_ipr()
+
+    def _assert_ndp_proxy_calls(self, fake_ipr, command, ips, ifindex=7):
+        calls = [mock.call(command, dst=ip, ifindex=ifindex,
+                           family=constants.AF_INET6,
+                           flags=priv_linux_net.NTF_PROXY)
+                 for ip in ips]
+        fake_ipr.neigh.assert_has_calls(calls, any_order=True)
+        self.assertEqual(len(calls), fake_ipr.neigh.call_count)
+        self.mock_exc.assert_not_called()
 
     def test_add_ndp_proxy(self):
+        mock_link_id, fake_ipr = self._mock_ndp_proxy_iproute()
         priv_linux_net.add_ndp_proxy(self.ipv6, self.dev)
-        self.mock_exc.assert_called_once_with(
-            'ip', '-6', 'nei', 'add', 'proxy', self.ipv6, 'dev', self.dev)
+        mock_link_id.assert_called_once_with(self.dev)
+        self._assert_ndp_proxy_calls(fake_ipr, 'add', [self.ipv6])
 
     def test_add_ndp_proxy_vlan(self):
+        mock_link_id, fake_ipr = self._mock_ndp_proxy_iproute()
         priv_linux_net.add_ndp_proxy(self.ipv6, self.dev, vlan=10)
-        self.mock_exc.assert_called_once_with(
-            'ip', '-6', 'nei', 'add', 'proxy', self.ipv6,
-            'dev', '%s.10' % self.dev)
+        mock_link_id.assert_called_once_with('%s.10' % self.dev)
+        self._assert_ndp_proxy_calls(fake_ipr, 'add', [self.ipv6])
 
     def test_add_trimmed_ndp_proxy_vlan(self):
+        mock_link_id, fake_ipr = self._mock_ndp_proxy_iproute()
         priv_linux_net.add_ndp_proxy(self.ipv6, self.dev_br, vlan=1024)
-        self.mock_exc.assert_called_once_with(
-            'ip', '-6', 'nei', 'add', 'proxy', self.ipv6,
-            'dev', '%s.1024' %
-            self.dev_br[:constants.OVN_VLAN_DEVICE_MAX_LENGTH])
+        mock_link_id.assert_called_once_with(
+            '%s.1024' % self.dev_br[:constants.OVN_VLAN_DEVICE_MAX_LENGTH])
+        self._assert_ndp_proxy_calls(fake_ipr, 'add', [self.ipv6])
+
+    def test_add_ndp_proxies(self):
+        _, fake_ipr = self._mock_ndp_proxy_iproute()
+        priv_linux_net.add_ndp_proxies(
+            ['2001:db8::/64', '2001:db8:0:1::1/64', '2001:db8::/64'],
+            self.dev)
+        self._assert_ndp_proxy_calls(fake_ipr, 'add',
+                                     ['2001:db8::', '2001:db8:0:1::'])
+
+    def test_add_ndp_proxy_already_exists(self):
+        _, fake_ipr = self._mock_ndp_proxy_iproute()
+        fake_ipr.neigh.side_effect = netlink_exceptions.NetlinkError(
+            errno.EEXIST)
+        priv_linux_net.add_ndp_proxy(self.ipv6, self.dev)
+        self._assert_ndp_proxy_calls(fake_ipr, 'add', [self.ipv6])
 
     def test_add_ndp_proxy_exception(self):
-        self.mock_exc.side_effect = FakeException()
+        _, fake_ipr = self._mock_ndp_proxy_iproute()
+        fake_ipr.neigh.side_effect = netlink_exceptions.NetlinkError(
+            errno.EINVAL)
         self.assertRaises(
-            FakeException,
+            netlink_exceptions.NetlinkError,
             priv_linux_net.add_ndp_proxy, self.ipv6, self.dev)
 
     def test_del_ndp_proxy(self):
+        mock_link_id, fake_ipr = self._mock_ndp_proxy_iproute()
         priv_linux_net.del_ndp_proxy(self.ipv6, self.dev)
-        self.mock_exc.assert_called_once_with(
-            'ip', '-6', 'nei', 'del', 'proxy', self.ipv6, 'dev',
-            self.dev, env_variables=mock.ANY)
+        mock_link_id.assert_called_once_with(self.dev)
+        self._assert_ndp_proxy_calls(fake_ipr, 'del', [self.ipv6])
 
     def test_del_ndp_proxy_vlan(self):
+        mock_link_id, fake_ipr = self._mock_ndp_proxy_iproute()
         priv_linux_net.del_ndp_proxy(self.ipv6, self.dev, vlan=10)
-        self.mock_exc.assert_called_once_with(
-            'ip', '-6', 'nei', 'del', 'proxy', self.ipv6, 'dev',
-            '%s.10' % self.dev, env_variables=mock.ANY)
+        mock_link_id.assert_called_once_with('%s.10' % self.dev)
+        self._assert_ndp_proxy_calls(fake_ipr, 'del', [self.ipv6])
 
     def test_del_trimeed_ndp_proxy_vlan(self):
+        mock_link_id, fake_ipr = self._mock_ndp_proxy_iproute()
         priv_linux_net.del_ndp_proxy(self.ipv6, self.dev_br, vlan=1024)
-        self.mock_exc.assert_called_once_with(
-            'ip', '-6', 'nei', 'del', 'proxy', self.ipv6, 'dev',
-            '%s.1024' % self.dev_br[:constants.OVN_VLAN_DEVICE_MAX_LENGTH],
-            env_variables=mock.ANY)
+        mock_link_id.assert_called_once_with(
+            '%s.1024' % self.dev_br[:constants.OVN_VLAN_DEVICE_MAX_LENGTH])
+        self._assert_ndp_proxy_calls(fake_ipr, 'del', [self.ipv6])
 
     def test_del_ndp_proxy_exception(self):
-        self.mock_exc.side_effect = FakeException()
+        _, fake_ipr = self._mock_ndp_proxy_iproute()
+        fake_ipr.neigh.side_effect = netlink_exceptions.NetlinkError(
+            errno.EINVAL)
         self.assertRaises(
-            FakeException,
+            netlink_exceptions.NetlinkError,
             priv_linux_net.del_ndp_proxy, self.ipv6, self.dev)
 
-    def test_del_ndp_proxy_exception_no_such_file(self):
-        exp = FakeException()
-        exp.stderr = 'No such file or directory'
-        self.mock_exc.side_effect = exp
+    def test_del_ndp_proxy_already_deleted(self):
+        _, fake_ipr = self._mock_ndp_proxy_iproute()
+        fake_ipr.neigh.side_effect = netlink_exceptions.NetlinkError(
+            errno.ENOENT)
+        self.assertIsNone(priv_linux_net.del_ndp_proxy(self.ipv6, self.dev))
+
+    def test_del_ndp_proxy_no_device(self):
+        mock_link_id, fake_ipr = self._mock_ndp_proxy_iproute()
+        mock_link_id.side_effect = agent_exc.NetworkInterfaceNotFound(
+            device=self.dev)
         self.assertIsNone(priv_linux_net.del_ndp_proxy(self.ipv6, self.dev))
+        fake_ipr.neigh.assert_not_called()
+
+    def test_sync_ndp_proxies(self):
+        _, fake_ipr = self._mock_ndp_proxy_iproute()
+        ntf_proxy = priv_linux_net.NTF_PROXY
+        dump = test_utils.create_linux_routes([
+            {'ifindex': 7, 'flags': ntf_proxy,
+             'attrs': [('NDA_DST', '2001:db8::')]},
+            {'ifindex': 7, 'flags': ntf_proxy,
+             'attrs': [('NDA_DST', '2001:db8:0:2::')]},
+            # proxy entry on a different device
+            {'ifindex': 8, 'flags': ntf_proxy,
+             'attrs': [('NDA_DST', '2001:db8:0:3::')]},
+            # regular neighbour
+            {'ifindex': 7, 'flags': 0,
+             'attrs': [('NDA_DST', '2001:db8::5')]}])
+        fake_ipr.neigh.side_effect = lambda command, **kwargs: (
+            dump if command == 'dump' else None)
+
+        ret = priv_linux_net.sync_ndp_proxies(
+            ['2001:db8::1/64', '2001:db8:0:1::1/64'], self.dev)
+
+        self.assertEqual((['2001:db8:0:1::'], ['2001:db8:0:2::']), ret)
+        expected_calls = [
+            mock.call('add', dst='2001:db8:0:1::', ifindex=7,
+                      family=constants.AF_INET6,
+                      flags=priv_linux_net.NTF_PROXY),
+            mock.call('del', dst='2001:db8:0:2::', ifindex=7,
+                      family=constants.AF_INET6,
+                      flags=priv_linux_net.NTF_PROXY)]
+        fake_ipr.neigh.assert_has_calls(expected_calls)
+        self.assertEqual(3, fake_ipr.neigh.call_count)
+        fake_ipr.neigh.assert_any_call(
+            'dump', family=constants.AF_INET6,
+            flags=priv_linux_net.NTF_PROXY, dump_filter=mock.ANY)
 
     @mock.patch('builtins.open', new_callable=mock.mock_open())
     def test_create_routing_table_for_bridge(self, mock_o):
         priv_linux_net.create_routing_table_for_bridge(17, 'fake-bridge')
         mock_o.assert_called_once_with('/etc/iproute2/rt_tables', 'a')
         mock_o().__enter__().write.assert_called_once_with('17 fake-bridge\n')
+
+    def _mock_link_get(self, link=None, error=None):
+        mock_ipr = mock.patch.object(priv_linux_net.iproute,
+                                     'IPRoute').start()
+        fake_ipr = mock_ipr()
+        if error:
+            fake_ipr.link.side_effect = netlink_exceptions.NetlinkError(error)
+        else:
+            fake_ipr.link.return_value = [link]
+        return fake_ipr
+
+    def test_get_link_attributes(self):
+        link = mock.MagicMock()
+        link.__getitem__.side_effect = {'index': 7, 'state': 'up'}.get
+        link.get_attr.side_effect = {'IFLA_ADDRESS': self.mac}.get
+        fake_ipr = self._mock_link_get(link)
+
+        ret = priv_linux_net.get_link_attributes(self.dev, ['IFLA_ADDRESS'])
+
+        self.assertEqual({'index': 7, 'state': 'up',
+                          'IFLA_ADDRESS': self.mac}, ret)
+        fake_ipr.link.assert_called_once_with('get', ifname=self.dev)
+        self.assertEqual('up', priv_linux_net.get_link_state(self.dev))
+
+    def test_get_link_attributes_not_found(self):
+        self._mock_link_get(error=errno.ENODEV)
+        self.assertIsNone(priv_linux_net.get_link_attributes(self.dev))
+        self.assertIsNone(priv_linux_net.get_link_state(self.dev))
+        self.assertIsNone(priv_linux_net.get_link_device(self.dev))
+
+    def test_get_link_attributes_error(self):
+        self._mock_link_get(error=errno.EPERM)
+        self.assertRaises(netlink_exceptions.NetlinkError,
+                          priv_linux_net.get_link_attributes, self.dev)
+
+    def test_get_bridge_vlans(self):
+        mock.patch.object(priv_linux_net, '_get_link_id',
+                          return_value=7).start()
+        fake_ipr = self._mock_link_get()
+        ifla_data = mock.Mock(**{'get_attr.return_value': 10})
+        fake_ipr.get_links.return_value = [
+            mock.Mock(**{'get_nested.return_value': ifla_data}),
+            mock.Mock(**{'get_nested.return_value': None})]
+
+        self.assertEqual([10], priv_linux_net.get_bridge_vlans(self.dev_br))
+        fake_ipr.get_links.assert_called_once_with(link=7)
+        ifla_data.get_attr.assert_called_once_with('IFLA_VLAN_ID')
+
+    def test_get_bridge_vlans_no_bridge(self):
+        mock.patch.object(priv_linux_net, '_get_link_id',
+                          return_value=None).start()
+        fake_ipr = self._mock_link_get()
+
+        self.assertEqual([], priv_linux_net.get_bridge_vlans(self.dev_br))
+        fake_ipr.get_links.assert_not_called()
+
+
+class TestPrivilegedLinuxNetIPRoute(test_base.TestCase):
+
+    def setUp(self):
+        super(TestPrivilegedLinuxNetIPRoute, self).setUp()
+        self.mock_iproute = mock.patch.object(priv_linux_net.iproute,
+                                              'IPRoute').start()
+        self.mock_iproute.side_effect = lambda: mock.MagicMock()
+        self.addCleanup(setattr, priv_linux_net, '_link_ids', None)
+        self.addCleanup(setattr, priv_linux_net, '_link_names', {})
+
+    def test_iproute_reused(self):
+        with priv_linux_net._iproute() as ip:
+            pass
+        with priv_linux_net._iproute() as other_ip:
+            pass
+
+        self.assertIs(ip, other_ip)
+        self.mock_iproute.assert_called_once_with()
+        ip.close.assert_not_called()
+
+    def test_iproute_per_thread(self):
+        with priv_linux_net._iproute() as ip:
+            pass
+        ips = []
+
+        def _run():
+            with priv_linux_net._iproute() as thread_ip:
+                ips.append(thread_ip)
+            priv_linux_net.close_iproute()
+
+        thread = threading.Thread(target=_run)
+        thread.start()
+        thread.join()
+
+        self.assertEqual(1, len(ips))
+        self.assertIsNot(ip, ips[0])
+        ips[0].close.assert_called_once_with()
+
+    def test_iproute_netlink_error(self):
+        def _run():
+            with priv_linux_net._iproute():
+                raise netlink_exceptions.NetlinkError(errno.EEXIST)
+
+        self.assertRaises(netlink_exceptions.NetlinkError, _run)
+        with priv_linux_net._iproute():
+            pass
+        self.mock_iproute.assert_called_once_with()
+
+    def test_iproute_socket_error(self):
+        def _run():
+            with priv_linux_net._iproute() as ip:
+                raise OSError(errno.ENOBUFS, 'fake-error')
+            return ip
+
+        ips = []
+        with priv_linux_net._iproute() as ip:
+            ips.append(ip)
+        self.assertRaises(OSError, _run)
+        with priv_linux_net._iproute() as ip:
+            ips.append(ip)
+
+        ips[0].close.assert_called_once_with()
+        self.assertIsNot(ips[0], ips[1])
+
+    def _start_monitor(self):
+        priv_linux_net._link_ids = {}
+        priv_linux_net._link_names = {}
+
+    def _get_fake_ip(self):
+        with priv_linux_net._iproute() as ip:
+            ip.link_lookup.return_value = [7]
+        return ip
+
+    def test_get_link_id_not_monitored(self):
+        ip = self._get_fake_ip()
+
+        self.assertEqual(7, priv_linux_net._get_link_id('fake-dev'))
+        self.assertEqual(7, priv_linux_net._get_link_id('fake-dev'))
+
+        self.assertEqual(2, ip.link_lookup.call_count)
+
+    def test_get_link_id_cached(self):
+        self._start_monitor()
+        ip = self._get_fake_ip()
+
+        self.assertEqual(7, priv_linux_net._get_link_id('fake-dev'))
+        self.assertEqual(7, priv_linux_net._get_link_id('fake-dev'))
+
+        ip.link_lookup.assert_called_once_with(ifname='fake-dev')
+
+    def test_get_link_id_not_found(self):
+        self._start_monitor()
+        ip = self._get_fake_ip()
+        ip.link_lookup.return_value = []
+
+        self.assertIsNone(
+            priv_linux_net._get_link_id('fake-dev', raise_exception=False))
+        self.assertRaises(agent_exc.NetworkInterfaceNotFound,
+                          priv_linux_net._get_link_id, 'fake-dev')
+        self.assertEqual({}, priv_linux_net._link_ids)
+
+    def test_get_link_id_changed_meanwhile(self):
+        self._start_monitor()
+        ip = self._get_fake_ip()
+
+        def _link_lookup(ifname):
+            priv_linux_net._process_link_event(
+                test_utils.FakeLinkMsg(ifname, 7, event='RTM_DELLINK'))
+            return [7]
+
+        ip.link_lookup.side_effect = _link_lookup
+
+        self.assertEqual(7, priv_linux_net._get_link_id('fake-dev'))
+        self.assertEqual({}, priv_linux_net._link_ids)
+
+    def test_delete_interface_forgets_link_id(self):
+        self._start_monitor()
+        ip = self._get_fake_ip()
+        self.assertEqual(7, priv_linux_net._get_link_id('fake-dev'))
+
+        priv_linux_net.delete_interface('fake-dev')
+
+        ip.link.assert_called_once_with('del', index=7)
+        self.assertEqual({}, priv_linux_net._link_ids)
+        self.assertEqual({}, priv_linux_net._link_names)
+
+    def test_run_iproute_link_stale_link_id(self):
+        self._start_monitor()
+        ip = self._get_fake_ip()
+        # deleted and created again before the monitor got the events
+        priv_linux_net._cache_link_id('fake-dev', 5)
+
+        def _link(command, index, **kwargs):
+            if index == 5:
+                raise netlink_exceptions.NetlinkError(errno.ENODEV)
+
+        ip.link.side_effect = _link
+
+        priv_linux_net.set_link_attribute('fake-dev', state='up')
+
+        self.assertEqual([mock.call('set', index=5, state='up'),
+                          mock.call('set', index=7, state='up')],
+                         ip.link.call_args_list)
+        self.assertEqual({'fake-dev': 7}, priv_linux_net._link_ids)
+
+    def test_run_iproute_link_not_found(self):
+        self._start_monitor()
+        ip = self._get_fake_ip()
+        ip.link.side_effect = netlink_exceptions.NetlinkError(errno.ENODEV)
+
+        # the index was not cached, so it is not looked up again
+        self.assertRaises(agent_exc.NetworkInterfaceNotFound,
+                          priv_linux_net.set_link_attribute, 'fake-dev',
+                          state='up')
+        ip.link.assert_called_once_with('set', index=7, state='up')
+
+    def test_process_link_event(self):
+        self._start_monitor()
+        process = priv_linux_net._process_link_event
+
+        process(test_utils.FakeLinkMsg('fake-dev', 7))
+        process(test_utils.FakeLinkMsg('other-dev', 8))
+        self.assertEqual({'fake-dev': 7, 'other-dev': 8},
+                         priv_linux_net._link_ids)
+
+        # renamed
+        process(test_utils.FakeLinkMsg('new-dev', 7))
+        self.assertEqual({'new-dev': 7, 'other-dev': 8},
+                         priv_linux_net._link_ids)
+
+        # deleted
+        process(test_utils.FakeLinkMsg('other-dev', 8, event='RTM_DELLINK'))
+        self.assertEqual({'new-dev': 7}, priv_linux_net._link_ids)
+        self.assertEqual({7: 'new-dev'}, priv_linux_net._link_names)
+
+    def test_process_link_event_not_monitored(self):
+        priv_linux_net._process_link_event(
+            test_utils.FakeLinkMsg('fake-dev', 7))
+        self.assertIsNone(priv_linux_net._link_ids)
+
+    @mock.patch.object(priv_linux_net.link_events, 'monitor')
+    def test_monitor_links(self, mock_monitor):
+        priv_linux_net._monitor_links()
+        mock_monitor.assert_called_once_with(
+            mock.ANY, priv_linux_net._process_link_event,
+            priv_linux_net._monitor_links_started,
+            priv_linux_net._monitor_links_stopped)
+
+        priv_linux_net._monitor_links_started()
+        priv_linux_net._process_link_event(test_utils.FakeLinkMsg(
+            'fake-dev', 7))
+        self.assertEqual({'fake-dev': 7}, priv_linux_net._link_ids)
+
+        priv_linux_net._monitor_links_stopped()
+        self.assertIsNone(priv_linux_net._link_ids)
+        self.assertEqual({}, priv_linux_net._link_names)
+
+    @mock.patch.object(priv_linux_net.link_events, 'start_thread')
+    def test_start_link_monitor(self, mock_start_thread):
+        self.addCleanup(setattr, priv_linux_net, '_link_monitor_started',
+                        False)
+
+        priv_linux_net.start_link_monitor()
+        priv_linux_net.start_link_monitor()
+
+        mock_start_thread.assert_called_once_with(
+            'link-monitor', priv_linux_net._monitor_links)
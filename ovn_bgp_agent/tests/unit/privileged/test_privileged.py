@@ -0,0 +1,71 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from oslo_config import cfg
+
+from ovn_bgp_agent import privileged
+from ovn_bgp_agent.tests import base as test_base
+
+CONF = cfg.CONF
+
+
+class TestPrivContext(test_base.TestCase):
+
+    def setUp(self):
+        super(TestPrivContext, self).setUp()
+        self.context = privileged.PrivContext(
+            'ovn_bgp_agent.privileged', cfg_section='privsep_fake',
+            capabilities=[])
+        self.context.set_client_mode(False)
+        CONF.set_override('thread_pool_size', 1, group='privsep_fake')
+        self.addCleanup(CONF.clear_override, 'thread_pool_size',
+                        group='privsep_fake')
+
+    def test_get_stats(self):
+        self.assertEqual(privileged.ContextStats(0, 0, 0, 0, 0.0, 0.0),
+                         self.context.get_stats())
+
+        self.assertEqual(3, self.context._wrap(lambda a, b=0: a + b, 1, b=2))
+
+        stats = self.context.get_stats()
+        self.assertEqual((1, 0, 1, 0), stats[:4])
+        self.assertGreaterEqual(stats.busy_time, stats.max_time)
+
+    def test_get_stats_queued(self):
+        in_flight = []
+
+        def _inner():
+            in_flight.append(self.context.get_stats().in_flight)
+
+        self.context._wrap(lambda: self.context._wrap(_inner))
+        self.context._wrap(_inner)
+
+        self.assertEqual([2, 1], in_flight)
+        self.assertEqual((3, 0, 2, 1), self.context.get_stats()[:4])
+
+    def test_get_stats_exception(self):
+        def _fail():
+            raise ValueError()
+
+        self.assertRaises(ValueError, self.context._wrap, _fail)
+        self.assertEqual((1, 0, 1, 0), self.context.get_stats()[:4])
+
+    def test_get_stats_all_contexts(self):
+        stats = privileged.get_stats()
+
+        self.assertEqual({'privsep', 'privsep_ovs_vsctl', 'privsep_vtysh'},
+                         set(stats))
+        self.assertEqual(set(privileged.ContextStats._fields),
+                         set(stats['privsep']))
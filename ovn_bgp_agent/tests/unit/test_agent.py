@@ -14,19 +14,28 @@
 
 from unittest import mock
 
+from oslo_config import cfg
+
 from ovn_bgp_agent import agent
 from ovn_bgp_agent.tests import base as test_base
 
+CONF = cfg.CONF
+
 
 class TestAgent(test_base.TestCase):
 
     @mock.patch('oslo_service.service.launch')
+    @mock.patch('ovn_bgp_agent.utils.profiling.setup_signal_handler')
     @mock.patch('ovn_bgp_agent.config.register_opts')
     @mock.patch('ovn_bgp_agent.config.init')
     @mock.patch('ovn_bgp_agent.config.setup_logging')
+    @mock.patch('ovn_bgp_agent.utils.linux_net.start_link_monitor')
     @mock.patch('ovn_bgp_agent.agent.BGPAgent')
-    def test_start(self, m_agent, m_setup_logging, m_config_init,
-                   m_register_opts, m_oslo_launch):
+    def _test_start(self, m_agent, m_start_link_monitor, m_setup_logging,
+                    m_config_init, m_register_opts, m_setup_signal_handler,
+                    m_oslo_launch, cache_link_indexes=False):
+        CONF.set_override('cache_link_indexes', cache_link_indexes)
+        self.addCleanup(CONF.clear_override, 'cache_link_indexes')
         m_launcher = mock.Mock()
         m_oslo_launch.return_value = m_launcher
 
@@ -35,6 +44,137 @@ class TestAgent(test_base.TestCase):
         m_register_opts.assert_called()
         m_config_init.assert_called()
         m_setup_logging.assert_called()
+        m_setup_signal_handler.assert_called_once_with()
+        if cache_link_indexes:
+            m_start_link_monitor.assert_called_once_with()
+        else:
+            m_start_link_monitor.assert_not_called()
         m_agent.assert_called()
         m_oslo_launch.assert_called()
         m_launcher.wait.assert_called()
+
+    def test_start(self):
+        self._test_start()
+
+    def test_start_cache_link_indexes(self):
+        self._test_start(cache_link_indexes=True)
+
+
+class TestReconcileScheduler(test_base.TestCase):
+
+    def setUp(self):
+        super(TestReconcileScheduler, self).setUp()
+        self.addCleanup(CONF.clear_override, 'reconcile_jitter')
+        self.func = mock.Mock(__name__='fake-sync', return_value=None)
+        self.scheduler = agent.ReconcileScheduler(self.func, 300, 30)
+
+    @mock.patch.object(agent.socket, 'gethostname')
+    def test_get_initial_delay(self, mock_hostname):
+        CONF.set_override('reconcile_jitter', 0.1)
+        mock_hostname.return_value = 'host-0'
+        delay0 = self.scheduler.get_initial_delay()
+        self.assertEqual(delay0, self.scheduler.get_initial_delay())
+        self.assertTrue(0 <= delay0 <= 30)
+
+        mock_hostname.return_value = 'host-1'
+        delay1 = self.scheduler.get_initial_delay()
+        self.assertTrue(0 <= delay1 <= 30)
+        self.assertNotEqual(delay0, delay1)
+
+    def test_get_initial_delay_no_jitter(self):
+        CONF.set_override('reconcile_jitter', 0)
+        self.assertEqual(0, self.scheduler.get_initial_delay())
+
+    @mock.patch.object(agent.random, 'uniform')
+    def test_get_next_delay(self, mock_uniform):
+        CONF.set_override('reconcile_jitter', 0.1)
+        mock_uniform.return_value = 0.05
+
+        # from the end of the run, that took 10 seconds
+        self.assertEqual(305, self.scheduler.get_next_delay(10))
+        mock_uniform.assert_called_once_with(0, 0.1)
+
+    def test_get_next_delay_no_jitter(self):
+        CONF.set_override('reconcile_jitter', 0)
+        self.assertEqual(290, self.scheduler.get_next_delay(10, False))
+
+    def test_get_next_delay_drift(self):
+        self.assertEqual(20, self.scheduler.get_next_delay(10, True))
+        self.assertEqual(0, self.scheduler.get_next_delay(40, True))
+
+    def test_get_next_delay_drift_disabled(self):
+        CONF.set_override('reconcile_jitter', 0)
+        scheduler = agent.ReconcileScheduler(self.func, 300)
+        self.assertEqual(290, scheduler.get_next_delay(10, True))
+
+    def test_get_next_delay_overrun(self):
+        CONF.set_override('reconcile_jitter', 0.1)
+        self.assertEqual(30, self.scheduler.get_next_delay(300, True))
+        self.assertEqual(60, self.scheduler.get_next_delay(400))
+        self.assertEqual(120, self.scheduler.get_next_delay(400))
+        self.assertEqual(240, self.scheduler.get_next_delay(400))
+        # capped to MAX_BACKOFF_FACTOR
+        self.assertEqual(240, self.scheduler.get_next_delay(400))
+        # back to the interval once a run does not overrun it
+        CONF.set_override('reconcile_jitter', 0)
+        self.assertEqual(290, self.scheduler.get_next_delay(10))
+        self.assertEqual(0, self.scheduler.overruns)
+
+    def test_get_next_delay_overrun_capped_to_interval(self):
+        CONF.set_override('reconcile_jitter', 1)
+        self.assertEqual(300, self.scheduler.get_next_delay(300))
+        self.assertEqual(300, self.scheduler.get_next_delay(300))
+
+    def test_get_next_delay_overrun_no_jitter(self):
+        CONF.set_override('reconcile_jitter', 0)
+        # the next run right away, as with a FixedIntervalLoopingCall
+        self.assertEqual(0, self.scheduler.get_next_delay(300))
+        self.assertEqual(0, self.scheduler.get_next_delay(400))
+
+    def _get_run_starts(self, durations):
+        """Start times of the runs taking durations, as the loop runs them"""
+        now = [0]
+        starts = []
+
+        def _func():
+            starts.append(now[0])
+            now[0] += durations[len(starts) - 1]
+
+        self.func.side_effect = _func
+        with mock.patch.object(agent.time, 'monotonic',
+                               side_effect=lambda: now[0]):
+            for _ in durations:
+                delay = self.scheduler._run()
+                # the DynamicLoopingCall waits the delay after the run
+                now[0] += delay
+        return starts
+
+    def test__run_fixed_interval(self):
+        CONF.set_override('reconcile_jitter', 0)
+        self.assertEqual([0, 300, 600, 900],
+                         self._get_run_starts([10, 50, 299, 10]))
+
+    def test__run_overrun_no_jitter(self):
+        CONF.set_override('reconcile_jitter', 0)
+        # the overrunning runs are followed right away by the next one,
+        # which does not overlap them
+        self.assertEqual([0, 400, 850, 1150],
+                         self._get_run_starts([400, 450, 10, 10]))
+
+    @mock.patch.object(agent.time, 'monotonic')
+    def test__run(self, mock_monotonic):
+        CONF.set_override('reconcile_jitter', 0)
+        mock_monotonic.side_effect = (100, 110)
+        self.func.return_value = True
+
+        self.assertEqual(20, self.scheduler._run())
+        self.func.assert_called_once_with()
+
+    @mock.patch.object(agent.loopingcall, 'DynamicLoopingCall')
+    def test_start(self, mock_loop):
+        CONF.set_override('reconcile_jitter', 0)
+
+        self.scheduler.start()
+
+        mock_loop.assert_called_once_with(self.scheduler._run)
+        mock_loop.return_value.start.assert_called_once_with(initial_delay=0)
@@ -0,0 +1,143 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.tests import utils as test_utils
+from ovn_bgp_agent.utils import device_registry
+
+
+class TestDeviceRegistry(test_base.TestCase):
+
+    def setUp(self):
+        super(TestDeviceRegistry, self).setUp()
+        device_registry._running = True
+        self.addCleanup(setattr, device_registry, '_running', False)
+        self.addCleanup(device_registry.clear)
+        self.mock_if_nametoindex = mock.patch.object(
+            device_registry.socket, 'if_nametoindex').start()
+        self.mock_if_nametoindex.return_value = 10
+
+    def _add(self, device, key='fake-key', **kwargs):
+        device_registry.add(device, key, device_registry.get_token(device),
+                            **kwargs)
+
+    def test_add(self):
+        self._add('fake-dev')
+        self.assertTrue(device_registry.is_ensured('fake-dev', 'fake-key'))
+        self.assertFalse(device_registry.is_ensured('fake-dev', 'other-key'))
+        self.assertFalse(device_registry.is_ensured('other-dev', 'fake-key'))
+
+    def test_add_long_name(self):
+        self._add('fake-device-with-a-long-name')
+        self.assertTrue(device_registry.is_ensured('fake-device-wit',
+                                                   'fake-key'))
+
+    def test_add_not_running(self):
+        device_registry._running = False
+        self.assertIsNone(device_registry.get_token('fake-dev'))
+        self._add('fake-dev')
+        self.assertFalse(device_registry.is_ensured('fake-dev', 'fake-key'))
+
+    def test_add_invalidated_meanwhile(self):
+        token = device_registry.get_token('fake-dev')
+        device_registry.invalidate('fake-dev')
+        device_registry.add('fake-dev', 'fake-key', token)
+        self.assertFalse(device_registry.is_ensured('fake-dev', 'fake-key'))
+
+    def test_add_cleared_meanwhile(self):
+        token = device_registry.get_token('fake-dev')
+        device_registry.clear()
+        device_registry.add('fake-dev', 'fake-key', token)
+        self.assertFalse(device_registry.is_ensured('fake-dev', 'fake-key'))
+
+    def test_invalidate_dependents(self):
+        self._add('fake-vrf')
+        self._add('fake-dev', master='fake-vrf')
+        self._add('fake-veth', depends=('fake-peer',))
+        self._add('fake-other')
+
+        device_registry.invalidate('fake-vrf')
+        device_registry.invalidate('fake-peer')
+
+        self.assertEqual(
+            [False, False, False, True],
+            [device_registry.is_ensured(device, 'fake-key')
+             for device in ('fake-vrf', 'fake-dev', 'fake-veth',
+                            'fake-other')])
+
+    def _test_process_event(self, ifname, invalidated=True, **kwargs):
+        self._add('fake-dev', master='fake-vrf')
+
+        device_registry._process_event(
+            test_utils.FakeLinkMsg(ifname, **kwargs))
+
+        self.assertEqual(not invalidated,
+                         device_registry.is_ensured('fake-dev', 'fake-key'))
+
+    def test_process_event_deleted(self):
+        self._test_process_event('fake-dev', event='RTM_DELLINK', master=10)
+
+    def test_process_event_down(self):
+        self._test_process_event('fake-dev', up=False, master=10)
+
+    def test_process_event_master_changed(self):
+        self._test_process_event('fake-dev', master=11)
+
+    def test_process_event_master_deleted(self):
+        self._test_process_event('fake-vrf', event='RTM_DELLINK')
+
+    def test_process_event_master_not_found(self):
+        self.mock_if_nametoindex.side_effect = OSError
+        self._test_process_event('fake-dev', master=10)
+
+    def test_process_event_no_changes(self):
+        self._test_process_event('fake-dev', invalidated=False, master=10)
+
+    def test_process_event_other_device(self):
+        self._test_process_event('other-dev', invalidated=False, up=False)
+
+    @mock.patch.object(device_registry.link_events, 'monitor')
+    def test_monitor(self, mock_monitor):
+        device_registry._monitor()
+        mock_monitor.assert_called_once_with(
+            mock.ANY, device_registry._process_event,
+            device_registry._monitor_started,
+            device_registry._monitor_stopped)
+
+    def test_monitor_started(self):
+        device_registry._running = False
+        token = device_registry.get_token('fake-dev')
+
+        device_registry._monitor_started()
+
+        self.assertTrue(device_registry._running)
+        # the tokens taken before may belong to changed devices
+        device_registry.add('fake-dev', 'fake-key', token)
+        self.assertFalse(device_registry.is_ensured('fake-dev', 'fake-key'))
+
+    def test_monitor_stopped(self):
+        self._add('fake-dev')
+
+        device_registry._monitor_stopped()
+
+        self.assertFalse(device_registry._running)
+        self.assertFalse(device_registry.is_ensured('fake-dev', 'fake-key'))
+
+    @mock.patch.object(device_registry.link_events, 'start_thread')
+    def test_start_monitor(self, mock_start_thread):
+        device_registry.start_monitor()
+        mock_start_thread.assert_called_once_with(
+            'device-registry-monitor', device_registry._monitor)
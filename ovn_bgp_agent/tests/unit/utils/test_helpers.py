@@ -29,6 +29,15 @@ class TestHelpers(test_base.TestCase):
         self.assertEqual(ret_net, 'provider-1')
         self.assertEqual(ret_bridge, 'br-ex')
 
+    def test_fingerprint(self):
+        self.assertEqual(helpers.fingerprint(['a', 'b']),
+                         helpers.fingerprint(iter(['b', 'a'])))
+        self.assertEqual(2, helpers.fingerprint(['a', 'b'])[0])
+        self.assertNotEqual(helpers.fingerprint(['a', 'b']),
+                            helpers.fingerprint(['a', 'c']))
+        self.assertNotEqual(helpers.fingerprint(['a', 'b']),
+                            helpers.fingerprint(['a']))
+
     def test_parse_bridge_mappings_missing_mapping(self):
         bridge_mappings = ""
         ret_net, ret_bridge = helpers.parse_bridge_mapping(bridge_mappings)
@@ -0,0 +1,75 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.tests import utils as test_utils
+from ovn_bgp_agent.utils import link_events
+
+
+class TestLinkEvents(test_base.TestCase):
+
+    @mock.patch.object(link_events.pyroute2, 'IPRoute')
+    def test_monitor(self, mock_iproute):
+        ipr = mock_iproute.return_value.__enter__.return_value
+        msg = test_utils.FakeLinkMsg('fake-dev', 7)
+        calls = []
+
+        def _get():
+            if ipr.get.call_count == 1:
+                return [msg]
+            raise OSError('fake-enobufs')
+
+        ipr.get.side_effect = _get
+
+        link_events.monitor(
+            'fake-state',
+            lambda m: calls.append(('event', m)),
+            lambda: calls.append(('started', ipr.bind.called)),
+            lambda: calls.append(('stopped',)))
+
+        # bound before being started, stopped once the events failed
+        self.assertEqual([('started', True), ('event', msg), ('stopped',)],
+                         calls)
+        ipr.bind.assert_called_once_with(groups=link_events.rtnl.RTMGRP_LINK)
+
+    @mock.patch.object(link_events.pyroute2, 'IPRoute')
+    def test_monitor_bind_error(self, mock_iproute):
+        ipr = mock_iproute.return_value.__enter__.return_value
+        ipr.bind.side_effect = OSError('fake-error')
+        started = mock.Mock()
+        stopped = mock.Mock()
+
+        link_events.monitor('fake-state', mock.Mock(), started, stopped)
+
+        started.assert_not_called()
+        stopped.assert_called_once_with()
+
+    @mock.patch.object(link_events.time, 'sleep')
+    @mock.patch.object(link_events.threading, 'Thread')
+    def test_start_thread(self, mock_thread, mock_sleep):
+        run = mock.Mock(side_effect=[None, ValueError])
+
+        link_events.start_thread('fake-monitor', run)
+
+        mock_thread.assert_called_once_with(target=mock.ANY,
+                                            name='fake-monitor')
+        mock_thread.return_value.start.assert_called_once_with()
+        self.assertTrue(mock_thread.return_value.daemon)
+        # run again, after a while, when it returns
+        loop = mock_thread.call_args[1]['target']
+        self.assertRaises(ValueError, loop)
+        self.assertEqual(2, run.call_count)
+        mock_sleep.assert_called_once_with(link_events.RETRY_INTERVAL)
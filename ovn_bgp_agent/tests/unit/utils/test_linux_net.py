@@ -13,14 +13,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import copy
+import errno
 import ipaddress
+import threading
+import time
 
 from unittest import mock
 
+from pyroute2.netlink import exceptions as netlink_exceptions
+
 from ovn_bgp_agent import constants
 from ovn_bgp_agent import exceptions as agent_exc
 from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.utils import device_registry
 from ovn_bgp_agent.utils import linux_net
 
 
@@ -36,14 +41,12 @@ class TestLinuxNet(test_base.TestCase):
 
     def setUp(self):
         super(TestLinuxNet, self).setUp()
-        # Mock pyroute2.NDB context manager object
-        self.mock_ndb = mock.patch.object(linux_net.pyroute2, 'NDB').start()
-        self.fake_ndb = self.mock_ndb().__enter__()
-
         # Mock pyroute2.IPRoute context manager object
         self.mock_ipr = mock.patch.object(linux_net.pyroute2,
                                           'IPRoute').start()
         self.fake_ipr = self.mock_ipr().__enter__()
+        # Index returned by get_interface_index
+        self.ifindex = self.fake_ipr.link_lookup.return_value[0]
 
         # Helper variables used accross many tests
         self.ip = '10.10.1.16'
@@ -52,8 +55,6 @@ class TestLinuxNet(test_base.TestCase):
         self.mac = 'aa:bb:cc:dd:ee:ff'
         self.bridge = 'br-fake'
         self.table_id = 100
-        self.network = ipaddress.IPv4Network("10.10.1.0/24")
-        self.network_v6 = ipaddress.IPv6Network("2002:0:0:1234:0:0:0:0/64")
 
     def test_get_ip_version_v4(self):
         self.assertEqual(4, linux_net.get_ip_version('%s/32' % self.ip))
@@ -63,6 +64,44 @@ class TestLinuxNet(test_base.TestCase):
         self.assertEqual(6, linux_net.get_ip_version('%s/64' % self.ipv6))
         self.assertEqual(6, linux_net.get_ip_version(self.ipv6))
 
+    def test_get_ip_key(self):
+        self.assertEqual(linux_net.get_ip_key('10.0.0.1/32'),
+                         linux_net.get_ip_key('10.0.0.1'))
+        self.assertEqual(linux_net.get_ip_key('fd00::a/128'),
+                         linux_net.get_ip_key('FD00:0::A'))
+        self.assertNotEqual(linux_net.get_ip_key('10.0.0.1/24'),
+                            linux_net.get_ip_key('10.0.0.1'))
+        self.assertRaises(ValueError, linux_net.get_ip_key, 'fake-ip')
+
+    def test_ip_leftovers(self):
+        leftovers = linux_net.IpLeftovers(['10.0.0.1', 'fd00::a',
+                                           '10.0.0.2'])
+
+        leftovers.discard('10.0.0.1/32')
+        leftovers.discard('fd00:0::a')
+        leftovers.discard('10.0.0.3')
+        leftovers.discard('fake-ip')
+
+        self.assertEqual(1, len(leftovers))
+        self.assertIn('10.0.0.2', leftovers)
+        self.assertNotIn('10.0.0.1', leftovers)
+        self.assertNotIn('fake-ip', leftovers)
+        self.assertEqual(['10.0.0.2'], list(leftovers))
+        self.assertEqual([('10.0.0.2', None)], leftovers.items())
+
+    def test_ip_leftovers_dict(self):
+        leftovers = linux_net.IpLeftovers({'10.0.0.1/32': 'rule1',
+                                           '10.0.1.0/24': 'rule2'})
+
+        leftovers.discard('10.0.0.1')
+        self.assertEqual([('10.0.1.0/24', 'rule2')], leftovers.items())
+        leftovers.discard('10.0.1.0/24')
+        self.assertFalse(leftovers)
+
+    def test_ip_leftovers_invalid(self):
+        leftovers = linux_net.IpLeftovers(['10.0.0.1', 'fake-ip'])
+        self.assertEqual(['10.0.0.1'], list(leftovers))
+
     def test_get_interfaces(self):
         iface0 = IPRouteDict({'attrs': [('IFLA_IFNAME', 'ethfake0')]})
         iface1 = IPRouteDict({'attrs': [('IFLA_IFNAME', 'ethfake1')]})
@@ -97,6 +136,92 @@ class TestLinuxNet(test_base.TestCase):
         self.assertRaises(agent_exc.NetworkInterfaceNotFound,
                           linux_net.get_interface_address, 'fake-nic')
 
+    def _get_fake_link(self, up=True, **kwargs):
+        attrs = {'IFLA_IFNAME': self.dev, 'IFLA_ADDRESS': self.mac,
+                 'IFLA_MASTER': 8}
+        attrs.update(kwargs)
+        return IPRouteDict({'index': 7, 'flags': 1 if up else 0,
+                            'attrs': list(attrs.items())})
+
+    def test_get_link_info(self):
+        self.fake_ipr.link.return_value = [self._get_fake_link()]
+
+        ret = linux_net.get_link_info(self.dev)
+
+        self.assertEqual(
+            linux_net.LinkInfo(7, self.dev, self.mac, 8, True), ret)
+        self.fake_ipr.link.assert_called_once_with('get', ifname=self.dev)
+
+    def test_get_link_info_not_found(self):
+        self.fake_ipr.link.side_effect = netlink_exceptions.NetlinkError(
+            errno.ENODEV)
+        self.assertIsNone(linux_net.get_link_info(self.dev))
+
+    def test_get_link_info_error(self):
+        self.fake_ipr.link.side_effect = netlink_exceptions.NetlinkError(
+            errno.EPERM)
+        self.assertRaises(netlink_exceptions.NetlinkError,
+                          linux_net.get_link_info, self.dev)
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_link_attribute')
+    def test_ensure_anycast_mac_for_interface_no_changes(self, mock_set):
+        self.fake_ipr.link.return_value = [
+            self._get_fake_link(IFLA_ADDRESS='02:00:00:00:00:05')]
+
+        linux_net.ensure_anycast_mac_for_interface(self.dev, offset=5)
+
+        mock_set.assert_not_called()
+        self.fake_ipr.get_addr.assert_not_called()
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.add_ip_address')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.delete_ip_address')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_link_attribute')
+    def test_ensure_anycast_mac_for_interface(self, mock_set, mock_del,
+                                              mock_add):
+        self.fake_ipr.link.return_value = [self._get_fake_link()]
+        self.fake_ipr.get_addr.return_value = [
+            IPRouteDict({'scope': 253, 'prefixlen': 64,
+                         'attrs': [('IFA_ADDRESS', 'fe80::1')]}),
+            IPRouteDict({'scope': 0, 'prefixlen': 64,
+                         'attrs': [('IFA_ADDRESS', self.ipv6)]})]
+
+        linux_net.ensure_anycast_mac_for_interface(self.dev, offset=5)
+
+        mock_set.assert_called_once_with(self.dev,
+                                         address='02:00:00:00:00:05')
+        self.fake_ipr.get_addr.assert_called_once_with(
+            index=7, family=constants.AF_INET6)
+        mock_del.assert_called_once_with('fe80::1', self.dev, prefixlen=64,
+                                         scope=253)
+        mock_add.assert_called_once_with('fe80::200:0:5', self.dev,
+                                         prefixlen=64, scope=253)
+
+    def test_ensure_anycast_mac_for_interface_not_found(self):
+        self.fake_ipr.link.side_effect = netlink_exceptions.NetlinkError(
+            errno.ENODEV)
+        self.assertRaises(agent_exc.NetworkInterfaceNotFound,
+                          linux_net.ensure_anycast_mac_for_interface,
+                          self.dev, offset=5)
+
+    def test_get_bridge_vlans(self):
+        vlan_devices = []
+        for vlan_id in (10, 11, None):
+            ifla_data = None
+            if vlan_id:
+                ifla_data = IPRouteDict(
+                    {'attrs': [('IFLA_VLAN_ID', vlan_id)]})
+            vlan_devices.append(
+                mock.Mock(**{'get_nested.return_value': ifla_data}))
+        self.fake_ipr.get_links.return_value = vlan_devices
+
+        self.assertEqual([10, 11], linux_net.get_bridge_vlans(self.bridge))
+        self.fake_ipr.get_links.assert_called_once_with(link=self.ifindex)
+
+    def test_get_bridge_vlans_no_bridge(self):
+        self.fake_ipr.link_lookup.return_value = []
+        self.assertEqual([], linux_net.get_bridge_vlans(self.bridge))
+        self.fake_ipr.get_links.assert_not_called()
+
     def test_get_nic_info(self):
         device_idx = 7
         nic_addr = IPRouteDict({'prefixlen': 32,
@@ -130,6 +255,41 @@ class TestLinuxNet(test_base.TestCase):
         linux_net.ensure_vxlan('fake-vxlan', 11, self.ip, 7)
         mock_ensure_vxlan.assert_called_once_with('fake-vxlan', 11, self.ip, 7)
 
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.ensure_evpn_devices')
+    def test_ensure_evpn_devices(self, mock_ensure_evpn_devices):
+        linux_net.ensure_evpn_devices('fake-bridge', 'fake-vxlan', 11,
+                                      self.ip, 7, vrf_name='fake-vrf')
+        mock_ensure_evpn_devices.assert_called_once_with(
+            'fake-bridge', 'fake-vxlan', 11, self.ip, 7, vrf_name='fake-vrf')
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.'
+                'ensure_evpn_vlan_device')
+    def test_ensure_evpn_vlan_device(self, mock_ensure):
+        linux_net.ensure_evpn_vlan_device('veth-vrf', 'veth-ovs', 'br-100')
+        mock_ensure.assert_called_once_with(
+            'veth-vrf', 'veth-ovs', 'br-100', ips=[], flags=[])
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.'
+                'ensure_evpn_vlan_device')
+    def test_ensure_evpn_vlan_device_l3(self, mock_ensure):
+        linux_net.ensure_evpn_vlan_device(
+            'veth-vrf', 'veth-ovs', 'vrf-100', ips=[self.ip],
+            arp_ndp_offset=511, routing_devices=('br-100',))
+        # the ones ensure_arp_ndp_enabled_for_bridge and
+        # enable_routing_for_interfaces would set
+        mock_ensure.assert_called_once_with(
+            'veth-vrf', 'veth-ovs', 'vrf-100',
+            ips=[self.ip, '169.254.1.255', 'fd53:d91e:400:7f17::1ff'],
+            flags=[('net.ipv4.conf.veth-vrf.proxy_arp', 1),
+                   ('net.ipv6.conf.veth-vrf.proxy_ndp', 1),
+                   ('net.ipv4.ip_forward', 1),
+                   ('net.ipv4.conf.all.forwarding', 1),
+                   ('net.ipv6.conf.all.forwarding', 1),
+                   ('net.ipv4.conf.veth-vrf.forwarding', 1),
+                   ('net.ipv6.conf.veth-vrf.forwarding', 1),
+                   ('net.ipv4.conf.br-100.forwarding', 1),
+                   ('net.ipv6.conf.br-100.forwarding', 1)])
+
     @mock.patch('ovn_bgp_agent.privileged.linux_net.ensure_veth')
     def test_ensure_veth(self, mock_ensure_veth):
         linux_net.ensure_veth('fake-veth', 'fake-veth-peer')
@@ -152,11 +312,10 @@ class TestLinuxNet(test_base.TestCase):
         linux_net.delete_device('fake-dev')
         mock_delete_device.assert_called_once_with('fake-dev')
 
-    @mock.patch.object(linux_net, 'enable_proxy_arp')
-    @mock.patch.object(linux_net, 'enable_proxy_ndp')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flags')
     @mock.patch('ovn_bgp_agent.privileged.linux_net.add_ip_to_dev')
     def test_ensure_arp_ndp_enabled_for_bridge(self, mock_add_ip_to_dev,
-                                               mock_ndp, mock_arp):
+                                               mock_flags):
         linux_net.ensure_arp_ndp_enabled_for_bridge('fake-bridge', 511)
         # NOTE(ltomasbo): hardoced starting ipv4 is 192.168.0.0, and ipv6 is
         # fd53:d91e:400:7f17::0
@@ -165,14 +324,14 @@ class TestLinuxNet(test_base.TestCase):
         calls = [mock.call(ipv4, 'fake-bridge'),
                  mock.call(ipv6, 'fake-bridge')]
         mock_add_ip_to_dev.assert_has_calls(calls)
-        mock_ndp.assert_called_once_with('fake-bridge')
-        mock_arp.assert_called_once_with('fake-bridge')
+        mock_flags.assert_called_once_with([
+            ('net.ipv4.conf.fake-bridge.proxy_arp', 1),
+            ('net.ipv6.conf.fake-bridge.proxy_ndp', 1)])
 
-    @mock.patch.object(linux_net, 'enable_proxy_arp')
-    @mock.patch.object(linux_net, 'enable_proxy_ndp')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flags')
     @mock.patch('ovn_bgp_agent.privileged.linux_net.add_ip_to_dev')
     def test_ensure_arp_ndp_enabled_for_bridge_vlan(self, mock_add_ip_to_dev,
-                                                    mock_ndp, mock_arp):
+                                                    mock_flags):
         linux_net.ensure_arp_ndp_enabled_for_bridge('fake-bridge', 511, 11)
         # NOTE(ltomasbo): hardoced starting ipv4 is 192.168.0.0, and ipv6 is
         # fd53:d91e:400:7f17::0
@@ -181,34 +340,35 @@ class TestLinuxNet(test_base.TestCase):
         calls = [mock.call(ipv4, 'fake-bridge'),
                  mock.call(ipv6, 'fake-bridge')]
         mock_add_ip_to_dev.assert_has_calls(calls)
-        mock_ndp.assert_called_once_with('fake-bridge')
-        mock_arp.assert_called_once_with('fake-bridge')
+        mock_flags.assert_called_once_with([
+            ('net.ipv4.conf.fake-bridge.proxy_arp', 1),
+            ('net.ipv6.conf.fake-bridge.proxy_ndp', 1)])
 
-    @mock.patch.object(linux_net, 'enable_proxy_arp')
-    @mock.patch.object(linux_net, 'enable_proxy_ndp')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flags')
     @mock.patch(
         'ovn_bgp_agent.privileged.linux_net.ensure_vlan_device_for_network')
     def test_ensure_vlan_device_for_network(
-            self, mock_ensure_vlan_device_for_network, mock_ndp, mock_arp):
+            self, mock_ensure_vlan_device_for_network, mock_flags):
         linux_net.ensure_vlan_device_for_network('fake-br', 10)
         expected_dev = 'fake-br/10'
         mock_ensure_vlan_device_for_network.assert_called_once_with(
             'fake-br', 10)
-        mock_ndp.assert_called_once_with(expected_dev)
-        mock_arp.assert_called_once_with(expected_dev)
+        mock_flags.assert_called_once_with([
+            ('net.ipv4.conf.%s.proxy_arp' % expected_dev, 1),
+            ('net.ipv6.conf.%s.proxy_ndp' % expected_dev, 1)])
 
-    @mock.patch.object(linux_net, 'enable_proxy_arp')
-    @mock.patch.object(linux_net, 'enable_proxy_ndp')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flags')
     @mock.patch(
         'ovn_bgp_agent.privileged.linux_net.ensure_vlan_device_for_network')
     def test_ensure_vlan_trimmed_device_for_network(
-            self, mock_ensure_vlan_device_for_network, mock_ndp, mock_arp):
+            self, mock_ensure_vlan_device_for_network, mock_flags):
         linux_net.ensure_vlan_device_for_network('fake-provider', 1020)
         mock_ensure_vlan_device_for_network.assert_called_once_with(
             'fake-provider', 1020)
         expected_dev = 'fake-provi/1020'
-        mock_ndp.assert_called_once_with(expected_dev)
-        mock_arp.assert_called_once_with(expected_dev)
+        mock_flags.assert_called_once_with([
+            ('net.ipv4.conf.%s.proxy_arp' % expected_dev, 1),
+            ('net.ipv6.conf.%s.proxy_ndp' % expected_dev, 1)])
 
     @mock.patch.object(linux_net, 'delete_device')
     def test_delete_vlan_device_for_network(self, mock_del):
@@ -222,17 +382,29 @@ class TestLinuxNet(test_base.TestCase):
         vlan_name = 'fake-provi.1020'
         mock_del.assert_called_once_with(vlan_name)
 
-    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flag')
-    def test_enable_proxy_ndp(self, mock_flag):
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flags')
+    def test_enable_proxy_ndp(self, mock_flags):
         linux_net.enable_proxy_ndp(self.dev)
         expected_flag = 'net.ipv6.conf.%s.proxy_ndp' % self.dev
-        mock_flag.assert_called_once_with(expected_flag, 1)
+        mock_flags.assert_called_once_with([(expected_flag, 1)])
 
-    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flag')
-    def test_enable_proxy_arp(self, mock_flag):
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flags')
+    def test_enable_proxy_arp(self, mock_flags):
         linux_net.enable_proxy_arp(self.dev)
         expected_flag = 'net.ipv4.conf.%s.proxy_arp' % self.dev
-        mock_flag.assert_called_once_with(expected_flag, 1)
+        mock_flags.assert_called_once_with([(expected_flag, 1)])
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_kernel_flags')
+    def test_enable_routing_for_interfaces(self, mock_flags):
+        linux_net.enable_routing_for_interfaces(self.dev, 'br-ex.10')
+        mock_flags.assert_called_once_with([
+            ('net.ipv4.ip_forward', 1),
+            ('net.ipv4.conf.all.forwarding', 1),
+            ('net.ipv6.conf.all.forwarding', 1),
+            ('net.ipv4.conf.%s.forwarding' % self.dev, 1),
+            ('net.ipv6.conf.%s.forwarding' % self.dev, 1),
+            ('net.ipv4.conf.br-ex/10.forwarding', 1),
+            ('net.ipv6.conf.br-ex/10.forwarding', 1)])
 
     def test_get_exposed_ips(self):
         ip0 = IPRouteDict({'prefixlen': 32,
@@ -251,6 +423,62 @@ class TestLinuxNet(test_base.TestCase):
         expected_ips = [self.ip, self.ipv6]
         self.assertEqual(expected_ips, ips)
 
+    @mock.patch.object(linux_net, '_STRICT_CHECK', True)
+    def test__netlink_dump(self):
+        self.fake_ipr.get_routes.side_effect = [['route0'], ['route1']]
+
+        ret = linux_net._netlink_dump('get_routes',
+                                      [{'table': 10}, {'table': 11}])
+
+        self.assertEqual(['route0', 'route1'], ret)
+        self.mock_ipr.assert_called_with(strict_check=True)
+        self.fake_ipr.get_routes.assert_has_calls([
+            mock.call(table=10), mock.call(table=11)])
+        self.assertTrue(linux_net._STRICT_CHECK)
+
+    @mock.patch.object(linux_net, '_STRICT_CHECK', True)
+    def test__netlink_dump_strict_check_not_supported(self):
+        self.mock_ipr.side_effect = [
+            OSError(errno.ENOPROTOOPT, 'Protocol not available'),
+            self.mock_ipr.return_value]
+        self.fake_ipr.get_routes.return_value = ['route0']
+
+        ret = linux_net._netlink_dump('get_routes', [{'table': 10}])
+
+        self.assertEqual(['route0'], ret)
+        self.mock_ipr.assert_has_calls([mock.call(strict_check=True),
+                                        mock.call()])
+        self.assertFalse(linux_net._STRICT_CHECK)
+
+    @mock.patch.object(linux_net, '_STRICT_CHECK', True)
+    def test__netlink_dump_strict_check_filter_not_supported(self):
+        self.fake_ipr.get_routes.side_effect = [
+            netlink_exceptions.NetlinkError(errno.EINVAL), ['route0']]
+
+        ret = linux_net._netlink_dump('get_routes', [{'table': 10}])
+
+        self.assertEqual(['route0'], ret)
+        self.assertFalse(linux_net._STRICT_CHECK)
+
+    @mock.patch.object(linux_net, '_STRICT_CHECK', True)
+    def test__netlink_dump_error(self):
+        self.fake_ipr.get_routes.side_effect = (
+            netlink_exceptions.NetlinkDumpInterrupted())
+
+        self.assertRaises(netlink_exceptions.NetlinkDumpInterrupted,
+                          linux_net._netlink_dump, 'get_routes',
+                          [{'table': 10}])
+        self.assertTrue(linux_net._STRICT_CHECK)
+
+    @mock.patch.object(linux_net, '_STRICT_CHECK', False)
+    def test__netlink_dump_no_strict_check(self):
+        self.fake_ipr.get_routes.return_value = ['route0']
+
+        ret = linux_net._netlink_dump('get_routes', [{'table': 10}])
+
+        self.assertEqual(['route0'], ret)
+        self.mock_ipr.assert_called_with()
+
     def test_get_nic_ip(self):
         ip0 = IPRouteDict({'attrs': [('IFA_ADDRESS', '10.10.1.16')]})
         ip1 = IPRouteDict({'attrs': [('IFA_ADDRESS', '10.10.1.17')]})
@@ -281,66 +509,6 @@ class TestLinuxNet(test_base.TestCase):
 
         self.assertEqual([self.ip, self.ipv6], ret)
 
-    def test_get_exposed_routes_on_network_v4(self):
-        route0 = mock.MagicMock(
-            dst=mock.Mock(),
-            table=self.table_id,
-            scope=1,
-            proto=11,
-            gateway=self.ip,
-        )
-        route1 = mock.MagicMock(
-            dst=mock.Mock(),
-            table=self.table_id,
-            scope=1,
-            proto=11,
-            gateway=self.ipv6,
-        )
-        route2 = mock.MagicMock(
-            dst=mock.Mock(),
-            table=self.table_id,
-            scope=1,
-            proto=11,
-            gateway=None,
-        )
-
-        self.fake_ndb.routes.dump.return_value = [route0, route1, route2]
-        ret = linux_net.get_exposed_routes_on_network(
-            [self.table_id], self.network
-        )
-
-        self.assertEqual([route0], ret)
-
-    def test_get_exposed_routes_on_network_v6(self):
-        route0 = mock.MagicMock(
-            dst=mock.Mock(),
-            table=self.table_id,
-            scope=1,
-            proto=11,
-            gateway=self.ip,
-        )
-        route1 = mock.MagicMock(
-            dst=mock.Mock(),
-            table=self.table_id,
-            scope=1,
-            proto=11,
-            gateway=self.ipv6,
-        )
-        route2 = mock.MagicMock(
-            dst=mock.Mock(),
-            table=self.table_id,
-            scope=1,
-            proto=11,
-            gateway=None,
-        )
-
-        self.fake_ndb.routes.dump.return_value = [route0, route1, route2]
-        ret = linux_net.get_exposed_routes_on_network(
-            [self.table_id], self.network_v6
-        )
-
-        self.assertEqual([route1], ret)
-
     def test_get_ovn_ip_rules(self):
         rule0 = IPRouteDict({'dst_len': 128, 'family': 10,
                              'attrs': [('FRA_TABLE', 7),
@@ -362,6 +530,23 @@ class TestLinuxNet(test_base.TestCase):
                         '6/128': {'table': 10, 'family': 10}}
         self.assertEqual(expected_ret, ret)
 
+    def test_get_ovn_ip_rules_without_dst(self):
+        rule0 = IPRouteDict({'dst_len': 32, 'family': 2,
+                             'attrs': [('FRA_TABLE', 7),
+                                       ('FRA_DST', '10.0.0.1')]})
+        # e.g., a rule matching on the source or the input interface only
+        rule1 = IPRouteDict({'dst_len': 0, 'family': 2,
+                             'attrs': [('FRA_TABLE', 7)]})
+        self.fake_ipr.get_rules.side_effect = [[rule0, rule1], []]
+
+        ip_rules = linux_net.get_ovn_ip_rules([7])
+        self.assertEqual({'10.0.0.1/32': {'table': 7, 'family': 2},
+                          'None/0': {'table': 7, 'family': 2}}, ip_rules)
+
+        leftovers = linux_net.IpLeftovers(ip_rules)
+        self.assertEqual([('10.0.0.1/32', {'table': 7, 'family': 2})],
+                         leftovers.items())
+
     @mock.patch('ovn_bgp_agent.privileged.linux_net.delete_exposed_ips')
     def test_delete_exposed_ips(self, mock_delete_exposed_ips):
         linux_net.delete_exposed_ips([self.ip], self.dev)
@@ -384,15 +569,12 @@ class TestLinuxNet(test_base.TestCase):
         vlan = 2030 if is_vlan else None
         mock_get_index.return_value = oif
 
-        route = {'route': {'dst': self.ip,
-                           'dst_len': 32,
-                           'table': 20},
-                 'vlan': vlan}
-        if has_gateway:
-            route['route']['gateway'] = gateway
+        route = linux_net.RouteInfo(
+            dst=self.ip, dst_len=32, oif=oif, table=20,
+            gateway=gateway if has_gateway else None, vlan=vlan)
 
         routing_tables = {bridge: 20}
-        routing_tables_routes = {bridge: [route]}
+        routing_tables_routes = {bridge: {route}}
         # extra_route0 matches with the route
         extra_route0 = IPRouteDict({
             'dst_len': 32, 'family': constants.AF_INET, 'table': 20,
@@ -447,6 +629,68 @@ class TestLinuxNet(test_base.TestCase):
 
         mock_delete_ip_routes.assert_called_once_with([route0, route1])
 
+    @mock.patch.object(linux_net, 'delete_ip_routes')
+    def test_mark_and_sweep_stale_routes(self, mock_delete_ip_routes):
+        self.addCleanup(linux_net._STALE_ROUTES.clear)
+        route0 = {'scope': 0, 'proto': 3, 'dst': '10.0.0.0',
+                  'dst_len': 24, 'oif': 5, 'gateway': '172.24.4.10'}
+        route1 = {'scope': 253, 'proto': 3, 'dst': '10.0.1.0',
+                  'dst_len': 24, 'oif': 5}
+        self.fake_ipr.get_routes.return_value = [route0, route1]
+
+        linux_net.mark_stale_routes(self.table_id)
+        # route0 is re-installed by the agent, so it is no longer stale
+        linux_net._unmark_stale_route(
+            {'dst': '10.0.0.0', 'dst_len': 24, 'oif': 5,
+             'gateway': '172.24.4.10', 'table': self.table_id})
+        linux_net.sweep_stale_routes(self.table_id)
+
+        mock_delete_ip_routes.assert_called_once_with([route1])
+        self.assertNotIn(self.table_id, linux_net._STALE_ROUTES)
+
+    @mock.patch.object(linux_net, 'delete_ip_routes')
+    def test_sweep_stale_routes_not_marked(self, mock_delete_ip_routes):
+        linux_net.sweep_stale_routes(self.table_id)
+
+        self.fake_ipr.get_routes.assert_not_called()
+        mock_delete_ip_routes.assert_not_called()
+
+    @mock.patch.object(linux_net, 'get_routes_on_tables')
+    @mock.patch.object(linux_net, 'get_ovn_ip_rules')
+    @mock.patch.object(linux_net, 'get_exposed_ips')
+    def test_get_state_fingerprint(self, mock_exposed_ips, mock_ip_rules,
+                                   mock_routes):
+        route = IPRouteDict({
+            'dst': self.ip, 'dst_len': 32, 'oif': 3,
+            'attrs': [('RTA_TABLE', self.table_id)]})
+        mock_exposed_ips.return_value = [self.ip]
+        mock_ip_rules.return_value = {
+            '{}/32'.format(self.ip): {'table': self.table_id, 'family': 2}}
+        mock_routes.return_value = [route]
+
+        ret = linux_net.get_state_fingerprint(self.dev, [self.table_id])
+
+        mock_exposed_ips.assert_called_once_with(self.dev)
+        mock_ip_rules.assert_called_once_with([self.table_id])
+        mock_routes.assert_called_once_with([self.table_id])
+        self.assertEqual(
+            ((1, hash(frozenset([self.ip]))),
+             (1, hash(frozenset([('{}/32'.format(self.ip), self.table_id)]))),
+             (1, hash(frozenset([(self.table_id, self.ip, 32, 3, None)])))),
+            ret)
+
+    @mock.patch.object(linux_net, '_get_table_routes')
+    def test_get_table_routes_by_oif(self, mock_routes):
+        routes = [IPRouteDict({'attrs': [('RTA_DST', dst), ('RTA_OIF', oif)]})
+                  for dst, oif in (('10.0.0.1', 3), ('10.0.0.2', 4),
+                                   ('10.0.0.3', 3))]
+        mock_routes.return_value = routes
+
+        ret = linux_net.get_table_routes_by_oif(self.table_id)
+
+        self.assertEqual({3: [routes[0], routes[2]], 4: [routes[1]]}, ret)
+        mock_routes.assert_called_once_with(self.table_id)
+
     def test_get_routes_on_tables(self):
         route0 = IPRouteDict({
             'proto': 10, 'table': 10,
@@ -496,6 +740,27 @@ class TestLinuxNet(test_base.TestCase):
         linux_net.del_ndp_proxy(self.ip, self.dev, vlan=10)
         mock_ndp_proxy.assert_called_once_with(self.ip, self.dev, 10)
 
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.add_ndp_proxies')
+    def test_add_ndp_proxies(self, mock_ndp_proxies):
+        linux_net.add_ndp_proxies([self.ipv6], self.dev, vlan=10)
+        mock_ndp_proxies.assert_called_once_with([self.ipv6], self.dev, 10)
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.add_ndp_proxies')
+    def test_add_ndp_proxies_no_ips(self, mock_ndp_proxies):
+        linux_net.add_ndp_proxies([], self.dev)
+        mock_ndp_proxies.assert_not_called()
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.del_ndp_proxies')
+    def test_del_ndp_proxies(self, mock_ndp_proxies):
+        linux_net.del_ndp_proxies([self.ipv6], self.dev, vlan=10)
+        mock_ndp_proxies.assert_called_once_with([self.ipv6], self.dev, 10)
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.sync_ndp_proxies')
+    def test_sync_ndp_proxies(self, mock_ndp_proxies):
+        mock_ndp_proxies.return_value = ([], [])
+        linux_net.sync_ndp_proxies([self.ipv6], self.dev)
+        mock_ndp_proxies.assert_called_once_with([self.ipv6], self.dev, None)
+
     @mock.patch.object(linux_net, 'get_interface_index')
     @mock.patch('ovn_bgp_agent.privileged.linux_net.route_delete')
     @mock.patch('ovn_bgp_agent.privileged.linux_net.add_ip_to_dev')
@@ -606,13 +871,9 @@ class TestLinuxNet(test_base.TestCase):
         routes = {}
         linux_net.add_ip_route(routes, self.ip, 7, self.dev)
         expected_routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': None}]}
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32, oif=self.ifindex, table=7,
+                gateway=None, vlan=None)}}
         self.assertEqual(expected_routes, routes)
         mock_route_create.assert_not_called()
 
@@ -621,13 +882,9 @@ class TestLinuxNet(test_base.TestCase):
         routes = {}
         linux_net.add_ip_route(routes, self.ipv6, 7, self.dev)
         expected_routes = {
-            self.dev: [{'route': {'dst': self.ipv6,
-                                  'dst_len': 128,
-                                  'family': constants.AF_INET6,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'table': 7},
-                        'vlan': None}]}
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ipv6, dst_len=128, oif=self.ifindex, table=7,
+                gateway=None, vlan=None)}}
         self.assertEqual(expected_routes, routes)
         mock_route_create.assert_not_called()
 
@@ -636,14 +893,9 @@ class TestLinuxNet(test_base.TestCase):
         routes = {}
         linux_net.add_ip_route(routes, self.ip, 7, self.dev, via='1.1.1.1')
         expected_routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'gateway': '1.1.1.1',
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 0,
-                                  'table': 7},
-                        'vlan': None}]}
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32, oif=self.ifindex, table=7,
+                gateway='1.1.1.1', vlan=None)}}
         self.assertEqual(expected_routes, routes)
         mock_route_create.assert_not_called()
 
@@ -652,13 +904,9 @@ class TestLinuxNet(test_base.TestCase):
         routes = {}
         linux_net.add_ip_route(routes, self.ip, 7, self.dev, vlan=10)
         expected_routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': 10}]}
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32, oif=self.ifindex, table=7,
+                gateway=None, vlan=10)}}
         self.assertEqual(expected_routes, routes)
         mock_route_create.assert_not_called()
 
@@ -673,13 +921,9 @@ class TestLinuxNet(test_base.TestCase):
         mock_get_index.side_effect = [agent_exc.NetworkInterfaceNotFound, oif]
         linux_net.add_ip_route(routes, self.ip, 7, self.dev, vlan=10)
         expected_routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'oif': oif,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': 10}]}
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32, oif=oif, table=7,
+                gateway=None, vlan=10)}}
         self.assertEqual(expected_routes, routes)
         mock_ensure_vlan_device.assert_called_once_with(self.dev, 10)
         mock_route_create.assert_not_called()
@@ -689,13 +933,9 @@ class TestLinuxNet(test_base.TestCase):
         routes = {}
         linux_net.add_ip_route(routes, self.ip, 7, self.dev, mask=30)
         expected_routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 30,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': None}]}
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=30, oif=self.ifindex, table=7,
+                gateway=None, vlan=None)}}
         self.assertEqual(expected_routes, routes)
         mock_route_create.assert_not_called()
 
@@ -705,101 +945,108 @@ class TestLinuxNet(test_base.TestCase):
         routes = {}
         linux_net.add_ip_route(routes, self.ip, 7, self.dev)
         expected_routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': None}]}
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32, oif=self.ifindex, table=7,
+                gateway=None, vlan=None)}}
         self.assertEqual(expected_routes, routes)
         mock_route_create.assert_called_once_with(
-            expected_routes[self.dev][0]['route'])
+            {'dst': self.ip, 'dst_len': 32, 'oif': mock.ANY, 'proto': 3,
+             'scope': 253, 'table': 7})
 
     @mock.patch('ovn_bgp_agent.privileged.linux_net.route_delete')
     def test_del_ip_route(self, mock_route_delete):
+        route = {'dst': self.ip,
+                 'dst_len': 32,
+                 'oif': mock.ANY,
+                 'proto': 3,
+                 'scope': 253,
+                 'table': 7}
         routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': None}]}
-        route = copy.deepcopy(routes[self.dev][0]['route'])
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32,
+                oif=self.ifindex, table=7,
+                gateway=None, vlan=None)}}
 
         linux_net.del_ip_route(routes, self.ip, 7, self.dev)
 
-        self.assertEqual({self.dev: []}, routes)
+        self.assertEqual({self.dev: set()}, routes)
         mock_route_delete.assert_called_once_with(route)
 
     @mock.patch('ovn_bgp_agent.privileged.linux_net.route_delete')
     def test_del_ip_route_ipv6(self, mock_route_delete):
+        route = {'dst': self.ipv6,
+                 'dst_len': 128,
+                 'family': constants.AF_INET6,
+                 'oif': mock.ANY,
+                 'proto': 3,
+                 'table': 7}
         routes = {
-            self.dev: [{'route': {'dst': self.ipv6,
-                                  'dst_len': 128,
-                                  'family': constants.AF_INET6,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'table': 7},
-                        'vlan': None}]}
-        route = copy.deepcopy(routes[self.dev][0]['route'])
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ipv6, dst_len=128,
+                oif=self.ifindex, table=7,
+                gateway=None, vlan=None)}}
 
         linux_net.del_ip_route(routes, self.ipv6, 7, self.dev)
 
-        self.assertEqual({self.dev: []}, routes)
+        self.assertEqual({self.dev: set()}, routes)
         mock_route_delete.assert_called_once_with(route)
 
     @mock.patch('ovn_bgp_agent.privileged.linux_net.route_delete')
     def test_del_ip_route_via(self, mock_route_delete):
+        route = {'dst': self.ip,
+                 'dst_len': 32,
+                 'oif': mock.ANY,
+                 'gateway': '1.1.1.1',
+                 'proto': 3,
+                 'scope': 0,
+                 'table': 7}
         routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'oif': mock.ANY,
-                                  'gateway': '1.1.1.1',
-                                  'proto': 3,
-                                  'scope': 0,
-                                  'table': 7},
-                        'vlan': None}]}
-        route = copy.deepcopy(routes[self.dev][0]['route'])
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32,
+                oif=self.ifindex, table=7,
+                gateway='1.1.1.1', vlan=None)}}
 
         linux_net.del_ip_route(routes, self.ip, 7, self.dev, via='1.1.1.1')
 
-        self.assertEqual({self.dev: []}, routes)
+        self.assertEqual({self.dev: set()}, routes)
         mock_route_delete.assert_called_once_with(route)
 
     @mock.patch('ovn_bgp_agent.privileged.linux_net.route_delete')
     def test_del_ip_route_vlan(self, mock_route_delete):
+        route = {'dst': self.ip,
+                 'dst_len': 32,
+                 'oif': mock.ANY,
+                 'proto': 3,
+                 'scope': 253,
+                 'table': 7}
         routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 32,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': 10}]}
-        route = copy.deepcopy(routes[self.dev][0]['route'])
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=32,
+                oif=self.ifindex, table=7,
+                gateway=None, vlan=10)}}
 
         linux_net.del_ip_route(routes, self.ip, 7, self.dev, vlan=10)
 
-        self.assertEqual({self.dev: []}, routes)
+        self.assertEqual({self.dev: set()}, routes)
         mock_route_delete.assert_called_once_with(route)
 
     @mock.patch('ovn_bgp_agent.privileged.linux_net.route_delete')
     def test_del_ip_route_mask(self, mock_route_delete):
+        route = {'dst': self.ip,
+                 'dst_len': 30,
+                 'oif': mock.ANY,
+                 'proto': 3,
+                 'scope': 253,
+                 'table': 7}
         routes = {
-            self.dev: [{'route': {'dst': self.ip,
-                                  'dst_len': 30,
-                                  'oif': mock.ANY,
-                                  'proto': 3,
-                                  'scope': 253,
-                                  'table': 7},
-                        'vlan': None}]}
-        route = copy.deepcopy(routes[self.dev][0]['route'])
+            self.dev: {linux_net.RouteInfo(
+                dst=self.ip, dst_len=30,
+                oif=self.ifindex, table=7,
+                gateway=None, vlan=None)}}
 
         linux_net.del_ip_route(routes, self.ip, 7, self.dev, mask=30)
 
-        self.assertEqual({self.dev: []}, routes)
+        self.assertEqual({self.dev: set()}, routes)
         mock_route_delete.assert_called_once_with(route)
 
 
@@ -876,3 +1123,92 @@ class TestEnsureRoutingTableForBridge(test_base.TestCase):
                 self.ovn_routing_tables, self.bridge_name, self.vrf_table)
 
         self.assertDictEqual({}, self.ovn_routing_tables)
+
+
+class TestEnsureOnce(test_base.TestCase):
+
+    def setUp(self):
+        super(TestEnsureOnce, self).setUp()
+        device_registry._running = True
+        self.addCleanup(setattr, device_registry, '_running', False)
+        self.addCleanup(device_registry.clear)
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.ensure_vrf')
+    def test_ensure_vrf(self, mock_ensure_vrf):
+        linux_net.ensure_vrf('fake-vrf', 10)
+        linux_net.ensure_vrf('fake-vrf', 10)
+        mock_ensure_vrf.assert_called_once_with('fake-vrf', 10)
+
+        # different attributes
+        linux_net.ensure_vrf('fake-vrf', 11)
+        self.assertEqual(2, mock_ensure_vrf.call_count)
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.ensure_vrf')
+    def test_ensure_vrf_exception(self, mock_ensure_vrf):
+        mock_ensure_vrf.side_effect = [RuntimeError, None]
+        self.assertRaises(RuntimeError, linux_net.ensure_vrf, 'fake-vrf', 10)
+        linux_net.ensure_vrf('fake-vrf', 10)
+        self.assertEqual(2, mock_ensure_vrf.call_count)
+
+    @mock.patch.object(linux_net, 'set_kernel_flags')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.'
+                'ensure_vlan_device_for_network')
+    def test_ensure_vlan_device_for_network_concurrently(self, mock_ensure,
+                                                         mock_flags):
+        # the first one is still creating it when the second one checks it
+        mock_ensure.side_effect = lambda *args: time.sleep(0.05)
+        threads = [threading.Thread(
+            target=linux_net.ensure_vlan_device_for_network,
+            args=('fake-bridge', 10)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_ensure.assert_called_once_with('fake-bridge', 10)
+        mock_flags.assert_called_once_with(mock.ANY)
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.ensure_vrf')
+    def test_ensure_different_devices_concurrently(self, mock_ensure_vrf):
+        # each creation only completes once the other one is in progress,
+        # which would time out if they were serialized
+        barrier = threading.Barrier(2, timeout=5)
+        mock_ensure_vrf.side_effect = lambda *args: barrier.wait()
+        errors = []
+
+        def _ensure(vrf_name, vrf_table):
+            try:
+                linux_net.ensure_vrf(vrf_name, vrf_table)
+            except threading.BrokenBarrierError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=_ensure, args=(vrf, table))
+                   for vrf, table in (('fake-vrf1', 10), ('fake-vrf2', 11))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([], errors)
+        mock_ensure_vrf.assert_has_calls([mock.call('fake-vrf1', 10),
+                                          mock.call('fake-vrf2', 11)],
+                                         any_order=True)
+        self.assertTrue(device_registry.is_ensured('fake-vrf1',
+                                                   ('vrf', 10)))
+        self.assertTrue(device_registry.is_ensured('fake-vrf2',
+                                                   ('vrf', 11)))
+
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.delete_device')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.set_master_for_device')
+    @mock.patch('ovn_bgp_agent.privileged.linux_net.ensure_dummy_device')
+    def test_ensure_ovn_device_deleted(self, mock_ensure_dummy,
+                                       mock_set_master, mock_delete):
+        linux_net.ensure_ovn_device('fake-dev', 'fake-vrf')
+        linux_net.ensure_ovn_device('fake-dev', 'fake-vrf')
+        mock_ensure_dummy.assert_called_once_with('fake-dev')
+        mock_set_master.assert_called_once_with('fake-dev', 'fake-vrf')
+
+        linux_net.delete_device('fake-dev')
+        linux_net.ensure_ovn_device('fake-dev', 'fake-vrf')
+        self.assertEqual(2, mock_ensure_dummy.call_count)
+        self.assertEqual(2, mock_set_master.call_count)
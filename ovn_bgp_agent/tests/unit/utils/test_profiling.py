@@ -0,0 +1,188 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import pstats
+from unittest import mock
+
+import fixtures
+from oslo_config import cfg
+
+from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.utils import profiling
+
+CONF = cfg.CONF
+
+
+class TestProfiling(test_base.TestCase):
+
+    def setUp(self):
+        super(TestProfiling, self).setUp()
+        self.profiling_dir = self.useFixture(fixtures.TempDir()).path
+        CONF.set_override('profiling_dir', self.profiling_dir)
+        self.addCleanup(CONF.clear_override, 'profiling_dir')
+        self.addCleanup(setattr, profiling, '_syncs_left', 0)
+        self.addCleanup(setattr, profiling, '_handlers_session', None)
+        self.mock_timer = mock.patch.object(
+            profiling.threading, 'Timer').start()
+
+    def _get_files(self, extension):
+        return sorted(os.path.join(self.profiling_dir, f)
+                      for f in os.listdir(self.profiling_dir)
+                      if f.endswith(extension))
+
+    def _read_json(self):
+        files = self._get_files('.json')
+        self.assertEqual(1, len(files))
+        with open(files[0]) as f:
+            return json.load(f)
+
+    def _get_functions(self):
+        files = self._get_files('.prof')
+        self.assertEqual(1, len(files))
+        return {func[2] for func in pstats.Stats(files[0]).stats}
+
+    @staticmethod
+    def _fake_work():
+        return sum(range(10))
+
+    def test_sync_profile_not_requested(self):
+        with profiling.sync_profile('fake-driver'):
+            profiling.end_phase('fake-phase')
+        self.assertEqual([], os.listdir(self.profiling_dir))
+
+    def test_sync_profile(self):
+        profiling.request(syncs=1)
+
+        with profiling.sync_profile('fake-driver'):
+            self._fake_work()
+            profiling.end_phase('fake-phase1')
+            profiling.end_phase('fake-phase2')
+
+        data = self._read_json()
+        self.assertEqual('fake-driver', data['sync'])
+        self.assertEqual(['fake-phase1', 'fake-phase2'],
+                         [p['name'] for p in data['phases']])
+        self.assertLessEqual(sum(p['elapsed'] for p in data['phases']),
+                             data['elapsed'])
+        self.assertIn('_fake_work', self._get_functions())
+        self.assertIn('privsep', data['privsep'])
+        self.mock_timer.assert_not_called()
+
+        # only the requested number of syncs is profiled
+        with profiling.sync_profile('fake-driver'):
+            profiling.end_phase('fake-phase')
+        self.assertEqual(1, len(self._get_files('.json')))
+
+    def test_sync_profile_exception(self):
+        profiling.request(syncs=1)
+
+        def _sync():
+            with profiling.sync_profile('fake-driver'):
+                profiling.end_phase('fake-phase')
+                raise ValueError()
+
+        self.assertRaises(ValueError, _sync)
+        self.assertEqual(['fake-phase'],
+                         [p['name'] for p in self._read_json()['phases']])
+
+    def test_handler_profile(self):
+        profiling.request(duration=60)
+        self.mock_timer.assert_called_once_with(
+            60, profiling._finish_handlers_session)
+
+        with profiling.handler_profile('FakeEvent'):
+            self._fake_work()
+        with profiling.handler_profile('FakeEvent'):
+            pass
+        with profiling.handler_profile('OtherFakeEvent'):
+            pass
+        profiling._finish_handlers_session()
+
+        events = self._read_json()['events']
+        self.assertEqual({'FakeEvent', 'OtherFakeEvent'}, set(events))
+        self.assertEqual(2, events['FakeEvent']['runs'])
+        self.assertEqual(1, events['OtherFakeEvent']['runs'])
+        self.assertIn('privsep', self._read_json()['privsep'])
+        self.assertIn('_fake_work', self._get_functions())
+        self.assertIsNone(profiling._handlers_session)
+
+    def test_handler_profile_expired(self):
+        profiling.request(duration=60)
+        profiling._handlers_session.end = 0
+
+        with profiling.handler_profile('FakeEvent'):
+            pass
+
+        self.assertEqual({}, profiling._handlers_session.timings)
+
+    def test_handle_signal(self):
+        self.addCleanup(profiling._requested.clear)
+        # the signal may interrupt the main thread while holding the lock
+        with profiling._lock:
+            profiling._handle_signal(profiling.PROFILING_SIGNAL, None)
+
+        self.assertTrue(profiling._requested.is_set())
+        self.assertEqual(0, profiling._syncs_left)
+
+    @mock.patch.object(profiling, '_requested')
+    def test_wait_requests(self, mock_requested):
+        CONF.set_override('profiling_syncs', 2)
+        CONF.set_override('profiling_duration', 0)
+        self.addCleanup(CONF.clear_override, 'profiling_syncs')
+        self.addCleanup(CONF.clear_override, 'profiling_duration')
+        # stop waiting after the first request
+        mock_requested.wait.side_effect = [True, SystemExit]
+
+        self.assertRaises(SystemExit, profiling._wait_requests)
+
+        mock_requested.clear.assert_called_once_with()
+        self.assertEqual(2, profiling._syncs_left)
+        self.assertIsNone(profiling._handlers_session)
+        self.mock_timer.assert_not_called()
+
+    @mock.patch.object(profiling.signal, 'signal')
+    @mock.patch.object(profiling.threading, 'Thread')
+    def test_setup_signal_handler(self, mock_thread, mock_signal):
+        profiling.setup_signal_handler()
+
+        mock_thread.assert_called_once_with(
+            target=profiling._wait_requests, name='profiling-requests',
+            daemon=True)
+        mock_thread.return_value.start.assert_called_once_with()
+        mock_signal.assert_called_once_with(profiling.PROFILING_SIGNAL,
+                                            profiling._handle_signal)
+
+    @mock.patch.object(profiling, '_get_timestamp',
+                       return_value='fake-timestamp')
+    def test_dump_symlink(self, mock_timestamp):
+        target = os.path.join(self.profiling_dir, 'fake-target')
+        with open(target, 'w') as f:
+            f.write('fake-content')
+        os.symlink(target, os.path.join(
+            self.profiling_dir, 'sync-fake-driver-fake-timestamp.json'))
+        profiling.request(syncs=1)
+
+        with profiling.sync_profile('fake-driver'):
+            pass
+
+        with open(target) as f:
+            self.assertEqual('fake-content', f.read())
+
+    def test_dump_error(self):
+        CONF.set_override('profiling_dir', '/nonexistent')
+        profiling.request(syncs=1)
+        with profiling.sync_profile('fake-driver'):
+            pass
@@ -0,0 +1,150 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+
+import fixtures
+from oslo_config import cfg
+
+from ovn_bgp_agent import privileged
+from ovn_bgp_agent.tests import base as test_base
+from ovn_bgp_agent.utils import tracing
+
+CONF = cfg.CONF
+
+
+class TestTracing(test_base.TestCase):
+
+    def setUp(self):
+        super(TestTracing, self).setUp()
+        self.trace_file = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'traces.json')
+        CONF.set_override('trace_file', self.trace_file)
+        CONF.set_override('trace_sample_rate', 1)
+        self.addCleanup(CONF.clear_override, 'trace_file')
+        self.addCleanup(CONF.clear_override, 'trace_sample_rate')
+
+    def _read_traces(self):
+        with open(self.trace_file) as f:
+            return [json.loads(line) for line in f]
+
+    def _get_spans(self, trace):
+        spans = trace['resourceSpans'][0]['scopeSpans'][0]['spans']
+        return {s['name']: s for s in spans}
+
+    def test_start_trace(self):
+        idl = type('FakeIdl', (), {'last_id': 'fake-txn'})()
+        trace = tracing.start_trace('fake-trace', {'fake-attr': 1}, idl=idl)
+        trace.hold()
+        trace.hold()
+
+        trace.release()
+        self.assertFalse(os.path.exists(self.trace_file))
+        trace.release()
+
+        traces = self._read_traces()
+        self.assertEqual(1, len(traces))
+        self.assertEqual(
+            [{'key': 'service.name',
+              'value': {'stringValue': tracing.SERVICE_NAME}}],
+            traces[0]['resourceSpans'][0]['resource']['attributes'])
+        root = self._get_spans(traces[0])['fake-trace']
+        self.assertEqual(trace.trace_id, root['traceId'])
+        self.assertEqual('', root['parentSpanId'])
+        self.assertEqual(
+            [{'key': 'fake-attr', 'value': {'intValue': '1'}},
+             {'key': 'ovsdb.txn_id', 'value': {'stringValue': 'fake-txn'}}],
+            root['attributes'])
+        self.assertLessEqual(int(root['startTimeUnixNano']),
+                             int(root['endTimeUnixNano']))
+
+    def test_start_trace_disabled(self):
+        CONF.set_override('trace_file', None)
+        self.assertIsNone(tracing.start_trace('fake-trace'))
+
+    def test_start_trace_not_sampled(self):
+        CONF.set_override('trace_sample_rate', 0)
+        self.assertIsNone(tracing.start_trace('fake-trace'))
+
+    def test_span_without_trace(self):
+        with tracing.span('fake-span') as span:
+            self.assertIsNone(span)
+
+    def test_spans(self):
+        @tracing.traced('fake-traced')
+        def _traced():
+            with tracing.span('fake-inner', attr=True):
+                pass
+
+        @tracing.synchronized('fake-lock')
+        def _locked():
+            _traced()
+
+        trace = tracing.start_trace('fake-trace')
+        with trace.activate('fake-activated'):
+            _locked()
+        with trace.activate('fake-privsep'):
+            self.assertRaises(ValueError, privileged.default._wrap,
+                              self._raise_value_error)
+        self.assertIsNone(tracing._get_current_span())
+        trace.finish()
+
+        spans = self._get_spans(self._read_traces()[0])
+        root = spans['fake-trace']
+        self.assertEqual(root['spanId'],
+                         spans['fake-activated']['parentSpanId'])
+        self.assertEqual(spans['fake-activated']['spanId'],
+                         spans['lock.wait']['parentSpanId'])
+        self.assertEqual(
+            [{'key': 'lock', 'value': {'stringValue': 'fake-lock'}}],
+            spans['lock.wait']['attributes'])
+        self.assertEqual(spans['fake-activated']['spanId'],
+                         spans['_locked']['parentSpanId'])
+        self.assertEqual(spans['_locked']['spanId'],
+                         spans['fake-traced']['parentSpanId'])
+        self.assertEqual(spans['fake-traced']['spanId'],
+                         spans['fake-inner']['parentSpanId'])
+        self.assertEqual(
+            [{'key': 'attr', 'value': {'boolValue': True}}],
+            spans['fake-inner']['attributes'])
+        privsep_span = spans['privsep._raise_value_error']
+        self.assertEqual(spans['fake-privsep']['spanId'],
+                         privsep_span['parentSpanId'])
+        self.assertEqual(
+            {'code': tracing.STATUS_CODE_ERROR,
+             'message': 'ValueError: fake-error'},
+            privsep_span['status'])
+        self.assertNotIn('status', spans['fake-privsep'])
+        self.assertNotIn('status', spans['fake-activated'])
+
+    @staticmethod
+    def _raise_value_error():
+        raise ValueError('fake-error')
+
+    def test_traced_without_trace(self):
+        @tracing.traced()
+        def _traced(arg):
+            return arg
+
+        @tracing.synchronized('fake-lock')
+        def _locked(arg):
+            return _traced(arg)
+
+        self.assertEqual('fake-arg', _locked('fake-arg'))
+        self.assertFalse(os.path.exists(self.trace_file))
+
+    def test_export_error(self):
+        CONF.set_override('trace_file', '/nonexistent/traces.json')
+        tracing.start_trace('fake-trace').finish()
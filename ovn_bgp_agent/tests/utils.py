@@ -14,6 +14,7 @@
 #    under the License.
 
 import eventlet
+from pyroute2.netlink.rtnl import ifinfmsg
 import uuid
 
 
@@ -40,6 +41,19 @@ def create_linux_routes(route_info) -> 'list[FakeLinuxRoute]':
     return [FakeLinuxRoute(r) for r in route_info]
 
 
+class FakeLinkMsg(dict):
+    """Link event message, as got by the link events monitors"""
+
+    def __init__(self, ifname, index=None, event='RTM_NEWLINK', up=True,
+                 master=None):
+        super(FakeLinkMsg, self).__init__(
+            event=event, index=index, flags=ifinfmsg.IFF_UP if up else 0)
+        self.attrs = {'IFLA_IFNAME': ifname, 'IFLA_MASTER': master}
+
+    def get_attr(self, name):
+        return self.attrs.get(name)
+
+
 def wait_until_true(predicate, timeout=60, sleep=1, exception=None):
     """Wait until callable predicate is evaluated as True
 
@@ -0,0 +1,181 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Registry of the devices already ensured by the agent
+
+The linux_net ensure_* helpers register here the devices they ensured,
+along with what they were ensured for (a key such as the device kind and
+its attributes, or its master), and skip the privileged calls while the
+device is still registered with that key.
+
+A thread monitors the netlink link events, unregistering the devices that
+are deleted, set down or moved to another master than the one they were
+registered with, so that they are ensured again the next time. The devices
+registered as depending on them (e.g. a veth on its peer) are unregistered
+too. If the monitoring fails (e.g. events are lost because the socket
+buffer overflowed), every device is unregistered.
+
+Devices are only registered while the link events are monitored, which is
+enabled by CONF.cache_ensured_devices.
+"""
+
+import collections
+import socket
+import threading
+
+from neutron_lib import constants as n_const
+from oslo_config import cfg
+from oslo_log import log as logging
+from pyroute2.netlink.rtnl import ifinfmsg
+
+from ovn_bgp_agent.utils import link_events
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_running = False
+# bumped when every device is unregistered
+_epoch = 0
+# device -> keys it was ensured for
+_devices = collections.defaultdict(set)
+# device -> expected master
+_masters = {}
+# device -> devices depending on it
+_dependents = collections.defaultdict(set)
+# device -> times it was unregistered
+_generations = collections.Counter()
+
+
+def _get_name(device):
+    return device[:n_const.DEVICE_NAME_MAX_LEN]
+
+
+def is_ensured(device, key):
+    """Whether the device was already ensured for the key"""
+    with _lock:
+        return key in _devices.get(_get_name(device), ())
+
+
+def get_token(device):
+    """Get the token to register the device with once ensured
+
+    It must be taken before ensuring the device, so that it is not
+    registered if it was unregistered in the meantime.
+    """
+    device = _get_name(device)
+    with _lock:
+        if not _running:
+            return None
+        return _epoch, _generations[device]
+
+
+def add(device, key, token, master=None, depends=()):
+    """Register the device as ensured for the key
+
+    :param master: the master the device must keep.
+    :param depends: the devices whose changes also unregister this one.
+    """
+    if token is None:
+        return
+    device = _get_name(device)
+    with _lock:
+        if not _running or token != (_epoch, _generations[device]):
+            return
+        _devices[device].add(key)
+        if master:
+            _masters[device] = _get_name(master)
+            _dependents[_masters[device]].add(device)
+        for dependency in depends:
+            if dependency:
+                _dependents[_get_name(dependency)].add(device)
+
+
+def invalidate(device):
+    """Unregister the device and the devices depending on it"""
+    with _lock:
+        _invalidate(_get_name(device))
+
+
+def _invalidate(device):
+    pending = [device]
+    while pending:
+        device = pending.pop()
+        _generations[device] += 1
+        if _devices.pop(device, None):
+            LOG.debug("Device %s has to be ensured again", device)
+        _masters.pop(device, None)
+        pending.extend(_dependents.pop(device, ()))
+
+
+def clear():
+    """Unregister every device"""
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _devices.clear()
+        _masters.clear()
+        _dependents.clear()
+        _generations.clear()
+
+
+def _is_master_changed(device, msg):
+    with _lock:
+        master = _masters.get(device)
+    if not master:
+        return False
+    try:
+        master_index = socket.if_nametoindex(master)
+    except OSError:
+        return True
+    return msg.get_attr('IFLA_MASTER') != master_index
+
+
+def _process_event(msg):
+    device = msg.get_attr('IFLA_IFNAME')
+    with _lock:
+        if device not in _devices and device not in _dependents:
+            return
+
+    if (msg['event'] == 'RTM_DELLINK' or
+            not msg['flags'] & ifinfmsg.IFF_UP or
+            _is_master_changed(device, msg)):
+        invalidate(device)
+
+
+def _monitor_started():
+    global _running
+    with _lock:
+        _running = True
+    # the devices ensured before binding may have changed unnoticed
+    clear()
+    LOG.info("Monitoring the link events to skip ensuring the devices "
+             "already ensured")
+
+
+def _monitor_stopped():
+    global _running
+    with _lock:
+        _running = False
+    clear()
+
+
+def _monitor():
+    link_events.monitor('ensured devices', _process_event, _monitor_started,
+                        _monitor_stopped)
+
+
+def start_monitor():
+    """Start monitoring the link events, allowing to register devices"""
+    link_events.start_thread('device-registry-monitor', _monitor)
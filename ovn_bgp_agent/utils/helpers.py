@@ -27,6 +27,15 @@ def parse_bridge_mapping(bridge_mapping):
     return network, bridge
 
 
+def fingerprint(items):
+    """Return a cheap fingerprint of a collection of hashable items
+
+    It is a (count, hash) tuple that does not depend on the items order.
+    """
+    items = frozenset(items)
+    return len(items), hash(items)
+
+
 def _get_lb_datapaths_from_group(lb, attr):
     try:
         dps = getattr(lb, attr)[0].datapaths
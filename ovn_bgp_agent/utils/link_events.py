@@ -0,0 +1,68 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Monitoring of the netlink link events
+
+Used by the state kept about the links (e.g. the devices already ensured
+or the interface indexes), which must be dropped whenever the monitoring
+fails, as events may have been lost (e.g. because the socket buffer
+overflowed).
+"""
+
+import threading
+import time
+
+from oslo_log import log as logging
+import pyroute2
+from pyroute2.netlink import rtnl
+
+LOG = logging.getLogger(__name__)
+
+RETRY_INTERVAL = 1
+
+
+def monitor(name, process_event, started, stopped):
+    """Process the link events until the monitoring fails
+
+    :param name: what the link events are monitored for, to log it.
+    :param process_event: called with each link event message.
+    :param started: called once bound to the link events, so that no change
+                    after it is missed.
+    :param stopped: called once the monitoring stopped.
+    """
+    try:
+        with pyroute2.IPRoute() as ipr:
+            ipr.bind(groups=rtnl.RTMGRP_LINK)
+            started()
+            while True:
+                for msg in ipr.get():
+                    process_event(msg)
+    except Exception as e:
+        LOG.warning("Stopped monitoring the link events for the %s, its "
+                    "state is dropped: %s", name, e)
+    finally:
+        stopped()
+
+
+def start_thread(name, run):
+    """Run the monitoring function in a thread, again whenever it returns"""
+    def _loop():
+        while True:
+            run()
+            time.sleep(RETRY_INTERVAL)
+
+    thread = threading.Thread(target=_loop, name=name)
+    thread.daemon = True
+    thread.start()
+    return thread
@@ -12,27 +12,168 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import errno
 import ipaddress
 import random
 import re
 import sys
+import threading
 
 import netaddr
 from neutron_lib import constants as n_const
 from oslo_log import log as logging
 import pyroute2
 from pyroute2.netlink import exceptions as netlink_exceptions
+from pyroute2.netlink.rtnl import ifinfmsg
 import tenacity
 
 from ovn_bgp_agent import constants
 from ovn_bgp_agent import exceptions as agent_exc
 import ovn_bgp_agent.privileged.linux_net
 from ovn_bgp_agent.utils import common as common_utils
+from ovn_bgp_agent.utils import device_registry
+from ovn_bgp_agent.utils import helpers
 
 LOG = logging.getLogger(__name__)
 
 RE_TABLE_ROW = re.compile(r"^(?P<table>[0-9]+)\s+(?P<bridge>\S+)")
 
+# Routes found on a table when the agent started, that are kept (and keep
+# forwarding traffic) until the first sync either re-installs or sweeps them
+# {table_id: set((dst, dst_len, oif, gateway))}
+_STALE_ROUTES = {}
+
+# Whether the kernel supports NETLINK_GET_STRICT_CHK, i.e., filtering the
+# dump requests (by table, family, oif, interface...) on the kernel side
+# instead of transferring every object to discard most of them here. It is
+# disabled on the first dump failing due to the lack of support for it.
+_STRICT_CHECK = True
+
+# Serializes the creation of each device not ensured yet, as the sync
+# partitions may run concurrently and need the same device (e.g. the vlan
+# device of a provider network), while different devices are still ensured
+# concurrently. _ensure_locks_lock only guards the registry of locks.
+_ensure_locks = {}
+_ensure_locks_lock = threading.Lock()
+
+
+class RouteInfo(collections.namedtuple(
+        'RouteInfo', ['dst', 'dst_len', 'oif', 'table', 'gateway', 'vlan'])):
+    """Route added by the agent on an OVN routing table
+
+    The routes are kept per device, in sets of these records, with the
+    addresses interned, as there can be a large number of them.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_route(cls, route, vlan=None):
+        gateway = route.get('gateway')
+        return cls(sys.intern(route['dst']), route['dst_len'], route['oif'],
+                   route['table'], gateway and sys.intern(gateway), vlan)
+
+
+class LinkInfo(collections.namedtuple(
+        'LinkInfo', ['index', 'name', 'address', 'master', 'up'])):
+    """Main attributes of a link, as returned by get_link_info"""
+    __slots__ = ()
+
+    @classmethod
+    def from_link(cls, link):
+        return cls(link['index'], link.get_attr('IFLA_IFNAME'),
+                   link.get_attr('IFLA_ADDRESS'), link.get_attr('IFLA_MASTER'),
+                   bool(link['flags'] & ifinfmsg.IFF_UP))
+
+
+def get_ip_key(ip):
+    """Get the normalized (packed address, prefixlen) of an IP or a CIDR
+
+    An IP without prefix length is taken as a host one (/32 or /128), the
+    same way the ip rules to it are (e.g., 10.0.0.1 and 10.0.0.1/32 have
+    the same key).
+
+    :raises ValueError: if it is not a valid IP or CIDR.
+    """
+    address, _, prefixlen = ip.partition('/')
+    packed = ipaddress.ip_address(address).packed
+    return packed, int(prefixlen) if prefixlen else len(packed) * 8
+
+
+class IpLeftovers(object):
+    """IPs or CIDRs found on the node at sync time, along with their info
+
+    They are hashed by get_ip_key, so that the ones still needed can be
+    discarded in constant time while syncing, whatever their notation,
+    leaving only the leftovers to delete. It can be built from a list of
+    IPs (such as the exposed ones) or from a dict with them as keys (such
+    as the ip rules, by destination), skipping the ones that are not valid
+    IPs or CIDRs. It is iterated as the list of IPs, and items() returns the
+    pairs of IP and info as in the dict.
+    """
+
+    def __init__(self, ips=()):
+        if not isinstance(ips, dict):
+            ips = dict.fromkeys(ips)
+        self._ips = {}
+        for ip, info in ips.items():
+            try:
+                self._ips[get_ip_key(ip)] = (ip, info)
+            except ValueError:
+                # e.g., an ip rule without destination ("None/0")
+                LOG.debug("Ignoring %s as it is not a valid IP or CIDR", ip)
+
+    def __bool__(self):
+        return bool(self._ips)
+
+    def __len__(self):
+        return len(self._ips)
+
+    def __iter__(self):
+        return (ip for ip, _ in self._ips.values())
+
+    def __contains__(self, ip):
+        try:
+            return get_ip_key(ip) in self._ips
+        except ValueError:
+            return False
+
+    def items(self):
+        return list(self._ips.values())
+
+    def discard(self, ip):
+        """Discard the IP (or CIDR), as it is still needed"""
+        try:
+            self._ips.pop(get_ip_key(ip), None)
+        except ValueError:
+            pass
+
+
+def _netlink_dump(method, requests):
+    """Run the dump requests with filtering done by the kernel if possible
+
+    param method: name of the IPRoute method to dump with, e.g., get_routes
+    param requests: list of dicts with the filters for each dump request
+    return: list with the netlink messages returned by all the requests
+    """
+    global _STRICT_CHECK
+    if _STRICT_CHECK:
+        try:
+            with pyroute2.IPRoute(strict_check=True) as ipr:
+                return [msg for filters in requests
+                        for msg in getattr(ipr, method)(**filters)]
+        except (OSError, netlink_exceptions.NetlinkError) as e:
+            code = (e.code if isinstance(e, netlink_exceptions.NetlinkError)
+                    else e.errno)
+            if code not in (errno.ENOPROTOOPT, errno.EINVAL):
+                raise
+            LOG.info("Kernel side filtering of netlink dumps not supported "
+                     "(%s), falling back to filter them on the agent", e)
+            _STRICT_CHECK = False
+    with pyroute2.IPRoute() as ipr:
+        return [msg for filters in requests
+                for msg in getattr(ipr, method)(**filters)]
+
 
 def get_ip_version(ip):
     # IP network can consume both an IP address and a network with cidr
@@ -66,6 +207,28 @@ def get_interface_index(nic):
         raise agent_exc.NetworkInterfaceNotFound(device=nic)
 
 
+def start_link_monitor():
+    ovn_bgp_agent.privileged.linux_net.start_link_monitor()
+
+
+def get_link_info(device):
+    """Get the main attributes of a link, or None if it does not exist
+
+    Only the given link is requested, instead of dumping all of them, and
+    with no need for privileges.
+    """
+    device = device[:n_const.DEVICE_NAME_MAX_LEN]
+    try:
+        with pyroute2.IPRoute() as ipr:
+            link = ipr.link('get', ifname=device)[0]
+    except netlink_exceptions.NetlinkError as e:
+        if e.code == errno.ENODEV:
+            LOG.debug("Interface %s not found", device)
+            return
+        raise
+    return LinkInfo.from_link(link)
+
+
 @tenacity.retry(
     retry=tenacity.retry_if_exception_type(
         netlink_exceptions.NetlinkDumpInterrupted),
@@ -101,29 +264,94 @@ def get_nic_info(nic):
         raise agent_exc.NetworkInterfaceNotFound(device=nic)
 
 
+def _ensure_once(device, key, method, *args, master=None, depends=(),
+                 **kwargs):
+    """Run method to ensure device, unless it was already ensured for key
+
+    See device_registry for when a device has to be ensured again.
+    """
+    if device_registry.is_ensured(device, key):
+        return
+    with _get_ensure_lock(device):
+        # it may have been ensured while waiting for the lock
+        if device_registry.is_ensured(device, key):
+            return
+        token = device_registry.get_token(device)
+        method(*args, **kwargs)
+        device_registry.add(device, key, token, master=master,
+                            depends=depends)
+
+
+def _get_ensure_lock(device):
+    with _ensure_locks_lock:
+        return _ensure_locks.setdefault(device, threading.Lock())
+
+
 def ensure_vrf(vrf_name, vrf_table):
-    ovn_bgp_agent.privileged.linux_net.ensure_vrf(vrf_name, vrf_table)
+    _ensure_once(vrf_name, ('vrf', vrf_table),
+                 ovn_bgp_agent.privileged.linux_net.ensure_vrf,
+                 vrf_name, vrf_table)
 
 
 def ensure_bridge(bridge_name):
-    ovn_bgp_agent.privileged.linux_net.ensure_bridge(bridge_name)
+    _ensure_once(bridge_name, ('bridge',),
+                 ovn_bgp_agent.privileged.linux_net.ensure_bridge,
+                 bridge_name)
 
 
 def ensure_vxlan(vxlan_name, vni, local_ip, dstport):
-    ovn_bgp_agent.privileged.linux_net.ensure_vxlan(vxlan_name, vni, local_ip,
-                                                    dstport)
+    _ensure_once(vxlan_name, ('vxlan', vni, local_ip, dstport),
+                 ovn_bgp_agent.privileged.linux_net.ensure_vxlan,
+                 vxlan_name, vni, local_ip, dstport)
 
 
 def ensure_veth(veth_name, veth_peer):
-    ovn_bgp_agent.privileged.linux_net.ensure_veth(veth_name, veth_peer)
+    _ensure_once(veth_name, ('veth', veth_peer),
+                 ovn_bgp_agent.privileged.linux_net.ensure_veth,
+                 veth_name, veth_peer, depends=(veth_peer,))
+
+
+def ensure_evpn_devices(bridge_name, vxlan_name, vni, local_ip, dstport,
+                        vrf_name=None):
+    _ensure_once(bridge_name,
+                 ('evpn', vxlan_name, vni, local_ip, dstport, vrf_name),
+                 ovn_bgp_agent.privileged.linux_net.ensure_evpn_devices,
+                 bridge_name, vxlan_name, vni, local_ip, dstport,
+                 vrf_name=vrf_name, master=vrf_name,
+                 depends=(vxlan_name, vrf_name))
+
+
+def ensure_evpn_vlan_device(veth_vrf, veth_ovs, master, ips=(),
+                            arp_ndp_offset=None, routing_devices=()):
+    """Ensure the veth pair of an EVPN vlan device in a single privsep call
+
+    Besides attaching veth_vrf to master and adding the given ips to it, if
+    arp_ndp_offset is given (L3 mode) it is configured as
+    ensure_arp_ndp_enabled_for_bridge and enable_routing_for_interfaces
+    (along with routing_devices) would do.
+    """
+    ips = list(ips)
+    flags = []
+    if arp_ndp_offset is not None:
+        ips.extend(_get_arp_ndp_ips(arp_ndp_offset))
+        flags = [_get_proxy_arp_flag(veth_vrf), _get_proxy_ndp_flag(veth_vrf)]
+        flags.extend(_get_routing_flags(veth_vrf, *routing_devices))
+    changed = ovn_bgp_agent.privileged.linux_net.ensure_evpn_vlan_device(
+        veth_vrf, veth_ovs, master, ips=ips, flags=flags)
+    if changed:
+        LOG.debug('Sysctl flags modified: %s', changed)
 
 
 def set_master_for_device(device, master):
-    ovn_bgp_agent.privileged.linux_net.set_master_for_device(device, master)
+    _ensure_once(device, ('master', master),
+                 ovn_bgp_agent.privileged.linux_net.set_master_for_device,
+                 device, master, master=master)
 
 
 def ensure_dummy_device(device):
-    ovn_bgp_agent.privileged.linux_net.ensure_dummy_device(device)
+    _ensure_once(device, ('dummy',),
+                 ovn_bgp_agent.privileged.linux_net.ensure_dummy_device,
+                 device)
 
 
 def ensure_ovn_device(ovn_ifname, vrf_name):
@@ -133,15 +361,20 @@ def ensure_ovn_device(ovn_ifname, vrf_name):
 
 def delete_device(device):
     ovn_bgp_agent.privileged.linux_net.delete_device(device)
+    # do not wait for the link event, it may be ensured again right away
+    device_registry.invalidate(device)
 
 
-def ensure_arp_ndp_enabled_for_bridge(bridge, offset, vlan_tag=None):
+def _get_arp_ndp_ips(offset):
     ipv4 = "%s%d.%s" % (
         constants.ARP_IPV4_PREFIX, offset / constants.IPV4_OCTET_RANGE,
         offset % constants.IPV4_OCTET_RANGE)
     ipv6 = "%s%x" % (constants.NDP_IPV6_PREFIX, offset)
+    return [ipv4, ipv6]
+
 
-    for ip in (ipv4, ipv6):
+def ensure_arp_ndp_enabled_for_bridge(bridge, offset, vlan_tag=None):
+    for ip in _get_arp_ndp_ips(offset):
         try:
             ovn_bgp_agent.privileged.linux_net.add_ip_to_dev(ip, bridge)
         except agent_exc.IpAddressAlreadyExists:
@@ -153,8 +386,8 @@ def ensure_arp_ndp_enabled_for_bridge(bridge, offset, vlan_tag=None):
                 raise
 
     # also enable the arp/ndp on the bridge in case there are flat networks
-    enable_proxy_arp(bridge)
-    enable_proxy_ndp(bridge)
+    set_kernel_flags([_get_proxy_arp_flag(bridge),
+                      _get_proxy_ndp_flag(bridge)])
 
 
 def ensure_anycast_mac_for_interface(intf, offset):
@@ -169,10 +402,11 @@ def ensure_anycast_mac_for_interface(intf, offset):
     lladdr = ":".join([ll[i:i + 2] for i in range(0, len(ll), 2)])
 
     # Check what the mac address currently is.
-    dev = priv.get_link_device(intf)
-    curr_lladdr = priv.get_attr(dev, 'IFLA_ADDRESS')
+    link = get_link_info(intf)
+    if not link:
+        raise agent_exc.NetworkInterfaceNotFound(device=intf)
 
-    if lladdr != curr_lladdr:
+    if lladdr != link.address:
         LOG.info("Updating mac address for intf %s to address %s",
                  intf, lladdr)
         priv.set_link_attribute(intf, address=lladdr)
@@ -185,11 +419,11 @@ def ensure_anycast_mac_for_interface(intf, offset):
 
         # Fetch all ipv6 addresses and check if we already configured the
         # link-local address.
-        addresses = priv.get_ip_addresses(
-            index=dev['index'], family=constants.AF_INET6)
+        with pyroute2.IPRoute() as ipr:
+            addresses = ipr.get_addr(index=link.index,
+                                     family=constants.AF_INET6)
         for addr in addresses:
-            ip_addr = ipaddress.IPv6Address(
-                priv.get_attr(addr, 'IFA_ADDRESS'))
+            ip_addr = ipaddress.IPv6Address(addr.get_attr('IFA_ADDRESS'))
 
             if (addr['scope'] != 0 and
                     ip_addr in ll_net and
@@ -402,12 +636,19 @@ def get_extra_routing_table_for_bridge(ovn_routing_tables, bridge):
 
 
 def ensure_vlan_device_for_network(bridge, vlan_tag):
+    vlan_device_name = '{}.{}'.format(
+        bridge[:constants.OVN_VLAN_DEVICE_MAX_LENGTH], vlan_tag)
+    _ensure_once(vlan_device_name, ('vlan', bridge, vlan_tag),
+                 _ensure_vlan_device_for_network, bridge, vlan_tag)
+
+
+def _ensure_vlan_device_for_network(bridge, vlan_tag):
     ovn_bgp_agent.privileged.linux_net.ensure_vlan_device_for_network(bridge,
                                                                       vlan_tag)
     device = "{}/{}".format(
         bridge[:constants.OVN_VLAN_DEVICE_MAX_LENGTH], vlan_tag)
-    enable_proxy_arp(device)
-    enable_proxy_ndp(device)
+    set_kernel_flags([_get_proxy_arp_flag(device),
+                      _get_proxy_ndp_flag(device)])
 
 
 def delete_vlan_device_for_network(bridge, vlan_tag):
@@ -416,22 +657,59 @@ def delete_vlan_device_for_network(bridge, vlan_tag):
     delete_device(vlan_device_name)
 
 
+@tenacity.retry(
+    retry=tenacity.retry_if_exception_type(
+        netlink_exceptions.NetlinkDumpInterrupted),
+    wait=tenacity.wait_exponential(multiplier=0.02, max=1),
+    stop=tenacity.stop_after_delay(8),
+    reraise=True)
 def get_bridge_vlans(bridge):
-    return ovn_bgp_agent.privileged.linux_net.get_bridge_vlans(bridge)
+    """Get the VLAN IDs of the vlan devices on top of the bridge"""
+    try:
+        index = get_interface_index(bridge)
+    except agent_exc.NetworkInterfaceNotFound:
+        LOG.debug("OVS Bridge %s deleted, no need to get information about "
+                  "associated vlan devices", bridge)
+        return []
+
+    with pyroute2.IPRoute() as ipr:
+        vlan_devices = ipr.get_links(link=index)
+    vlans = []
+    for vlan_device in vlan_devices:
+        ifla_data = vlan_device.get_nested('IFLA_LINKINFO',
+                                           'IFLA_INFO_DATA')
+        if ifla_data:
+            vlans.append(ifla_data.get_attr('IFLA_VLAN_ID'))
+    return vlans
+
+
+def set_kernel_flags(flags):
+    LOG.debug('Configure sysctl %s', flags)
+    changed = ovn_bgp_agent.privileged.linux_net.set_kernel_flags(flags)
+    if changed:
+        LOG.debug('Sysctl flags modified: %s', changed)
+
+
+def _get_proxy_ndp_flag(device):
+    return (f"net.ipv6.conf.{device[:n_const.DEVICE_NAME_MAX_LEN]}.proxy_ndp",
+            1)
+
+
+def _get_proxy_arp_flag(device):
+    return (f"net.ipv4.conf.{device[:n_const.DEVICE_NAME_MAX_LEN]}.proxy_arp",
+            1)
 
 
 def enable_proxy_ndp(device):
-    flag = f"net.ipv6.conf.{device[:n_const.DEVICE_NAME_MAX_LEN]}.proxy_ndp"
-    ovn_bgp_agent.privileged.linux_net.set_kernel_flag(flag, 1)
+    _ensure_once(device, ('proxy_ndp',), set_kernel_flags,
+                 [_get_proxy_ndp_flag(device)])
 
 
 def enable_proxy_arp(device):
-    flag = f"net.ipv4.conf.{device[:n_const.DEVICE_NAME_MAX_LEN]}.proxy_arp"
-    ovn_bgp_agent.privileged.linux_net.set_kernel_flag(flag, 1)
+    set_kernel_flags([_get_proxy_arp_flag(device)])
 
 
-def enable_routing_for_interfaces(*interfaces):
-    # Configure sysctl
+def _get_routing_flags(*interfaces):
     keys = [
         ('net.ipv4.ip_forward', 1),
         ('net.ipv4.conf.all.forwarding', 1),
@@ -441,10 +719,12 @@ def enable_routing_for_interfaces(*interfaces):
         intf_key = intf.replace('.', '/')
         keys.append((f'net.ipv4.conf.{intf_key}.forwarding', 1))
         keys.append((f'net.ipv6.conf.{intf_key}.forwarding', 1))
+    return keys
 
-    for k, v in keys:
-        LOG.debug('Configure sysctl %s=%s', k, v)
-        ovn_bgp_agent.privileged.linux_net.set_kernel_flag(k, v)
+
+def enable_routing_for_interfaces(*interfaces):
+    # Configure sysctl
+    set_kernel_flags(_get_routing_flags(*interfaces))
 
 
 @tenacity.retry(
@@ -456,10 +736,9 @@ def enable_routing_for_interfaces(*interfaces):
 def get_exposed_ips(nic):
     nic_idx = get_interface_index(nic)
     try:
-        with pyroute2.IPRoute() as ipr:
-            return [ip.get_attr('IFA_ADDRESS')
-                    for ip in ipr.get_addr(index=nic_idx)
-                    if ip['prefixlen'] in (32, 128)]
+        return [ip.get_attr('IFA_ADDRESS')
+                for ip in _netlink_dump('get_addr', [{'index': nic_idx}])
+                if ip['prefixlen'] in (32, 128)]
     except pyroute2.netlink.exceptions.NetlinkError:
         # Nic does not exist
         LOG.debug("NIC %s does not yet exist, so it does not have exposed IPs",
@@ -494,26 +773,6 @@ def get_exposed_ips_on_network(nic, network):
     return [ip for ip in exposed_ips if ipaddress.ip_address(ip) in network]
 
 
-@tenacity.retry(
-    retry=tenacity.retry_if_exception_type(
-        netlink_exceptions.NetlinkDumpInterrupted),
-    wait=tenacity.wait_exponential(multiplier=0.02, max=1),
-    stop=tenacity.stop_after_delay(8),
-    reraise=True)
-def get_exposed_routes_on_network(table_ids, network):
-    with pyroute2.NDB() as ndb:
-        # NOTE: skip bgp routes (proto 186)
-        return [
-            r
-            for r in ndb.routes.dump()
-            if r.table in table_ids and
-            r.dst != "" and
-            r.gateway is not None and
-            r.proto != 186 and
-            ipaddress.ip_address(r.gateway) in network
-        ]
-
-
 @tenacity.retry(
     retry=tenacity.retry_if_exception_type(
         netlink_exceptions.NetlinkDumpInterrupted),
@@ -538,11 +797,11 @@ def get_ovn_ip_rules(routing_tables):
 
 
 def delete_exposed_ips(ips, nic):
-    ovn_bgp_agent.privileged.linux_net.delete_exposed_ips(ips, nic)
+    ovn_bgp_agent.privileged.linux_net.delete_exposed_ips(list(ips), nic)
 
 
 def delete_ip_rules(ip_rules):
-    ovn_bgp_agent.privileged.linux_net.delete_ip_rules(ip_rules)
+    ovn_bgp_agent.privileged.linux_net.delete_ip_rules(dict(ip_rules.items()))
 
 
 def delete_bridge_ip_routes(routing_tables, routing_tables_routes,
@@ -552,23 +811,22 @@ def delete_bridge_ip_routes(routing_tables, routing_tables_routes,
             continue
         for route_info in routes_info:
             oif = get_interface_index(device)
-            if route_info['vlan']:
+            if route_info.vlan:
                 vlan_device_name = '{}.{}'.format(
                     device[:constants.OVN_VLAN_DEVICE_MAX_LENGTH],
-                    route_info['vlan'])
+                    route_info.vlan)
                 oif = get_interface_index(vlan_device_name)
-            if 'gateway' in route_info['route'].keys():  # subnet route
+            if route_info.gateway:  # subnet route
                 possible_matchings = [
                     r for r in extra_routes[device]
-                    if (r.get_attr('RTA_DST') == route_info['route']['dst'] and
-                        r['dst_len'] == route_info['route']['dst_len'] and
-                        r.get_attr('RTA_GATEWAY') == route_info['route'][
-                            'gateway'])]
+                    if (r.get_attr('RTA_DST') == route_info.dst and
+                        r['dst_len'] == route_info.dst_len and
+                        r.get_attr('RTA_GATEWAY') == route_info.gateway)]
             else:  # cr-lrp
                 possible_matchings = [
                     r for r in extra_routes[device]
-                    if (r.get_attr('RTA_DST') == route_info['route']['dst'] and
-                        r['dst_len'] == route_info['route']['dst_len'] and
+                    if (r.get_attr('RTA_DST') == route_info.dst and
+                        r['dst_len'] == route_info.dst_len and
                         r.get_attr('RTA_OIF') == oif)]
             for r in possible_matchings:
                 extra_routes[device].remove(r)
@@ -590,6 +848,42 @@ def delete_routes_from_table(table):
     delete_ip_routes(table_routes)
 
 
+def _get_route_key(route):
+    return (route.get('dst'), int(route['dst_len']), route.get('oif'),
+            route.get('gateway'))
+
+
+def mark_stale_routes(table):
+    """Mark the current routes on the table as stale
+
+    Instead of removing them right away, they are kept until the agent
+    either re-installs them (through add_ip_route) or sweeps them with
+    sweep_stale_routes.
+    """
+    _STALE_ROUTES[table] = {
+        _get_route_key(r) for r in _get_table_routes(table)}
+    LOG.debug("Marked %d routes on table %s as stale",
+              len(_STALE_ROUTES[table]), table)
+
+
+def _unmark_stale_route(route):
+    stale_routes = _STALE_ROUTES.get(route['table'])
+    if stale_routes:
+        stale_routes.discard(_get_route_key(route))
+
+
+def sweep_stale_routes(table):
+    """Remove the routes marked as stale that were not re-installed"""
+    stale_routes = _STALE_ROUTES.pop(table, None)
+    if not stale_routes:
+        return
+    table_routes = [r for r in _get_table_routes(table)
+                    if _get_route_key(r) in stale_routes]
+    LOG.debug("Sweeping %d stale routes from table %s", len(table_routes),
+              table)
+    delete_ip_routes(table_routes)
+
+
 @tenacity.retry(
     retry=tenacity.retry_if_exception_type(
         netlink_exceptions.NetlinkDumpInterrupted),
@@ -597,11 +891,22 @@ def delete_routes_from_table(table):
     stop=tenacity.stop_after_delay(8),
     reraise=True)
 def _get_table_routes(table):
-    with pyroute2.IPRoute() as ipr:
-        return [
-            r for r in ipr.get_routes(table=table)
-            if r['scope'] != 254 and r['proto'] != 186
-        ]
+    return [
+        r for r in _netlink_dump('get_routes', [{'table': table}])
+        if r['scope'] != 254 and r['proto'] != 186
+    ]
+
+
+def get_table_routes_by_oif(table):
+    """Return the routes of the table, by the index of their output device
+
+    The table is dumped once, so that the routes of each of the devices on
+    it can be looked up without dumping it again.
+    """
+    routes = collections.defaultdict(list)
+    for route in _get_table_routes(table):
+        routes[route.get_attr('RTA_OIF')].append(route)
+    return routes
 
 
 @tenacity.retry(
@@ -611,15 +916,29 @@ def _get_table_routes(table):
     stop=tenacity.stop_after_delay(8),
     reraise=True)
 def get_routes_on_tables(table_ids):
-    routes = []
-    with pyroute2.IPRoute() as ipr:
-        for table_id in table_ids:
-            table_routes = [
-                r for r in ipr.get_routes(table=table_id)
-                if r.get_attr('RTA_DST') and r['proto'] != 186
-            ]
-            routes.extend(table_routes)
-    return routes
+    return [
+        r for r in _netlink_dump('get_routes',
+                                 [{'table': table_id}
+                                  for table_id in table_ids])
+        if r.get_attr('RTA_DST') and r['proto'] != 186
+    ]
+
+
+def get_state_fingerprint(nic, table_ids):
+    """Return a fingerprint of the exposed IPs and the ovn rules and routes
+
+    It covers the IPs on nic, as well as the ip rules pointing to table_ids
+    and the (non bgp) routes on them, so that comparing it with a previous
+    one tells if any of them was added or removed in between.
+    """
+    ovn_ip_rules = get_ovn_ip_rules(table_ids)
+    routes = get_routes_on_tables(table_ids)
+    return (
+        helpers.fingerprint(get_exposed_ips(nic)),
+        helpers.fingerprint((dst, rule['table'])
+                            for dst, rule in ovn_ip_rules.items()),
+        helpers.fingerprint((r.get_attr('RTA_TABLE'),) + _get_route_key(r)
+                            for r in routes))
 
 
 def delete_ip_routes(routes):
@@ -641,6 +960,24 @@ def del_ndp_proxy(ip, dev, vlan=None):
     ovn_bgp_agent.privileged.linux_net.del_ndp_proxy(ip, dev, vlan)
 
 
+def add_ndp_proxies(ips, dev, vlan=None):
+    if ips:
+        ovn_bgp_agent.privileged.linux_net.add_ndp_proxies(ips, dev, vlan)
+
+
+def del_ndp_proxies(ips, dev, vlan=None):
+    if ips:
+        ovn_bgp_agent.privileged.linux_net.del_ndp_proxies(ips, dev, vlan)
+
+
+def sync_ndp_proxies(ips, dev, vlan=None):
+    added, deleted = ovn_bgp_agent.privileged.linux_net.sync_ndp_proxies(
+        ips, dev, vlan)
+    if added or deleted:
+        LOG.debug("Proxy neighbours for dev %s (vlan %s) updated. Added: %s, "
+                  "deleted: %s", dev, vlan, added, deleted)
+
+
 def add_ips_to_dev(nic, ips, clear_local_route_at_table=False):
     already_added_ips = []
     for ip in ips:
@@ -781,8 +1118,9 @@ def add_ip_route(ovn_routing_tables_routes, ip_address, route_table, dev,
             LOG.debug("Route created at table %s: %s", route_table, route)
         else:
             LOG.debug("Route already existing: %s", route)
-    route_info = {'vlan': vlan, 'route': route}
-    ovn_routing_tables_routes.setdefault(dev, []).append(route_info)
+    _unmark_stale_route(route)
+    ovn_routing_tables_routes.setdefault(dev, set()).add(
+        RouteInfo.from_route(route, vlan))
 
 
 def del_ip_route(ovn_routing_tables_routes, ip_address, route_table, dev,
@@ -829,11 +1167,11 @@ def del_ip_route(ovn_routing_tables_routes, ip_address, route_table, dev,
     LOG.debug("Deleting route at table %s: %s", route_table, route)
     ovn_bgp_agent.privileged.linux_net.route_delete(route)
     LOG.debug("Route deleted at table %s: %s", route_table, route)
-    route_info = {'vlan': vlan, 'route': route}
-    if route_info in ovn_routing_tables_routes.get(dev, []):
-        ovn_routing_tables_routes[dev].remove(route_info)
+    ovn_routing_tables_routes.get(dev, set()).discard(
+        RouteInfo.from_route(route, vlan))
 
 
 def set_device_status(device, status, ndb=None):
-    ovn_bgp_agent.privileged.linux_net.set_device_state(
-        device, status, ndb=ndb)
+    _ensure_once(device, ('status', status),
+                 ovn_bgp_agent.privileged.linux_net.set_device_state,
+                 device, status, ndb=ndb)
@@ -0,0 +1,244 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""On demand profiling of the syncs and the events handlers
+
+Sending PROFILING_SIGNAL to the agent profiles (with cProfile) the next
+CONF.profiling_syncs sync runs, and every event handler run during the next
+CONF.profiling_duration seconds, with no need to restart it.
+
+For each profiled sync, a <sync-...>.prof file (pstats format) and a
+<sync-...>.json file with the wall-clock time of each of its phases (as
+marked by the drivers with end_phase()) are written to CONF.profiling_dir.
+For the handlers, a <handlers-...>.prof file and a <handlers-...>.json file
+with the number of runs and the wall-clock time of each event are written
+there once the profiling period ends. Both json files also include the
+statistics of the calls to each privsep context, since the agent started.
+
+Note cProfile only profiles the thread it is enabled on, so the calls made
+from the sync_workers threads are only accounted for in the phase timings.
+"""
+
+import collections
+import contextlib
+import cProfile
+import json
+import marshal
+import os
+import pstats
+import signal
+import tempfile
+import threading
+import time
+
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from ovn_bgp_agent import privileged
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+PROFILING_SIGNAL = signal.SIGUSR1
+
+_lock = threading.Lock()
+_local = threading.local()
+# set by the signal handler, for _wait_requests to request the profiling
+_requested = threading.Event()
+_syncs_left = 0
+_handlers_session = None
+
+
+class _HandlersSession(object):
+
+    def __init__(self, duration):
+        self.start_time = time.time()
+        self.end = time.monotonic() + duration
+        self.profiles = []
+        # event name -> [runs, total time, max time]
+        self.timings = collections.defaultdict(lambda: [0, 0.0, 0.0])
+
+    def is_active(self):
+        return time.monotonic() < self.end
+
+    def add(self, event_name, profile, elapsed):
+        with _lock:
+            if profile is not None:
+                self.profiles.append(profile)
+            timing = self.timings[event_name]
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+
+def request(syncs=0, duration=0):
+    """Profile the next syncs runs and the handlers for duration seconds"""
+    global _syncs_left, _handlers_session
+    with _lock:
+        _syncs_left = max(_syncs_left, syncs)
+        start_handlers = duration > 0 and _handlers_session is None
+        if start_handlers:
+            _handlers_session = _HandlersSession(duration)
+    if start_handlers:
+        timer = threading.Timer(duration, _finish_handlers_session)
+        timer.daemon = True
+        timer.start()
+    LOG.info("Profiling the next %d syncs and the events handlers for %d "
+             "seconds", syncs, duration)
+
+
+def _handle_signal(signum, frame):
+    # NOTE: the handler runs on the main thread in between any two of its
+    # instructions, maybe while holding _lock or the logging locks, so the
+    # request is handed off to the _wait_requests thread
+    _requested.set()
+
+
+def _wait_requests():
+    while True:
+        _requested.wait()
+        _requested.clear()
+        try:
+            request(CONF.profiling_syncs, CONF.profiling_duration)
+        except Exception:
+            LOG.exception("Unable to request the profiling")
+
+
+def setup_signal_handler():
+    thread = threading.Thread(target=_wait_requests,
+                              name='profiling-requests', daemon=True)
+    thread.start()
+    signal.signal(PROFILING_SIGNAL, _handle_signal)
+
+
+def _enable(profile):
+    try:
+        profile.enable()
+    except ValueError as e:
+        # Another profiler is already active (Python >= 3.12 only allows
+        # one at a time)
+        LOG.debug("Unable to enable the profiler: %s", e)
+        return
+    return profile
+
+
+def _get_path(prefix, extension):
+    return os.path.join(
+        CONF.profiling_dir or tempfile.gettempdir(),
+        '{}.{}'.format(prefix, extension))
+
+
+def _open(prefix, extension, mode):
+    # NOTE: the file names are predictable and the agent runs as root, so
+    # never follow a symlink or overwrite a file planted there by someone
+    # else (e.g. in the world-writable temporary directory)
+    fd = os.open(_get_path(prefix, extension),
+                 os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+    return os.fdopen(fd, mode)
+
+
+def _dump(prefix, profiles, data):
+    try:
+        if profiles:
+            with _open(prefix, 'prof', 'wb') as f:
+                marshal.dump(pstats.Stats(*profiles).stats, f)
+        with _open(prefix, 'json', 'w') as f:
+            json.dump(data, f, indent=2)
+    except OSError as e:
+        LOG.warning("Unable to write the profiling data of %s: %s", prefix,
+                    e)
+        return
+    LOG.info("Profiling data written to %s", _get_path(prefix, '*'))
+
+
+def _get_timestamp(start_time):
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(start_time))
+
+
+@contextlib.contextmanager
+def sync_profile(name):
+    """Profile the sync run in the block, if requested"""
+    global _syncs_left
+    with _lock:
+        profiling = _syncs_left > 0
+        if profiling:
+            _syncs_left -= 1
+    if not profiling:
+        yield
+        return
+
+    phases = []
+    _local.phases = phases
+    start_time = time.time()
+    start = _local.phase_start = time.monotonic()
+    profile = _enable(cProfile.Profile())
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+        elapsed = time.monotonic() - start
+        _local.phases = None
+        LOG.info("Profiled %s sync took %.3f seconds: %s", name, elapsed,
+                 ', '.join('{}={:.3f}'.format(*p) for p in phases))
+        _dump('sync-{}-{}'.format(name, _get_timestamp(start_time)),
+              [profile] if profile is not None else [],
+              {'sync': name, 'start_time': start_time, 'elapsed': elapsed,
+               'phases': [{'name': n, 'elapsed': e} for n, e in phases],
+               'privsep': privileged.get_stats()})
+
+
+def end_phase(name):
+    """Record the wall-clock time of a sync phase, if the sync is profiled
+
+    The phase is the time since the previous one ended, or since the sync
+    started.
+    """
+    phases = getattr(_local, 'phases', None)
+    if phases is None:
+        return
+    now = time.monotonic()
+    phases.append((name, now - _local.phase_start))
+    _local.phase_start = now
+
+
+@contextlib.contextmanager
+def handler_profile(event_name):
+    """Profile the event handler run in the block, if requested"""
+    session = _handlers_session
+    if session is None or not session.is_active():
+        yield
+        return
+
+    start = time.monotonic()
+    profile = _enable(cProfile.Profile())
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+        session.add(event_name, profile, time.monotonic() - start)
+
+
+def _finish_handlers_session():
+    global _handlers_session
+    with _lock:
+        session, _handlers_session = _handlers_session, None
+        profiles = list(session.profiles)
+        timings = dict(session.timings)
+    _dump('handlers-{}'.format(_get_timestamp(session.start_time)), profiles,
+          {'start_time': session.start_time,
+           'events': {name: {'runs': runs, 'elapsed': total, 'max': max_}
+                      for name, (runs, total, max_) in timings.items()},
+           'privsep': privileged.get_stats()})
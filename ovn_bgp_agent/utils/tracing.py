@@ -0,0 +1,240 @@
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Event to dataplane latency tracing
+
+A trace is started when an OVSDB row notification matches some watched
+events, and it is finished once all of them have run. In between, the spans
+opened (in any thread the trace is activated on) are recorded as children
+of the current one: events matching, lock waits, wiring and privsep calls.
+
+Finished traces are appended to CONF.trace_file, one per line, using the
+OpenTelemetry (OTLP/JSON) format, so they can be loaded by any tool reading
+the output of the OpenTelemetry collector file exporter.
+"""
+
+import contextlib
+import functools
+import json
+import random
+import threading
+import time
+
+from oslo_concurrency import lockutils
+from oslo_config import cfg
+from oslo_log import log as logging
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+SERVICE_NAME = 'ovn-bgp-agent'
+SCOPE_NAME = 'ovn_bgp_agent'
+# OTLP span kind and status codes
+SPAN_KIND_INTERNAL = 1
+STATUS_CODE_ERROR = 2
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class Span(object):
+
+    def __init__(self, trace, name, parent=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent else ''
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self.error = None
+
+    def end(self):
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+
+    def to_dict(self):
+        span = {
+            'traceId': self.trace.trace_id,
+            'spanId': self.span_id,
+            'parentSpanId': self.parent_id,
+            'name': self.name,
+            'kind': SPAN_KIND_INTERNAL,
+            'startTimeUnixNano': str(self.start_time),
+            'endTimeUnixNano': str(self.end_time or time.time_ns()),
+            'attributes': [_attribute(k, v)
+                           for k, v in self.attributes.items()],
+        }
+        if self.error:
+            span['status'] = {'code': STATUS_CODE_ERROR,
+                              'message': self.error}
+        return span
+
+
+class Trace(object):
+    """Spans related to the processing of an OVSDB notification
+
+    The trace is kept open while it is held, i.e., until every matched event
+    handling it was queued for releases it.
+    """
+
+    def __init__(self, name, attributes=None, idl=None):
+        self.trace_id = '%032x' % random.getrandbits(128)
+        self.idl = idl
+        self._lock = threading.Lock()
+        self._holders = 0
+        self.root = Span(self, name, attributes=attributes)
+        self.spans = [self.root]
+
+    def new_span(self, name, parent=None, attributes=None):
+        span = Span(self, name, parent=parent or self.root,
+                    attributes=attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def hold(self):
+        with self._lock:
+            self._holders += 1
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders > 0:
+                return
+        self.finish()
+
+    def finish(self):
+        self.root.end()
+        if self.idl is not None:
+            # NOTE: the IDL only stores the transaction id once the whole
+            # update has been processed, which already happened by now (but
+            # a later update could have been processed too)
+            self.root.attributes['ovsdb.txn_id'] = str(
+                getattr(self.idl, 'last_id', ''))
+        _export(self)
+
+    @contextlib.contextmanager
+    def activate(self, name, attributes=None):
+        """Run the block within a new span of the trace on this thread"""
+        span = self.new_span(name, parent=_get_current_span(),
+                             attributes=attributes)
+        with _current_span(span):
+            yield span
+
+
+def _get_current_span():
+    return getattr(_local, 'span', None)
+
+
+@contextlib.contextmanager
+def _current_span(span):
+    previous = _get_current_span()
+    _local.span = span
+    try:
+        yield span
+    except Exception as e:
+        span.error = '{}: {}'.format(type(e).__name__, e)
+        raise
+    finally:
+        span.end()
+        _local.span = previous
+
+
+def is_enabled():
+    return bool(CONF.trace_file)
+
+
+def start_trace(name, attributes=None, idl=None):
+    """Start a new trace, if tracing is enabled and it is sampled
+
+    :returns: the Trace, or None if not traced
+    """
+    if not is_enabled() or random.random() >= CONF.trace_sample_rate:
+        return
+    return Trace(name, attributes=attributes, idl=idl)
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Run the block within a child span of the current one, if any"""
+    parent = _get_current_span()
+    if parent is None:
+        yield None
+        return
+    with parent.trace.activate(name, attributes=attributes) as new_span:
+        yield new_span
+
+
+def traced(name=None):
+    """Decorator running the function within a span, if there is a trace"""
+    def decorator(f):
+        span_name = name or '{}.{}'.format(f.__module__, f.__name__)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if _get_current_span() is None:
+                return f(*args, **kwargs)
+            with span(span_name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def synchronized(lock_name):
+    """lockutils.synchronized recording the time waiting for the lock"""
+    def decorator(f):
+        @lockutils.synchronized(lock_name)
+        def _locked(wait_span, *args, **kwargs):
+            if wait_span is None:
+                return f(*args, **kwargs)
+            wait_span.end()
+            with span(f.__name__):
+                return f(*args, **kwargs)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            parent = _get_current_span()
+            wait_span = None
+            if parent is not None:
+                wait_span = parent.trace.new_span(
+                    'lock.wait', parent=parent, attributes={'lock': lock_name})
+            return _locked(wait_span, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _export(trace):
+    data = {'resourceSpans': [{
+        'resource': {'attributes': [_attribute('service.name',
+                                               SERVICE_NAME)]},
+        'scopeSpans': [{
+            'scope': {'name': SCOPE_NAME},
+            'spans': [s.to_dict() for s in trace.spans]}]}]}
+    try:
+        with _write_lock, open(CONF.trace_file, 'a') as f:
+            f.write(json.dumps(data) + '\n')
+    except OSError as e:
+        LOG.warning("Unable to write the trace %s to %s: %s", trace.trace_id,
+                    CONF.trace_file, e)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Memory used by the exposure state kept by the agent
+
+Builds the routes kept per device (ovn_routing_tables_routes), the routes
+kept per EVPN vlan device and the IPs exposed by the NB driver, for the
+given number of objects, both with the previous (nested dicts and lists)
+and the current (records) representations, and prints the memory used by
+each one along with the time to remove all of the routes one by one.
+
+Usage: python tools/benchmark_exposure_state.py [number of objects]
+"""
+
+import ipaddress
+import sys
+import time
+import tracemalloc
+
+from ovn_bgp_agent.drivers.openstack import nb_ovn_bgp_driver
+from ovn_bgp_agent.drivers.openstack.utils import evpn
+from ovn_bgp_agent.utils import linux_net
+
+DEVICE = 'br-ex'
+TABLE = 200
+OIF = 10
+
+
+def _get_ips(count):
+    network = ipaddress.IPv4Network('10.0.0.0/8')
+    # build new strings, as the ones received from the OVN DBs would be
+    return [str(network[i]) for i in range(1, count + 1)]
+
+
+def _get_route(ip):
+    return {'dst': ip, 'dst_len': 32, 'oif': OIF, 'table': TABLE,
+            'proto': 3, 'scope': 253}
+
+
+def build_routes_dicts(ips):
+    routes = {DEVICE: []}
+    for ip in ips:
+        routes[DEVICE].append({'vlan': None, 'route': _get_route(ip)})
+    return routes
+
+
+def build_routes_records(ips):
+    routes = {DEVICE: set()}
+    for ip in ips:
+        routes[DEVICE].add(linux_net.RouteInfo.from_route(_get_route(ip)))
+    return routes
+
+
+def remove_routes_dicts(routes, ips):
+    for ip in ips:
+        route_info = {'vlan': None, 'route': _get_route(ip)}
+        if route_info in routes[DEVICE]:
+            routes[DEVICE].remove(route_info)
+
+
+def remove_routes_records(routes, ips):
+    for ip in ips:
+        routes[DEVICE].discard(
+            linux_net.RouteInfo.from_route(_get_route(ip)))
+
+
+def build_vlan_routes_dicts(ips):
+    return [{'ip': ip, 'mask': None, 'mac': 'fa:16:3e:00:00:01', 'via': None}
+            for ip in ips]
+
+
+def build_vlan_routes_records(ips):
+    return {ip: evpn.VlanDevRoute.create(ip, mac='fa:16:3e:00:00:01')
+            for ip in ips}
+
+
+def build_exposed_ips_dicts(ips):
+    return {'provider': {ip: {'bridge_device': DEVICE, 'bridge_vlan': None}
+                         for ip in ips}}
+
+
+def build_exposed_ips_records(ips):
+    exposed_ip = nb_ovn_bgp_driver.ExposedIp(DEVICE, None, None)
+    return {'provider': {ip: exposed_ip for ip in ips}}
+
+
+def measure(build, ips):
+    tracemalloc.start()
+    state = build(ips)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return state, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    ips = _get_ips(count)
+    print("Exposure state for {} objects".format(count))
+    print("{:<20} {:>12} {:>12} {:>8}".format(
+        'state', 'dicts (KiB)', 'records (KiB)', 'ratio'))
+    for name, build_dicts, build_records in (
+            ('routes', build_routes_dicts, build_routes_records),
+            ('vlan routes', build_vlan_routes_dicts,
+             build_vlan_routes_records),
+            ('exposed ips', build_exposed_ips_dicts,
+             build_exposed_ips_records)):
+        _, dicts_size = measure(build_dicts, ips)
+        _, records_size = measure(build_records, ips)
+        print("{:<20} {:>12.0f} {:>12.0f} {:>7.1f}x".format(
+            name, dicts_size / 1024, records_size / 1024,
+            dicts_size / records_size))
+
+    # removing every route is quadratic with the lists, so limit it
+    ips = ips[:min(count, 10000)]
+    for name, build, remove in (
+            ('dicts', build_routes_dicts, remove_routes_dicts),
+            ('records', build_routes_records, remove_routes_records)):
+        routes = build(ips)
+        start = time.perf_counter()
+        # latest first, as the lists are scanned from the beginning
+        remove(routes, ips[::-1])
+        print("Removing {} routes with {}: {:.3f} seconds".format(
+            len(ips), name, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Throughput of the privsep daemons depending on their thread_pool_size
+
+Starts (forking, so it has to run as root) privsep daemons with 1, 4 and
+16 threads, and measures how many netlink calls (getting a link, as most
+of the agent privileged calls do) per second they complete when made from
+several threads:
+- alone,
+- along with calls forking a slow command (as the ovs-ofctl and vtysh ones
+  do) on the same daemon,
+- along with those slow calls on another daemon, as the agent does with
+  its privsep_ovs_vsctl and privsep_vtysh contexts.
+
+Usage: sudo PYTHONPATH=. python tools/benchmark_privsep.py [calls]
+"""
+
+from concurrent import futures
+import sys
+import threading
+import time
+
+from oslo_concurrency import processutils
+from oslo_config import cfg
+from oslo_privsep import capabilities
+from oslo_privsep import priv_context
+from pyroute2 import iproute
+
+from ovn_bgp_agent import privileged
+
+CONF = cfg.CONF
+
+CLIENT_THREADS = 16
+SLOW_COMMAND = ('sleep', '0.05')
+WORKERS = (1, 4, 16)
+
+netlink_context = privileged.PrivContext(
+    __name__,
+    cfg_section='privsep_benchmark_netlink',
+    pypath=__name__ + '.netlink_context',
+    capabilities=[capabilities.CAP_NET_ADMIN],
+)
+
+command_context = privileged.PrivContext(
+    __name__,
+    cfg_section='privsep_benchmark_command',
+    pypath=__name__ + '.command_context',
+    capabilities=[capabilities.CAP_NET_ADMIN],
+)
+
+
+@netlink_context.entrypoint
+def netlink_get_link(device):
+    with iproute.IPRoute() as ipr:
+        return ipr.link('get', ifname=device)[0]['index']
+
+
+@netlink_context.entrypoint
+def netlink_run_command():
+    return processutils.execute(*SLOW_COMMAND)
+
+
+@command_context.entrypoint
+def command_run_command():
+    return processutils.execute(*SLOW_COMMAND)
+
+
+def _run_slow_calls(run_command, stop):
+    while not stop.is_set():
+        run_command()
+
+
+def measure(calls, run_command=None):
+    stop = threading.Event()
+    slow_callers = []
+    if run_command:
+        slow_callers = [threading.Thread(target=_run_slow_calls,
+                                         args=(run_command, stop))
+                        for _ in range(CLIENT_THREADS // 2)]
+        for thread in slow_callers:
+            thread.start()
+    start = time.perf_counter()
+    with futures.ThreadPoolExecutor(CLIENT_THREADS) as executor:
+        list(executor.map(netlink_get_link, ['lo'] * calls))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in slow_callers:
+        thread.join()
+    return calls / elapsed
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    CONF([], project='bgp-agent')
+    print("Netlink calls per second, from {} threads".format(CLIENT_THREADS))
+    print("{:>8} {:>10} {:>14} {:>16}".format(
+        'workers', 'alone', 'slow calls on', 'slow calls on'))
+    print("{:>8} {:>10} {:>14} {:>16}".format(
+        '', '', 'same daemon', 'another daemon'))
+    for workers in WORKERS:
+        for context in (netlink_context, command_context):
+            CONF.set_override('thread_pool_size', workers,
+                              group=context.cfg_section)
+            context.start(priv_context.Method.FORK)
+        try:
+            # warm up, so that the daemons are already running
+            netlink_get_link('lo')
+            command_run_command()
+            print("{:>8} {:>10.0f} {:>14.0f} {:>16.0f}".format(
+                workers, measure(calls),
+                measure(calls, netlink_run_command),
+                measure(calls, command_run_command)))
+        finally:
+            for context in (netlink_context, command_context):
+                context.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Copyright 2026 Red Hat, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Time to find the leftover exposed IPs and ip rules at sync time
+
+For an increasing number of exposed IPs (and ip rules to them), of which
+90% are still needed, times discarding the needed ones to find the
+leftovers, both the previous way (a list of IPs and a dict of rules by
+formatted destination) and with linux_net.IpLeftovers. The former grows
+quadratically with the number of IPs, the latter linearly.
+
+Usage: PYTHONPATH=. python tools/benchmark_sync_leftovers.py [max IPs]
+"""
+
+import ipaddress
+import sys
+import time
+
+from ovn_bgp_agent.utils import linux_net
+
+STALE_RATIO = 10
+
+
+def _get_ips(count):
+    networks = (ipaddress.IPv4Network('10.0.0.0/8'),
+                ipaddress.IPv6Network('fd00::/64'))
+    return [str(networks[i % 2][i + 1]) for i in range(count)]
+
+
+def _get_rules(ips):
+    return {'{}/{}'.format(ip, 128 if ':' in ip else 32): {'table': 200}
+            for ip in ips}
+
+
+def find_leftovers_lists(ips, needed_ips):
+    exposed_ips = list(ips)
+    ovn_ip_rules = _get_rules(ips)
+    for ip in needed_ips:
+        if exposed_ips and ip in exposed_ips:
+            exposed_ips.remove(ip)
+        if ovn_ip_rules:
+            if linux_net.get_ip_version(ip) == 6:
+                ip_dst = "{}/128".format(ip)
+            else:
+                ip_dst = "{}/32".format(ip)
+            ovn_ip_rules.pop(ip_dst, None)
+    return exposed_ips, ovn_ip_rules
+
+
+def find_leftovers_sets(ips, needed_ips):
+    exposed_ips = linux_net.IpLeftovers(ips)
+    ovn_ip_rules = linux_net.IpLeftovers(_get_rules(ips))
+    for ip in needed_ips:
+        if exposed_ips:
+            exposed_ips.discard(ip)
+        if ovn_ip_rules:
+            ovn_ip_rules.discard(ip)
+    return exposed_ips, ovn_ip_rules
+
+
+def measure(find_leftovers, ips, needed_ips):
+    start = time.perf_counter()
+    exposed_ips, ovn_ip_rules = find_leftovers(ips, needed_ips)
+    elapsed = time.perf_counter() - start
+    assert len(exposed_ips) == len(ovn_ip_rules) == len(ips) - len(needed_ips)
+    return elapsed
+
+
+def main():
+    max_count = int(sys.argv[1]) if len(sys.argv) > 1 else 32000
+    print("{:>8} {:>12} {:>12}".format('IPs', 'lists (s)', 'sets (s)'))
+    count = 1000
+    while count <= max_count:
+        ips = _get_ips(count)
+        # the needed IPs are the ones last exposed, latest first, as the
+        # list is scanned from the beginning
+        needed_ips = ips[count // STALE_RATIO:][::-1]
+        print("{:>8} {:>12.3f} {:>12.3f}".format(
+            count, measure(find_leftovers_lists, ips, needed_ips),
+            measure(find_leftovers_sets, ips, needed_ips)))
+        count *= 2
+
+
+if __name__ == '__main__':
+    main()